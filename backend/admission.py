@@ -0,0 +1,228 @@
+"""
+Admission control for provider (AI) calls.
+
+A global concurrency budget is shared by all plans; when it is exhausted,
+callers wait in per-tier FIFO queues that are served by weighted fair
+queueing (stride scheduling), so a flood of free users delays paying users
+only in proportion to the tier weights. Waiting is bounded: a full queue or
+a queue wait over the tier's limit is rejected fast with 503 + Retry-After,
+and a user over their own in-flight cap gets 429 + Retry-After.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Mapping, NamedTuple, Optional
+
+from .metrics import Counter, Gauge, Histogram
+
+ADMISSION_QUEUE_DEPTH = Gauge("tickrify_admission_queue_depth", "Requests waiting for a provider slot", ("tier",))
+ADMISSION_IN_USE = Gauge("tickrify_admission_slots_in_use", "Provider slots currently held")
+ADMISSION_WAIT_SECONDS = Histogram(
+    "tickrify_admission_wait_seconds", "Time spent queued before admission (admitted requests)", ("tier",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+ADMISSION_REJECTIONS = Counter(
+    "tickrify_admission_rejections", "Requests rejected by admission control", ("tier", "reason"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        self.message = message
+
+
+def _parse_tier_map(spec: str, cast=float) -> Dict[str, float]:
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.replace(":", "=").partition("=")
+        out[name.strip()] = cast(value)
+    return out
+
+
+class AdmissionTicket(NamedTuple):
+    user_id: str
+    tier: str
+    waited: float
+    admitted_at: float
+
+
+class _Waiter:
+    __slots__ = ("future", "user_id", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, user_id: str):
+        self.future = future
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        capacity: int = 16,
+        weights: Optional[Mapping[str, float]] = None,
+        max_wait: Optional[Mapping[str, float]] = None,
+        max_queue_depth: int = 100,
+        per_user_inflight: int = 2,
+        default_tier: str = "free",
+    ):
+        self.capacity = capacity
+        self.weights = dict(weights or {"alpha_pro": 6.0, "trader": 3.0, "free": 1.0})
+        self.max_wait = dict(max_wait or {"alpha_pro": 30.0, "trader": 20.0, "free": 8.0})
+        self.max_queue_depth = max_queue_depth
+        self.per_user_inflight = per_user_inflight
+        self.default_tier = default_tier
+        self.in_use = 0
+        self._user_inflight: Dict[str, int] = {}
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._pass: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # EWMA of slot hold time, used to estimate Retry-After
+        self._service_time = 5.0
+
+    def _tier(self, tier: Optional[str]) -> str:
+        return tier if tier in self.weights else self.default_tier
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters' futures belong to a loop; a new loop (tests, reloads) starts clean
+            self._loop = loop
+            self._queues.clear()
+            self._user_inflight.clear()
+            self.in_use = 0
+            ADMISSION_IN_USE.set(0)
+
+    def queue_depth(self, tier: Optional[str] = None) -> int:
+        if tier is not None:
+            return len(self._queues.get(tier, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    def retry_after(self, tier: str) -> int:
+        ahead = self.queue_depth() + 1
+        return max(1, math.ceil(self._service_time * ahead / max(1, self.capacity)))
+
+    def _reject(self, tier: str, status_code: int, reason: str, message: str) -> AdmissionRejected:
+        ADMISSION_REJECTIONS.labels(tier, reason).inc()
+        return AdmissionRejected(status_code, reason, self.retry_after(tier), message)
+
+    def _enqueue(self, tier: str, waiter: _Waiter) -> None:
+        queue = self._queues.setdefault(tier, deque())
+        if not queue:
+            # A tier coming back from idle does not get credit for the time it was away
+            self._pass[tier] = max(self._pass.get(tier, 0.0), self._virtual_time)
+        queue.append(waiter)
+        ADMISSION_QUEUE_DEPTH.labels(tier).set(len(queue))
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued waiters, lowest stride pass first."""
+        while self.in_use < self.capacity:
+            candidates = [t for t, q in self._queues.items() if q]
+            if not candidates:
+                return
+            tier = min(candidates, key=lambda t: self._pass[t])
+            waiter = self._queues[tier].popleft()
+            ADMISSION_QUEUE_DEPTH.labels(tier).set(len(self._queues[tier]))
+            if waiter.future.done():
+                continue  # timed out or cancelled while queued
+            self._virtual_time = self._pass[tier]
+            self._pass[tier] += 1.0 / self.weights[tier]
+            self.in_use += 1
+            ADMISSION_IN_USE.set(self.in_use)
+            waiter.future.set_result(None)
+
+    def _release(self, user_id: str, held_for: float) -> None:
+        self.in_use -= 1
+        ADMISSION_IN_USE.set(self.in_use)
+        remaining = self._user_inflight.get(user_id, 1) - 1
+        if remaining > 0:
+            self._user_inflight[user_id] = remaining
+        else:
+            self._user_inflight.pop(user_id, None)
+        self._service_time = 0.8 * self._service_time + 0.2 * held_for
+        self._dispatch()
+
+    async def acquire(self, user_id: str, tier: Optional[str] = None) -> AdmissionTicket:
+        """Wait for a slot; pass the ticket to ``release``. Raises AdmissionRejected."""
+        self._bind_loop()
+        tier = self._tier(tier)
+        if self._user_inflight.get(user_id, 0) >= self.per_user_inflight:
+            raise self._reject(tier, 429, "user_inflight",
+                               "Muitas análises simultâneas para este usuário; aguarde a conclusão das anteriores")
+        if self.in_use < self.capacity and not self.queue_depth():
+            self.in_use += 1
+            ADMISSION_IN_USE.set(self.in_use)
+            self._user_inflight[user_id] = self._user_inflight.get(user_id, 0) + 1
+            ADMISSION_WAIT_SECONDS.labels(tier).observe(0.0)
+            return AdmissionTicket(user_id, tier, 0.0, time.monotonic())
+        if self.queue_depth(tier) >= self.max_queue_depth:
+            raise self._reject(tier, 503, "queue_full", "Capacidade de análise esgotada no momento")
+
+        waiter = _Waiter(self._loop.create_future(), user_id)
+        # Count the user as in flight while queued so the per-user cap also bounds queue slots
+        self._user_inflight[user_id] = self._user_inflight.get(user_id, 0) + 1
+        self._enqueue(tier, waiter)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait.get(tier, 10.0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted at the same moment we gave up: give the slot back
+                self._release(user_id, 0.0)
+            else:
+                waiter.future.cancel()
+                self._dequeue_user(user_id)
+                queue = self._queues.get(tier)
+                if queue is not None and waiter in queue:
+                    queue.remove(waiter)
+                ADMISSION_QUEUE_DEPTH.labels(tier).set(len(queue or ()))
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject(tier, 503, "queue_timeout", "Fila de análise excedeu o tempo limite")
+        waited = time.monotonic() - waiter.enqueued_at
+        ADMISSION_WAIT_SECONDS.labels(tier).observe(waited)
+        return AdmissionTicket(user_id, tier, waited, time.monotonic())
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        self._release(ticket.user_id, time.monotonic() - ticket.admitted_at)
+
+    def _dequeue_user(self, user_id: str) -> None:
+        remaining = self._user_inflight.get(user_id, 1) - 1
+        if remaining > 0:
+            self._user_inflight[user_id] = remaining
+        else:
+            self._user_inflight.pop(user_id, None)
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, tier: Optional[str] = None):
+        ticket = await self.acquire(user_id, tier)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queued": {tier: len(q) for tier, q in self._queues.items()},
+            "estimated_service_seconds": round(self._service_time, 3),
+        }
+
+
+def controller_from_env() -> AdmissionController:
+    return AdmissionController(
+        capacity=int(os.getenv("AI_MAX_CONCURRENCY", "16")),
+        weights=_parse_tier_map(os.getenv("AI_TIER_WEIGHTS", "alpha_pro=6,trader=3,free=1")),
+        max_wait=_parse_tier_map(os.getenv("AI_QUEUE_MAX_WAIT_SECONDS", "alpha_pro=30,trader=20,free=8")),
+        max_queue_depth=int(os.getenv("AI_QUEUE_MAX_DEPTH", "100")),
+        per_user_inflight=int(os.getenv("AI_MAX_INFLIGHT_PER_USER", "2")),
+    )
+
+
+ai_admission = controller_from_env()
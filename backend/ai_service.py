@@ -1,119 +1,80 @@
 import os
 import base64
 import json
-import requests
+import time
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv, find_dotenv
+from . import deadlines, startup
+from .debug_capture import capture_debug
+from .logging_config import get_logger, log_payload
+from .metrics import MODEL_REPLIES, PARSE_RETRY_CALLS, PROVIDER_FALLBACKS, PROVIDER_SECONDS, stage_timer
+from .prompts import MalformedOutput, PromptVersion, get_prompt, record_usage
+from .tracing import SPAN_KIND_CLIENT, start_span, traced
 
-def _load_env_once() -> None:
-    """Ensure .env is loaded from project root if available.
-    Uses find_dotenv to locate the nearest .env and loads it if not already loaded.
-    """
-    try:
-        dotenv_path = find_dotenv(usecwd=True)
-        if dotenv_path:
-            load_dotenv(dotenv_path, override=False)
-        else:
-            # Fallback: try default loader (no-op if already loaded)
-            load_dotenv(override=False)
-    except Exception:
-        # Do not raise here; absence of .env should not crash the service
-        pass
+logger = get_logger(__name__)
+
+# Carregado na primeira chamada a um provedor (ou pelo aquecimento pós-startup)
+requests = startup.lazy_import("requests")
+
+def _get_base_urls() -> Dict[str, str]:
+    """Provider endpoints; overridable so load tests can point at local stand-ins."""
+    return {
+        "openai": os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/"),
+        "gemini": os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/"),
+    }
 
 def _get_api_keys() -> Dict[str, Optional[str]]:
     """Fetch API keys from environment at call time (not only at import time)."""
-    _load_env_once()
+    startup.load_env()
     return {
         "openai": os.getenv("OPENAI_API_KEY"),
         "gemini": os.getenv("GEMINI_API_KEY"),
     }
 
-# Prompt profissional para análise técnica
-PROFESSIONAL_TRADING_PROMPT = """
-Você é um analista técnico de mercado financeiro altamente especializado, com vasta experiência em análise gráfica, padrões de preço, indicadores técnicos e estratégias de trading. Sua tarefa é analisar uma imagem de um gráfico financeiro fornecida, utilizando seus conhecimentos avançados para extrair o máximo de informações e fornecer uma análise completa, precisa e acionável.
-
-PROCESSO DE ANÁLISE PASSO A PASSO:
-
-**PASSO 1: ANÁLISE DA ESTRUTURA DE MERCADO E TENDÊNCIA**
-- Identifique a tendência principal (Alta, Baixa ou Lateral)
-- Determine sub-tendências de menor grau
-- Trace linhas de tendência (LTA/LTB)
-- Marque topos e fundos relevantes
-
-**PASSO 2: IDENTIFICAÇÃO DE SUPORTES E RESISTÊNCIAS**
-- Detecte zonas de congestão
-- Trace níveis horizontais de suporte/resistência
-- Avalie a força de cada nível
-- Observe mudanças de polaridade
-
-**PASSO 3: ANÁLISE DE PADRÕES DE CANDLESTICK**
-- Detecte padrões de reversão (Engolfo, Martelo, Estrela Cadente, etc.)
-- Identifique padrões de continuação (Doji em tendência, etc.)
-- Avalie confiabilidade (Alta/Média/Baixa)
-- Contextualize com tendência e S/R
-
-**PASSO 4: DETECÇÃO DE PADRÕES GRÁFICOS CLÁSSICOS**
-- Procure padrões de reversão (OCO, Topo/Fundo Duplo, etc.)
-- Identifique padrões de continuação (Triângulos, Bandeiras, etc.)
-- Projete alvos baseados na altura dos padrões
-- Determine direção provável de rompimento
-
-**PASSO 5: ANÁLISE DE INDICADORES TÉCNICOS VISÍVEIS**
-- Liste todos indicadores visíveis (MAs, RSI, MACD, etc.)
-- Interprete sinais de cada indicador
-- Analise comportamento do volume
-- Avalie confluência entre indicadores
-
-**PASSO 6: SUGESTÃO DE TRADING E GESTÃO DE RISCO**
-- Determine direção da operação (Long/Short)
-- Defina ponto ideal de entrada
-- Calcule stop loss baseado em S/R ou ATR
-- Projete take profit baseado em padrões
-- Calcule relação risco-retorno
-
-**PASSO 7: CONSIDERAÇÕES FINAIS**
-- Indique nível de confiança da análise
-- Mencione contexto de mercado relevante
-- Destaque evidências visuais principais
+# Modelos com saída estruturada nativa (json_schema estrito); os demais recebem json_object quando suportado
+_JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4o-mini", "gpt-4.1", "gpt-4.1-mini")
+_JSON_OBJECT_MODELS = ("gpt-4-turbo",)
 
-FORMATO DE RESPOSTA OBRIGATÓRIO (JSON):
-{
-  "simbolo_detectado": "SÍMBOLO EXATO do gráfico",
-  "preco_atual": "PREÇO EXATO visível",
-  "timeframe_detectado": "TIMEFRAME identificado",
-  "analise_tecnica": "Análise completa seguindo os 7 passos",
-  "decisao": "compra|venda|esperar",
-  "justificativa_decisao": "Justificativa detalhada baseada na confluência",
-  "confianca_percentual": 75,
-  "indicadores_utilizados": ["Lista de indicadores analisados"],
-  "estrutura_mercado": {
-    "tendencia_principal": "Alta/Baixa/Lateral",
-    "sub_tendencias": ["Tendências menores"],
-    "topos_fundos": "Descrição da estrutura"
-  },
-  "suportes_resistencias": {
-    "suportes": [42000, 41500],
-    "resistencias": [44000, 44500],
-    "forca_niveis": "Avaliação da força"
-  }
-}
-
-**INSTRUÇÕES CRÍTICAS:**
-1. Analise APENAS o que está VISÍVEL no gráfico
-2. NÃO invente dados que não consegue ver
-3. Base toda análise em evidências visuais concretas
-4. Priorize confluência de múltiplos sinais
-5. Adapte a análise ao tipo de mercado identificado
-6. Forneça justificativas técnicas sólidas
-7. Responda APENAS o JSON válido, sem texto adicional
-"""
+def _structured_output_enabled() -> bool:
+    return os.getenv("AI_STRUCTURED_OUTPUT", "true").lower() not in ("0", "false", "no")
 
 class AIService:
     """Serviço para análise de gráficos usando IA"""
     
     @staticmethod
-    def analyze_chart_with_openai(image_base64: str) -> Dict[str, Any]:
-        """Analisa um gráfico usando OpenAI Vision API com fallback de modelos."""
+    def parse_json_content(content: str) -> Dict[str, Any]:
+        """Extrai o JSON da resposta do modelo (direto ou cercado por texto adicional)"""
+        try:
+            # Tentar parsear como JSON direto
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # Tentar extrair JSON de uma resposta que pode ter texto adicional
+            start = content.find("{")
+            end = content.rfind("}")
+            if start == -1 or end <= start:
+                raise ValueError("Não foi possível extrair JSON válido da resposta")
+            return json.loads(content[start:end + 1])
+    
+    @staticmethod
+    def parse_model_reply(prompt: PromptVersion, provider: str, model: str, content: str) -> Dict[str, Any]:
+        """Valida a resposta contra o esquema do prompt em uma passada e contabiliza o resultado"""
+        try:
+            payload, outcome = prompt.parse(content)
+        except MalformedOutput:
+            MODEL_REPLIES.labels(provider, model, "malformed").inc()
+            log_payload(logger, "Resposta fora do esquema", content, model=model)
+            raise
+        MODEL_REPLIES.labels(provider, model, outcome).inc()
+        return payload
+    
+    @staticmethod
+    @traced("openai.analyze_chart")
+    def analyze_chart_with_openai(image_base64: str, prompt: Optional[PromptVersion] = None,
+                                  context: Optional[str] = None) -> Dict[str, Any]:
+        """Analisa um gráfico usando OpenAI Vision API com fallback de modelos.
+
+        ``context``: texto opcional (pré-análise local) enviado depois da imagem.
+        """
+        prompt = prompt or get_prompt()
         keys = _get_api_keys()
         OPENAI_API_KEY = keys.get("openai")
         if not OPENAI_API_KEY:
@@ -136,66 +97,91 @@ class AIService:
             "gpt-4.1",
             "gpt-4.1-mini"
         ]
+        structured = _structured_output_enabled()
         last_error = None
         for model_name in models_to_try:
+            if isinstance(last_error, MalformedOutput):
+                # Outra chamada de visão completa só porque a resposta anterior não era JSON válido
+                PARSE_RETRY_CALLS.labels("openai").inc()
+            # Prefixo estático (prompt versionado) primeiro e imagem por último: o cache de prefixo
+            # da OpenAI reaproveita os tokens do prompt entre requisições
             payload = {
                 "model": model_name,
                 "messages": [
+                    {"role": "system", "content": prompt.text},
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": PROFESSIONAL_TRADING_PROMPT},
                             {
                                 "type": "image_url",
                                 "image_url": {
                                     "url": f"data:image/png;base64,{image_base64}"
                                 }
                             }
-                        ]
+                        ] + ([{"type": "text", "text": context}] if context else [])
                     }
                 ],
-                "max_tokens": 2000,
+                "max_tokens": prompt.max_output_tokens,
                 "temperature": 0.1
             }
-            try:
-                response = requests.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=60
-                )
-                if response.status_code != 200:
-                    print(f"❌ OpenAI {model_name} status {response.status_code}: {response.text}")
-                    try:
-                        err_json = response.json()
-                        err_msg = err_json.get("error", {}).get("message") or response.text
-                    except Exception:
-                        err_msg = response.text
-                    last_error = Exception(f"OpenAI {model_name} {response.status_code}: {err_msg}")
-                    continue
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
+            if structured and model_name in _JSON_SCHEMA_MODELS:
+                payload["response_format"] = prompt.openai_response_format()
+            elif structured and model_name in _JSON_OBJECT_MODELS:
+                payload["response_format"] = {"type": "json_object"}
+            # Cada tentativa usa o que resta do prazo da requisição; sem tempo, não tenta o próximo modelo
+            request_timeout = deadlines.timeout(60, "openai")
+            with start_span("openai.chat.completions", {"ai.provider": "openai", "ai.model": model_name},
+                            SPAN_KIND_CLIENT) as span:
+                started = time.perf_counter()
+                outcome = "error"
                 try:
-                    analysis_json = json.loads(content)
-                except json.JSONDecodeError:
-                    import re
-                    json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                    if json_match:
-                        json_content = json_match.group()
-                        analysis_json = json.loads(json_content)
-                    else:
-                        raise ValueError("Não foi possível extrair JSON válido da resposta")
-                return analysis_json
-            except Exception as e:
-                print(f"⚠️ Falha com modelo {model_name}: {e}")
-                last_error = e
-                continue
+                    response = requests.post(
+                        f"{_get_base_urls()['openai']}/chat/completions",
+                        headers=headers,
+                        json=payload,
+                        timeout=request_timeout
+                    )
+                    outcome = str(response.status_code)
+                    span.set_attribute("http.status_code", response.status_code)
+                    PROVIDER_SECONDS.labels("openai", model_name, outcome).observe(time.perf_counter() - started)
+                    capture_debug("openai_response", {"model": model_name, "status": response.status_code, "body": response.text})
+                    if response.status_code != 200:
+                        logger.warning("OpenAI %s status %s", model_name, response.status_code)
+                        log_payload(logger, "OpenAI error body", response.text, model=model_name)
+                        try:
+                            err_json = response.json()
+                            err_msg = err_json.get("error", {}).get("message") or response.text
+                        except Exception:
+                            err_msg = response.text
+                        last_error = Exception(f"OpenAI {model_name} {response.status_code}: {err_msg}")
+                        span.set_status(False, f"HTTP {response.status_code}")
+                        PROVIDER_FALLBACKS.labels("openai", model_name).inc()
+                        continue
+                    result = response.json()
+                    record_usage(prompt, "openai", model_name, result.get("usage"), time.perf_counter() - started)
+                    message = result["choices"][0]["message"]
+                    if message.get("refusal"):
+                        MODEL_REPLIES.labels("openai", model_name, "refusal").inc()
+                        raise ValueError(f"OpenAI {model_name} recusou a análise: {message['refusal']}")
+                    with stage_timer("json_parse"):
+                        return AIService.parse_model_reply(prompt, "openai", model_name, message["content"] or "")
+                except Exception as e:
+                    if outcome == "error":
+                        PROVIDER_SECONDS.labels("openai", model_name, outcome).observe(time.perf_counter() - started)
+                    PROVIDER_FALLBACKS.labels("openai", model_name).inc()
+                    span.record_exception(e)
+                    logger.warning("Falha com modelo %s: %s", model_name, e)
+                    last_error = e
+                    continue
         # Se todos os modelos falharem, propagar último erro
         raise last_error or Exception("Falha desconhecida na OpenAI")
     
     @staticmethod
-    def analyze_chart_with_gemini(image_base64: str) -> Dict[str, Any]:
+    @traced("gemini.generate_content", kind=SPAN_KIND_CLIENT, **{"ai.provider": "gemini", "ai.model": "gemini-1.5-pro"})
+    def analyze_chart_with_gemini(image_base64: str, prompt: Optional[PromptVersion] = None,
+                                  context: Optional[str] = None) -> Dict[str, Any]:
         """Analisa um gráfico usando Google Gemini API"""
+        prompt = prompt or get_prompt()
         keys = _get_api_keys()
         GEMINI_API_KEY = keys.get("gemini")
         if not GEMINI_API_KEY:
@@ -213,7 +199,7 @@ class AIService:
             "contents": [{
                 "parts": [
                     {
-                        "text": PROFESSIONAL_TRADING_PROMPT
+                        "text": prompt.text
                     },
                     {
                         "inline_data": {
@@ -221,68 +207,120 @@ class AIService:
                             "data": image_base64
                         }
                     }
-                ]
+                ] + ([{"text": context}] if context else [])
             }],
             "generationConfig": {
                 "temperature": 0.2,
-                "maxOutputTokens": 1500,
+                "maxOutputTokens": prompt.max_output_tokens,
             }
         }
+        if _structured_output_enabled():
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+            payload["generationConfig"]["responseSchema"] = prompt.gemini_response_schema()
         
+        request_timeout = deadlines.timeout(60, "gemini")
+        started = time.perf_counter()
+        outcome = "error"
         try:
             response = requests.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={GEMINI_API_KEY}",
+                f"{_get_base_urls()['gemini']}/models/gemini-1.5-pro:generateContent?key={GEMINI_API_KEY}",
                 headers=headers,
-                json=payload
+                json=payload,
+                timeout=request_timeout
             )
+            outcome = str(response.status_code)
+            PROVIDER_SECONDS.labels("gemini", "gemini-1.5-pro", outcome).observe(time.perf_counter() - started)
+            capture_debug("gemini_response", {"model": "gemini-1.5-pro", "status": response.status_code, "body": response.text})
             
             if response.status_code != 200:
-                print(f"❌ Erro na API Gemini: {response.status_code}")
-                print(response.text)
+                logger.error("Erro na API Gemini: %s", response.status_code)
+                log_payload(logger, "Gemini error body", response.text)
                 raise Exception(f"Erro na API Gemini: {response.status_code}")
             
             result = response.json()
+            record_usage(prompt, "gemini", "gemini-1.5-pro", result.get("usageMetadata"), time.perf_counter() - started)
             content = result["candidates"][0]["content"]["parts"][0]["text"]
             
             # Extrair JSON da resposta
-            try:
-                # Tentar parsear como JSON direto
-                analysis_json = json.loads(content)
-            except json.JSONDecodeError:
-                # Tentar extrair JSON de uma resposta que pode ter texto adicional
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    json_content = json_match.group()
-                    analysis_json = json.loads(json_content)
-                else:
-                    raise ValueError("Não foi possível extrair JSON válido da resposta")
-            
-            return analysis_json
+            with stage_timer("json_parse"):
+                return AIService.parse_model_reply(prompt, "gemini", "gemini-1.5-pro", content)
             
         except Exception as e:
-            print(f"❌ Erro na análise Gemini: {e}")
+            if outcome == "error":
+                PROVIDER_SECONDS.labels("gemini", "gemini-1.5-pro", outcome).observe(time.perf_counter() - started)
+            PROVIDER_FALLBACKS.labels("gemini", "gemini-1.5-pro").inc()
+            logger.error("Erro na análise Gemini: %s", e)
             raise
     
     @staticmethod
-    def analyze_chart(image_base64: str) -> Dict[str, Any]:
+    def narrate_with_openai(prompt: PromptVersion, text: str) -> Dict[str, Any]:
+        """Chamada só de texto (sem imagem) para um prompt do registro; um modelo, sem fallback."""
+        keys = _get_api_keys()
+        if not keys.get("openai"):
+            raise ValueError("OPENAI_API_KEY não configurada")
+        model_name = os.getenv("AI_NARRATION_MODEL", "gpt-4o-mini")
+        payload = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": prompt.text},
+                {"role": "user", "content": text},
+            ],
+            "max_tokens": prompt.max_output_tokens,
+            "temperature": 0.2,
+        }
+        if _structured_output_enabled() and model_name in _JSON_SCHEMA_MODELS:
+            payload["response_format"] = prompt.openai_response_format()
+        request_timeout = deadlines.timeout(30, "narration")
+        with start_span("openai.chat.completions", {"ai.provider": "openai", "ai.model": model_name},
+                        SPAN_KIND_CLIENT) as span:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                response = requests.post(
+                    f"{_get_base_urls()['openai']}/chat/completions",
+                    headers={"Authorization": f"Bearer {keys['openai']}", "Content-Type": "application/json"},
+                    json=payload,
+                    timeout=request_timeout
+                )
+                outcome = str(response.status_code)
+                span.set_attribute("http.status_code", response.status_code)
+                if response.status_code != 200:
+                    span.set_status(False, f"HTTP {response.status_code}")
+                    raise Exception(f"OpenAI {model_name} {response.status_code}")
+                result = response.json()
+                record_usage(prompt, "openai", model_name, result.get("usage"), time.perf_counter() - started)
+                with stage_timer("json_parse"):
+                    return AIService.parse_model_reply(prompt, "openai", model_name,
+                                                       result["choices"][0]["message"]["content"] or "")
+            except Exception as e:
+                span.record_exception(e)
+                raise
+            finally:
+                PROVIDER_SECONDS.labels("openai", model_name, outcome).observe(time.perf_counter() - started)
+    
+    @staticmethod
+    def analyze_chart(image_base64: str, context: Optional[str] = None) -> Dict[str, Any]:
         """Analisa um gráfico usando o melhor provedor disponível"""
         keys = _get_api_keys()
         # Tentar OpenAI primeiro
         if keys.get("openai"):
             try:
-                print("🤖 Tentando análise com OpenAI...")
-                return AIService.analyze_chart_with_openai(image_base64)
+                logger.debug("Tentando análise com OpenAI")
+                return AIService.analyze_chart_with_openai(image_base64, context=context)
             except Exception as e:
-                print(f"⚠️ Falha na análise OpenAI: {e}")
+                logger.warning("Falha na análise OpenAI: %s", e)
+                if isinstance(e, deadlines.DeadlineExceeded):
+                    raise
+                if isinstance(e, MalformedOutput) and keys.get("gemini"):
+                    PARSE_RETRY_CALLS.labels("gemini").inc()
         
         # Tentar Gemini como fallback
         if keys.get("gemini"):
             try:
-                print("🤖 Tentando análise com Gemini...")
-                return AIService.analyze_chart_with_gemini(image_base64)
+                logger.debug("Tentando análise com Gemini")
+                return AIService.analyze_chart_with_gemini(image_base64, context=context)
             except Exception as e:
-                print(f"⚠️ Falha na análise Gemini: {e}")
+                logger.warning("Falha na análise Gemini: %s", e)
         
         # Se ambos falharem, lançar erro
         raise Exception("Nenhum serviço de IA disponível para análise")
@@ -0,0 +1,260 @@
+"""
+Background chart-analysis jobs (``/api/analysis-jobs``).
+
+``submit`` persists the job and returns at once; a fixed pool of asyncio
+workers drains a bounded queue and runs the same pipeline as
+``/api/analyze-chart``. Clients poll the job or wait on its SSE stream.
+
+Jobs are written through to the ``analysis_jobs`` table, so a job accepted
+by one worker process can be polled on another and queued/stale jobs are
+picked up again on startup. Without Supabase (dev/offline) the in-memory
+copy is the only one.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .database import AnalysisJob, Database
+from .logging_config import get_logger
+from .metrics import Counter, Gauge, Histogram, register_stats
+from .tracing import start_span
+
+logger = get_logger(__name__)
+
+JOBS_SUBMITTED = Counter("tickrify_analysis_jobs_submitted", "Analysis jobs accepted")
+JOBS_FINISHED = Counter("tickrify_analysis_jobs_finished", "Analysis jobs finished, by status", ("status",))
+JOBS_QUEUED = Gauge("tickrify_analysis_jobs_queued", "Analysis jobs waiting for a worker")
+JOB_SECONDS = Histogram(
+    "tickrify_analysis_job_duration_seconds", "Job latency from submission to completion", ("status",))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class AnalysisJobQueue:
+    def __init__(
+        self,
+        process: Callable[[AnalysisJob], Awaitable[Dict[str, Any]]],
+        workers: int = 4,
+        max_queue: int = 1000,
+        retention_seconds: float = 3600.0,
+        max_attempts: int = 3,
+        stale_seconds: float = 600.0,
+        claim_attempts: int = 3,
+        claim_retry_seconds: float = 0.5,
+    ):
+        self.process = process
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max_attempts
+        self.stale_seconds = stale_seconds
+        self.claim_attempts = claim_attempts
+        self.claim_retry_seconds = claim_retry_seconds
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.processed = 0
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queue and events belong to a loop; a new loop (tests, reloads) starts a fresh pool
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._done = {}
+            self._tasks = []
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._worker(), name=f"analysis-job-worker-{len(self._tasks)}"))
+
+    def _event(self, job_id: str) -> asyncio.Event:
+        return self._done.setdefault(job_id, asyncio.Event())
+
+    def pending_for(self, user_id: str) -> int:
+        """Jobs accepted for this user that have not been counted in usage yet."""
+        return sum(1 for j in self._jobs.values() if j.user_id == user_id and j.status not in FINISHED)
+
+    async def submit(self, user_id: str, plan_type: str, image_base64: str) -> AnalysisJob:
+        self._ensure_workers()
+        if self._queue.qsize() >= self.max_queue:
+            raise JobQueueFull()
+        job = AnalysisJob(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            plan_type=plan_type,
+            status=QUEUED,
+            image_base64=image_base64,
+            created_at=datetime.now(timezone.utc),
+        )
+        await Database.create_analysis_job(job.model_dump(mode="json"))
+        self._jobs[job.id] = job
+        self._event(job.id)
+        self._queue.put_nowait(job.id)
+        JOBS_SUBMITTED.inc()
+        JOBS_QUEUED.set(self._queue.qsize())
+        self._prune()
+        return job
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Aceito por outro processo ou antes de um restart
+            job = await Database.get_analysis_job(job_id)
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[AnalysisJob]:
+        """Wait until a job owned by this process finishes (or ``timeout``); returns its latest state."""
+        job = await self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        if job_id in self._jobs and self._loop is asyncio.get_running_loop():
+            try:
+                await asyncio.wait_for(self._event(job_id).wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            # Job de outro processo: acompanhar pelo banco
+            deadline = time.monotonic() + timeout
+            while job is not None and job.status not in FINISHED and time.monotonic() < deadline:
+                await asyncio.sleep(1.0)
+                job = await Database.get_analysis_job(job_id)
+            return job
+        return await self.get(job_id)
+
+    async def recover(self) -> int:
+        """Requeue persisted jobs left queued, or running for longer than ``stale_seconds`` (crashed worker)."""
+        self._ensure_workers()
+        requeued = 0
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=self.stale_seconds)
+        for job in await Database.get_pending_analysis_jobs():
+            if job.id in self._jobs:
+                continue
+            if job.status == RUNNING and (job.started_at is None or job.started_at > stale_before):
+                continue
+            if job.attempts >= self.max_attempts:
+                # Um job que derruba o processo repetidamente não volta para a fila
+                await Database.update_analysis_job(job.id, {
+                    "status": FAILED, "error": "Número máximo de tentativas excedido",
+                    "finished_at": datetime.now(timezone.utc).isoformat(), "image_base64": None})
+                JOBS_FINISHED.labels(FAILED).inc()
+                continue
+            if not await Database.claim_analysis_job(job.id, job.status, {"status": QUEUED}):
+                continue  # outro processo assumiu o job
+            job.status = QUEUED
+            self._jobs[job.id] = job
+            self._event(job.id)
+            self._queue.put_nowait(job.id)
+            requeued += 1
+        JOBS_QUEUED.set(self._queue.qsize())
+        if requeued:
+            logger.info("Jobs de análise recuperados", extra={"requeued": requeued})
+        return requeued
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            job_id = await queue.get()
+            JOBS_QUEUED.set(queue.qsize())
+            try:
+                await self._run(self._jobs[job_id])
+            except Exception:
+                logger.exception("Falha inesperada no worker de jobs", extra={"job_id": job_id})
+            finally:
+                queue.task_done()
+
+    async def _claim(self, job: AnalysisJob, started: datetime) -> Optional[bool]:
+        """True: this process runs the job; False: another process has it; None: the claim kept failing."""
+        for attempt in range(self.claim_attempts):
+            if attempt:
+                await asyncio.sleep(self.claim_retry_seconds * attempt)
+            if await Database.claim_analysis_job(job.id, QUEUED, {
+                    "status": RUNNING, "started_at": started.isoformat(), "attempts": job.attempts + 1}):
+                return True
+            row = await Database.get_analysis_job(job.id)
+            if row is None:
+                # Sem a linha (modo offline ou leitura falhou): o job em memória é a única cópia
+                return True
+            if row.status != QUEUED:
+                return False  # outro processo assumiu o job
+            # Linha ainda na fila: a reserva falhou por erro do banco, tentar de novo
+        return None
+
+    async def _run(self, job: AnalysisJob) -> None:
+        started = datetime.now(timezone.utc)
+        claimed = await self._claim(job, started)
+        if claimed is False:
+            # Quem espera neste processo passa a acompanhar o job pelo banco
+            self._jobs.pop(job.id, None)
+            event = self._done.pop(job.id, None)
+            if event is not None:
+                event.set()
+            return
+        if claimed is None:
+            logger.error("Não foi possível reservar o job de análise", extra={"job_id": job.id})
+            job.error = "Não foi possível iniciar a análise; tente novamente"
+            job.status = FAILED
+        else:
+            job.status, job.started_at, job.attempts = RUNNING, started, job.attempts + 1
+            with start_span("analysis_job", attributes={"job.id": job.id, "job.attempt": job.attempts}):
+                try:
+                    job.result = await self.process(job)
+                    job.status = SUCCEEDED
+                except Exception as e:
+                    logger.warning("Job de análise falhou: %s", e, extra={"job_id": job.id})
+                    job.error = str(e) or e.__class__.__name__
+                    job.status = FAILED
+        job.finished_at = datetime.now(timezone.utc)
+        job.image_base64 = None
+        await Database.update_analysis_job(job.id, {
+            "status": job.status,
+            "result": job.result,
+            "error": job.error,
+            "finished_at": job.finished_at.isoformat(),
+            "image_base64": None,
+        })
+        self.processed += 1
+        JOBS_FINISHED.labels(job.status).inc()
+        JOB_SECONDS.labels(job.status).observe((job.finished_at - job.created_at).total_seconds())
+        self._event(job.id).set()
+
+    def _prune(self) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        for job_id in [j.id for j in self._jobs.values() if j.status in FINISHED and j.finished_at < cutoff]:
+            self._jobs.pop(job_id, None)
+            self._done.pop(job_id, None)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "tracked": len(self._jobs),
+            "processed": self.processed,
+        }
+
+
+def queue_from_env(process: Callable[[AnalysisJob], Awaitable[Dict[str, Any]]]) -> AnalysisJobQueue:
+    queue = AnalysisJobQueue(
+        process,
+        workers=int(os.getenv("ANALYSIS_JOB_WORKERS", "4")),
+        max_queue=int(os.getenv("ANALYSIS_JOB_MAX_QUEUE", "1000")),
+        retention_seconds=float(os.getenv("ANALYSIS_JOB_RETENTION_SECONDS", "3600")),
+        stale_seconds=float(os.getenv("ANALYSIS_JOB_STALE_SECONDS", "600")),
+    )
+    register_stats("tickrify_analysis_job_queue", queue.stats, counters=("processed",))
+    return queue
@@ -1,27 +1,26 @@
 import os
 import time
 import json
-import jwt
-import requests
 from typing import Optional, Dict, Any
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from . import deadlines, startup
 from .database import Database, User, Subscription
-# Importar algoritmos JWT de forma resiliente (evitar erro em ambientes sem extras RSA)
-try:
-    from jwt import algorithms as jwt_algorithms  # type: ignore
-except Exception:
-    jwt_algorithms = None  # type: ignore
+from .logging_config import get_logger
+from .metrics import stage_timer
+# PyJWT e requests carregados no primeiro token verificado (ou pelo aquecimento pós-startup)
+jwt = startup.lazy_import("jwt")
+requests = startup.lazy_import("requests")
 
 # Carregar variáveis de ambiente
-load_dotenv()
+startup.load_env()
+
+logger = get_logger(__name__)
 
 # Configurações de autenticação
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 if not SUPABASE_JWT_SECRET:
-    # Modo desenvolvimento: permitir requests sem autenticação
-    print("⚠️ SUPABASE_JWT_SECRET ausente - autenticação relaxada em desenvolvimento")
+    # Modo desenvolvimento: permitir requests sem autenticação (aviso registrado em startup.log_startup)
     SUPABASE_JWT_SECRET = "dev-secret"
 
 # Configurações do Clerk (JWT RS256 via JWKS)
@@ -35,6 +34,11 @@ _JWKS_CACHE: Dict[str, Any] = {}
 def _get_clerk_public_key(token: str):
     if not CLERK_JWKS_URL:
         return None
+    # Importar algoritmos JWT de forma resiliente (evitar erro em ambientes sem extras RSA)
+    try:
+        from jwt import algorithms as jwt_algorithms  # type: ignore
+    except Exception:
+        jwt_algorithms = None  # type: ignore
     try:
         header = jwt.get_unverified_header(token)
         kid = header.get("kid")
@@ -42,7 +46,7 @@ def _get_clerk_public_key(token: str):
             return None
         if kid in _JWKS_CACHE:
             return _JWKS_CACHE[kid]
-        resp = requests.get(CLERK_JWKS_URL, timeout=5)
+        resp = requests.get(CLERK_JWKS_URL, timeout=deadlines.timeout(5, "jwks"))
         resp.raise_for_status()
         jwks = resp.json()
         for jwk in jwks.get("keys", []):
@@ -54,6 +58,8 @@ def _get_clerk_public_key(token: str):
                     return None
                 _JWKS_CACHE[kid] = public_key
                 return public_key
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
         # Falha ao obter chave pública; retornar None para tentar fallback
         return None
@@ -76,64 +82,66 @@ class AuthMiddleware:
         """Verifica o token JWT e retorna os dados do usuário"""
         token = credentials.credentials
         
-        try:
-            # 1) Tentar verificar token do Clerk (RS256 via JWKS)
-            if CLERK_JWKS_URL:
-                public_key = _get_clerk_public_key(token)
-                if public_key is not None:
-                    payload = jwt.decode(
-                        token,
-                        public_key,
-                        algorithms=["RS256"],
-                        issuer=CLERK_ISSUER,
-                        options={"verify_aud": False}
-                    )
-                    # Clerk usa 'sub' como ID do usuário
-                    if not payload.get("sub"):
-                        raise HTTPException(status_code=401, detail="Token Clerk inválido (sub ausente)")
-                    return payload
+        with stage_timer("auth_jwt"):
+            try:
+                # 1) Tentar verificar token do Clerk (RS256 via JWKS)
+                if CLERK_JWKS_URL:
+                    public_key = _get_clerk_public_key(token)
+                    if public_key is not None:
+                        payload = jwt.decode(
+                            token,
+                            public_key,
+                            algorithms=["RS256"],
+                            issuer=CLERK_ISSUER,
+                            options={"verify_aud": False}
+                        )
+                        # Clerk usa 'sub' como ID do usuário
+                        if not payload.get("sub"):
+                            raise HTTPException(status_code=401, detail="Token Clerk inválido (sub ausente)")
+                        return payload
 
-            # 1b) Fallback: verificar com chave pública PEM (se fornecida)
-            if CLERK_PEM_PUBLIC_KEY:
-                try:
-                    payload = jwt.decode(
-                        token,
-                        CLERK_PEM_PUBLIC_KEY,
-                        algorithms=["RS256"],
-                        issuer=CLERK_ISSUER,
-                        options={"verify_aud": False}
-                    )
-                    if not payload.get("sub"):
-                        raise HTTPException(status_code=401, detail="Token Clerk inválido (sub ausente)")
-                    return payload
-                except Exception:
-                    pass
+                # 1b) Fallback: verificar com chave pública PEM (se fornecida)
+                if CLERK_PEM_PUBLIC_KEY:
+                    try:
+                        payload = jwt.decode(
+                            token,
+                            CLERK_PEM_PUBLIC_KEY,
+                            algorithms=["RS256"],
+                            issuer=CLERK_ISSUER,
+                            options={"verify_aud": False}
+                        )
+                        if not payload.get("sub"):
+                            raise HTTPException(status_code=401, detail="Token Clerk inválido (sub ausente)")
+                        return payload
+                    except Exception:
+                        pass
 
-            # 2) Fallback: verificar token JWT do Supabase (HS256)
-            payload = jwt.decode(
-                token,
-                SUPABASE_JWT_SECRET,
-                algorithms=["HS256"],
-                options={"verify_signature": True}
-            )
+                # 2) Fallback: verificar token JWT do Supabase (HS256)
+                payload = jwt.decode(
+                    token,
+                    SUPABASE_JWT_SECRET,
+                    algorithms=["HS256"],
+                    options={"verify_signature": True}
+                )
             
-            # Verificar se o token não expirou
-            if payload.get("exp") and payload["exp"] < time.time():
-                raise HTTPException(status_code=401, detail="Token expirado")
+                # Verificar se o token não expirou
+                if payload.get("exp") and payload["exp"] < time.time():
+                    raise HTTPException(status_code=401, detail="Token expirado")
             
-            # Verificar se o token tem o subject (sub) que é o user_id
-            if not payload.get("sub"):
-                raise HTTPException(status_code=401, detail="Token inválido")
+                # Verificar se o token tem o subject (sub) que é o user_id
+                if not payload.get("sub"):
+                    raise HTTPException(status_code=401, detail="Token inválido")
             
-            return payload
+                return payload
             
-        except jwt.PyJWTError as e:
-            # Em dev, aceitar sem token válido
-            if os.getenv("ENVIRONMENT", "development") == "development":
-                return {"sub": "dev-user", "email": "dev@example.com"}
-            raise HTTPException(status_code=401, detail=f"Token inválido: {str(e)}")
-        except Exception as e:
-            raise HTTPException(status_code=401, detail=f"Erro de autenticação: {str(e)}")
+            except jwt.PyJWTError as e:
+                # Em dev, aceitar sem token válido
+                if os.getenv("ENVIRONMENT", "development") == "development":
+                    return {"sub": "dev-user", "email": "dev@example.com"}
+                raise HTTPException(status_code=401, detail=f"Token inválido: {str(e)}")
+            except Exception as e:
+                raise HTTPException(status_code=401, detail=f"Erro de autenticação: {str(e)}")
+    
     
     @staticmethod
     async def get_current_user(payload: Dict[str, Any] = Depends(verify_token)) -> User:
@@ -250,6 +258,28 @@ class AuthMiddleware:
         
         return True
 
+def verify_token_claims(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verificação síncrona e sem rede do JWT (usada antes do roteamento, ex.: rate limiting).
+    Usa apenas chaves Clerk já em cache; retorna None para token inválido ou não verificável.
+    """
+    try:
+        if CLERK_JWKS_URL or CLERK_PEM_PUBLIC_KEY:
+            kid = jwt.get_unverified_header(token).get("kid")
+            for public_key in (_JWKS_CACHE.get(kid) if kid else None, CLERK_PEM_PUBLIC_KEY):
+                if public_key is None:
+                    continue
+                try:
+                    payload = jwt.decode(token, public_key, algorithms=["RS256"], issuer=CLERK_ISSUER,
+                                         options={"verify_aud": False})
+                    return payload if payload.get("sub") else None
+                except jwt.PyJWTError:
+                    pass
+        payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"])
+        return payload if payload.get("sub") else None
+    except Exception:
+        return None
+
 # Funções auxiliares para uso nos endpoints
 async def get_current_user_from_request(request: Request) -> Optional[User]:
     """Extrai o usuário atual a partir do token na requisição (sem lançar exceção)"""
@@ -262,21 +292,25 @@ async def get_current_user_from_request(request: Request) -> Optional[User]:
         token = auth_header.replace("Bearer ", "")
         
         # Verificar token JWT
-        payload = jwt.decode(
-            token,
-            SUPABASE_JWT_SECRET,
-            algorithms=["HS256"],
-            options={"verify_signature": True}
-        )
+        with stage_timer("auth_jwt"):
+            payload = jwt.decode(
+                token,
+                SUPABASE_JWT_SECRET,
+                algorithms=["HS256"],
+                options={"verify_signature": True}
+            )
         
         user_id = payload.get("sub")
         if not user_id:
             return None
         
         # Buscar usuário
-        user = await Database.get_user(user_id)
+        with stage_timer("user_lookup"):
+            user = await Database.get_user(user_id)
         return user
         
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception:
         return None
 
@@ -0,0 +1,168 @@
+"""
+Recover an approximate price series from a chart screenshot.
+
+Candle/bar charts: pixels in the up (green-ish) and down (red-ish) colour
+families are segmented into column groups, one per candle; a volume pane is
+recognised by its bars sharing one baseline and dropped. Per group the wick
+gives high/low and the body (or the open/close ticks of an OHLC bar) gives
+open/close, with the colour deciding which end is which.
+
+Line/area charts: the saturated colour drawn across most columns with the
+thinnest stroke is the series; its row per column gives the close.
+
+Without OCR of the price axis the series is in *relative* units: 0 is the
+lowest and 100 the highest price visible in the plot area. Every indicator
+that compares prices with each other (RSI, MACD sign, MA crossovers,
+Bollinger %B, ATR as % of the visible range) is unaffected by that.
+"""
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .chart_screen import foreground_mask
+
+# Largura máxima analisada: candles continuam separados por pelo menos 1 px em gráficos de até ~300 barras
+_MAX_WIDTH = 1600
+_MIN_CANDLES = 15
+_MIN_LINE_COLUMNS = 30
+_MAX_LINE_POINTS = 300
+
+
+class DigitizedChart(NamedTuple):
+    kind: str  # "candles" ou "line"
+    ohlc: np.ndarray  # (n, 4) open/high/low/close em unidades relativas (0 = mínima visível, 100 = máxima)
+    columns: np.ndarray  # coluna (px) de cada barra
+    plot_box: Tuple[int, int, int, int]  # (x0, y0, x1, y1) da série na imagem analisada
+    volume_pane: bool
+
+
+def _load(source) -> np.ndarray:
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    image = image.convert("RGB")
+    if image.width > _MAX_WIDTH:
+        image = image.resize((_MAX_WIDTH, round(image.height * _MAX_WIDTH / image.width)), Image.Resampling.BOX)
+    return np.asarray(image)
+
+
+def _runs(flags: np.ndarray) -> np.ndarray:
+    """(k, 2) start/end (inclusive) indices of runs of True."""
+    padded = np.concatenate(([False], flags, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    return np.stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1), axis=1)
+
+
+def _colour_classes(pixels: np.ndarray, foreground: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    r, g, b = (pixels[..., i].astype(np.int16) for i in range(3))
+    up = foreground & (g > r + 50) & (g >= b)
+    down = foreground & (r > g + 80) & (r > b + 60)
+    return up, down
+
+
+def _drop_volume_pane(mask: np.ndarray) -> Tuple[np.ndarray, bool]:
+    """Volume bars all end on one baseline row; remove the run touching it in every such column."""
+    columns = np.flatnonzero(mask.any(axis=0))
+    if len(columns) < _MIN_CANDLES:
+        return mask, False
+    height = mask.shape[0]
+    bottoms = height - 1 - np.argmax(mask[::-1, columns], axis=0)
+    values, counts = np.unique(bottoms, return_counts=True)
+    baseline = values[counts.argmax()]
+    on_baseline = columns[np.abs(bottoms - baseline) <= 1]
+    if len(on_baseline) < 0.5 * len(columns):
+        return mask, False
+    # Barras de volume são separadas; uma área preenchida também termina numa base comum, mas é contínua
+    flags = np.zeros(mask.shape[1], dtype=bool)
+    flags[on_baseline] = True
+    if len(_runs(flags)) < _MIN_CANDLES:
+        return mask, False
+    cleaned = mask.copy()
+    for col in on_baseline:
+        column = cleaned[:, col]
+        top = baseline
+        while top > 0 and column[top - 1]:
+            top -= 1
+        column[top:baseline + 2] = False
+    return cleaned, True
+
+
+def _digitize_candles(up: np.ndarray, down: np.ndarray) -> Optional[DigitizedChart]:
+    mask, volume_pane = _drop_volume_pane(up | down)
+    groups = _runs(mask.any(axis=0))
+    if len(groups) < _MIN_CANDLES:
+        return None
+    rows = np.arange(mask.shape[0])
+    bars, centres = [], []
+    for c0, c1 in groups:
+        block = mask[:, c0:c1 + 1]
+        filled = np.flatnonzero(block.any(axis=1))
+        high_row, low_row = filled[0], filled[-1]
+        left, right = block[:, 0], block[:, -1]
+        rising = np.count_nonzero(up[:, c0:c1 + 1] & block) >= np.count_nonzero(down[:, c0:c1 + 1] & block)
+        if c1 - c0 >= 2 and np.array_equal(left, right) and left.any():
+            # Candle: as bordas do corpo cobrem as mesmas linhas; a cor diz qual ponta é abertura
+            body = rows[left]
+            top, bottom = body[0], body[-1]
+            open_row, close_row = (bottom, top) if rising else (top, bottom)
+        elif left.any() and right.any():
+            # Barra OHLC: traço da abertura à esquerda, do fechamento à direita
+            open_row, close_row = rows[left].mean(), rows[right].mean()
+        else:
+            open_row = close_row = (high_row + low_row) / 2.0
+        bars.append((open_row, high_row, low_row, close_row))
+        centres.append((c0 + c1) / 2.0)
+    return _to_chart("candles", np.array(bars, dtype=np.float64), np.array(centres), groups, volume_pane)
+
+
+def _digitize_line(pixels: np.ndarray, foreground: np.ndarray) -> Optional[DigitizedChart]:
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    chroma = np.maximum(np.maximum(r, g), b).astype(np.int16) - np.minimum(np.minimum(r, g), b)
+    saturated = foreground & (chroma >= 60)
+    saturated, volume_pane = _drop_volume_pane(saturated)
+    width = saturated.shape[1]
+    ys, xs = np.nonzero(saturated)
+    if len(np.unique(xs)) < _MIN_LINE_COLUMNS:
+        return None
+    quantized = (pixels[ys, xs] >> 5).astype(np.int64)
+    codes = (quantized[:, 0] << 6) | (quantized[:, 1] << 3) | quantized[:, 2]
+    pixel_count = np.bincount(codes, minlength=512)
+    covered = np.bincount(np.unique(codes * width + xs) // width, minlength=512)
+    if covered.max() < _MIN_LINE_COLUMNS:
+        return None
+    # A série cobre mais colunas; entre cores com cobertura parecida (linha x área preenchida), vence o traço mais fino
+    thickness = pixel_count / np.maximum(covered, 1)
+    contenders = np.flatnonzero(covered >= 0.9 * covered.max())
+    best = contenders[thickness[contenders].argmin()]
+    selected = codes == best
+    line_x, line_y = xs[selected], ys[selected].astype(np.float64)
+    columns = np.unique(line_x)
+    position = np.searchsorted(columns, line_x)
+    closes_row = np.bincount(position, weights=line_y) / np.bincount(position)
+    step = -(-len(columns) // _MAX_LINE_POINTS)
+    columns, closes_row = columns[::step], closes_row[::step]
+    bars = np.column_stack((closes_row, closes_row, closes_row, closes_row))
+    groups = np.stack((columns, columns), axis=1)
+    return _to_chart("line", bars, columns.astype(np.float64), groups, volume_pane)
+
+
+def _to_chart(kind: str, rows_ohlc: np.ndarray, centres: np.ndarray, groups: np.ndarray,
+              volume_pane: bool) -> DigitizedChart:
+    top, bottom = rows_ohlc[:, 1].min(), rows_ohlc[:, 2].max()
+    span = max(bottom - top, 1.0)
+    # Linha de pixel (cresce para baixo) -> preço relativo (cresce para cima)
+    ohlc = (bottom - rows_ohlc) / span * 100.0
+    plot_box = (int(groups[0, 0]), int(top), int(groups[-1, 1]), int(bottom))
+    return DigitizedChart(kind, ohlc, centres, plot_box, volume_pane)
+
+
+def digitize_chart(source) -> Optional[DigitizedChart]:
+    """Series from a chart image (path or PIL image), or None when no series can be found."""
+    pixels = _load(source)
+    foreground = foreground_mask(pixels)
+    up, down = _colour_classes(pixels, foreground)
+    coloured = np.count_nonzero(up) + np.count_nonzero(down)
+    if coloured and min(np.count_nonzero(up), np.count_nonzero(down)) >= 0.03 * coloured:
+        chart = _digitize_candles(up, down)
+        if chart is not None:
+            return chart
+    return _digitize_line(pixels, foreground)
@@ -0,0 +1,181 @@
+"""
+CPU-only pre-screen that rejects uploads which are clearly not price charts.
+
+Runs on a thumbnail (longest side ``_SCREEN_SIDE`` px) with Pillow and NumPy
+before the quota check and the provider call. Feature extraction takes about
+4 ms; decoding dominates for large PNGs (JPEG uses draft-mode decoding):
+
+* background: share of the dominant colour (charts sit on a flat canvas;
+  photos and noise have none, blank screenshots are nothing else);
+* palette: number of colours with a visible share (charts use a handful);
+* edge density: fraction of pixels with a strong luminance gradient;
+* series shape: after dropping full-width/full-height lines (grid, axes),
+  how many columns hold foreground, how many separate runs a column holds
+  (one for a candle or a line point, one per text line for a paragraph) and
+  how far the per-column centre moves across the image (prices move, text
+  lines stay put);
+* grid lines: faint full-width/full-height rules.
+
+The sub-scores are combined into ``score`` in [0, 1]; uploads below
+``CHART_SCREEN_THRESHOLD`` get 422. The threshold is deliberately low: a
+false reject blocks a paying user, a false accept only costs one model call.
+Precision/recall on the labelled synthetic set: ``python -m benchmarks.bench_chart_screen``.
+"""
+import os
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from .metrics import Counter
+
+CHART_SCREEN_RESULTS = Counter(
+    "tickrify_chart_screen", "Chart pre-screen decisions (accepted, rejected, unreadable)", ("decision",))
+
+_SCREEN_SIDE = 320
+_FOREGROUND_DISTANCE = 48  # distância L1 (RGB) ao fundo a partir da qual o pixel é "desenho"
+_EDGE_STEP = 40  # salto de luminância entre vizinhos que conta como borda
+_LINE_FILL = 0.6  # linha/coluna com mais que isso de desenho é grade/eixo, não série
+_BACKGROUND_SAMPLE = 120_000  # pixels usados para estimar a cor de fundo
+
+
+class ChartFeatures(NamedTuple):
+    background: float  # fração de pixels na cor dominante
+    palette: int  # cores (RGB 4 bits/canal) com pelo menos 0,2% dos pixels
+    edge_density: float
+    coverage: float  # fração de colunas com desenho após remover grade/eixos
+    runs_per_column: float  # mediana de trechos contínuos de desenho por coluna
+    motion: float  # amplitude (p90 - p10) do centro vertical do desenho por coluna, relativa à altura
+    variety: float  # fração de colunas vizinhas com desenho diferente (séries mudam a cada coluna, caixas não)
+    grid_lines: int
+
+
+class ScreenResult(NamedTuple):
+    score: float
+    likely_chart: bool
+    features: Optional[ChartFeatures]
+    seconds: float
+
+
+def _ramp(value: float, zero: float, one: float) -> float:
+    """0 at ``zero``, 1 at ``one``, linear in between (either direction)."""
+    return float(np.clip((value - zero) / (one - zero), 0.0, 1.0))
+
+
+def _count_groups(flags: np.ndarray) -> int:
+    """Number of runs of True (adjacent flagged rows/columns are one anti-aliased line)."""
+    return int(np.count_nonzero(np.diff(flags.astype(np.int8), prepend=0) == 1))
+
+
+def load_thumbnail(source) -> np.ndarray:
+    """``source`` is a path or an open PIL image; returns an (h, w, 3) uint8 array."""
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    # JPEG: decodificar já reduzido (draft) é bem mais rápido que decodificar tudo e reduzir depois
+    image.draft("RGB", (_SCREEN_SIDE, _SCREEN_SIDE))
+    image = image.convert("RGB")
+    image.thumbnail((_SCREEN_SIDE, _SCREEN_SIDE), Image.Resampling.BOX)
+    return np.asarray(image)
+
+
+class Background(NamedTuple):
+    counts: np.ndarray  # pixels por cor quantizada (RGB 4 bits/canal)
+    share: float  # fração de pixels na cor dominante
+    distance: np.ndarray  # (h, w) distância L1 de cada pixel à cor de fundo
+
+
+def background(pixels: np.ndarray) -> Background:
+    quantized = (pixels >> 4).astype(np.int32)
+    codes = (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+    counts = np.bincount(codes.ravel(), minlength=4096)
+    dominant = int(counts.argmax())
+    # Cor de fundo real = média dos pixels no bin dominante (soma mascarada: evita indexação booleana);
+    # em imagens grandes uma amostra em grade basta
+    step = max(1, int(np.sqrt(codes.size / _BACKGROUND_SAMPLE)))
+    signed = pixels.astype(np.int16)
+    sample = signed[::step, ::step]
+    in_bin = (codes[::step, ::step] == dominant)[..., None]
+    colour = ((sample * in_bin).sum(axis=(0, 1)) // max(int(in_bin.sum()), 1)).astype(np.int16)
+    distance = np.abs(signed[..., 0] - colour[0]) + np.abs(signed[..., 1] - colour[1]) + np.abs(signed[..., 2] - colour[2])
+    return Background(counts, float(counts[dominant] / codes.size), distance)
+
+
+def foreground_mask(pixels: np.ndarray) -> np.ndarray:
+    """Pixels that clearly differ from the dominant (background) colour."""
+    return background(pixels).distance > _FOREGROUND_DISTANCE
+
+
+def extract_features(pixels: np.ndarray) -> ChartFeatures:
+    height, width, _ = pixels.shape
+    total = height * width
+    bg = background(pixels)
+    counts, distance = bg.counts, bg.distance
+    palette = int(np.count_nonzero(counts >= total * 0.002))
+    foreground = distance > _FOREGROUND_DISTANCE
+
+    # int32: 255 x 150 já estoura int16 (a luma dava a volta em pixels claros e inventava bordas)
+    luma = pixels.astype(np.int32) @ np.array([77, 150, 29], dtype=np.int32) >> 8
+    edges = (np.abs(np.diff(luma, axis=0))[:, :-1] > _EDGE_STEP) | (np.abs(np.diff(luma, axis=1))[:-1, :] > _EDGE_STEP)
+    edge_density = float(edges.mean())
+
+    # Grade/eixos: linhas e colunas quase totalmente preenchidas (desenho forte) ou levemente diferentes do fundo
+    faint = (distance > 6) & ~foreground
+    full_rows = foreground.mean(axis=1) > _LINE_FILL
+    full_cols = foreground.mean(axis=0) > _LINE_FILL
+    grid_lines = _count_groups(full_rows | (faint.mean(axis=1) > _LINE_FILL)) + \
+        _count_groups(full_cols | (faint.mean(axis=0) > _LINE_FILL))
+    series = foreground.copy()
+    series[full_rows, :] = False
+    series[:, full_cols] = False
+
+    covered = series.any(axis=0)
+    coverage = float(covered.mean())
+    if covered.sum() >= 3:
+        cols = series[:, covered]
+        starts = np.count_nonzero(np.diff(cols.astype(np.int8), axis=0, prepend=0) == 1, axis=0)
+        runs_per_column = float(np.median(starts))
+        rows = np.arange(height, dtype=np.float32)[:, None]
+        centres = (cols * rows).sum(axis=0) / cols.sum(axis=0)
+        p10, p90 = np.percentile(centres, (10, 90))
+        motion = float((p90 - p10) / height)
+        variety = float((cols[:, 1:] != cols[:, :-1]).any(axis=0).mean())
+    else:
+        runs_per_column, motion, variety = 0.0, 0.0, 0.0
+    return ChartFeatures(bg.share, palette, edge_density, coverage, runs_per_column, motion, variety,
+                         grid_lines)
+
+
+def score_features(f: ChartFeatures) -> float:
+    # Sem fundo liso (foto, ruído) ou sem nada desenhado (tela em branco): rejeição direta
+    if f.background < 0.2 or f.edge_density < 0.002 or f.coverage < 0.1:
+        return 0.0
+    canvas = (
+        2.0 * _ramp(f.background, 0.2, 0.4) * _ramp(f.background, 0.995, 0.97)
+        + _ramp(f.palette, 60, 25)
+        + _ramp(f.edge_density, 0.002, 0.01) * _ramp(f.edge_density, 0.35, 0.2)
+    ) / 4.0
+    # Uma série: poucos trechos por coluna (texto: um por linha), que se move e muda a cada coluna (caixas de UI não)
+    series = _ramp(f.runs_per_column, 7, 3.5) * _ramp(f.motion, 0.0, 0.05) * _ramp(f.variety, 0.3, 0.7)
+    return canvas * series * (0.8 + 0.2 * _ramp(f.grid_lines, 0, 4))
+
+
+def screen_threshold() -> float:
+    return float(os.getenv("CHART_SCREEN_THRESHOLD", "0.45"))
+
+
+def screen_image(source, threshold: Optional[float] = None) -> ScreenResult:
+    """Decide whether ``source`` (path or PIL image) is likely a price chart."""
+    threshold = screen_threshold() if threshold is None else threshold
+    started = time.perf_counter()
+    try:
+        features = extract_features(load_thumbnail(source))
+    except (UnidentifiedImageError, OSError, ValueError):
+        CHART_SCREEN_RESULTS.labels("unreadable").inc()
+        return ScreenResult(0.0, False, None, time.perf_counter() - started)
+    score = score_features(features)
+    CHART_SCREEN_RESULTS.labels("accepted" if score >= threshold else "rejected").inc()
+    return ScreenResult(round(score, 4), score >= threshold, features, time.perf_counter() - started)
+
+
+def screen_enabled() -> bool:
+    return os.getenv("CHART_SCREEN_ENABLED", "true").lower() not in ("0", "false", "no")
@@ -1,37 +1,52 @@
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel
-from dotenv import load_dotenv
-try:
-    import supabase
-    from supabase import create_client, Client
-except Exception:
-    supabase = None
-    create_client = None  # type: ignore
-    Client = object  # type: ignore
+from . import deadlines, startup
+from .logging_config import get_logger
+from .tracing import SPAN_KIND_CLIENT, traced
 
 # Carregar variáveis de ambiente
-load_dotenv()
+startup.load_env()
+
+logger = get_logger(__name__)
 
 # Configurar cliente Supabase (modo tolerante para desenvolvimento)
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
 
-SUPABASE_ENABLED = bool(supabase_url and supabase_key and create_client)
-supabase_client: Client | None = None  # type: ignore
-
-if SUPABASE_ENABLED:
-    try:
-        supabase_client = create_client(supabase_url, supabase_key)  # type: ignore[arg-type]
-        print("✅ Conexão com Supabase estabelecida com sucesso")
-    except Exception as e:
-        print(f"❌ Erro ao conectar com Supabase: {e}")
-        print("⚠️ Continuando sem Supabase (modo offline/dev)")
-        SUPABASE_ENABLED = False
-        supabase_client = None
-else:
-    print("⚠️ SUPABASE_URL/SUPABASE_SERVICE_KEY ausentes - modo offline/dev ativado")
+# O SDK (e a conexão) só é carregado no primeiro acesso ao banco: ver get_supabase_client
+SUPABASE_ENABLED = bool(supabase_url and supabase_key)
+supabase_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase_client():
+    """Cliente Supabase, criado no primeiro uso; None em modo offline/dev ou se a conexão falhar."""
+    global SUPABASE_ENABLED, supabase_client
+    if supabase_client is not None or not SUPABASE_ENABLED:
+        return supabase_client
+    with _client_lock:
+        if supabase_client is None and SUPABASE_ENABLED:
+            try:
+                from supabase import create_client
+
+                supabase_client = create_client(supabase_url, supabase_key)  # type: ignore[arg-type]
+                logger.info("Conexão com Supabase estabelecida com sucesso")
+            except Exception as e:
+                logger.error("Erro ao conectar com Supabase: %s", e)
+                logger.warning("Continuando sem Supabase (modo offline/dev)")
+                SUPABASE_ENABLED = False
+    return supabase_client
+
+# Limite de cada consulta ao Supabase (encurtado pelo prazo da requisição, quando houver)
+DB_TIMEOUT_SECONDS = float(os.getenv("DB_TIMEOUT_SECONDS", "10"))
+
+
+async def _execute(query):
+    """Executa a consulta PostgREST (cliente síncrono) fora do event loop, dentro do prazo."""
+    return await deadlines.to_thread("db", DB_TIMEOUT_SECONDS, query.execute)
 
 # Modelos de dados
 class User(BaseModel):
@@ -78,77 +93,108 @@ class UsageLimit(BaseModel):
     count: int
     updated_at: datetime
 
+class AnalysisJob(BaseModel):
+    id: str
+    user_id: str
+    plan_type: str = "free"
+    status: str  # 'queued', 'running', 'succeeded', 'failed'
+    image_base64: Optional[str] = None  # mantido só até o processamento
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Funções de acesso ao banco de dados
 class Database:
     @staticmethod
+    @traced("db.get_user", kind=SPAN_KIND_CLIENT)
     async def get_user(user_id: str) -> Optional[User]:
         """Busca um usuário pelo ID"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
-            response = supabase_client.table("users").select("*").eq("id", user_id).execute()
+            response = await _execute(client.table("users").select("*").eq("id", user_id))
             if response.data and len(response.data) > 0:
                 return User(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar usuário: {e}")
+            logger.error("Erro ao buscar usuário: %s", e)
             return None
 
     @staticmethod
+    @traced("db.get_user_by_email", kind=SPAN_KIND_CLIENT)
     async def get_user_by_email(email: str) -> Optional[User]:
         """Busca um usuário pelo email"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
-            response = supabase_client.table("users").select("*").eq("email", email).execute()
+            response = await _execute(client.table("users").select("*").eq("email", email))
             if response.data and len(response.data) > 0:
                 return User(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar usuário por email: {e}")
+            logger.error("Erro ao buscar usuário por email: %s", e)
             return None
 
     @staticmethod
+    @traced("db.create_user", kind=SPAN_KIND_CLIENT)
     async def create_user(user_data: Dict[str, Any]) -> Optional[User]:
         """Cria um novo usuário"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
             user_data["created_at"] = datetime.now().isoformat()
             user_data["updated_at"] = datetime.now().isoformat()
             
-            response = supabase_client.table("users").insert(user_data).execute()
+            response = await _execute(client.table("users").insert(user_data))
             if response.data and len(response.data) > 0:
                 return User(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao criar usuário: {e}")
+            logger.error("Erro ao criar usuário: %s", e)
             return None
 
     @staticmethod
+    @traced("db.update_user", kind=SPAN_KIND_CLIENT)
     async def update_user(user_id: str, user_data: Dict[str, Any]) -> Optional[User]:
         """Atualiza um usuário existente"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
             user_data["updated_at"] = datetime.now().isoformat()
             
-            response = supabase_client.table("users").update(user_data).eq("id", user_id).execute()
+            response = await _execute(client.table("users").update(user_data).eq("id", user_id))
             if response.data and len(response.data) > 0:
                 return User(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao atualizar usuário: {e}")
+            logger.error("Erro ao atualizar usuário: %s", e)
             return None
 
     @staticmethod
+    @traced("db.get_active_subscription", kind=SPAN_KIND_CLIENT)
     async def get_active_subscription(user_id: str) -> Optional[Subscription]:
         """Busca a assinatura ativa de um usuário"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             # Modo offline: nenhuma assinatura ativa
             return None
         try:
-            response = supabase_client.table("subscriptions").select("*").eq("user_id", user_id).eq("is_active", True).execute()
+            response = await _execute(client.table("subscriptions").select("*").eq("user_id", user_id).eq("is_active", True))
             if response.data and len(response.data) > 0:
                 sub = Subscription(**response.data[0])
                 # Validar active_until
@@ -176,17 +222,23 @@ class Database:
                             stripe_customer_id=None,
                             stripe_subscription_id=None,
                         )
+            except deadlines.DeadlineExceeded:
+                raise
             except Exception as _:
                 pass
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar assinatura: {e}")
+            logger.error("Erro ao buscar assinatura: %s", e)
             return None
 
     @staticmethod
+    @traced("db.create_subscription", kind=SPAN_KIND_CLIENT)
     async def create_subscription(subscription_data: Dict[str, Any]) -> Optional[Subscription]:
         """Cria uma nova assinatura"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
             subscription_data["created_at"] = datetime.now().isoformat()
@@ -195,100 +247,208 @@ class Database:
             # Desativar assinaturas existentes do usuário
             user_id = subscription_data.get("user_id")
             if user_id:
-                supabase_client.table("subscriptions").update({"is_active": False, "updated_at": datetime.now().isoformat()}).eq("user_id", user_id).execute()
+                await _execute(client.table("subscriptions").update({"is_active": False, "updated_at": datetime.now().isoformat()}).eq("user_id", user_id))
             
-            response = supabase_client.table("subscriptions").insert(subscription_data).execute()
+            response = await _execute(client.table("subscriptions").insert(subscription_data))
             if response.data and len(response.data) > 0:
                 return Subscription(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao criar assinatura: {e}")
+            logger.error("Erro ao criar assinatura: %s", e)
             return None
 
     @staticmethod
+    @traced("db.update_subscription", kind=SPAN_KIND_CLIENT)
     async def update_subscription(subscription_id: str, subscription_data: Dict[str, Any]) -> Optional[Subscription]:
         """Atualiza uma assinatura existente"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
             subscription_data["updated_at"] = datetime.now().isoformat()
             
-            response = supabase_client.table("subscriptions").update(subscription_data).eq("id", subscription_id).execute()
+            response = await _execute(client.table("subscriptions").update(subscription_data).eq("id", subscription_id))
             if response.data and len(response.data) > 0:
                 return Subscription(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao atualizar assinatura: {e}")
+            logger.error("Erro ao atualizar assinatura: %s", e)
             return None
 
     @staticmethod
+    @traced("db.cancel_subscription", kind=SPAN_KIND_CLIENT)
     async def cancel_subscription(subscription_id: str) -> bool:
         """Cancela uma assinatura"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return False
         try:
-            response = supabase_client.table("subscriptions").update({
+            response = await _execute(client.table("subscriptions").update({
                 "is_active": False,
                 "status": "canceled",
                 "updated_at": datetime.now().isoformat()
-            }).eq("id", subscription_id).execute()
+            }).eq("id", subscription_id))
             
             return response.data is not None and len(response.data) > 0
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao cancelar assinatura: {e}")
+            logger.error("Erro ao cancelar assinatura: %s", e)
             return False
 
     @staticmethod
+    @traced("db.save_analysis", kind=SPAN_KIND_CLIENT)
     async def save_analysis(analysis_data: Dict[str, Any]) -> Optional[Analysis]:
         """Salva uma análise"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
             analysis_data["created_at"] = datetime.now().isoformat()
             
-            response = supabase_client.table("analyses").insert(analysis_data).execute()
+            response = await _execute(client.table("analyses").insert(analysis_data))
             if response.data and len(response.data) > 0:
                 return Analysis(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao salvar análise: {e}")
+            logger.error("Erro ao salvar análise: %s", e)
             return None
 
     @staticmethod
+    @traced("db.get_user_analyses", kind=SPAN_KIND_CLIENT)
     async def get_user_analyses(user_id: str, limit: int = 50) -> List[Analysis]:
         """Busca análises de um usuário"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return []
         try:
-            response = supabase_client.table("analyses").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit).execute()
+            response = await _execute(client.table("analyses").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit))
             if response.data:
                 return [Analysis(**item) for item in response.data]
             return []
+        except deadlines.DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error("Erro ao buscar análises: %s", e)
+            return []
+
+    @staticmethod
+    @traced("db.create_analysis_job", kind=SPAN_KIND_CLIENT)
+    async def create_analysis_job(job_data: Dict[str, Any]) -> bool:
+        """Persiste um job de análise assíncrona"""
+        client = get_supabase_client()
+        if client is None:
+            return False
+        try:
+            response = await _execute(client.table("analysis_jobs").insert(job_data))
+            return bool(response.data)
+        except deadlines.DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error("Erro ao criar job de análise: %s", e)
+            return False
+
+    @staticmethod
+    @traced("db.get_analysis_job", kind=SPAN_KIND_CLIENT)
+    async def get_analysis_job(job_id: str) -> Optional[AnalysisJob]:
+        """Busca um job de análise pelo ID"""
+        client = get_supabase_client()
+        if client is None:
+            return None
+        try:
+            response = await _execute(client.table("analysis_jobs").select("*").eq("id", job_id))
+            if response.data and len(response.data) > 0:
+                return AnalysisJob(**response.data[0])
+            return None
+        except deadlines.DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error("Erro ao buscar job de análise: %s", e)
+            return None
+
+    @staticmethod
+    @traced("db.get_pending_analysis_jobs", kind=SPAN_KIND_CLIENT)
+    async def get_pending_analysis_jobs(limit: int = 500) -> List[AnalysisJob]:
+        """Jobs ainda não concluídos (para retomar após restart)"""
+        client = get_supabase_client()
+        if client is None:
+            return []
+        try:
+            response = await _execute(client.table("analysis_jobs").select("*").in_("status", ["queued", "running"]).order("created_at").limit(limit))
+            return [AnalysisJob(**item) for item in response.data or []]
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar análises: {e}")
+            logger.error("Erro ao buscar jobs pendentes: %s", e)
             return []
 
     @staticmethod
+    @traced("db.claim_analysis_job", kind=SPAN_KIND_CLIENT)
+    async def claim_analysis_job(job_id: str, expected_status: str, job_data: Dict[str, Any]) -> bool:
+        """Atualiza o job somente se ainda estiver em expected_status (evita dois processos no mesmo job)"""
+        client = get_supabase_client()
+        if client is None:
+            return True
+        try:
+            job_data["updated_at"] = datetime.now().isoformat()
+            response = await _execute(client.table("analysis_jobs").update(job_data).eq("id", job_id).eq("status", expected_status))
+            return bool(response.data)
+        except deadlines.DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error("Erro ao reservar job de análise: %s", e)
+            return False
+
+    @staticmethod
+    @traced("db.update_analysis_job", kind=SPAN_KIND_CLIENT)
+    async def update_analysis_job(job_id: str, job_data: Dict[str, Any]) -> bool:
+        """Atualiza um job de análise"""
+        client = get_supabase_client()
+        if client is None:
+            return False
+        try:
+            job_data["updated_at"] = datetime.now().isoformat()
+            response = await _execute(client.table("analysis_jobs").update(job_data).eq("id", job_id))
+            return bool(response.data)
+        except deadlines.DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error("Erro ao atualizar job de análise: %s", e)
+            return False
+
+    @staticmethod
+    @traced("db.get_monthly_usage", kind=SPAN_KIND_CLIENT)
     async def get_monthly_usage(user_id: str) -> int:
         """Busca o uso mensal de um usuário"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return 0
         try:
             current_month_year = datetime.now().strftime("%m-%Y")
             
-            response = supabase_client.table("usage_limits").select("count").eq("user_id", user_id).eq("month_year", current_month_year).execute()
+            response = await _execute(client.table("usage_limits").select("count").eq("user_id", user_id).eq("month_year", current_month_year))
             
             if response.data and len(response.data) > 0:
                 return response.data[0]["count"]
             return 0
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar uso mensal: {e}")
+            logger.error("Erro ao buscar uso mensal: %s", e)
             return 0
 
     @staticmethod
+    @traced("db.increment_monthly_usage", kind=SPAN_KIND_CLIENT)
     async def increment_monthly_usage(user_id: str) -> int:
         """Incrementa o uso mensal de um usuário"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             # Em modo offline apenas retorna 1 para indicar incremento virtual
             return 1
         try:
@@ -296,72 +456,82 @@ class Database:
             now = datetime.now().isoformat()
             
             # Verificar se já existe registro para este mês
-            response = supabase_client.table("usage_limits").select("*").eq("user_id", user_id).eq("month_year", current_month_year).execute()
+            response = await _execute(client.table("usage_limits").select("*").eq("user_id", user_id).eq("month_year", current_month_year))
             
             if response.data and len(response.data) > 0:
                 # Atualizar registro existente
                 current_count = response.data[0]["count"]
                 new_count = current_count + 1
                 
-                update_response = supabase_client.table("usage_limits").update({
+                update_response = await _execute(client.table("usage_limits").update({
                     "count": new_count,
                     "updated_at": now
-                }).eq("user_id", user_id).eq("month_year", current_month_year).execute()
+                }).eq("user_id", user_id).eq("month_year", current_month_year))
                 
                 if update_response.data and len(update_response.data) > 0:
                     return new_count
                 return current_count
             else:
                 # Criar novo registro
-                insert_response = supabase_client.table("usage_limits").insert({
+                insert_response = await _execute(client.table("usage_limits").insert({
                     "user_id": user_id,
                     "month_year": current_month_year,
                     "count": 1,
                     "updated_at": now
-                }).execute()
+                }))
                 
                 if insert_response.data and len(insert_response.data) > 0:
                     return 1
                 return 0
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao incrementar uso mensal: {e}")
+            logger.error("Erro ao incrementar uso mensal: %s", e)
             return -1
 
     @staticmethod
+    @traced("db.get_subscription_by_stripe_id", kind=SPAN_KIND_CLIENT)
     async def get_subscription_by_stripe_id(stripe_subscription_id: str) -> Optional[Subscription]:
         """Busca uma assinatura pelo ID do Stripe"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
-            response = supabase_client.table("subscriptions").select("*").eq("stripe_subscription_id", stripe_subscription_id).execute()
+            response = await _execute(client.table("subscriptions").select("*").eq("stripe_subscription_id", stripe_subscription_id))
             if response.data and len(response.data) > 0:
                 return Subscription(**response.data[0])
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar assinatura por ID do Stripe: {e}")
+            logger.error("Erro ao buscar assinatura por ID do Stripe: %s", e)
             return None
 
     @staticmethod
+    @traced("db.get_user_by_stripe_customer_id", kind=SPAN_KIND_CLIENT)
     async def get_user_by_stripe_customer_id(stripe_customer_id: str) -> Optional[User]:
         """Busca um usuário pelo ID de cliente do Stripe"""
-        if not SUPABASE_ENABLED or not supabase_client:
+        client = get_supabase_client()
+        if client is None:
             return None
         try:
             # Primeiro, encontre a assinatura com este customer_id
-            sub_response = supabase_client.table("subscriptions").select("user_id").eq("stripe_customer_id", stripe_customer_id).execute()
+            sub_response = await _execute(client.table("subscriptions").select("user_id").eq("stripe_customer_id", stripe_customer_id))
             
             if sub_response.data and len(sub_response.data) > 0:
                 user_id = sub_response.data[0]["user_id"]
                 
                 # Agora, busque o usuário com este ID
-                user_response = supabase_client.table("users").select("*").eq("id", user_id).execute()
+                user_response = await _execute(client.table("users").select("*").eq("id", user_id))
                 
                 if user_response.data and len(user_response.data) > 0:
                     return User(**user_response.data[0])
             
             return None
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao buscar usuário por ID de cliente do Stripe: {e}")
+            logger.error("Erro ao buscar usuário por ID de cliente do Stripe: %s", e)
             return None
 
 
@@ -0,0 +1,293 @@
+"""
+Per-request deadlines propagated to every downstream call.
+
+``DeadlineMiddleware`` gives each request a time budget chosen by route and
+plan (same rule format as the rate limiter, ``*`` globs allowed in paths)
+and stores the absolute deadline in a context variable. The variable
+follows the request into ``asyncio.to_thread`` workers, so provider, Supabase,
+Stripe and JWKS calls made on behalf of the request ask ``timeout(cap)``
+for their own timeout: the usual cap, shortened to what is left of the
+budget. A call with no budget left raises ``DeadlineExceeded`` (504) instead
+of starting.
+
+The middleware itself enforces the budget: if no response has started
+``REQUEST_DEADLINE_GRACE_SECONDS`` after the deadline, the handler task is
+cancelled and the client gets 504. A client that disconnects cancels the
+handler the same way (work shared with other requests through single-flight
+keeps running while someone still waits for it). Background work (analysis
+jobs, signal refreshes) runs outside any request and keeps the per-call caps.
+
+``tickrify_deadline_exceeded{route,stage}`` counts requests cut off at the
+deadline (``stage="request"``) and downstream calls refused or timed out for
+lack of budget; ``tickrify_client_disconnects{route}`` counts handlers
+cancelled because the client went away.
+"""
+import asyncio
+import contextvars
+import fnmatch
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from .error_handler import APIException
+from .logging_config import get_logger
+from .metrics import Counter
+
+logger = get_logger(__name__)
+
+DEADLINE_EXCEEDED = Counter(
+    "tickrify_deadline_exceeded", "Requests and downstream calls cut short by the request deadline",
+    ("route", "stage"))
+CLIENT_DISCONNECTS = Counter(
+    "tickrify_client_disconnects", "Requests whose handler was cancelled because the client disconnected", ("route",))
+
+# "<METHOD> <path>=<plan>:<seconds>,...;..."  ("*" = any plan without its own entry; 0 = no deadline)
+# Regras avaliadas em ordem: a primeira que casar vale (caminhos aceitam glob: /api/analysis-jobs/*)
+DEFAULT_DEADLINES = (
+    "POST /api/analyze-chart=*:45,trader:60,alpha_pro:90;"
+    "POST /api/analysis-jobs=*:15;"
+    "GET /api/analysis-jobs/*/events=*:0;"
+    "GET /api/analysis-jobs/*=*:30;"
+    "GET /api/signal/stream=*:0;"
+    "POST /api/analyze-ohlc=*:30;"
+    "POST /webhook/stripe=*:25;"
+    "POST /api/webhooks/stripe=*:25"
+)
+
+# Abaixo disso não vale a pena começar uma chamada de rede
+MIN_CALL_SECONDS = 0.05
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+_route: contextvars.ContextVar[str] = contextvars.ContextVar("request_deadline_route", default="none")
+
+
+class DeadlineExceeded(APIException):
+    def __init__(self, stage: str):
+        super().__init__(504, "Tempo limite da requisição excedido",
+                         details=f"Sem tempo restante para {stage}", error_code="deadline_exceeded")
+        self.stage = stage
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request with a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left < MIN_CALL_SECONDS
+
+
+def exceeded(stage: str) -> DeadlineExceeded:
+    """Count a deadline hit for ``stage`` and return the exception to raise."""
+    DEADLINE_EXCEEDED.labels(_route.get(), stage).inc()
+    return DeadlineExceeded(stage)
+
+
+def timeout(cap: float, stage: str) -> float:
+    """Timeout for a downstream call: ``cap`` shortened to the remaining budget."""
+    left = remaining()
+    if left is None:
+        return cap
+    if left < MIN_CALL_SECONDS:
+        raise exceeded(stage)
+    return min(cap, left)
+
+
+async def to_thread(stage: str, cap: float, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """``fn(*args, **kwargs)`` off the event loop, bounded by ``cap`` and the request deadline."""
+    limit = timeout(cap, stage)
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), limit)
+    except asyncio.TimeoutError:
+        if expired():
+            raise exceeded(stage) from None
+        raise
+
+
+@dataclass(frozen=True)
+class DeadlineRule:
+    method: str
+    path: str
+    budgets: Dict[str, float]
+
+    def budget_for(self, plan: str) -> float:
+        return self.budgets.get(plan, self.budgets.get("*", 0.0))
+
+    @property
+    def by_plan(self) -> bool:
+        """True if the budget depends on the plan (the caller must be identified)."""
+        return len(set(self.budgets.values())) > 1
+
+
+def parse_rules(spec: str) -> List[DeadlineRule]:
+    rules = []
+    for entry in filter(None, (e.strip() for e in spec.split(";"))):
+        route, _, budgets_spec = entry.partition("=")
+        method, _, path = route.strip().partition(" ")
+        budgets = {}
+        for item in filter(None, (i.strip() for i in budgets_spec.split(","))):
+            plan, _, seconds = item.partition(":")
+            budgets[plan.strip()] = float(seconds)
+        rules.append(DeadlineRule(method.strip().upper(), path.strip().rstrip("/") or "/", budgets))
+    return rules
+
+
+class DeadlinePolicy:
+    def __init__(self, rules: List[DeadlineRule], default_seconds: float = 30.0, grace_seconds: float = 1.0):
+        self.rules = rules
+        self.default_seconds = default_seconds
+        self.grace_seconds = grace_seconds
+
+    def match(self, method: str, path: str) -> Optional[DeadlineRule]:
+        path = path.rstrip("/") or "/"
+        for rule in self.rules:
+            if rule.method == method and fnmatch.fnmatchcase(path, rule.path):
+                return rule
+        return None
+
+    def budget(self, method: str, path: str, plan_of: Callable[[], str]) -> Tuple[str, float]:
+        """(route label, seconds) for a request; 0 means no deadline."""
+        rule = self.match(method, path)
+        if rule is None:
+            return "default", self.default_seconds
+        return rule.path, rule.budget_for(plan_of() if rule.by_plan else "*")
+
+
+def policy_from_env() -> DeadlinePolicy:
+    return DeadlinePolicy(
+        parse_rules(os.getenv("REQUEST_DEADLINES", DEFAULT_DEADLINES)),
+        default_seconds=float(os.getenv("REQUEST_DEADLINE_SECONDS", "30")),
+        grace_seconds=float(os.getenv("REQUEST_DEADLINE_GRACE_SECONDS", "1")),
+    )
+
+
+deadline_policy = policy_from_env()
+
+
+def _plan(scope) -> str:
+    # Import tardio: rate_limit importa auth, que consulta este módulo
+    from . import rate_limit
+
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+    return rate_limit.rate_limiter.identify(headers, scope.get("client"))[1]
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware: runs the handler as a task, cancels it at the
+    deadline (504 if nothing was sent yet) or when the client disconnects.
+    """
+
+    def __init__(self, app, policy: Optional[DeadlinePolicy] = None):
+        self.app = app
+        self.policy = policy
+        self.enabled = os.getenv("REQUEST_DEADLINES_ENABLED", "true").lower() not in ("0", "false", "no")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        policy = self.policy or deadline_policy
+        route, budget = policy.budget(scope["method"], scope["path"], lambda: _plan(scope))
+        if budget <= 0:
+            # Streams (SSE) não têm prazo; cada chamada ainda usa o próprio limite
+            await self.app(scope, receive, send)
+            return
+        deadline_token = _deadline.set(time.monotonic() + budget)
+        route_token = _route.set(route)
+        try:
+            await self._run(scope, receive, send, route, budget + policy.grace_seconds)
+        finally:
+            _deadline.reset(deadline_token)
+            _route.reset(route_token)
+
+    async def _run(self, scope, receive, send, route: str, limit: float) -> None:
+        loop = asyncio.get_running_loop()
+        cutoff = loop.time() + limit
+        inbox: asyncio.Queue = asyncio.Queue(maxsize=1)  # backpressure: o corpo não é lido antes do app pedir
+        disconnected = asyncio.Event()
+        started = finished = False
+
+        async def pump():
+            # Único leitor do servidor: repassa o corpo ao app e percebe o disconnect mesmo que o app nunca leia
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+                await inbox.put(message)
+
+        async def receive_wrapper():
+            if inbox.empty() and disconnected.is_set():
+                return {"type": "http.disconnect"}
+            getter = asyncio.ensure_future(inbox.get())
+            waiter = asyncio.ensure_future(disconnected.wait())
+            try:
+                await asyncio.wait({getter, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+                if not getter.done():
+                    getter.cancel()
+            return getter.result() if getter.done() and not getter.cancelled() else {"type": "http.disconnect"}
+
+        async def send_wrapper(message):
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, receive_wrapper, send_wrapper))
+        reader = asyncio.ensure_future(pump())
+        disconnect_wait = asyncio.ensure_future(disconnected.wait())
+        try:
+            while True:
+                waiting = {handler} if finished else {handler, disconnect_wait}
+                done, _ = await asyncio.wait(waiting, timeout=None if started else max(0.0, cutoff - loop.time()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if handler in done:
+                    break
+                if disconnect_wait in done and not finished:
+                    CLIENT_DISCONNECTS.labels(route).inc()
+                    logger.info("Cliente desconectou; cancelando a requisição", extra={"path": scope["path"]})
+                    await _cancel(handler)
+                    return
+                if not done and not started:
+                    DEADLINE_EXCEEDED.labels(route, "request").inc()
+                    logger.warning("Prazo da requisição excedido", extra={"path": scope["path"], "budget_s": limit})
+                    await _cancel(handler)
+                    if not started:
+                        await _timeout_response(scope)(scope, receive, send)
+                    return
+                # Resposta já enviada por completo: o disconnect que o servidor reporta depois é o fim normal
+            await handler
+        finally:
+            for task in (handler, reader, disconnect_wait):
+                if not task.done():
+                    task.cancel()
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        # Cancelado (ou falhou ao cancelar): o resultado não interessa a mais ninguém
+        pass
+
+
+def _timeout_response(scope) -> JSONResponse:
+    # Mesmo formato das respostas do ErrorHandler
+    return JSONResponse(status_code=504, content={
+        "status": "error",
+        "code": 504,
+        "message": "Tempo limite da requisição excedido",
+        "details": "Tente novamente ou use /api/analysis-jobs para análises demoradas",
+        "path": scope["path"],
+    })
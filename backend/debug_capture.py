@@ -0,0 +1,224 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from .metrics import register_stats
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in {"1", "true", "yes", "on"}
+
+
+class DebugCaptureSink:
+    """
+    Non-blocking sink for MODEL_DEBUG_MODE records.
+
+    ``capture`` only samples and enqueues; a background thread batches records
+    into gzip-compressed JSONL segments and rotates them by record count, size
+    or age. Segments are written as ``*.jsonl.gz.part`` and renamed when closed,
+    so readers never see a half-written file. When the bounded buffer is full
+    new records are dropped (and counted) instead of blocking the caller.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 1.0,
+        buffer_size: int = 10000,
+        segment_max_records: int = 50000,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        segment_max_seconds: float = 300.0,
+    ):
+        self.directory = directory
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.segment_max_records = segment_max_records
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=buffer_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._segment_records = 0
+        self._segment_bytes = 0
+        self._segment_opened = 0.0
+        # metrics
+        self.captured = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.segments = 0
+
+    def capture(self, kind: str, payload: Dict[str, Any]) -> bool:
+        """Enqueue a record; never blocks. Returns False if sampled out or dropped."""
+        if self._closed:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+        self._ensure_started()
+        record = {"timestamp": datetime.now(timezone.utc).isoformat(), "kind": kind, **payload}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.captured += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything enqueued so far is written and flushed to disk."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "buffered": self._queue.qsize(),
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "written": self.written,
+            "segments": self.segments,
+        }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="debug-capture-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+            batch = [item]
+            # Drain whatever else is waiting so each wakeup writes one batch
+            while len(batch) < 1024:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for entry in batch:
+                if entry is None:
+                    self._close_segment()
+                    return
+                if isinstance(entry, threading.Event):
+                    if self._segment is not None:
+                        self._segment.flush()
+                    entry.set()
+                    continue
+                self._write(entry)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        try:
+            line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(line)
+            self._segment_records += 1
+            self._segment_bytes += len(line)
+            self.written += 1
+            self._maybe_rotate()
+        except Exception:
+            # Debug capture must never take the service down
+            self.dropped += 1
+
+    def _open_segment(self) -> None:
+        name = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}.jsonl.gz"
+        self._segment_path = os.path.join(self.directory, name)
+        self._segment = gzip.open(self._segment_path + ".part", "wb", compresslevel=6)
+        self._segment_records = 0
+        self._segment_bytes = 0
+        self._segment_opened = time.monotonic()
+
+    def _maybe_rotate(self) -> None:
+        if self._segment is None:
+            return
+        if (self._segment_records >= self.segment_max_records
+                or self._segment_bytes >= self.segment_max_bytes
+                or time.monotonic() - self._segment_opened >= self.segment_max_seconds):
+            self._close_segment()
+
+    def _close_segment(self) -> None:
+        if self._segment is None:
+            return
+        try:
+            self._segment.close()
+            os.replace(self._segment_path + ".part", self._segment_path)
+            self.segments += 1
+        except Exception:
+            pass
+        self._segment = None
+        self._segment_path = None
+
+
+_sink: Optional[DebugCaptureSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_debug_sink() -> Optional[DebugCaptureSink]:
+    """Process-wide sink configured from MODEL_DEBUG_* env vars; None when debug mode is off."""
+    global _sink
+    if not _env_flag("MODEL_DEBUG_MODE"):
+        return None
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = DebugCaptureSink(
+                    directory=os.getenv("MODEL_DEBUG_DIR", "logs/model_debug"),
+                    sample_rate=float(os.getenv("MODEL_DEBUG_SAMPLE_RATE", "1.0")),
+                    buffer_size=int(os.getenv("MODEL_DEBUG_BUFFER_SIZE", "10000")),
+                    segment_max_records=int(os.getenv("MODEL_DEBUG_SEGMENT_RECORDS", "50000")),
+                    segment_max_bytes=int(float(os.getenv("MODEL_DEBUG_SEGMENT_MB", "64")) * 1024 * 1024),
+                    segment_max_seconds=float(os.getenv("MODEL_DEBUG_SEGMENT_SECONDS", "300")),
+                )
+                atexit.register(_sink.close)
+    return _sink
+
+
+# Expose sink counters on /metrics once debug mode has created it
+register_stats(
+    "tickrify_debug_capture",
+    lambda: _sink.stats() if _sink is not None else None,
+    counters=("captured", "dropped", "sampled_out", "written", "segments"),
+)
+
+
+def capture_debug(kind: str, payload: Dict[str, Any]) -> None:
+    """Record a debug payload if MODEL_DEBUG_MODE is on (cheap no-op otherwise)."""
+    sink = get_debug_sink()
+    if sink is not None:
+        sink.capture(kind, payload)
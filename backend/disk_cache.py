@@ -0,0 +1,267 @@
+"""
+Host-wide analysis cache shared by every worker process (SQLite, WAL mode).
+
+The in-process layers (idempotency store, single-flight, near-duplicate
+index) are split across uvicorn workers and emptied on every deploy. This
+tier sits on disk next to them: a result written by one worker is a hit for
+all the others and for the next process after a restart.
+
+* Keys are namespaced; chart analyses use the upload's SHA-256 plus the
+  prompt version (``chart_analysis@v2``), so switching prompts never serves
+  an answer produced by another prompt.
+* Values are JSON with an absolute expiry (wall clock, shared by all
+  processes); expired rows are ignored on read and purged on write.
+* Size bound: a trigger keeps the total payload size in a one-row table;
+  once a write takes it over ``max_bytes`` the least recently read rows are
+  deleted down to 90%. Recency is refreshed at most once per
+  ``_TOUCH_SECONDS`` per row and only if the write lock is free, so reads
+  stay read-only in practice.
+* Reads never block: in WAL mode readers see the last committed snapshot
+  while a writer appends, and every thread has its own connection. Writers
+  serialise on SQLite's file lock (``busy_timeout``).
+* Crash safety: each write is one transaction (WAL, ``synchronous=NORMAL``),
+  so a killed worker leaves either the old or the new row, never a torn
+  one. A file that is not a database at all is moved aside and recreated;
+  any other SQLite error is logged and treated as a miss. If the directory
+  cannot be created (read-only or misconfigured path), the tier is disabled
+  in that process: every read is a miss and writes are skipped.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .logging_config import get_logger
+from .metrics import CACHE_HITS, CACHE_MISSES, register_stats
+
+logger = get_logger(__name__)
+
+_TOUCH_SECONDS = 60.0
+_EVICT_BATCH = 256
+_LOW_WATER = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL, entries INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size, entries = entries + 1 WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size, entries = entries - 1 WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size + NEW.size WHERE id = 0;
+END;
+"""
+
+
+class DiskCache:
+    def __init__(self, path: str, ttl_seconds: float = 86400.0, max_bytes: int = 256 * 1024 * 1024,
+                 busy_timeout_seconds: float = 5.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.busy_timeout_seconds = busy_timeout_seconds
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized_pid: Optional[int] = None
+        self._disabled = False
+        self._counts = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+    # --- conexões ----------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        # Uma conexão por thread e por processo (workers não herdam conexões abertas antes do fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        with self._init_lock:
+            if self._initialized_pid != os.getpid():
+                self._initialize()
+                self._initialized_pid = os.getpid()
+        connection = self._open()
+        self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout_seconds, isolation_level=None)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _initialize(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            # Caminho sem permissão/inválido: sem cache neste processo, mas a análise segue
+            self._disabled = True
+            logger.error("Cache em disco desativado: não foi possível criar %s (%s)", directory, e)
+            raise
+        try:
+            self._create_schema()
+        except sqlite3.DatabaseError as e:
+            if isinstance(e, sqlite3.OperationalError):
+                raise
+            # Arquivo corrompido/não-SQLite: guardar para inspeção e recomeçar vazio (é só cache)
+            logger.warning("Cache em disco ilegível (%s); recriando %s", e, self.path)
+            try:
+                os.replace(self.path, f"{self.path}.corrupt-{int(time.time())}")
+            except FileNotFoundError:
+                pass  # outro worker já moveu o arquivo
+            for suffix in ("-wal", "-shm"):
+                try:
+                    os.unlink(self.path + suffix)
+                except OSError:
+                    pass
+            self._create_schema()
+
+    def _create_schema(self) -> None:
+        connection = self._open()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+        finally:
+            connection.close()
+
+    # --- API -----------------------------------------------------------------
+
+    def get(self, namespace: str, key: str, now: Optional[float] = None) -> Optional[Any]:
+        now = time.time() if now is None else now
+        row = None
+        if not self._disabled:
+            try:
+                connection = self._connect()
+                row = connection.execute(
+                    "SELECT value, accessed FROM entries WHERE namespace = ? AND key = ? AND expires > ?",
+                    (namespace, key, now)).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                self._error("leitura", e)
+        if row is None:
+            self._count("misses")
+            CACHE_MISSES.labels(namespace).inc()
+            return None
+        value, accessed = row
+        if now - accessed > _TOUCH_SECONDS:
+            self._touch(connection, namespace, key, now)
+        self._count("hits")
+        CACHE_HITS.labels(namespace).inc()
+        return json.loads(value)
+
+    def _touch(self, connection: sqlite3.Connection, namespace: str, key: str, now: float) -> None:
+        # Recência aproximada para a evicção; com outro processo escrevendo, pular em vez de esperar
+        try:
+            connection.execute("PRAGMA busy_timeout=0")
+            connection.execute("UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_seconds * 1000)}")
+
+    def put(self, namespace: str, key: str, value: Any, ttl_seconds: Optional[float] = None,
+            now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        size = len(payload.encode()) + len(namespace) + len(key)
+        if size > self.max_bytes:
+            return
+        expires = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        if self._disabled:
+            return
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (namespace, key) DO UPDATE SET "
+                    "value = excluded.value, size = excluded.size, expires = excluded.expires, accessed = excluded.accessed",
+                    (namespace, key, payload, size, expires, now))
+                evicted = self._evict(connection, now)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError) as e:
+            self._error("escrita", e)
+            return
+        self._count("writes")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> int:
+        """Inside the write transaction: purge expired rows, then least recently read, down to the low-water mark."""
+        total = connection.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        evicted = connection.execute("DELETE FROM entries WHERE expires <= ?", (now,)).rowcount
+        target = self.max_bytes * _LOW_WATER
+        while True:
+            total, entries = connection.execute("SELECT bytes, entries FROM totals WHERE id = 0").fetchone()
+            if total <= target or not entries:
+                return evicted
+            # Lote estimado pelo tamanho médio: o suficiente para chegar à meta, sem esvaziar o cache
+            batch = min(_EVICT_BATCH, max(1, math.ceil((total - target) / (total / entries))))
+            evicted += connection.execute(
+                "DELETE FROM entries WHERE (namespace, key) IN "
+                "(SELECT namespace, key FROM entries ORDER BY accessed LIMIT ?)", (batch,)).rowcount
+
+    def clear(self) -> None:
+        try:
+            self._connect().execute("DELETE FROM entries")
+        except (sqlite3.Error, OSError) as e:
+            self._error("limpeza", e)
+
+    def _count(self, field: str, amount: int = 1) -> None:
+        with self._init_lock:
+            self._counts[field] += amount
+
+    def _error(self, operation: str, error: Exception) -> None:
+        self._count("errors")
+        if not self._disabled:  # desativado: já registrado uma vez em _initialize
+            logger.warning("Falha na %s do cache em disco: %s", operation, error)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process plus the shared size of the store."""
+        with self._init_lock:
+            stats: Dict[str, Any] = dict(self._counts)
+        stats["disabled"] = self._disabled
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        if self._disabled:
+            return stats
+        try:
+            stats["bytes"], stats["entries"] = self._connect().execute(
+                "SELECT bytes, entries FROM totals WHERE id = 0").fetchone()
+        except (sqlite3.Error, OSError):
+            pass
+        return stats
+
+
+def analysis_cache_from_env() -> Optional[DiskCache]:
+    """None (tier disabled) unless ``ANALYSIS_CACHE_PATH`` is set."""
+    path = os.getenv("ANALYSIS_CACHE_PATH", "").strip()
+    if not path:
+        return None
+    return DiskCache(
+        path,
+        ttl_seconds=float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400")),
+        max_bytes=int(float(os.getenv("ANALYSIS_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    )
+
+
+analysis_cache = analysis_cache_from_env()
+register_stats("tickrify_analysis_cache", lambda: analysis_cache.stats() if analysis_cache else None,
+               counters=("hits", "misses", "writes", "evictions", "errors"))
@@ -3,21 +3,12 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import traceback
-import logging
 import json
 from typing import Dict, Any, Optional, Union
+from .logging_config import get_logger
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("api_errors.log"),
-        logging.StreamHandler()
-    ]
-)
-
-logger = logging.getLogger("tickrify-api")
+# Handlers (stdout, api_errors.log) são configurados em logging_config
+logger = get_logger("api")
 
 class ErrorHandler:
     """
@@ -30,8 +21,7 @@ class ErrorHandler:
         Manipulador de exceções HTTP
         """
         # Log do erro
-        logger.error(f"HTTP Exception: {exc.status_code} - {exc.detail}")
-        logger.error(f"Request path: {request.url.path}")
+        logger.error("HTTP Exception: %s - %s", exc.status_code, exc.detail, extra={"path": request.url.path})
         
         # Construir resposta de erro
         error_response = {
@@ -54,7 +44,8 @@ class ErrorHandler:
         
         return JSONResponse(
             status_code=exc.status_code,
-            content=error_response
+            content=error_response,
+            headers=getattr(exc, "headers", None)
         )
     
     @staticmethod
@@ -63,8 +54,7 @@ class ErrorHandler:
         Manipulador de exceções de validação de dados
         """
         # Log do erro
-        logger.error(f"Validation Error: {exc}")
-        logger.error(f"Request path: {request.url.path}")
+        logger.error("Validation Error: %s", exc, extra={"path": request.url.path})
         
         # Extrair erros de validação
         errors = []
@@ -96,9 +86,7 @@ class ErrorHandler:
         Manipulador de exceções gerais
         """
         # Log detalhado do erro
-        logger.error(f"Unhandled Exception: {str(exc)}")
-        logger.error(f"Request path: {request.url.path}")
-        logger.error(traceback.format_exc())
+        logger.error("Unhandled Exception: %s", exc, exc_info=exc, extra={"path": request.url.path})
         
         # Construir resposta de erro
         error_response = {
@@ -141,10 +129,8 @@ async def api_exception_handler(request: Request, exc: APIException) -> JSONResp
     Manipulador de exceções personalizadas de API
     """
     # Log do erro
-    logger.error(f"API Exception: {exc.status_code} - {exc.message}")
-    logger.error(f"Request path: {request.url.path}")
-    if exc.details:
-        logger.error(f"Details: {exc.details}")
+    logger.error("API Exception: %s - %s", exc.status_code, exc.message,
+                 extra={"path": request.url.path, "details": exc.details})
     
     # Construir resposta de erro
     error_response = {
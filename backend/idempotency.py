@@ -0,0 +1,127 @@
+"""
+Duplicate-request suppression for chart analyses.
+
+* ``IdempotencyStore`` keeps completed responses per ``(scope, Idempotency-Key)``
+  for ``IDEMPOTENCY_TTL_SECONDS`` so a retried request is replayed instead of
+  re-running (and re-billing) the analysis. Reusing a key with a different
+  image is a client error (422).
+* ``SingleFlight`` attaches concurrent identical requests (same user and
+  image SHA-256) to the computation already in flight. The computation is
+  cancelled once every request waiting on it has gone away (client
+  disconnect or deadline).
+
+Both are per process; behind several workers a retry that lands on another
+worker is recomputed, which is still correct, only not deduplicated.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from .metrics import CACHE_HITS, CACHE_MISSES, Counter
+
+SINGLE_FLIGHT_COALESCED = Counter(
+    "tickrify_singleflight_coalesced", "Requests attached to an identical in-flight computation", ("flight",))
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different payload."""
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: Any
+    headers: Dict[str, str]
+    stored_at: float
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_seconds: float = 86400.0, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+
+    def get(self, scope: str, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """``scope`` isolates keys per user and endpoint; raises IdempotencyConflict on a payload mismatch."""
+        entry = self._entries.get((scope, key))
+        if entry is None or time.monotonic() - entry.stored_at > self.ttl_seconds:
+            self._entries.pop((scope, key), None)
+            CACHE_MISSES.labels("idempotency").inc()
+            return None
+        if entry.fingerprint != fingerprint:
+            raise IdempotencyConflict(key)
+        CACHE_HITS.labels("idempotency").inc()
+        return entry
+
+    def put(self, scope: str, key: str, fingerprint: str, status_code: int, body: Any,
+            headers: Optional[Dict[str, str]] = None) -> None:
+        self._entries.pop((scope, key), None)
+        self._entries[(scope, key)] = StoredResponse(fingerprint, status_code, body, dict(headers or {}), time.monotonic())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """``await flight.do(key, fn)``: at most one ``fn()`` per key runs at a time; callers share its outcome."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    def joining(self, key: Hashable) -> bool:
+        """True if ``do(key, ...)`` called now would attach to a running flight instead of calling ``fn``."""
+        task = self._inflight.get(key)
+        return task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        shared = self.joining(key)
+        if shared:
+            task = self._inflight[key]
+            SINGLE_FLIGHT_COALESCED.labels(self.name).inc()
+        else:
+            # A separate task: a caller that disconnects must not cancel the work others still wait on
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+
+            def forget(done: asyncio.Task, key=key) -> None:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(forget)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Todos que esperavam foram cancelados: ninguém vai ler o resultado
+                    task.cancel()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+def validate_key(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise ValueError(f"Idempotency-Key deve ter de 1 a {MAX_KEY_LENGTH} caracteres imprimíveis")
+    return key
+
+
+def store_from_env() -> IdempotencyStore:
+    return IdempotencyStore(
+        ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+        max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+    )
@@ -0,0 +1,118 @@
+"""
+Vectorized technical indicators over NumPy arrays.
+
+All functions take float arrays with bars on the last axis (oldest first):
+one series of shape ``(n,)`` or many symbols at once as ``(symbols, n)``.
+They return arrays of the same shape, NaN where the window is not yet full,
+so results line up with the input bars. Exponential smoothing follows the usual charting-platform
+conventions: EMA seeded with the first value (``adjust=False``), Wilder
+smoothing (alpha = 1/n) for RSI and ATR.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+# Bloco da EMA vetorizada: (1 - alpha) ** -k cabe em float64 com folga para k até aqui
+_EMA_BLOCK = 256
+
+
+def _shift_in(first: np.ndarray, rest: np.ndarray) -> np.ndarray:
+    """Concatenate along the bar axis (``first`` has that axis of length 1)."""
+    return np.concatenate((first, rest), axis=-1)
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= period:
+        sums = _shift_in(np.zeros(values.shape[:-1] + (1,)), np.cumsum(values, axis=-1))
+        out[..., period - 1:] = (sums[..., period:] - sums[..., :-period]) / period
+    return out
+
+
+def ema(values: np.ndarray, period: int = 0, alpha: float = 0.0) -> np.ndarray:
+    """EMA with ``alpha = 2 / (period + 1)`` (or an explicit ``alpha``), computed block-wise without a Python loop per bar."""
+    values = np.asarray(values, dtype=np.float64)
+    alpha = alpha or 2.0 / (period + 1)
+    out = np.empty_like(values)
+    n = values.shape[-1]
+    if not n:
+        return out
+    decay = 1.0 - alpha
+    if decay == 0:  # period 1 (ou alpha 1): a EMA é a própria série, e decay ** -k dividiria por zero
+        return values.copy()
+    previous = values[..., :1]
+    for start in range(0, n, _EMA_BLOCK):
+        block = values[..., start:start + _EMA_BLOCK]
+        k = np.arange(1, block.shape[-1] + 1)
+        # y_k = decay^k * y_0 + alpha * sum_{i<=k} decay^(k-i) x_i
+        weighted = np.cumsum(block * decay ** -k, axis=-1)
+        out[..., start:start + block.shape[-1]] = decay ** k * (previous + alpha * weighted)
+        previous = out[..., start + block.shape[-1] - 1:start + block.shape[-1]]
+    out[..., 0] = values[..., 0]
+    return out
+
+
+def _wilder(values: np.ndarray, period: int) -> np.ndarray:
+    """Wilder smoothing of ``values[..., period - 1:]``, seeded with the mean of the first ``period`` values."""
+    seeded = _shift_in(values[..., :period].mean(axis=-1, keepdims=True), values[..., period:])
+    return ema(seeded, alpha=1.0 / period)
+
+
+def rsi(closes: np.ndarray, period: int = 14) -> np.ndarray:
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] <= period:
+        return out
+    delta = np.diff(closes, axis=-1)
+    avg_gain = _wilder(np.clip(delta, 0, None), period)
+    avg_loss = _wilder(np.clip(-delta, 0, None), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        values = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + rs))
+    out[..., period:] = values
+    return out
+
+
+class MACD(NamedTuple):
+    macd: np.ndarray
+    signal: np.ndarray
+    histogram: np.ndarray
+
+
+def macd(closes: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> MACD:
+    closes = np.asarray(closes, dtype=np.float64)
+    line = ema(closes, fast) - ema(closes, slow)
+    signal_line = ema(line, signal)
+    if closes.shape[-1] < slow:
+        line = np.full(closes.shape, np.nan)
+        signal_line = line.copy()
+    return MACD(line, signal_line, line - signal_line)
+
+
+class Bands(NamedTuple):
+    middle: np.ndarray
+    upper: np.ndarray
+    lower: np.ndarray
+
+
+def bollinger(closes: np.ndarray, period: int = 20, width: float = 2.0) -> Bands:
+    closes = np.asarray(closes, dtype=np.float64)
+    # Variância móvel por somas acumuladas (E[x²] - E[x]²), sobre a série centrada para não perder precisão
+    offset = closes.mean(axis=-1, keepdims=True) if closes.shape[-1] else 0.0
+    centred = closes - offset
+    mean = sma(centred, period)
+    deviation = np.sqrt(np.maximum(sma(centred * centred, period) - mean * mean, 0.0))
+    middle = mean + offset
+    return Bands(middle, middle + width * deviation, middle - width * deviation)
+
+
+def atr(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, period: int = 14) -> np.ndarray:
+    highs, lows, closes = (np.asarray(a, dtype=np.float64) for a in (highs, lows, closes))
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] < period:
+        return out
+    previous = _shift_in(closes[..., :1], closes[..., :-1])
+    true_range = np.maximum(highs - lows, np.maximum(np.abs(highs - previous), np.abs(lows - previous)))
+    out[..., period - 1:] = _wilder(true_range, period)
+    return out
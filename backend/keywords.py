@@ -0,0 +1,130 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class KeywordHits:
+    """Result of a single KeywordMatcher scan: category -> keywords found."""
+
+    __slots__ = ("by_category",)
+
+    def __init__(self, by_category: Dict[str, FrozenSet[str]]):
+        self.by_category = by_category
+
+    def has(self, *categories: str) -> bool:
+        return any(c in self.by_category for c in categories)
+
+    def keywords(self, category: str) -> FrozenSet[str]:
+        return self.by_category.get(category, frozenset())
+
+    @property
+    def hits(self) -> List[Tuple[str, str]]:
+        """Every (category, keyword) pair present in the text."""
+        return sorted((c, k) for c, kws in self.by_category.items() for k in kws)
+
+    def __repr__(self) -> str:
+        return f"KeywordHits({self.hits!r})"
+
+
+class KeywordMatcher:
+    """
+    Precompiled multi-category keyword matcher.
+
+    ``words`` categories match whole words only (same semantics as ``\\bkw\\b``);
+    ``substrings`` categories match anywhere (same semantics as ``kw in text``).
+    The text is lowercased and split once; every whitespace-delimited chunk is
+    classified once and memoised, so repeated vocabulary across completions
+    costs a dict lookup instead of a rescan of the whole text per keyword.
+    """
+
+    def __init__(
+        self,
+        words: Optional[Dict[str, Iterable[str]]] = None,
+        substrings: Optional[Dict[str, Iterable[str]]] = None,
+        cache_size: int = 65536,
+    ):
+        self._words: Dict[str, Tuple[str, ...]] = {}
+        self._substrings: List[Tuple[str, str]] = []
+        self._phrases: List[Tuple[str, str, str, str]] = []
+        for category, kws in (words or {}).items():
+            for kw in kws:
+                kw = kw.lower()
+                if not _WORD_RE.fullmatch(kw):
+                    raise ValueError(f"whole-word keyword must be a single word: {kw!r}")
+                self._words[kw] = self._words.get(kw, ()) + (category,)
+        for category, kws in (substrings or {}).items():
+            for kw in kws:
+                kw = kw.lower()
+                parts = kw.split(" ")
+                if len(parts) > 1:
+                    # Multi-word phrases span chunks: find candidates per chunk, confirm on the full text
+                    self._phrases.append((category, kw, parts[0], parts[-1]))
+                else:
+                    self._substrings.append((category, kw))
+        self._cache: Dict[str, Tuple[Tuple[Tuple[str, str], ...], FrozenSet[int], FrozenSet[int]]] = {}
+        self._cache_size = cache_size
+
+    def _classify(self, chunk: str):
+        hits = []
+        for token in (_WORD_RE.findall(chunk) if not chunk.isalnum() else (chunk,)):
+            for category in self._words.get(token, ()):
+                hits.append((category, token))
+        for category, kw in self._substrings:
+            if kw in chunk:
+                hits.append((category, kw))
+        heads = frozenset(i for i, p in enumerate(self._phrases) if chunk.endswith(p[2]))
+        tails = frozenset(i for i, p in enumerate(self._phrases) if chunk.startswith(p[3]))
+        entry = (tuple(hits), heads, tails)
+        if len(self._cache) >= self._cache_size:
+            self._cache.clear()
+        self._cache[chunk] = entry
+        return entry
+
+    def scan(self, text: Optional[str], lowered: bool = False) -> KeywordHits:
+        t = text or ""
+        if not lowered:
+            t = t.lower()
+        found: Dict[str, set] = {}
+        heads: set = set()
+        tails: set = set()
+        cache = self._cache
+        for chunk in set(t.split()):
+            entry = cache.get(chunk) or self._classify(chunk)
+            for category, kw in entry[0]:
+                found.setdefault(category, set()).add(kw)
+            if entry[1]:
+                heads.update(entry[1])
+            if entry[2]:
+                tails.update(entry[2])
+        for i in heads & tails:
+            category, kw, _, _ = self._phrases[i]
+            if kw in t:
+                found.setdefault(category, set()).add(kw)
+        return KeywordHits({c: frozenset(kws) for c, kws in found.items()})
+
+
+# Vocabulary shared by the text signal parser (signal_utils) and the free-text
+# chart heuristics in main.analyze_chart_with_ai.
+KEYWORDS = KeywordMatcher(
+    words={
+        "signal_buy": ("buy", "long", "compra"),
+        "signal_sell": ("sell", "short", "venda"),
+        "signal_wait": ("wait", "hold", "esperar"),
+    },
+    substrings={
+        "confidence_strong": ("strong", "confident"),
+        "confidence_weak": ("weak", "slight"),
+        "macd": ("macd",),
+        "macd_positive": ("positivo", "bullish", "acima"),
+        "macd_negative": ("negativo", "bearish", "abaixo"),
+        "moving_average": ("média móvel", "mm", "moving average", "ma"),
+        "price_above": ("acima", "above", "rompeu"),
+        "price_below": ("abaixo", "below", "rompimento"),
+        "volume": ("volume",),
+        "volume_high": ("alto", "high", "crescente", "forte"),
+        "volume_low": ("baixo", "low", "fraco"),
+        "action_buy": ("compra", "buy", "bullish", "entrada", "long"),
+        "action_sell": ("venda", "sell", "bearish", "saída", "short"),
+    },
+)
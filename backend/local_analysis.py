@@ -0,0 +1,202 @@
+"""
+Deterministic, CPU-only chart analysis: digitize the screenshot
+(backend.chart_digitizer), run the vectorized indicators (backend.indicators)
+on the recovered series and turn their confluence into compra/venda/esperar.
+
+Used as the answer when no provider is configured or every provider call
+failed (it replaces the old random "simulated" analysis), and optionally as a
+pre-analysis whose measured levels are sent to the model alongside the image
+(``AI_LOCAL_PREANALYSIS``).
+
+Prices are in the digitizer's relative units (0 = lowest, 100 = highest price
+visible), so levels are reported as a position in the visible range, never as
+quotes.
+"""
+import os
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .chart_digitizer import DigitizedChart, digitize_chart
+from .indicators import atr, bollinger, macd, rsi, sma
+
+_LEVEL_LOOKBACK = 20  # barras usadas para suporte/resistência recentes
+_DECISION_SCORE = 2  # confluência mínima (em módulo) para compra/venda
+MAX_SCORE = 5  # tendência (2) + histograma MACD (1) + cruzamento (1) + exaustão (1)
+_MAX_JUSTIFICATIVA = 150
+
+
+class IndicatorSnapshot(NamedTuple):
+    bars: int
+    close: float
+    trend: str  # "alta", "baixa" ou "lateral"
+    sma20: Optional[float]
+    sma50: Optional[float]
+    rsi: Optional[float]
+    macd_histogram: Optional[float]
+    macd_cross: Optional[str]  # "alta"/"baixa" quando a linha cruzou o sinal nas últimas 3 barras
+    percent_b: Optional[float]  # posição nas bandas de Bollinger (0 = inferior, 1 = superior)
+    atr_pct: Optional[float]  # ATR em % da faixa de preços observada
+    support: float
+    resistance: float
+    score: int  # soma dos sinais: > 0 comprador, < 0 vendedor
+
+
+class LocalAnalysis(NamedTuple):
+    acao: str
+    justificativa: str
+    snapshot: Optional[IndicatorSnapshot]
+    chart: Optional[DigitizedChart]
+    seconds: float
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def _slopes(closes: np.ndarray) -> np.ndarray:
+    """Least-squares slope over the last bars, as % of the observed range per bar, per symbol."""
+    window = closes[:, -_LEVEL_LOOKBACK:]
+    if window.shape[1] < 2:
+        return np.zeros(len(closes))
+    x = np.arange(window.shape[1]) - (window.shape[1] - 1) / 2.0
+    slope = ((window - window.mean(axis=1, keepdims=True)) * x).sum(axis=1) / (x * x).sum()
+    span = np.maximum(closes.max(axis=1) - closes.min(axis=1), 1e-9)
+    return slope / span * 100.0
+
+
+def compute_snapshots(ohlc: np.ndarray) -> List[IndicatorSnapshot]:
+    """
+    Indicators and confluence score for many symbols at once: ``ohlc`` is
+    (symbols, n, 4) open/high/low/close, oldest bar first, same n for all.
+    """
+    ohlc = np.asarray(ohlc, dtype=np.float64)
+    highs, lows, closes = ohlc[..., 1], ohlc[..., 2], ohlc[..., 3]
+    close = closes[:, -1]
+    sma20, sma50 = sma(closes, 20)[:, -1], sma(closes, 50)[:, -1]
+    rsi14 = rsi(closes, 14)[:, -1]
+    lines = macd(closes)
+    histogram = lines.histogram[:, -1]
+    bands = bollinger(closes, 20)
+    upper, lower = bands.upper[:, -1], bands.lower[:, -1]
+    atr14 = atr(highs, lows, closes, 14)[:, -1]
+    span = np.maximum(highs.max(axis=1) - lows.min(axis=1), 1e-9)
+
+    # Tendência pelas médias (MM20 x MM50); com poucas barras para a MM50, pela inclinação das últimas barras
+    if closes.shape[1] >= 50:
+        up, down = (close > sma20) & (sma20 > sma50), (close < sma20) & (sma20 < sma50)
+    else:
+        slope = _slopes(closes)
+        up, down = slope > 0.5, slope < -0.5
+    trend = np.where(up, 1, np.where(down, -1, 0))
+    # A tendência pesa em dobro; RSI extremo ou preço fora das bandas contam juntos, uma vez, contra ela (exaustão)
+    score = 2 * trend + np.nan_to_num(np.sign(histogram)).astype(int)
+    if closes.shape[1] >= 26:
+        signs = np.sign(lines.histogram[:, -4:])
+        cross = np.where(signs[:, 0] != signs[:, -1], signs[:, -1], 0).astype(int)
+    else:
+        cross = np.zeros(len(closes), dtype=int)
+    score += cross
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent_b = np.where(upper > lower, (close - lower) / (upper - lower), np.nan)
+    stretched_up = (rsi14 >= 70) | (percent_b > 1.0)
+    stretched_down = (rsi14 <= 30) | (percent_b < 0.0)
+    score -= np.where(stretched_up, 1, np.where(stretched_down, -1, 0))
+    support = lows[:, -_LEVEL_LOOKBACK:].min(axis=1)
+    resistance = highs[:, -_LEVEL_LOOKBACK:].max(axis=1)
+    atr_pct = atr14 / span * 100.0
+
+    trends = {1: "alta", -1: "baixa", 0: "lateral"}
+    return [
+        IndicatorSnapshot(
+            bars=closes.shape[1],
+            close=float(close[i]),
+            trend=trends[int(trend[i])],
+            sma20=_optional(sma20[i]),
+            sma50=_optional(sma50[i]),
+            rsi=_optional(rsi14[i]),
+            macd_histogram=_optional(histogram[i]),
+            macd_cross={1: "alta", -1: "baixa"}.get(int(cross[i])),
+            percent_b=_optional(percent_b[i]),
+            atr_pct=_optional(atr_pct[i]),
+            support=float(support[i]),
+            resistance=float(resistance[i]),
+            score=int(score[i]),
+        )
+        for i in range(len(closes))
+    ]
+
+
+def compute_snapshot(ohlc: np.ndarray) -> IndicatorSnapshot:
+    """Indicators and confluence score for one (n, 4) open/high/low/close array, oldest first."""
+    return compute_snapshots(np.asarray(ohlc, dtype=np.float64)[None])[0]
+
+
+def _describe(snapshot: IndicatorSnapshot) -> str:
+    parts = [f"tendência {snapshot.trend}"]
+    if snapshot.rsi is not None:
+        parts.append(f"RSI {snapshot.rsi:.0f}")
+    if snapshot.macd_cross:
+        parts.append(f"MACD cruzou para {snapshot.macd_cross}")
+    elif snapshot.macd_histogram is not None:
+        parts.append("MACD positivo" if snapshot.macd_histogram > 0 else "MACD negativo")
+    if snapshot.percent_b is not None:
+        if snapshot.percent_b > 1.0:
+            parts.append("acima da banda superior")
+        elif snapshot.percent_b < 0.0:
+            parts.append("abaixo da banda inferior")
+    return ", ".join(parts)
+
+
+def decide(snapshot: IndicatorSnapshot, label: str = "Análise local") -> Tuple[str, str]:
+    """(acao, justificativa) from the confluence score."""
+    if snapshot.score >= _DECISION_SCORE:
+        acao = "compra"
+    elif snapshot.score <= -_DECISION_SCORE:
+        acao = "venda"
+    else:
+        acao = "esperar"
+    justificativa = f"{label} ({snapshot.score:+d}): {_describe(snapshot)}"
+    if len(justificativa) > _MAX_JUSTIFICATIVA:
+        justificativa = justificativa[:_MAX_JUSTIFICATIVA - 3] + "..."
+    return acao, justificativa
+
+
+def analyze_image(source) -> LocalAnalysis:
+    """Local analysis of a chart image (path or PIL image); ``esperar`` when no series can be recovered."""
+    started = time.perf_counter()
+    try:
+        chart = digitize_chart(source)
+    except (OSError, ValueError):
+        chart = None
+    if chart is None:
+        return LocalAnalysis("esperar", "Análise local: não foi possível extrair a série de preços do gráfico",
+                             None, None, time.perf_counter() - started)
+    snapshot = compute_snapshot(chart.ohlc)
+    acao, justificativa = decide(snapshot)
+    return LocalAnalysis(acao, justificativa, snapshot, chart, time.perf_counter() - started)
+
+
+def preanalysis_context(snapshot: IndicatorSnapshot) -> str:
+    """Measured levels as a short text part for the model (relative units, 0-100 of the visible range)."""
+    lines = [
+        "Medições locais do gráfico (preços em % da faixa visível: 0 = mínima, 100 = máxima; "
+        "use como apoio, a imagem prevalece):",
+        f"- barras: {snapshot.bars}, último fechamento: {snapshot.close:.1f}, tendência: {snapshot.trend}",
+        f"- suporte recente: {snapshot.support:.1f}, resistência recente: {snapshot.resistance:.1f}",
+    ]
+    if snapshot.rsi is not None:
+        lines.append(f"- RSI(14): {snapshot.rsi:.1f}")
+    if snapshot.macd_histogram is not None:
+        lines.append(f"- histograma MACD(12,26,9): {snapshot.macd_histogram:+.2f}"
+                     + (f", cruzamento de {snapshot.macd_cross}" if snapshot.macd_cross else ""))
+    if snapshot.percent_b is not None:
+        lines.append(f"- Bollinger(20,2) %B: {snapshot.percent_b:.2f}")
+    if snapshot.atr_pct is not None:
+        lines.append(f"- ATR(14): {snapshot.atr_pct:.1f}% da faixa")
+    return "\n".join(lines)
+
+
+def preanalysis_enabled() -> bool:
+    return os.getenv("AI_LOCAL_PREANALYSIS", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,233 @@
+"""
+Structured logging for the backend.
+
+Every module logs through ``get_logger(__name__)``. Records are enqueued by a
+QueueHandler in the request path and formatted/written by a QueueListener
+thread, so handlers never block the event loop on stdout or disk.
+
+Environment:
+- LOG_LEVEL                 root level for tickrify loggers (default INFO)
+- LOG_LEVELS                per-module overrides, e.g. "tickrify.ai_service=DEBUG,httpx=WARNING"
+- LOG_FORMAT                "json" (default) or "text"
+- LOG_FILE                  optional file receiving every record (rotated)
+- LOG_ERROR_FILE            file receiving ERROR and above (default api_errors.log, "" disables)
+- LOG_PAYLOAD_SAMPLE_RATE   fraction of verbose payload logs kept (default 0.01)
+- LOG_PAYLOAD_MAX_CHARS     truncation for sampled payloads (default 4000)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+ROOT_LOGGER = "tickrify"
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """``get_logger(__name__)`` -> ``tickrify.<module>`` (``backend.`` prefix dropped)."""
+    if name.startswith("backend."):
+        name = name[len("backend."):]
+    return logging.getLogger(name if name.startswith(ROOT_LOGGER) else f"{ROOT_LOGGER}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, extra fields, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Captures the request id and renders message/traceback in the caller (the
+    only work done on the request path), then hands the record to the
+    listener thread. Unlike the stock ``prepare`` it keeps ``extra`` fields and
+    the traceback separate so the JSON formatter can emit them as fields.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, level = part.partition("=")
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def configure_logging(force: bool = False) -> None:
+    """Install the queue handler and start the writer thread (idempotent)."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+
+        formatter = TextFormatter() if os.getenv("LOG_FORMAT", "json").lower() == "text" else JsonFormatter()
+        handlers = []
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(formatter)
+        handlers.append(stream)
+        log_file = os.getenv("LOG_FILE")
+        if log_file:
+            file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=50 * 1024 * 1024, backupCount=5,
+                                                                encoding="utf-8")
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        error_file = os.getenv("LOG_ERROR_FILE", "api_errors.log")
+        if error_file:
+            error_handler = logging.handlers.RotatingFileHandler(error_file, maxBytes=10 * 1024 * 1024,
+                                                                 backupCount=3, encoding="utf-8", delay=True)
+            error_handler.setLevel(logging.ERROR)
+            error_handler.setFormatter(formatter)
+            handlers.append(error_handler)
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = _ContextQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        # Our records and third-party libraries (httpx, stripe, uvicorn) share the same writer
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, _ContextQueueHandler):
+                root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(logging.WARNING)
+        logging.getLogger(ROOT_LOGGER).setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+            logging.getLogger(name).setLevel(level)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def _payload_sample_rate() -> float:
+    try:
+        return float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+    except ValueError:
+        return 0.0
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, **fields: Any) -> None:
+    """
+    Log a verbose payload (model JSON, provider error bodies) at DEBUG, only
+    for a sampled fraction of calls. Serialization happens after the level
+    and sampling checks, so unsampled calls cost almost nothing.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= _payload_sample_rate():
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+    limit = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "4000"))
+    if len(text) > limit:
+        text = text[:limit] + f"...[{len(text) - limit} chars truncated]"
+    logger.debug(message, extra={**fields, "payload": text})
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware: takes X-Request-ID from the client (or generates
+    one), exposes it to every log record of the request via a contextvar,
+    echoes it in the response and logs one access line with the duration.
+    """
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.encode("latin-1")
+        self.logger = get_logger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.logger.info("request", extra={
+                "method": scope.get("method"), "path": scope.get("path"), "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            })
+            request_id_var.reset(token)
@@ -1,31 +1,59 @@
+from . import startup  # primeiro: marca o início do cold start (e perfila as importações, se ativado)
+startup.load_env()  # .env antes dos módulos que leem a configuração na importação
 import os
+import asyncio
 import base64
-import tempfile
+import hashlib
+import logging
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from fastapi import FastAPI, HTTPException, Body, Depends, Request
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import json
 import re
-from dotenv import load_dotenv
+import time
+from .logging_config import configure_logging, get_logger, log_payload, RequestContextMiddleware
+from .metrics import REGISTRY, MetricsMiddleware, SIMULATED_FALLBACKS, stage_timer
+from .tracing import TracingMiddleware, traced
+from .admission import AdmissionRejected, ai_admission
+from .rate_limit import RateLimitMiddleware, rate_limiter
+from . import deadlines
+from .analysis_jobs import JobQueueFull, queue_from_env
+from .uploads import CHART_UPLOAD_OPENAPI, ChartUpload, decode_base64_image, receive_chart_upload
+from .idempotency import IdempotencyConflict, SingleFlight, StoredResponse, store_from_env, validate_key
+from .prompts import get_prompt, usage_report
+from .near_duplicates import image_fingerprint, recent_analyses
+from .disk_cache import analysis_cache
+from .preflight import PREFLIGHT_SAVED_SECONDS, SPECULATIVE_ANALYSES, QuotaState, discard, quota_hints_from_env
+
+# Configurar logging antes dos demais módulos (alguns registram avisos já na importação)
+configure_logging()
+logger = get_logger(__name__)
+
+# NumPy/Pillow só no primeiro upload (triagem, análise local), não no cold start
+chart_screen = startup.lazy_import(f"{__package__}.chart_screen")
+local_analysis = startup.lazy_import(f"{__package__}.local_analysis")
+
 from .auth import AuthMiddleware, get_current_user_from_request
 from .database import Subscription
-from .database import Database, User, Subscription
+from .database import AnalysisJob, Database, User, Subscription, get_supabase_client
 from .error_handler import register_exception_handlers, APIException
 from fastapi import Header
-import stripe
 from .stripe_endpoints import router as stripe_router
 from .stripe_webhook import stripe_webhook as stripe_webhook_handler
 from .signal_api import router as signal_router
-
-# Carregar variáveis de ambiente
-load_dotenv()
+from .ohlc_api import router as ohlc_router
+from .keywords import KEYWORDS
 
 app = FastAPI(title="Tickrify API", version="1.0.0")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development").lower()
 
+# Prazo por rota/plano propagado às chamadas de banco, IA e Stripe; 504 ao estourar, cancelamento se o cliente cair
+# (o mais interno: o 504 passa pelo CORS, pelas métricas e pelo trace)
+app.add_middleware(deadlines.DeadlineMiddleware)
 # Configurar CORS para permitir conexões do frontend
 cors_origins_env = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:5174,http://localhost:3000")
 allow_origins = [o.strip() for o in cors_origins_env.split(",") if o.strip()]
@@ -36,6 +64,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Token bucket por usuário/IP antes de auth e banco; dentro do CORS para que o 429 seja legível no navegador
+app.add_middleware(RateLimitMiddleware)
+# Latência por rota/status e requisições em andamento (/metrics)
+app.add_middleware(MetricsMiddleware)
+# Span raiz por requisição (waterfall exportado em OTLP/JSON quando TRACE_EXPORTER está ativo)
+app.add_middleware(TracingMiddleware)
+# X-Request-ID em cada resposta e em cada linha de log da requisição
+app.add_middleware(RequestContextMiddleware)
+# Momento da primeira resposta do processo (relatório de cold start em /api/startup)
+app.add_middleware(startup.FirstResponseMiddleware)
 
 # Registrar manipuladores de exceções
 register_exception_handlers(app)
@@ -43,215 +81,75 @@ register_exception_handlers(app)
 # Importar serviço de IA
 from .ai_service import AIService
 
-# Verificar disponibilidade de serviços de IA
+# Verificar disponibilidade de serviços de IA (o aviso de configuração sai no startup, não na importação)
 openai_client = None
-OPENAI_AVAILABLE = False
-
-try:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key and api_key.startswith("sk-"):
-        OPENAI_AVAILABLE = True
-        print("✅ API key OpenAI configurada com sucesso")
-    else:
-        print("⚠️ OPENAI_API_KEY inválida ou não encontrada - usando modo simulado")
-        OPENAI_AVAILABLE = False
-except Exception as e:
-    print(f"❌ Erro ao verificar configuração OpenAI: {e}")
-    print("⚠️ Continuando com análise simulada")
-    OPENAI_AVAILABLE = False
-
-class ChartAnalysisRequest(BaseModel):
-    image_base64: str
-    user_id: str
+_openai_key = os.getenv("OPENAI_API_KEY")
+OPENAI_AVAILABLE = bool(_openai_key and _openai_key.startswith("sk-"))
 
 class ChartAnalysisResponse(BaseModel):
     acao: str  # 'compra', 'venda' ou 'esperar'
     justificativa: str
 
-def decode_base64_image(base64_string: str) -> str:
-    """Decodifica imagem base64 e salva como arquivo temporário"""
-    try:
-        # Remove o prefixo data:image/... se presente
-        if "," in base64_string:
-            base64_string = base64_string.split(",")[1]
-        
-        # Decodifica a imagem
-        image_data = base64.b64decode(base64_string)
-        
-        # Cria arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-            temp_file.write(image_data)
-            return temp_file.name
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erro ao decodificar imagem: {str(e)}")
-
-# Prompt profissional melhorado para análise técnica - Metodologia de 6 passos
-ANALYSIS_PROMPT = """
-Você é um ANALISTA TÉCNICO PROFISSIONAL especializado em mercados financeiros.
-
-🔍 TAREFA: Analise este gráfico seguindo RIGOROSAMENTE a metodologia de 6 passos.
-
-⚠️ INSTRUÇÕES CRÍTICAS:
-1. EXAMINE DETALHADAMENTE cada parte visível do gráfico
-2. PROCURE ATIVAMENTE por indicadores técnicos (RSI, MACD, médias móveis, Volume, etc.)
-3. Se indicadores estiverem visíveis, ANALISE-OS COMPLETAMENTE com valores específicos
-4. NÃO diga "não disponível" se conseguir ver dados dos indicadores
-5. Use APENAS informações visíveis - não invente dados
-6. Retorne APENAS o JSON final
-
-🎯 METODOLOGIA DE 6 PASSOS OBRIGATÓRIA:
-
-PASSO 1 - ESTRUTURA DO GRÁFICO:
-- Identifique tendência principal (alta/baixa/lateral) baseada em topos e fundos
-- Analise o timeframe visível
-- Observe a direção geral dos preços
-
-PASSO 2 - SUPORTE E RESISTÊNCIA:
-- Identifique níveis horizontais onde o preço reagiu múltiplas vezes
-- Marque zonas de rejeição e aceitação claras
-- Use apenas pontos claramente visíveis
-
-PASSO 3 - PADRÕES DE CANDLESTICK:
-- Procure padrões de reversão: martelo, doji, engolfo, estrela cadente
-- Procure padrões de continuação: marubozu, spinning tops
-- Se não houver padrões claros, declare "nenhum padrão claro"
-
-PASSO 4 - FORMAÇÕES GRÁFICAS:
-- Identifique triângulos, retângulos, cunhas, ombro-cabeça-ombro
-- Procure topos/fundos duplos ou triplos
-- Se não houver formações claras, declare "nenhum padrão formado"
-
-PASSO 5 - INDICADORES TÉCNICOS (CRÍTICO - ANALISE TUDO QUE ESTIVER VISÍVEL):
-🚨 EXAMINE CUIDADOSAMENTE se há indicadores visíveis:
-
-▶️ RSI (Relative Strength Index):
-   - Se visível: leia o valor exato (0-100) e interprete (sobrecompra >70, sobrevenda <30)
-   - Se não visível: "não disponível"
-
-▶️ MACD (Moving Average Convergence Divergence):
-   - Se visível: analise linha MACD vs linha de sinal, histograma, cruzamentos
-   - Se não visível: "não disponível"
-
-▶️ MÉDIAS MÓVEIS:
-   - Se visíveis: identifique período (MM20, MM50, MM200) e posição do preço
-   - Se não visíveis: "não disponível"
-
-▶️ BOLLINGER BANDS:
-   - Se visíveis: analise posição do preço vs bandas superior/inferior
-   - Se não visíveis: "não disponível"
-
-▶️ VOLUME:
-   - Se visível: analise padrão de volume vs movimento de preço
-   - Se não visível: "não disponível"
-
-▶️ OUTROS INDICADORES:
-   - Procure Stochastic, Williams %R, CCI, ADX, OBV
-   - Analise qualquer indicador visível no gráfico
-
-PASSO 6 - CONFLUÊNCIA E DECISÃO:
-- Combine APENAS sinais confirmados nos passos 1-5
-- Identifique confluências (múltiplos indicadores apontando na mesma direção)
-- Tome decisão final baseada em evidências
-FORMATO DE RESPOSTA OBRIGATÓRIO (JSON):
-
-⚠️ IMPORTANTE: SEMPRE EXTRAIA O SÍMBOLO E PREÇO VISÍVEIS NO GRÁFICO
-
-{
-  "simbolo_detectado": "SÍMBOLO EXATO lido do gráfico (ex: BTCUSDT, EURUSD, AAPL)",
-  "preco_atual": "PREÇO ATUAL EXATO visível no gráfico",
-  
-  "passo_1_estrutura": {
-    "tendencia_principal": "alta|baixa|lateral",
-    "descricao": "descrição da tendência baseada apenas no que está visível"
-  },
-  
-  "passo_2_suporte_resistencia": {
-    "suporte_proximo": "valor do suporte mais próximo visível no gráfico",
-    "resistencia_proxima": "valor da resistência mais próxima visível no gráfico",
-    "base_analise": "topos e fundos identificados no gráfico"
-  },
-  
-  "passo_3_candlestick": {
-    "padrao_identificado": "nome do padrão OU 'nenhum padrão claro'",
-    "descricao": "descrição do padrão se identificado, ou 'não há padrões claros visíveis'"
-  },
-  
-  "passo_4_padroes": {
-    "formacao_identificada": "nome da formação OU 'nenhum padrão formado'",
-    "descricao": "descrição da formação se identificada, ou 'não há padrões formados'"
-  },
-  
-  "passo_5_indicadores": {
-    "rsi": "LEIA O VALOR EXATO se visível (ex: 'RSI 65 - zona de sobrecompra') OU 'não disponível'",
-    "macd": "ANALISE COMPLETAMENTE se visível (ex: 'MACD 0.25 acima do sinal, histograma positivo') OU 'não disponível'",
-    "medias_moveis": "IDENTIFIQUE TODAS as MMs visíveis (ex: 'MM20 em 45200, MM50 em 44800, preço acima de ambas') OU 'não disponível'",
-    "volume": "ANALISE o padrão de volume se visível (ex: 'Volume alto nas altas, confirma movimento') OU 'não disponível'",
-    "bollinger": "POSIÇÃO nas bandas se visível (ex: 'Preço na banda superior, possível sobrecompra') OU 'não disponível'",
-    "outros": "QUALQUER outro indicador visível (Stochastic, Williams %R, etc.) OU 'não disponível'"
-  },
-  
-  "passo_6_confluencia": {
-    "sinais_confirmados": ["lista apenas dos sinais confirmados nos passos anteriores"],
-    "decisao_final": "compra|venda|aguardar",
-    "justificativa": "justificativa baseada APENAS nos sinais confirmados"
-  },
-  
-  "resumo_analise": {
-    "acao": "compra|venda|esperar",
-    "justificativa": "resumo técnico profissional baseado nos 6 passos (máximo 150 caracteres)"
-  }
-}
-INSTRUÇÕES FINAIS CRÍTICAS:
-1. Retorne APENAS o JSON, sem texto antes ou depois
-2. Siga EXATAMENTE os 6 passos metodológicos
-3. Use APENAS informações visíveis no gráfico
-4. Se algo não estiver visível, escreva "não disponível" ou "nenhum padrão claro"
-5. SEMPRE extraia o símbolo e preço exatos do gráfico
-6. Base a decisão final apenas nos sinais confirmados nos 6 passos
-
-EXEMPLO DE RESPOSTA CORRETA:
-{
-  "simbolo_detectado": "BTCUSD",
-  "preco_atual": "43250.50",
-  "passo_1_estrutura": {
-    "tendencia_principal": "alta",
-    "descricao": "Tendência de alta clara com topos e fundos ascendentes"
-  },
-  "passo_2_suporte_resistencia": {
-    "suporte_proximo": "42800",
-    "resistencia_proxima": "44500",
-    "base_analise": "Suporte em mínima anterior, resistência em topo recente"
-  },
-  "passo_3_candlestick": {
-    "padrao_identificado": "martelo",
-    "descricao": "Martelo formado no suporte com confirmação bullish"
-  },
-  "passo_4_padroes": {
-    "formacao_identificada": "bandeira bullish",
-    "descricao": "Consolidação em formato de bandeira após movimento de alta"
-  },
-  "passo_5_indicadores": {
-    "rsi": "RSI 45 - zona neutra favorável para entrada",
-    "macd": "MACD 0.12 acima do sinal, histograma crescente - momentum positivo",
-    "medias_moveis": "MM20 em 43100, MM50 em 42850 - preço acima de ambas, tendência de alta",
-    "volume": "Volume alto nas últimas altas, confirmando movimento de alta",
-    "bollinger": "Preço no meio das bandas, espaço para movimento",
-    "outros": "Stochastic em 65 - ainda em zona de alta mas não sobrecomprado"
-  },
-  "passo_6_confluencia": {
-    "sinais_confirmados": ["tendência alta", "suporte testado", "RSI favorável", "MACD positivo"],
-    "decisao_final": "compra",
-    "justificativa": "Confluência de 4 sinais técnicos positivos"
-  },
-  "resumo_analise": {
-    "acao": "compra",
-    "justificativa": "BTCUSD: Tendência alta, suporte testado, confluência técnica positiva"
-  }
-}
-
-LEMBRE-SE: NUNCA INVENTE DADOS QUE NÃO CONSEGUE VER NO GRÁFICO!
-RETORNE APENAS O JSON ACIMA, SEM TEXTO ADICIONAL!
-"""
+_RSI_VALUE_RE = re.compile(r'rsi[:\s]*(\d+)')
+_SYMBOL_RE = re.compile(r'(BTC|ETH|EUR|USD|GBP|JPY|AAPL|GOOGL|TSLA|SPY)', re.IGNORECASE)
+
+def extract_free_text_heuristics(analysis_text: str) -> Dict[str, str]:
+    """Extrai indicadores e ação de uma resposta fora do formato de 6 passos (uma única varredura de palavras-chave)"""
+    analysis_text_lower = analysis_text.lower()
+    hits = KEYWORDS.scan(analysis_text_lower, lowered=True)
+    
+    rsi_match = _RSI_VALUE_RE.search(analysis_text_lower)
+    
+    macd_info = "não detectado"
+    if hits.has("macd"):
+        if hits.has("macd_positive"):
+            macd_info = "MACD com sinal positivo detectado"
+        elif hits.has("macd_negative"):
+            macd_info = "MACD com sinal negativo detectado"
+        else:
+            macd_info = "MACD mencionado na análise"
+    
+    # Detectar médias móveis
+    mm_info = "não detectado"
+    if hits.has("moving_average"):
+        if hits.has("price_above"):
+            mm_info = "Preço acima das médias móveis"
+        elif hits.has("price_below"):
+            mm_info = "Preço abaixo das médias móveis"
+        else:
+            mm_info = "Médias móveis analisadas"
+    
+    # Detectar volume
+    volume_info = "não detectado"
+    if hits.has("volume"):
+        if hits.has("volume_high"):
+            volume_info = "Volume alto confirmando movimento"
+        elif hits.has("volume_low"):
+            volume_info = "Volume baixo"
+        else:
+            volume_info = "Volume analisado"
+    
+    # Detectar ação
+    if hits.has("action_buy"):
+        acao = "compra"
+        base_justificativa = "Análise técnica indica oportunidade de compra"
+    elif hits.has("action_sell"):
+        acao = "venda"
+        base_justificativa = "Análise técnica indica oportunidade de venda"
+    else:
+        acao = "esperar"
+        base_justificativa = "Análise técnica sugere aguardar"
+    
+    return {
+        "rsi": rsi_match.group(1) if rsi_match else "não detectado",
+        "macd": macd_info,
+        "medias_moveis": mm_info,
+        "volume": volume_info,
+        "acao": acao,
+        "base_justificativa": base_justificativa,
+    }
+
+@traced("analyze_chart_with_ai")
 def analyze_chart_with_ai(image_path: str) -> ChartAnalysisResponse:
     """Analisa o gráfico usando serviço de IA com prompt profissional"""
     try:
@@ -259,16 +157,20 @@ def analyze_chart_with_ai(image_path: str) -> ChartAnalysisResponse:
         with open(image_path, "rb") as image_file:
             base64_image = base64.b64encode(image_file.read()).decode('utf-8')
         
-        print("🤖 Enviando imagem para análise com IA...")
+        logger.debug("Enviando imagem para análise com IA")
+        
+        # Pré-análise local opcional: níveis medidos no gráfico vão como texto junto da imagem
+        context = None
+        if local_analysis.preanalysis_enabled():
+            with stage_timer("local_analysis"):
+                local = local_analysis.analyze_image(image_path)
+            if local.snapshot is not None:
+                context = local_analysis.preanalysis_context(local.snapshot)
         
         # Usar o serviço de IA (OpenAI) para análise
-        analysis_json = AIService.analyze_chart_with_openai(base64_image)
+        analysis_json = AIService.analyze_chart_with_openai(base64_image, context=context)
         
-        print(f"🤖 Resposta IA recebida e processada")
-        print(f"🔍 ANÁLISE PROCESSADA:")
-        print("=" * 50)
-        print(json.dumps(analysis_json, indent=2, ensure_ascii=False))
-        print("=" * 50)
+        log_payload(logger, "Resposta IA recebida", analysis_json)
         
         # Extrair informações do novo formato de 6 passos
         simbolo_detectado = analysis_json.get("simbolo_detectado", "CHART_UNKNOWN")
@@ -283,83 +185,34 @@ def analyze_chart_with_ai(image_path: str) -> ChartAnalysisResponse:
         passo_6 = analysis_json.get("passo_6_confluencia", {})
         resumo = analysis_json.get("resumo_analise", {})
         
-        print(f"📊 SÍMBOLO DETECTADO: {simbolo_detectado}")
-        print(f"💰 PREÇO ATUAL: {preco_atual}")
-        print(f"📈 TENDÊNCIA: {passo_1.get('tendencia_principal', 'N/D')}")
-        print(f"🎯 DECISÃO: {passo_6.get('decisao_final', 'N/D')}")
-        
-        # LOG DETALHADO DOS INDICADORES ANALISADOS
-        if passo_5:
-            print(f"🔍 INDICADORES DETECTADOS:")
-            print(f"   RSI: {passo_5.get('rsi', 'não informado')}")
-            print(f"   MACD: {passo_5.get('macd', 'não informado')}")
-            print(f"   Médias Móveis: {passo_5.get('medias_moveis', 'não informado')}")
-            print(f"   Volume: {passo_5.get('volume', 'não informado')}")
-            print(f"   Bollinger: {passo_5.get('bollinger', 'não informado')}")
-            print(f"   Outros: {passo_5.get('outros', 'não informado')}")
-        else:
-            print("⚠️ Passo 5 (indicadores) não foi retornado pela OpenAI")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Análise processada", extra={
+                "simbolo": simbolo_detectado,
+                "preco": preco_atual,
+                "tendencia": passo_1.get("tendencia_principal", "N/D"),
+                "decisao": passo_6.get("decisao_final", "N/D"),
+                "indicadores": passo_5 or None,
+            })
+        if not passo_5:
+            logger.info("Passo 5 (indicadores) não foi retornado pela OpenAI")
         
         # FALLBACK INTELIGENTE: Se a OpenAI não seguiu o formato de 6 passos,
         # mas ainda deu uma resposta válida, vamos extrair o que conseguimos
         if not any([passo_1, passo_2, passo_3, passo_4, passo_5, passo_6, resumo]):
-            print("⚠️ OpenAI não seguiu o formato de 6 passos. Tentando extração inteligente...")
+            logger.warning("OpenAI não seguiu o formato de 6 passos. Tentando extração inteligente")
             
             # Converter o json para string para análise de texto
             analysis_text = json.dumps(analysis_json, ensure_ascii=False)
-            analysis_text_lower = analysis_text.lower()
-            
-            # Tentar extrair informações de indicadores da resposta
-            rsi_match = re.search(r'rsi[:\s]*(\d+)', analysis_text_lower)
-            macd_info = "não detectado"
-            if "macd" in analysis_text_lower:
-                if any(word in analysis_text_lower for word in ["positivo", "bullish", "acima"]):
-                    macd_info = "MACD com sinal positivo detectado"
-                elif any(word in analysis_text_lower for word in ["negativo", "bearish", "abaixo"]):
-                    macd_info = "MACD com sinal negativo detectado"
-                else:
-                    macd_info = "MACD mencionado na análise"
-            
-            # Detectar médias móveis
-            mm_info = "não detectado"
-            if any(ma in analysis_text_lower for ma in ["média móvel", "mm", "moving average", "ma"]):
-                if any(word in analysis_text_lower for word in ["acima", "above", "rompeu"]):
-                    mm_info = "Preço acima das médias móveis"
-                elif any(word in analysis_text_lower for word in ["abaixo", "below", "rompimento"]):
-                    mm_info = "Preço abaixo das médias móveis"
-                else:
-                    mm_info = "Médias móveis analisadas"
             
-            # Detectar volume
-            volume_info = "não detectado"
-            if "volume" in analysis_text_lower:
-                if any(word in analysis_text_lower for word in ["alto", "high", "crescente", "forte"]):
-                    volume_info = "Volume alto confirmando movimento"
-                elif any(word in analysis_text_lower for word in ["baixo", "low", "fraco"]):
-                    volume_info = "Volume baixo"
-                else:
-                    volume_info = "Volume analisado"
+            heuristics = extract_free_text_heuristics(analysis_text)
             
-            print(f"🔍 INDICADORES EXTRAÍDOS:")
-            print(f"   RSI: {rsi_match.group(1) if rsi_match else 'não detectado'}")
-            print(f"   MACD: {macd_info}")
-            print(f"   Médias Móveis: {mm_info}")
-            print(f"   Volume: {volume_info}")
+            logger.debug("Indicadores extraídos do texto livre", extra={"indicadores": heuristics})
             
-            # Detectar ação
-            if any(word in analysis_text_lower for word in ["compra", "buy", "bullish", "entrada", "long"]):
-                acao = "compra"
-                base_justificativa = "Análise técnica indica oportunidade de compra"
-            elif any(word in analysis_text_lower for word in ["venda", "sell", "bearish", "saída", "short"]):
-                acao = "venda"
-                base_justificativa = "Análise técnica indica oportunidade de venda"
-            else:
-                acao = "esperar"
-                base_justificativa = "Análise técnica sugere aguardar"
+            acao = heuristics["acao"]
+            base_justificativa = heuristics["base_justificativa"]
             
             # Extrair símbolo se possível
-            import re
-            simbolo_match = re.search(r'(BTC|ETH|EUR|USD|GBP|JPY|AAPL|GOOGL|TSLA|SPY)', analysis_text, re.IGNORECASE)
+            simbolo_match = _SYMBOL_RE.search(analysis_text)
             if simbolo_match:
                 simbolo_detectado = simbolo_match.group().upper()
             
@@ -376,7 +229,7 @@ def analyze_chart_with_ai(image_path: str) -> ChartAnalysisResponse:
             if len(justificativa) > 150:
                 justificativa = justificativa[:147] + "..."
                 
-            print(f"🔄 FALLBACK APLICADO - Ação: {acao}, Justificativa: {justificativa}")
+            logger.info("Fallback aplicado", extra={"acao": acao, "justificativa": justificativa})
             
             return ChartAnalysisResponse(acao=acao, justificativa=justificativa)
         
@@ -404,150 +257,56 @@ def analyze_chart_with_ai(image_path: str) -> ChartAnalysisResponse:
         if len(justificativa) > 150:
             justificativa = justificativa[:147] + "..."
         
-        print(f"✅ Análise OpenAI processada: {acao} - {justificativa}")
+        logger.info("Análise OpenAI processada", extra={"acao": acao, "simbolo": simbolo_detectado})
         
         return ChartAnalysisResponse(acao=acao, justificativa=justificativa)
         
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ Erro na análise OpenAI: {e}")
+        logger.error("Erro na análise OpenAI: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro na análise OpenAI: {str(e)}")
 
-def simulate_chart_analysis(image_path: str = None) -> ChartAnalysisResponse:
-    """Análise simulada AVANÇADA que demonstra análise completa com múltiplos indicadores"""
-    import random
-    from PIL import Image
-    
-    print("🎲 MODO SIMULADO: Demonstrando análise completa com múltiplos indicadores")
-    
-    # Símbolos mais comuns
-    simbolos_populares = [
-        "BTCUSDT", "ETHUSDT", "BNBUSDT", "ADAUSDT", "SOLUSDT", "XRPUSDT",
-        "EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "EURGBP",
-        "AAPL", "MSFT", "GOOGL", "TSLA", "AMZN", "META", "NVDA", "SPY"
-    ]
-    
-    simbolo_detectado = random.choice(simbolos_populares)
-    
-    # Tendências possíveis
-    tendencias = ["alta", "baixa", "lateral"]
-    tendencia_escolhida = random.choice(tendencias)
-    
-    # Preços simulados baseados no símbolo
-    if "BTC" in simbolo_detectado:
-        preco_base = random.uniform(42000, 48000)
-    elif "ETH" in simbolo_detectado:
-        preco_base = random.uniform(2500, 3500)
-    elif "USD" in simbolo_detectado:
-        preco_base = random.uniform(1.05, 1.15)
-    else:
-        preco_base = random.uniform(150, 300)
-    
-    # SIMULAÇÃO AVANÇADA: MÚLTIPLOS INDICADORES SEMPRE PRESENTES
-    # Para demonstrar que a análise pode extrair vários indicadores
-    
-    # RSI simulado (valor realista)
-    rsi_valor = random.randint(25, 75)
-    if rsi_valor >= 70:
-        rsi_interpretacao = f"RSI {rsi_valor} - zona de sobrecompra, possível correção"
-    elif rsi_valor <= 30:
-        rsi_interpretacao = f"RSI {rsi_valor} - zona de sobrevenda, possível recuperação"
-    else:
-        rsi_interpretacao = f"RSI {rsi_valor} - zona neutra, favorável para movimento"
-    
-    # MACD simulado
-    macd_linha = random.uniform(-0.5, 0.5)
-    macd_sinal = random.uniform(-0.4, 0.4)
-    if macd_linha > macd_sinal:
-        macd_interpretacao = f"MACD {macd_linha:.3f} acima do sinal {macd_sinal:.3f} - momentum positivo"
-    else:
-        macd_interpretacao = f"MACD {macd_linha:.3f} abaixo do sinal {macd_sinal:.3f} - momentum negativo"
-    
-    # Médias Móveis simuladas
-    mm20 = round(preco_base * random.uniform(0.98, 1.02), 2)
-    mm50 = round(preco_base * random.uniform(0.96, 1.04), 2)
-    if preco_base > mm20 and preco_base > mm50:
-        mm_interpretacao = f"MM20: {mm20}, MM50: {mm50} - preço acima de ambas, tendência alta"
-    elif preco_base < mm20 and preco_base < mm50:
-        mm_interpretacao = f"MM20: {mm20}, MM50: {mm50} - preço abaixo de ambas, tendência baixa"
-    else:
-        mm_interpretacao = f"MM20: {mm20}, MM50: {mm50} - preço entre médias, indefinição"
-    
-    # Volume simulado
-    volume_tipos = [
-        "Volume alto confirmando movimento de alta",
-        "Volume baixo, movimento sem confirmação",
-        "Volume crescente nas últimas barras",
-        "Volume em declínio, força diminuindo",
-        "Volume explosivo na última barra de alta"
-    ]
-    volume_interpretacao = random.choice(volume_tipos)
-    
-    # Bollinger Bands simulado
-    banda_superior = round(preco_base * 1.03, 2)
-    banda_inferior = round(preco_base * 0.97, 2)
-    if preco_base >= banda_superior * 0.99:
-        bollinger_interpretacao = f"Preço próximo à banda superior ({banda_superior}) - possível sobrecompra"
-    elif preco_base <= banda_inferior * 1.01:
-        bollinger_interpretacao = f"Preço próximo à banda inferior ({banda_inferior}) - possível sobrevenda"
-    else:
-        bollinger_interpretacao = f"Preço no meio das bandas ({banda_inferior}-{banda_superior}) - movimento neutro"
-    
-    # Outros indicadores
-    outros_indicadores = [
-        "Stochastic em 65 - ainda em alta mas não sobrecomprado",
-        "Williams %R em -25 - zona de sobrecompra moderada",
-        "CCI em +120 - indicando força bullish",
-        "ADX em 35 - tendência com força moderada",
-        "OBV em alta - volume confirma tendência"
-    ]
-    outros_interpretacao = random.choice(outros_indicadores)
-    
-    # Análise de confluência baseada nos indicadores
-    sinais_positivos = 0
-    sinais_negativos = 0
-    
-    # Contar sinais baseados nos indicadores
-    if rsi_valor < 70 and rsi_valor > 30:
-        sinais_positivos += 1
-    if macd_linha > macd_sinal:
-        sinais_positivos += 1
-    else:
-        sinais_negativos += 1
-    if preco_base > mm20:
-        sinais_positivos += 1
-    else:
-        sinais_negativos += 1
-    if "alto" in volume_interpretacao or "crescente" in volume_interpretacao:
-        sinais_positivos += 1
-    
-    # Decisão baseada na confluência de indicadores
-    if sinais_positivos >= 3:
-        acao = "compra"
-        justificativa = f"{simbolo_detectado}: {sinais_positivos} indicadores positivos - confluência bullish confirmada"
-    elif sinais_negativos >= 3:
-        acao = "venda"
-        justificativa = f"{simbolo_detectado}: {sinais_negativos} indicadores negativos - confluência bearish confirmada"
-    else:
-        acao = "esperar"
-        justificativa = f"{simbolo_detectado}: Sinais mistos ({sinais_positivos}+/{sinais_negativos}-) - aguardar definição"
-    
-    # Log detalhado da análise simulada
-    print(f"📊 ANÁLISE SIMULADA COMPLETA PARA {simbolo_detectado}:")
-    print(f"   💰 Preço simulado: {preco_base}")
-    print(f"   📈 {rsi_interpretacao}")
-    print(f"   📊 {macd_interpretacao}")
-    print(f"   📉 {mm_interpretacao}")
-    print(f"   🔊 {volume_interpretacao}")
-    print(f"   📋 {bollinger_interpretacao}")
-    print(f"   🎯 {outros_interpretacao}")
-    print(f"   ✅ DECISÃO: {acao.upper()} - {justificativa}")
-    
-    return ChartAnalysisResponse(acao=acao, justificativa=justificativa)
+@traced("local_chart_analysis")
+def local_chart_analysis(image_path: str) -> ChartAnalysisResponse:
+    """Análise determinística local (digitalização do gráfico + indicadores), usada sem provedor de IA"""
+    with stage_timer("local_analysis"):
+        result = local_analysis.analyze_image(image_path)
+    logger.info("Análise local", extra={
+        "acao": result.acao,
+        "barras": result.snapshot.bars if result.snapshot else 0,
+        "tipo": result.chart.kind if result.chart else None,
+    })
+    return ChartAnalysisResponse(acao=result.acao, justificativa=result.justificativa)
 
 @app.get("/")
 async def root():
     return {"message": "Tickrify API - Sistema de Análise de Gráficos", "status": "online"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Métricas no formato de exposição do Prometheus (opcionalmente protegidas por METRICS_TOKEN)"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/prompts", include_in_schema=False)
+async def prompt_usage(authorization: Optional[str] = Header(None)):
+    """Versões de prompt registradas e consumo de tokens/custo por versão (mesma proteção de /metrics)"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return usage_report()
+
+@app.get("/api/startup", include_in_schema=False)
+async def startup_report(authorization: Optional[str] = Header(None)):
+    """Tempos de cold start, importações adiadas e seu custo no primeiro uso (mesma proteção de /metrics)"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return startup.report()
+
 @app.get("/health")
 async def health_check():
     # Verificar conexão com banco de dados
@@ -556,7 +315,7 @@ async def health_check():
         # Testar conexão com banco de dados
         db_healthy = True
     except Exception as e:
-        print(f"❌ Erro na conexão com banco de dados: {e}")
+        logger.error("Erro na conexão com banco de dados: %s", e)
     
     return {
         "status": "healthy",
@@ -572,142 +331,552 @@ async def health_check_api():
     from datetime import datetime
     return {"ok": True, "timestamp": datetime.now().isoformat()}
 
-@app.post("/api/analyze-chart", response_model=ChartAnalysisResponse)
-async def analyze_chart(
-    request: ChartAnalysisRequest = Body(...),
-    current_user: Optional[User] = Depends(get_current_user_from_request)
-):
-    """
-    Endpoint principal para análise de gráficos
-    """
-    # Validate input
-    if not request.image_base64 or not request.user_id:
+# Cota mensal de análises por plano
+PLAN_ANALYSIS_LIMITS = {"free": 10, "trader": 120, "alpha_pro": 350}
+
+
+class AnalysisQuota(BaseModel):
+    user: User
+    plan_type: str = "free"
+    limit: int = 10
+    is_premium: bool = False
+    # Jobs aceitos e ainda não contabilizados no uso mensal
+    pending: int = 0
+
+
+# Última cota vista por usuário: só decide se a chamada ao provedor pode começar antes da checagem
+quota_hints = quota_hints_from_env()
+
+
+async def _load_quota_state(user_id: str) -> QuotaState:
+    """Assinatura e uso mensal consultados em paralelo (não dependem um do outro)"""
+    async def timed(stage: str, call):
+        started = time.perf_counter()
+        with stage_timer(stage):
+            value = await call
+        return value, time.perf_counter() - started
+
+    (subscription, subscription_seconds), (usage, usage_seconds) = await asyncio.gather(
+        timed("subscription_lookup", Database.get_active_subscription(user_id)),
+        timed("usage_check", Database.get_monthly_usage(user_id)),
+    )
+    return QuotaState(subscription.plan_type if subscription else None, usage, subscription_seconds + usage_seconds)
+
+
+def _start_quota_lookup(current_user: Optional[User]) -> Optional[asyncio.Task]:
+    # O usuário vem do token: as consultas de cota podem começar antes de a imagem ser lida
+    if ENVIRONMENT == "development" or current_user is None:
+        return None
+    return asyncio.ensure_future(_load_quota_state(current_user.id))
+
+
+async def _authorize_analysis(user_id: Optional[str], current_user: Optional[User],
+                              quota_lookup: Optional[asyncio.Task] = None) -> AnalysisQuota:
+    """Validação de entrada, autorização e verificação de cota (comum ao endpoint síncrono e aos jobs)"""
+    # Uploads binários podem omitir o user_id: vale o usuário do token
+    user_id = user_id or (current_user.id if current_user else None)
+    if not user_id:
         raise HTTPException(status_code=400, detail="Dados de entrada inválidos")
-    if not isinstance(request.image_base64, str) or not isinstance(request.user_id, str):
-        raise HTTPException(status_code=400, detail="Formato de dados inválido")
-    if len(request.user_id) > 100:
+    if len(user_id) > 100:
         raise HTTPException(status_code=400, detail="ID de usuário muito longo")
     
     # Verificar se o usuário tem permissão para analisar
-    if current_user and current_user.id != request.user_id:
+    if current_user and current_user.id != user_id:
         if ENVIRONMENT != "development":
             raise HTTPException(status_code=403, detail="Usuário não autorizado")
     
     # Verificar limite de análises e política free/premium
-    subscription = None
-    plan_type = "free"
-    limit = 10
-    is_premium = False
-    current_usage = 0
     if ENVIRONMENT == "development":
         # Liberar autenticação e limites em desenvolvimento
         if not current_user:
-            current_user = User(id=request.user_id or "dev-user", email="dev@example.com")
-        is_premium = True
-        limit = 10_000
-    else:
-        if not current_user:
-            raise HTTPException(status_code=401, detail="Usuário não autenticado")
+            current_user = User(id=user_id or "dev-user", email="dev@example.com")
+        return AnalysisQuota(user=current_user, is_premium=True, limit=10_000)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Usuário não autenticado")
+    quota = AnalysisQuota(user=current_user, pending=analysis_jobs.pending_for(current_user.id))
+    try:
+        state = await (quota_lookup or _load_quota_state(current_user.id))
+        quota.plan_type = state.plan_type or quota.plan_type
+        rate_limiter.remember_plan(current_user.id, quota.plan_type)
+        quota.is_premium = quota.plan_type != "free"
+        quota.limit = PLAN_ANALYSIS_LIMITS.get(quota.plan_type, quota.limit)
+        quota_hints.remember(current_user.id, quota.plan_type, state.usage, quota.limit)
+        if state.usage + quota.pending >= quota.limit:
+            raise HTTPException(status_code=402, detail="Limite gratuito atingido. Faça upgrade para continuar.")
+    except (HTTPException, deadlines.DeadlineExceeded):
+        # Sem prazo para a consulta de cota a análise não é liberada (504), nem cobrada
+        raise
+    except Exception as e:
+        logger.warning("Falha ao verificar assinatura/limite: %s", e)
+    return quota
+
+
+async def _near_duplicate(image_path: str, user_id: str) -> Tuple[Optional[int], Optional[ChartAnalysisResponse]]:
+    """Fingerprint perceptual da imagem e, se o usuário analisou há pouco um print quase igual, o resultado anterior"""
+    if not recent_analyses.enabled:
+        return None, None
+    try:
+        with stage_timer("image_hash"):
+            fingerprint = await asyncio.to_thread(image_fingerprint, image_path)
+    except (OSError, ValueError):
+        return None, None
+    match = recent_analyses.lookup(user_id, fingerprint)
+    if match is None:
+        recent_analyses.record("miss")
+        return fingerprint, None
+    if match.distance <= recent_analyses.reuse_distance:
+        recent_analyses.record("reused")
+        return fingerprint, ChartAnalysisResponse(**match.entry.result)
+    # Semelhante, mas não idêntico (novo candle, recorte maior): a análise local confirma se a leitura mudou
+    with stage_timer("local_analysis"):
+        local = await asyncio.to_thread(local_analysis.analyze_image, image_path)
+    if local.snapshot is not None and local.acao == match.entry.local_acao:
+        recent_analyses.record("refreshed")
+        return fingerprint, ChartAnalysisResponse(**match.entry.result)
+    recent_analyses.record("refresh_mismatch")
+    return fingerprint, None
+
+
+async def _remember_analysis(image_path: str, user_id: str, fingerprint: int, result: ChartAnalysisResponse) -> None:
+    local_acao = None
+    if recent_analyses.refresh_distance > recent_analyses.reuse_distance:
+        # Leitura local da imagem original: referência para o refresh barato de prints parecidos
+        with stage_timer("local_analysis"):
+            local = await asyncio.to_thread(local_analysis.analyze_image, image_path)
+        local_acao = local.acao if local.snapshot is not None else None
+    recent_analyses.add(user_id, fingerprint, result.model_dump(), local_acao)
+
+
+def _analysis_cache_key(image_path: str) -> str:
+    """SHA-256 da imagem + versão do prompt (+ pré-análise local, que muda o que o modelo recebe)"""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{digest.hexdigest()}|{get_prompt().key}{'|local' if local_analysis.preanalysis_enabled() else ''}"
+
+
+def _cached_analysis(image_path: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    try:
+        key = _analysis_cache_key(image_path)
+    except OSError:
+        return None, None
+    return key, analysis_cache.get("chart_analysis", key)
+
+
+async def _run_chart_analysis(image_path: str, user_id: str, plan_type: str,
+                              wait_for_admission: bool = False) -> ChartAnalysisResponse:
+    """IA real sob controle de admissão, com fallback para a análise local"""
+    fingerprint, reused = await _near_duplicate(image_path, user_id)
+    if reused is not None:
+        logger.info("Análise reaproveitada de print quase idêntico", extra={"user_id": user_id})
+        return reused
+    cache_key = None
+    if analysis_cache is not None:
+        # Mesma imagem e mesmo prompt já analisados por qualquer worker deste host (cache em disco compartilhado)
+        with stage_timer("analysis_cache"):
+            cache_key, cached = await asyncio.to_thread(_cached_analysis, image_path)
+        if cached is not None:
+            result = ChartAnalysisResponse(**cached)
+            if fingerprint is not None:
+                await _remember_analysis(image_path, user_id, fingerprint, result)
+            return result
+    if not OPENAI_AVAILABLE:
+        logger.warning("OPENAI_API_KEY não disponível - aplicando análise local")
+        SIMULATED_FALLBACKS.labels("provider_unavailable").inc()
+        return await asyncio.to_thread(local_chart_analysis, image_path)
+    # Controle de admissão: orçamento global de chamadas ao provedor, fila justa por plano
+    while True:
         try:
-            subscription = await Database.get_active_subscription(current_user.id)
-            plan_type = subscription.plan_type if subscription else plan_type
-            is_premium = plan_type != "free"
-            plan_limits = {"free": 10, "trader": 120, "alpha_pro": 350}
-            limit = plan_limits.get(plan_type, limit)
-            current_usage = await Database.get_monthly_usage(current_user.id)
-            if current_usage >= limit:
-                raise HTTPException(status_code=402, detail="Limite gratuito atingido. Faça upgrade para continuar.")
-        except HTTPException:
-            raise
-        except Exception as e:
-            print(f"⚠️ Falha ao verificar assinatura/limite: {e}")
+            ticket = await ai_admission.acquire(user_id, plan_type)
+            break
+        except AdmissionRejected as e:
+            if not wait_for_admission:
+                raise HTTPException(status_code=e.status_code, detail=e.message,
+                                    headers={"Retry-After": str(e.retry_after)})
+            # Jobs não têm cliente esperando na conexão: aguardar e tentar de novo
+            await asyncio.sleep(e.retry_after)
+    try:
+        # Chamada bloqueante ao provedor fora do event loop (o span atual segue para a thread)
+        result = await asyncio.to_thread(analyze_chart_with_ai, image_path)
+    except deadlines.DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning("Falha IA real: %s | Aplicando análise local", e)
+        SIMULATED_FALLBACKS.labels("provider_error").inc()
+        return await asyncio.to_thread(local_chart_analysis, image_path)
+    finally:
+        ai_admission.release(ticket)
+    if cache_key is not None:
+        await asyncio.to_thread(analysis_cache.put, "chart_analysis", cache_key, result.model_dump())
+    if fingerprint is not None:
+        await _remember_analysis(image_path, user_id, fingerprint, result)
+    return result
+
+
+async def _record_analysis(quota: AnalysisQuota, result: ChartAnalysisResponse) -> ChartAnalysisResponse:
+    """Contabiliza o uso mensal e salva a análise no banco"""
+    if ENVIRONMENT == "development":
+        return result
+    # Incrementar contador e checar se é a 10ª para sinalizar upgrade
+    with stage_timer("usage_increment"):
+        new_count = await Database.increment_monthly_usage(quota.user.id)
+    quota_hints.remember(quota.user.id, quota.plan_type, new_count, quota.limit)
+    # Se atingiu a cota do plano free, ajustar mensagem
+    if not quota.is_premium and new_count >= quota.limit:
+        # Sinalizar no texto da justificativa
+        result.justificativa = (
+            result.justificativa + " | Limite gratuito atingido. Faça upgrade para análises com IA."
+        )
+
+    # Salvar análise no banco de dados
+    analysis_id = str(uuid.uuid4())
     
-    print(f"📊 Recebida solicitação de análise do usuário: {request.user_id}")
+    # Determinar valores com base na resposta
+    recommendation_map = {"compra": "BUY", "venda": "SELL", "esperar": "HOLD"}
+    recommendation = recommendation_map.get(result.acao, "HOLD")
     
+    # Preparar dados da análise
+    analysis_data = {
+        "id": analysis_id,
+        "user_id": quota.user.id,
+        "symbol": "CHART_ANALYSIS",  # Poderia ser extraído da análise
+        "recommendation": recommendation,
+        "confidence": 75,  # Valor padrão
+        "target_price": 0.0,  # Seria calculado com base na análise
+        "stop_loss": 0.0,  # Seria calculado com base na análise
+        "timeframe": "1H",  # Valor padrão
+        "timestamp": datetime.now().isoformat(),
+        "reasoning": result.justificativa,
+        "technical_indicators": [{
+            "name": "AI Analysis",
+            "value": result.acao,
+            "signal": "BULLISH" if result.acao == "compra" else "BEARISH" if result.acao == "venda" else "NEUTRAL",
+            "description": result.justificativa
+        }]
+    }
+    
+    # Salvar no banco de dados
+    with stage_timer("save_analysis"):
+        await Database.save_analysis(analysis_data)
+    return result
+
+
+async def _analyze_image(image_path: str, quota: AnalysisQuota, wait_for_admission: bool = False,
+                         analysis: Optional[asyncio.Task] = None) -> ChartAnalysisResponse:
+    """``analysis``: chamada especulativa já iniciada no pre-flight (substitui uma nova execução)"""
+    if analysis is not None:
+        result = await analysis
+    else:
+        result = await _run_chart_analysis(image_path, quota.user.id, quota.plan_type, wait_for_admission)
+    logger.info("Análise concluída", extra={"acao": result.acao})
+    return await _record_analysis(quota, result)
+
+
+def _discard_image(image_path: str) -> None:
+    # Limpar arquivo temporário
     try:
-        # Decodificar imagem base64
-        image_path = decode_base64_image(request.image_base64)
-        print(f"🖼️  Imagem salva temporariamente em: {image_path}")
-        
+        os.unlink(image_path)
+    except OSError:
+        pass
+
+
+# Respostas concluídas por Idempotency-Key e análises idênticas em andamento (mesmo usuário e imagem)
+analysis_idempotency = store_from_env()
+analysis_flights = SingleFlight("chart_analysis")
+
+
+def _idempotency_key(http_request: Request) -> Optional[str]:
+    try:
+        return validate_key(http_request.headers.get("idempotency-key"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _idempotency_scope(http_request: Request, user_id: str) -> str:
+    return f"{http_request.url.path}|{user_id}"
+
+
+def _replay(stored: StoredResponse) -> JSONResponse:
+    return JSONResponse(status_code=stored.status_code, content=stored.body,
+                        headers={**stored.headers, "Idempotent-Replayed": "true"})
+
+
+class Preflight(NamedTuple):
+    upload: ChartUpload
+    quota: Optional[AnalysisQuota]
+    replay: Optional[JSONResponse]  # resposta original quando a Idempotency-Key já foi concluída
+    analysis: Optional[asyncio.Task] = None  # chamada ao provedor iniciada antes da checagem de cota
+    saved_seconds: float = 0.0  # latência economizada pela sobreposição/especulação
+
+
+def _start_speculative_analysis(upload: ChartUpload, current_user: Optional[User]) -> Optional[asyncio.Task]:
+    if ENVIRONMENT == "development" or current_user is None:
+        return None
+    # Requisição idêntica em andamento: esta vai se juntar a ela, não há o que adiantar
+    if analysis_flights.joining((current_user.id, upload.sha256)):
+        return None
+    plan_type = quota_hints.speculative_plan(current_user.id, analysis_jobs.pending_for(current_user.id))
+    if plan_type is None:
+        return None
+    return asyncio.ensure_future(_run_chart_analysis(upload.image_path, current_user.id, plan_type))
+
+
+def _preflight_savings(started: float, prepared: float, quota_lookup: Optional[asyncio.Task],
+                       speculated_at: Optional[float]) -> float:
+    """Observa e retorna a latência removida do pre-flight nesta requisição"""
+    resolved = time.perf_counter()
+    saved = 0.0
+    if quota_lookup is not None and not quota_lookup.cancelled() and quota_lookup.exception() is None:
+        # Em sequência: leitura/triagem da imagem + assinatura + uso; em paralelo: o tempo de parede
+        overlap = max(0.0, (prepared - started) + quota_lookup.result().seconds - (resolved - started))
+        PREFLIGHT_SAVED_SECONDS.labels("overlap").observe(overlap)
+        saved += overlap
+    if speculated_at is not None:
+        PREFLIGHT_SAVED_SECONDS.labels("speculative").observe(resolved - speculated_at)
+        saved += resolved - speculated_at
+    return saved
+
+
+async def _receive_authorized_upload(http_request: Request, current_user: Optional[User],
+                                     idempotency_key: Optional[str] = None, speculate: bool = False) -> Preflight:
+    """
+    Lê a imagem (JSON base64, multipart ou image/*) e valida usuário/cota; descarta o arquivo se negado.
+    As consultas de cota correm junto com a leitura e a triagem da imagem; com ``speculate``, usuários
+    pagos com folga na cota já iniciam a chamada ao provedor antes da checagem (cancelada se ela falhar).
+    """
+    started = time.perf_counter()
+    quota_lookup = _start_quota_lookup(current_user)
+    speculative, speculated_at = None, None
+    try:
+        with stage_timer("image_decode"):
+            upload = await receive_chart_upload(http_request)
+    except BaseException:
+        discard(quota_lookup)
+        raise
+    try:
+        if idempotency_key:
+            # Repetição da mesma requisição: devolver a resposta original antes da checagem de cota (sem nova cobrança)
+            owner = current_user.id if current_user else (upload.user_id if ENVIRONMENT == "development" else None)
+            stored = owner and analysis_idempotency.get(
+                _idempotency_scope(http_request, owner), idempotency_key, upload.sha256)
+            if stored:
+                discard(quota_lookup)
+                _discard_image(upload.image_path)
+                return Preflight(upload, None, _replay(stored))
+        if chart_screen.screen_enabled():
+            # Pré-triagem local (Pillow/NumPy): selfies, telas em branco e prints de texto não gastam cota nem IA
+            with stage_timer("chart_screen"):
+                screen = await asyncio.to_thread(chart_screen.screen_image, upload.image_path)
+            if screen.features is None:
+                raise HTTPException(status_code=422, detail="Arquivo enviado não é uma imagem válida")
+            if not screen.likely_chart:
+                logger.info("Imagem rejeitada na pré-triagem", extra={"score": screen.score, **screen.features._asdict()})
+                raise HTTPException(status_code=422, detail="A imagem não parece ser um gráfico de preços. "
+                                                            "Envie um print do gráfico (candles, barras ou linha).")
+        prepared = time.perf_counter()
+        if speculate:
+            speculative = _start_speculative_analysis(upload, current_user)
+            speculated_at = prepared if speculative is not None else None
+        quota = await _authorize_analysis(upload.user_id, current_user, quota_lookup)
+        saved = _preflight_savings(started, prepared, quota_lookup, speculated_at)
+        return Preflight(upload, quota, None, speculative, saved)
+    except BaseException as e:
+        discard(quota_lookup)
+        if speculative is not None:
+            SPECULATIVE_ANALYSES.labels("cancelled").inc()
+            discard(speculative)
+        _discard_image(upload.image_path)
+        if isinstance(e, IdempotencyConflict):
+            raise HTTPException(status_code=422, detail="Idempotency-Key já utilizada com outra imagem")
+        raise
+
+
+@app.post("/api/analyze-chart", response_model=ChartAnalysisResponse, openapi_extra=CHART_UPLOAD_OPENAPI)
+async def analyze_chart(
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_current_user_from_request)
+):
+    """
+    Endpoint principal para análise de gráficos
+    """
+    idempotency_key = _idempotency_key(http_request)
+    preflight = await _receive_authorized_upload(http_request, current_user, idempotency_key, speculate=True)
+    if preflight.replay is not None:
+        return preflight.replay
+    upload, quota = preflight.upload, preflight.quota
+    logger.info("Solicitação de análise recebida", extra={
+        "user_id": quota.user.id, "image_bytes": upload.size, "speculative": preflight.analysis is not None,
+        "preflight_saved_ms": round(preflight.saved_seconds * 1000, 1)})
+
+    async def run() -> ChartAnalysisResponse:
+        # O arquivo pertence à execução (que pode seguir para os demais aguardando mesmo se este cliente cair)
         try:
-            # Tentar IA real primeiro; em caso de falha, aplicar fallback simulado
-            if not OPENAI_AVAILABLE:
-                print("⚠️ OPENAI_API_KEY não disponível - aplicando fallback simulado")
-                result = simulate_chart_analysis(image_path)
-            else:
-                try:
-                    print("🤖 Usando serviço de IA para análise...")
-                    result = analyze_chart_with_ai(image_path)
-                except Exception as e:
-                    print(f"⚠️ Falha IA real: {e} | Aplicando fallback simulado")
-                    result = simulate_chart_analysis(image_path)
-            
-            print(f"✅ Análise concluída: {result.acao} - {result.justificativa}")
-            
-            # Incrementar contador e checar se é a 10ª para sinalizar upgrade
-            if current_user and ENVIRONMENT != "development":
-                new_count = await Database.increment_monthly_usage(current_user.id)
-                # Se atingiu a cota do plano free, ajustar mensagem
-                if not is_premium and new_count >= limit:
-                    # Sinalizar no texto da justificativa
-                    result.justificativa = (
-                        result.justificativa + " | Limite gratuito atingido. Faça upgrade para análises com IA."
-                    )
-
-                # Salvar análise no banco de dados
-                analysis_id = str(uuid.uuid4())
-                
-                # Determinar valores com base na resposta
-                recommendation_map = {"compra": "BUY", "venda": "SELL", "esperar": "HOLD"}
-                recommendation = recommendation_map.get(result.acao, "HOLD")
-                
-                # Preparar dados da análise
-                analysis_data = {
-                    "id": analysis_id,
-                    "user_id": current_user.id,
-                    "symbol": "CHART_ANALYSIS",  # Poderia ser extraído da análise
-                    "recommendation": recommendation,
-                    "confidence": 75,  # Valor padrão
-                    "target_price": 0.0,  # Seria calculado com base na análise
-                    "stop_loss": 0.0,  # Seria calculado com base na análise
-                    "timeframe": "1H",  # Valor padrão
-                    "timestamp": datetime.now().isoformat(),
-                    "reasoning": result.justificativa,
-                    "technical_indicators": [{
-                        "name": "AI Analysis",
-                        "value": result.acao,
-                        "signal": "BULLISH" if result.acao == "compra" else "BEARISH" if result.acao == "venda" else "NEUTRAL",
-                        "description": result.justificativa
-                    }]
-                }
-                
-                # Salvar no banco de dados
-                await Database.save_analysis(analysis_data)
-            
-            return result
-            
+            return await _analyze_image(upload.image_path, quota, analysis=preflight.analysis)
         finally:
-            # Limpar arquivo temporário
-            try:
-                os.unlink(image_path)
-                print("🗑️  Arquivo temporário removido")
-            except:
-                pass
-                
-    except HTTPException:
+            _discard_image(upload.image_path)
+
+    # Requisições idênticas simultâneas (mesmo usuário e imagem) compartilham uma única análise e cobrança
+    flight_key = (quota.user.id, upload.sha256)
+    joining = analysis_flights.joining(flight_key)
+    if preflight.analysis is not None:
+        SPECULATIVE_ANALYSES.labels("cancelled" if joining else "used").inc()
+        if joining:
+            discard(preflight.analysis)
+    try:
+        result = await analysis_flights.do(flight_key, run)
+    except (HTTPException, deadlines.DeadlineExceeded):
         raise
     except Exception as e:
-        print(f"❌ Erro inesperado: {e}")
+        logger.exception("Erro inesperado na análise: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    finally:
+        if joining:
+            _discard_image(upload.image_path)
+    if idempotency_key:
+        analysis_idempotency.put(_idempotency_scope(http_request, quota.user.id), idempotency_key, upload.sha256,
+                                 200, result.model_dump())
+    return result
+
+
+# --- Jobs de análise assíncrona ---------------------------------------------
+# Alternativa ao /api/analyze-chart para clientes atrás de proxies com timeout curto:
+# o POST retorna 202 com o id do job; o resultado é obtido por polling ou SSE.
+
+class AnalysisJobResponse(BaseModel):
+    id: str
+    status: str
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[ChartAnalysisResponse] = None
+    error: Optional[str] = None
+    links: Dict[str, str]
+
+
+def _job_response(job: AnalysisJob) -> AnalysisJobResponse:
+    return AnalysisJobResponse(
+        id=job.id,
+        status=job.status,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        result=job.result,
+        error=job.error,
+        links={"self": f"/api/analysis-jobs/{job.id}", "events": f"/api/analysis-jobs/{job.id}/events"},
+    )
+
+
+async def _process_analysis_job(job: AnalysisJob) -> Dict[str, Any]:
+    quota = AnalysisQuota(
+        user=User(id=job.user_id, email=""),
+        plan_type=job.plan_type,
+        limit=PLAN_ANALYSIS_LIMITS.get(job.plan_type, 10),
+        is_premium=job.plan_type != "free",
+    )
+    image_path = decode_base64_image(job.image_base64)
+    try:
+        result = await _analyze_image(image_path, quota, wait_for_admission=True)
+    finally:
+        _discard_image(image_path)
+    return result.model_dump()
+
+
+analysis_jobs = queue_from_env(_process_analysis_job)
 
-# Configurar chave secreta do Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-if not stripe.api_key:
-    print("\033[93mAVISO: STRIPE_SECRET_KEY não configurada\033[0m")
+
+# Retomar jobs pendentes persistidos antes de um restart; encerrar os workers no shutdown
+app.router.add_event_handler("startup", analysis_jobs.recover)
+app.router.add_event_handler("shutdown", analysis_jobs.stop)
+
+
+async def _report_startup() -> None:
+    """Avisos de configuração e tempos de cold start; SDKs adiados carregam em segundo plano"""
+    startup.mark("ready")
+    startup.log_startup(logger)
+    startup.warm_up(get_supabase_client)
+
+
+app.router.add_event_handler("startup", _report_startup)
+
+
+async def _get_owned_job(job_id: str, current_user: Optional[User]) -> AnalysisJob:
+    job = await analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if ENVIRONMENT != "development" and (not current_user or current_user.id != job.user_id):
+        # 404 também para jobs de outros usuários (não revelar existência)
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@app.post("/api/analysis-jobs", response_model=AnalysisJobResponse, status_code=202, openapi_extra=CHART_UPLOAD_OPENAPI)
+async def create_analysis_job(
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_current_user_from_request)
+):
+    """Enfileira uma análise de gráfico e retorna imediatamente o id do job"""
+    idempotency_key = _idempotency_key(http_request)
+    upload, quota, replay, *_ = await _receive_authorized_upload(http_request, current_user, idempotency_key)
+    if replay is not None:
+        return replay
+    try:
+        # O job é persistido com a imagem em base64 para sobreviver a restarts
+        with open(upload.image_path, "rb") as image_file:
+            image_base64 = base64.b64encode(image_file.read()).decode("ascii")
+    finally:
+        _discard_image(upload.image_path)
+    try:
+        job = await analysis_jobs.submit(quota.user.id, quota.plan_type, image_base64)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Fila de análises cheia; tente novamente em instantes",
+                            headers={"Retry-After": "30"})
+    logger.info("Job de análise enfileirado", extra={"job_id": job.id, "user_id": quota.user.id})
+    response = _job_response(job)
+    body, headers = response.model_dump(mode="json"), {"Location": response.links["self"]}
+    if idempotency_key:
+        # A repetição devolve o mesmo job (o estado atual fica em GET /api/analysis-jobs/{id})
+        analysis_idempotency.put(_idempotency_scope(http_request, quota.user.id), idempotency_key, upload.sha256,
+                                 202, body, headers)
+    return JSONResponse(status_code=202, content=body, headers=headers)
+
+
+@app.get("/api/analysis-jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(
+    job_id: str,
+    wait: float = 0,
+    current_user: Optional[User] = Depends(get_current_user_from_request)
+):
+    """Estado do job; ``wait`` (segundos, máx. 25) faz long polling até a conclusão"""
+    job = await _get_owned_job(job_id, current_user)
+    if wait > 0:
+        job = await analysis_jobs.wait(job_id, deadlines.timeout(min(wait, 25.0), "long_poll")) or job
+    return _job_response(job)
+
+
+@app.get("/api/analysis-jobs/{job_id}/events")
+async def analysis_job_events(job_id: str, current_user: Optional[User] = Depends(get_current_user_from_request)):
+    """Server-Sent Events: estado atual do job e um evento final quando concluir"""
+    job = await _get_owned_job(job_id, current_user)
+
+    async def events():
+        current = job
+        yield b"event: status\ndata: %s\n\n" % _job_response(current).model_dump_json().encode()
+        while current.status not in ("succeeded", "failed"):
+            current = await analysis_jobs.wait(job_id, 15.0) or current
+            if current.status in ("succeeded", "failed"):
+                yield b"event: done\ndata: %s\n\n" % _job_response(current).model_dump_json().encode()
+            else:
+                yield b": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # Incluir rotas do Stripe
 app.include_router(stripe_router)
 app.include_router(signal_router)
+app.include_router(ohlc_router)
 
 # Expor o webhook do Stripe na mesma aplicação, preservando headers
 @app.post("/webhook/stripe")
@@ -722,11 +891,8 @@ async def webhook_alias(request: Request, stripe_signature: str = Header(None)):
 @app.post("/api/checkout")
 async def checkout_alias(request: Request):
     body = await request.json()
-    # Log de debug para investigar payload recebido
-    try:
-        print(f"🧾 /api/checkout payload: {json.dumps(body)}")
-    except Exception:
-        print("🧾 /api/checkout payload recebido (não serializável)")
+    # Log de debug (amostrado) para investigar payload recebido
+    log_payload(logger, "/api/checkout payload", body)
     # Defaults tolerantes em desenvolvimento
     origin = request.headers.get("origin") or "http://localhost:5173"
     price_id = body.get("price_id") or os.getenv("STRIPE_PRICE_TRADER_MONTHLY") or os.getenv("VITE_STRIPE_PRICE_TRADER_MONTHLY")
@@ -757,3 +923,5 @@ async def checkout_alias(request: Request):
         metadata=metadata
     )
     return session
+
+startup.mark("import")
@@ -0,0 +1,351 @@
+"""
+Prometheus-compatible metrics (text exposition format 0.0.4), no client library.
+
+Metric families are created once at import time; ``labels(...)`` children are
+cached, so the hot path is a dict lookup plus a locked add. Exposed at
+``GET /metrics`` by main.py.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Seconds; covers fast DB/JWT stages (ms) up to slow vision-model calls (tens of seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+Sample = Tuple[str, Mapping[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: Any, **kwargs: Any):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; call .labels() first")
+        return self._children[()]
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, key)))
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+    def samples(self, name, labels):
+        yield f"{name}_total", labels, self._value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+    def get(self) -> float:
+        return self._unlabelled().get()
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def get(self) -> float:
+        return self._value
+
+    def samples(self, name, labels):
+        yield name, labels, self._value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._unlabelled().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._unlabelled().set(value)
+
+    def get(self) -> float:
+        return self._unlabelled().get()
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = 0
+        for bound, count in zip(self._upper_bounds + (math.inf,), counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield f"{name}_count", labels, cumulative
+        yield f"{name}_sum", labels, total
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled().observe(value)
+
+    def time(self) -> "_Timer":
+        return _Timer(self._unlabelled())
+
+
+class _Timer:
+    """Context manager observing elapsed seconds into a histogram child."""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]) -> None:
+        """``collector()`` yields ``(name, kind, help, samples)`` at scrape time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def family(name, kind, documentation, samples):
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+
+        for metric in list(self._metrics.values()):
+            family(metric.name, metric.kind, metric.documentation, metric.samples())
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception:
+                continue  # a broken collector must not take down the scrape
+            for name, kind, documentation, samples in families:
+                family(name, kind, documentation, samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def register_stats(prefix: str, stats: Callable[[], Mapping[str, Any]], labels: Optional[Mapping[str, str]] = None,
+                   counters: Sequence[str] = (), registry: Optional[Registry] = None) -> None:
+    """
+    Expose the numeric fields of an existing ``stats()`` dict (batcher,
+    publisher, debug sink) as ``<prefix>_<field>`` at scrape time. Fields
+    listed in ``counters`` are typed as counters, the rest as gauges.
+    """
+    labels = dict(labels or {})
+
+    def collect():
+        current = stats()
+        if current is None:
+            return
+        for key, value in current.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in counters:
+                yield f"{prefix}_{key}", "counter", f"{prefix} {key}", [(f"{prefix}_{key}_total", labels, value)]
+            else:
+                yield f"{prefix}_{key}", "gauge", f"{prefix} {key}", [(f"{prefix}_{key}", labels, value)]
+
+    (registry if registry is not None else REGISTRY).register_collector(collect)
+
+
+# --- Application metrics ---------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "tickrify_http_request_duration_seconds", "HTTP request latency by route template, method and status",
+    ("route", "method", "status"))
+HTTP_IN_FLIGHT = Gauge("tickrify_http_requests_in_flight", "HTTP requests currently being served")
+STAGE_SECONDS = Histogram(
+    "tickrify_stage_duration_seconds",
+    "Latency of request stages (image_decode, chart_screen, image_hash, analysis_cache, local_analysis, ohlc_decode, ohlc_indicators, auth_jwt, subscription_lookup, usage_check, usage_increment, "
+    "json_parse, save_analysis, ...)", ("stage",))
+PROVIDER_SECONDS = Histogram(
+    "tickrify_provider_request_duration_seconds", "Latency of AI provider calls by provider, model and outcome",
+    ("provider", "model", "outcome"))
+PROVIDER_FALLBACKS = Counter(
+    "tickrify_provider_fallbacks", "Provider/model attempts that failed and fell through to the next option",
+    ("provider", "model"))
+MODEL_REPLIES = Counter(
+    "tickrify_model_replies", "Provider replies by parse outcome (valid, repaired, malformed, refusal)",
+    ("provider", "model", "outcome"))
+PARSE_RETRY_CALLS = Counter(
+    "tickrify_parse_retry_calls", "Extra provider calls made because the previous reply could not be parsed",
+    ("provider",))
+SIMULATED_FALLBACKS = Counter(
+    "tickrify_simulated_fallbacks", "Chart analyses answered by the local engine (no provider), by reason", ("reason",))
+CACHE_HITS = Counter("tickrify_cache_hits", "Cache hits by cache", ("cache",))
+CACHE_MISSES = Counter("tickrify_cache_misses", "Cache misses by cache", ("cache",))
+
+
+def stage_timer(stage: str) -> _Timer:
+    """``with stage_timer("image_decode"): ...`` records into STAGE_SECONDS."""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording in-flight requests and latency per route
+    template (``/api/signal``, not the raw path, to keep cardinality bounded).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched",
+                scope.get("method", ""), str(status),
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,256 @@
+"""
+Near-duplicate reuse of recent chart analyses.
+
+Users re-screenshot the same chart a minute later with a slightly different
+crop or one new candle; the SHA-256 single-flight/idempotency layers treat
+that as a new image. Here every analysed upload gets a 127-bit perceptual
+fingerprint: a 63-bit pHash (low 8x8 DCT coefficients of a 32x32 grey
+thumbnail, minus DC) followed by a 64-bit dHash (horizontal gradient signs on
+9x8). On the synthetic re-screenshot set (crop jitter, JPEG re-encode, one
+extra bar) duplicates stay within ~10 bits, while a different series drawn
+in the same theme is almost always 12+ bits away.
+
+Per user, recent provider results are kept in a multi-index hash table over
+Hamming distance (``MultiIndex``):
+
+* distance <= ``NEAR_DUP_REUSE_DISTANCE``: the previous result is returned
+  as is;
+* distance <= ``NEAR_DUP_REFRESH_DISTANCE``: cheap refresh - the local
+  engine (backend.local_analysis) reads the new image, and the previous
+  result is reused only if it reaches the same action it reached on the
+  previous image; otherwise the model is called.
+
+Entries expire after ``NEAR_DUP_WINDOW_SECONDS``; each user keeps at most
+``NEAR_DUP_MAX_PER_USER`` entries and ``NEAR_DUP_MAX_PER_SYMBOL`` per detected
+symbol (the newest win), and users are evicted LRU beyond
+``NEAR_DUP_MAX_USERS``. Per process, like the idempotency store.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from . import startup
+from .metrics import CACHE_HITS, CACHE_MISSES, register_stats
+
+# NumPy/Pillow só no primeiro fingerprint: a importação do app não paga por elas
+np = startup.lazy_import("numpy")
+Image = startup.lazy_import("PIL.Image")
+
+_DCT_SIDE = 32
+_DCT_LOW = 8
+FINGERPRINT_BITS = 127
+_SYMBOL_RE = re.compile(r"^\s*([A-Z0-9][A-Z0-9./-]{1,19})\s*:")
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+@lru_cache(maxsize=None)
+def _bit_weights() -> np.ndarray:
+    return 1 << np.arange(63, -1, -1, dtype=np.uint64)
+
+
+def _pack(bits: np.ndarray) -> int:
+    """Boolean vector (up to 64 entries, most significant first) -> int."""
+    padded = np.zeros(64, dtype=bool)
+    padded[64 - len(bits):] = bits
+    return int((padded.astype(np.uint64) * _bit_weights()).sum())
+
+
+def image_fingerprint(source) -> int:
+    """127-bit pHash|dHash of an image (path or PIL image)."""
+    image = source if isinstance(source, Image.Image) else Image.open(source)
+    # Decodificação reduzida (JPEG) e escala de cinza: o hash só olha 32x32
+    image.draft("L", (4 * _DCT_SIDE, 4 * _DCT_SIDE))
+    grey = image.convert("L")
+    small = np.asarray(grey.resize((_DCT_SIDE, _DCT_SIDE), Image.Resampling.BOX), dtype=np.float64)
+    dct = _dct_matrix(_DCT_SIDE)
+    low = (dct @ small @ dct.T)[:_DCT_LOW, :_DCT_LOW].ravel()[1:]
+    phash = _pack(low > np.median(low))
+    gradient = np.asarray(grey.resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    dhash = _pack((gradient[:, 1:] > gradient[:, :-1]).ravel())
+    return (phash << 64) | dhash
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class Entry:
+    __slots__ = ("fingerprint", "created", "symbol", "result", "local_acao", "alive")
+
+    def __init__(self, fingerprint: int, created: float, symbol: Optional[str], result: Dict[str, Any],
+                 local_acao: Optional[str]):
+        self.fingerprint = fingerprint
+        self.created = created
+        self.symbol = symbol
+        self.result = result
+        self.local_acao = local_acao
+        self.alive = True
+
+
+class MultiIndex:
+    """
+    Multi-index hashing over Hamming distance. The fingerprint is split into
+    ``radius + 1`` disjoint chunks with one exact-match table per chunk: two
+    fingerprints within ``radius`` bits differ in at most ``radius`` chunks,
+    so they share at least one (pigeonhole), and only the entries sharing a
+    chunk with the query are compared in full. A BK-tree does not prune here:
+    chart fingerprints are spread around ~60 bits apart, so every radius
+    query visits most of the tree.
+    """
+
+    def __init__(self, radius: int):
+        self.radius = radius
+        chunks = radius + 1
+        self._chunks = [(FINGERPRINT_BITS * i // chunks, FINGERPRINT_BITS * (i + 1) // chunks) for i in range(chunks)]
+        self._tables: List[Dict[int, List[Entry]]] = [{} for _ in self._chunks]
+        self.live = 0
+
+    def _keys(self, fingerprint: int) -> List[int]:
+        return [(fingerprint >> low) & ((1 << (high - low)) - 1) for low, high in self._chunks]
+
+    def add(self, entry: Entry) -> None:
+        self.live += 1
+        for table, key in zip(self._tables, self._keys(entry.fingerprint)):
+            table.setdefault(key, []).append(entry)
+
+    def discard(self, entry: Entry) -> None:
+        if not entry.alive:
+            return
+        entry.alive = False
+        self.live -= 1
+        for table, key in zip(self._tables, self._keys(entry.fingerprint)):
+            bucket = table[key]
+            bucket.remove(entry)
+            if not bucket:
+                del table[key]
+
+    def search(self, fingerprint: int, radius: Optional[int] = None) -> List[Tuple[int, Entry]]:
+        radius = self.radius if radius is None else min(radius, self.radius)
+        found, seen = [], set()
+        for table, key in zip(self._tables, self._keys(fingerprint)):
+            for entry in table.get(key, ()):
+                if id(entry) not in seen:
+                    seen.add(id(entry))
+                    distance = hamming(fingerprint, entry.fingerprint)
+                    if distance <= radius:
+                        found.append((distance, entry))
+        return found
+
+
+class Match(NamedTuple):
+    entry: Entry
+    distance: int
+
+
+class _UserIndex:
+    def __init__(self, radius: int):
+        self.hashes = MultiIndex(radius)
+        self.order: List[Entry] = []  # inserção (mais antiga primeiro), inclui mortas até a próxima limpeza
+
+
+class RecentAnalyses:
+    def __init__(self, reuse_distance: int = 10, refresh_distance: int = 20, window_seconds: float = 300.0,
+                 max_per_user: int = 20, max_per_symbol: int = 2, max_users: int = 10_000):
+        self.reuse_distance = reuse_distance
+        self.refresh_distance = max(refresh_distance, reuse_distance)
+        self.window_seconds = window_seconds
+        self.max_per_user = max_per_user
+        self.max_per_symbol = max_per_symbol
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._outcomes = {"reused": 0, "refreshed": 0, "refresh_mismatch": 0, "miss": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.max_per_user > 0
+
+    def lookup(self, user_id: str, fingerprint: int, now: Optional[float] = None) -> Optional[Match]:
+        """Nearest live entry of ``user_id`` within the refresh distance, or None."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                return None
+            self._users.move_to_end(user_id)
+            self._expire(index, now)
+            found = index.hashes.search(fingerprint, self.refresh_distance)
+        if not found:
+            return None
+        distance, entry = min(found, key=lambda item: (item[0], -item[1].created))
+        return Match(entry, distance)
+
+    def add(self, user_id: str, fingerprint: int, result: Dict[str, Any], local_acao: Optional[str] = None,
+            now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        symbol_match = _SYMBOL_RE.match(str(result.get("justificativa", "")))
+        entry = Entry(fingerprint, now, symbol_match.group(1) if symbol_match else None, result, local_acao)
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                index = self._users[user_id] = _UserIndex(self.refresh_distance)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            self._expire(index, now)
+            if entry.symbol is not None:
+                # Novo print do mesmo ativo substitui os mais antigos (o índice guarda só as leituras recentes)
+                same_symbol = [e for e in index.order if e.alive and e.symbol == entry.symbol]
+                for old in same_symbol[:max(0, len(same_symbol) - self.max_per_symbol + 1)]:
+                    index.hashes.discard(old)
+            index.hashes.add(entry)
+            index.order.append(entry)
+            for old in [e for e in index.order if e.alive][:max(0, index.hashes.live - self.max_per_user)]:
+                index.hashes.discard(old)
+            index.order = [e for e in index.order if e.alive]
+
+    def _expire(self, index: _UserIndex, now: float) -> None:
+        while index.order and (not index.order[0].alive or now - index.order[0].created > self.window_seconds):
+            index.hashes.discard(index.order.pop(0))
+
+    def record(self, outcome: str) -> None:
+        """Count a lookup outcome: reused, refreshed, refresh_mismatch or miss."""
+        (CACHE_HITS if outcome in ("reused", "refreshed") else CACHE_MISSES).labels("near_duplicate").inc()
+        with self._lock:
+            self._outcomes[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = sum(self._outcomes.values())
+            hits = self._outcomes["reused"] + self._outcomes["refreshed"]
+            return {
+                **self._outcomes,
+                "lookups": lookups,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "users": len(self._users),
+                "entries": sum(index.hashes.live for index in self._users.values()),
+            }
+
+
+def recent_analyses_from_env() -> RecentAnalyses:
+    return RecentAnalyses(
+        reuse_distance=int(os.getenv("NEAR_DUP_REUSE_DISTANCE", "10")),
+        refresh_distance=int(os.getenv("NEAR_DUP_REFRESH_DISTANCE", "20")),
+        window_seconds=float(os.getenv("NEAR_DUP_WINDOW_SECONDS", "300")),
+        max_per_user=int(os.getenv("NEAR_DUP_MAX_PER_USER", "20")),
+        max_per_symbol=int(os.getenv("NEAR_DUP_MAX_PER_SYMBOL", "2")),
+        max_users=int(os.getenv("NEAR_DUP_MAX_USERS", "10000")),
+    )
+
+
+recent_analyses = recent_analyses_from_env()
+register_stats("tickrify_near_duplicate_index", recent_analyses.stats,
+               counters=("reused", "refreshed", "refresh_mismatch", "miss", "lookups"))
@@ -0,0 +1,243 @@
+"""
+``POST /api/analyze-ohlc``: signals from raw candles, no vision call.
+
+Clients that already hold OHLCV data send it directly instead of a
+screenshot. Two body encodings:
+
+* ``application/json``: ``{"series": [{"symbol", "open", "high", "low",
+  "close", "volume"?}], "narrate": false}`` (columnar arrays, oldest first;
+  series may differ in length);
+* ``application/vnd.tickrify.ohlcv`` (or ``application/octet-stream``):
+  little-endian float64 (``?dtype=f4`` for float32) laid out as
+  ``symbols x [open, high, low, close, volume] x bars``, with
+  ``?symbols=BTCUSDT,ETHUSDT`` naming the rows; every symbol has the same
+  number of bars.
+
+Series of equal length are stacked and run through backend.indicators in one
+vectorized pass (backend.local_analysis.compute_snapshots), so hundreds of
+symbols cost a few milliseconds. Each result is in the same canonical form
+as ``/api/signals`` (BUY/SELL/WAIT, confidence, reason, model_version) with
+the indicator values under ``explainability``. ``narrate`` adds a short
+model-written narration of the numbers (one text-only call for the whole
+request, under AI admission control); the decision itself never comes from
+the model.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from .admission import AdmissionRejected, ai_admission
+from .ai_service import AIService
+from . import startup
+from .logging_config import get_logger
+from .metrics import stage_timer
+from .prompts import get_prompt
+from .signal_api import SignalResp, _normalize_symbol
+from .signal_utils import canonical_signal_response
+
+# NumPy e o motor local (que traz o Pillow) carregados na primeira requisição
+np = startup.lazy_import("numpy")
+local_analysis = startup.lazy_import(f"{__package__}.local_analysis")
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+MAX_OHLC_SYMBOLS = int(os.getenv("MAX_OHLC_SYMBOLS", "1000"))
+MAX_OHLC_BARS = int(os.getenv("MAX_OHLC_BARS", "5000"))
+MAX_NARRATED_SYMBOLS = int(os.getenv("OHLC_NARRATE_MAX_SYMBOLS", "5"))
+MAX_OHLC_BODY_BYTES = int(float(os.getenv("MAX_OHLC_BODY_MB", "32")) * 1024 * 1024)
+BINARY_MEDIA_TYPE = "application/vnd.tickrify.ohlcv"
+MODEL_VERSION = "indicators-v1"
+_FIELDS = ("open", "high", "low", "close", "volume")
+_MIN_BARS = 2
+_VOLUME_LOOKBACK = 20
+_ACTIONS = {"compra": "BUY", "venda": "SELL", "esperar": "WAIT"}
+
+
+class OhlcSeries(BaseModel):
+    symbol: Optional[str] = None
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    volume: Optional[List[float]] = None
+
+
+class OhlcAnalysisReq(BaseModel):
+    series: List[OhlcSeries]
+    narrate: bool = False
+
+
+class OhlcSignalResp(SignalResp):
+    explainability: Dict[str, Any]
+    narration: Optional[str] = None
+
+
+class OhlcAnalysisResp(BaseModel):
+    symbols: List[Optional[str]]
+    signals: List[OhlcSignalResp]
+
+
+async def _read_body(request: Request) -> bytes:
+    limit = MAX_OHLC_BODY_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail="Corpo da requisição excede o limite de dados OHLC")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Corpo da requisição excede o limite de dados OHLC")
+    return bytes(body)
+
+
+def _check_symbols(symbols: int) -> None:
+    if symbols > MAX_OHLC_SYMBOLS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_OHLC_SYMBOLS} séries por requisição")
+
+
+def _check_bars(bars: int) -> None:
+    if bars > MAX_OHLC_BARS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_OHLC_BARS} barras por série")
+    if bars < _MIN_BARS:
+        raise HTTPException(status_code=400, detail=f"Cada série precisa de pelo menos {_MIN_BARS} barras")
+
+
+def _from_json(payload: OhlcAnalysisReq) -> List[np.ndarray]:
+    """One (5, n) array per series (volume row NaN when not sent)."""
+    _check_symbols(len(payload.series))
+    arrays = []
+    for series in payload.series:
+        bars = len(series.close)
+        _check_bars(bars)
+        volume = series.volume if series.volume is not None else [np.nan] * bars
+        columns = (series.open, series.high, series.low, series.close, volume)
+        if any(len(column) != bars for column in columns):
+            raise HTTPException(status_code=400, detail="open, high, low, close e volume devem ter o mesmo tamanho")
+        arrays.append(np.array(columns, dtype=np.float64))
+    return arrays
+
+
+def _from_binary(body: bytes, symbols: List[Optional[str]], dtype: str) -> np.ndarray:
+    """(symbols, 5, n) float64 array from the packed little-endian body."""
+    if dtype not in ("f4", "f8"):
+        raise HTTPException(status_code=400, detail="dtype deve ser f4 ou f8")
+    if not symbols or not all(symbols):
+        raise HTTPException(status_code=400, detail="Informe ?symbols= com um nome não vazio por série")
+    per_bar = len(symbols) * len(_FIELDS)
+    # Validar o tamanho antes do frombuffer, que falha (500) com um número fracionário de valores
+    if not body or len(body) % (np.dtype(dtype).itemsize * per_bar):
+        raise HTTPException(status_code=400,
+                            detail="Corpo binário deve ter símbolos x 5 (OHLCV) x barras valores")
+    values = np.frombuffer(body, dtype=f"<{dtype}")
+    _check_symbols(len(symbols))
+    _check_bars(len(values) // per_bar)
+    return values.reshape(len(symbols), len(_FIELDS), -1).astype(np.float64)
+
+
+def _analyze(series: List[np.ndarray]) -> List[Dict[str, Any]]:
+    """Canonical signal per series; equal-length series share one vectorized pass."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(series)
+    by_length: Dict[int, List[int]] = defaultdict(list)
+    for i, values in enumerate(series):
+        by_length[values.shape[1]].append(i)
+    for indices in by_length.values():
+        stacked = np.stack([series[i] for i in indices])
+        if not np.isfinite(stacked[:, :4]).all():
+            raise HTTPException(status_code=400, detail="Valores OHLC devem ser números finitos")
+        snapshots = local_analysis.compute_snapshots(stacked[:, :4].transpose(0, 2, 1))
+        volume = stacked[:, 4]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            volume_ratio = volume[:, -1] / volume[:, -_VOLUME_LOOKBACK:].mean(axis=1)
+        for i, snapshot, ratio in zip(indices, snapshots, volume_ratio.tolist()):
+            results[i] = _canonical(snapshot, None if not np.isfinite(ratio) else round(ratio, 4))
+    return results
+
+
+def _canonical(snapshot: local_analysis.IndicatorSnapshot, volume_ratio: Optional[float]) -> Dict[str, Any]:
+    acao, reason = local_analysis.decide(snapshot, label="Indicadores")
+    strength = min(abs(snapshot.score) / local_analysis.MAX_SCORE, 1.0)
+    explainability = {k: round(v, 6) if isinstance(v, float) else v for k, v in snapshot._asdict().items()}
+    explainability["volume_ratio"] = volume_ratio
+    return canonical_signal_response(
+        _ACTIONS[acao],
+        strength if acao != "esperar" else 1.0 - strength,
+        reason,
+        model_version=MODEL_VERSION,
+        explainability=explainability,
+    )
+
+
+async def _narrate(request: Request, symbols: List[Optional[str]], signals: List[Dict[str, Any]]) -> None:
+    """Fill ``narration`` with one text-only model call; failures leave it empty."""
+    prompt = get_prompt("ohlc_narration")
+    facts = [
+        {"indice": i, "simbolo": symbol, "decisao": signal["signal"], **signal["explainability"]}
+        for i, (symbol, signal) in enumerate(zip(symbols, signals))
+    ]
+    client = request.client.host if request.client else "anonymous"
+    try:
+        ticket = await ai_admission.acquire(f"ohlc:{client}")
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message, headers={"Retry-After": str(e.retry_after)})
+    try:
+        reply = await asyncio.to_thread(AIService.narrate_with_openai, prompt, json.dumps(facts, ensure_ascii=False))
+    except Exception as e:
+        logger.warning("Narração OHLC indisponível: %s", e)
+        return
+    finally:
+        ai_admission.release(ticket)
+    for item in reply.get("narrativas", []):
+        index = item.get("indice")
+        if isinstance(index, int) and 0 <= index < len(signals):
+            signals[index]["narration"] = str(item.get("narrativa", ""))[:600]
+
+
+@router.post("/api/analyze-ohlc", response_model=OhlcAnalysisResp, openapi_extra={
+    "requestBody": {"required": True, "content": {
+        "application/json": {"schema": OhlcAnalysisReq.model_json_schema()},
+        BINARY_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+    }},
+})
+async def analyze_ohlc(request: Request, symbols: Optional[str] = None, dtype: str = "f8",
+                       narrate: bool = False):
+    """Indicators, support/resistance and a BUY/SELL/WAIT signal per OHLCV series."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = await _read_body(request)
+    if content_type in (BINARY_MEDIA_TYPE, "application/octet-stream"):
+        names = [_normalize_symbol(s) for s in (symbols or "").split(",")] if symbols else []
+        with stage_timer("ohlc_decode"):
+            packed = _from_binary(body, names, dtype)
+        series = list(packed)
+    elif content_type in ("", "application/json") or content_type.endswith("+json"):
+        try:
+            payload = OhlcAnalysisReq.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        names = [_normalize_symbol(s.symbol) for s in payload.series]
+        with stage_timer("ohlc_decode"):
+            series = _from_json(payload)
+        narrate = narrate or payload.narrate
+    else:
+        raise HTTPException(status_code=415, detail=f"Use application/json ou {BINARY_MEDIA_TYPE}")
+    del body
+    if not series:
+        return {"symbols": [], "signals": []}
+    if narrate and len(series) > MAX_NARRATED_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"Narração disponível para até {MAX_NARRATED_SYMBOLS} séries")
+
+    # Lotes grandes saem do event loop (cálculo NumPy bloqueante)
+    with stage_timer("ohlc_indicators"):
+        signals = await asyncio.to_thread(_analyze, series)
+    if narrate:
+        await _narrate(request, names, signals)
+    return {"symbols": names, "signals": signals}
@@ -0,0 +1,97 @@
+"""
+Concurrent pre-flight for ``/api/analyze-chart``.
+
+The caller is known from the JWT before the body is read, so the two quota
+reads (``get_active_subscription`` and ``get_monthly_usage``) start when the
+handler is entered and run alongside each other and alongside the upload
+decode and the chart pre-screen. The quota decision still happens after the
+pre-screen, so a rejected upload is rejected exactly as before.
+
+Speculation: when the last quota this process saw for the user is a paid
+plan with at least ``AI_SPECULATIVE_MIN_HEADROOM`` analyses left (and is
+younger than ``AI_SPECULATIVE_HINT_SECONDS``), the provider call starts as
+soon as the pre-screen passes instead of after the quota check. If the check
+then fails the task is cancelled and the request gets the usual 401/402/403.
+A provider request already on the wire cannot be recalled (it runs in a
+worker thread), so a wrong guess costs one model call; a paid plan with
+headroom makes that rare.
+
+``tickrify_preflight_saved_seconds{kind}`` records, per request, the
+latency removed: ``overlap`` is the serial cost of the steps minus the wall
+time they took together, ``speculative`` the time the provider call had
+already been running when the quota check finished.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from .metrics import Counter, Histogram
+
+PREFLIGHT_SAVED_SECONDS = Histogram(
+    "tickrify_preflight_saved_seconds",
+    "Latency removed from the chart analysis pre-flight per request (overlap, speculative)", ("kind",))
+SPECULATIVE_ANALYSES = Counter(
+    "tickrify_speculative_analyses", "Provider calls started before the quota check, by outcome (used, cancelled)",
+    ("outcome",))
+
+
+class QuotaState(NamedTuple):
+    plan_type: Optional[str]  # None sem assinatura ativa
+    usage: int
+    seconds: float  # soma das duas consultas (o custo se fossem feitas em sequência)
+
+
+class QuotaHint(NamedTuple):
+    plan_type: str
+    usage: int
+    limit: int
+    seen: float
+
+
+class QuotaHints:
+    """Last quota seen per user, used only to decide whether to speculate (never to authorize)."""
+
+    def __init__(self, enabled: bool = True, max_age_seconds: float = 300.0, min_headroom: int = 5,
+                 max_users: int = 10_000):
+        self.enabled = enabled
+        self.max_age_seconds = max_age_seconds
+        self.min_headroom = min_headroom
+        self.max_users = max_users
+        self._hints: "OrderedDict[str, QuotaHint]" = OrderedDict()
+
+    def remember(self, user_id: str, plan_type: str, usage: int, limit: int, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._hints.pop(user_id, None)
+        self._hints[user_id] = QuotaHint(plan_type, usage, limit, now)
+        while len(self._hints) > self.max_users:
+            self._hints.popitem(last=False)
+
+    def speculative_plan(self, user_id: str, pending: int = 0, now: Optional[float] = None) -> Optional[str]:
+        """Plan to run the provider call under before the quota check, or None to wait for it."""
+        if not self.enabled:
+            return None
+        hint = self._hints.get(user_id)
+        now = time.monotonic() if now is None else now
+        if hint is None or hint.plan_type == "free" or now - hint.seen > self.max_age_seconds:
+            return None
+        if hint.limit - hint.usage - pending < self.min_headroom:
+            return None
+        return hint.plan_type
+
+
+def discard(task: Optional[asyncio.Task]) -> None:
+    """Cancel a pre-flight task nobody will await (its exception, if any, is consumed)."""
+    if task is None:
+        return
+    task.cancel()
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+def quota_hints_from_env() -> QuotaHints:
+    return QuotaHints(
+        enabled=os.getenv("AI_SPECULATIVE_ANALYSIS", "true").lower() not in ("0", "false", "no"),
+        max_age_seconds=float(os.getenv("AI_SPECULATIVE_HINT_SECONDS", "300")),
+        min_headroom=int(os.getenv("AI_SPECULATIVE_MIN_HEADROOM", "5")),
+    )
@@ -0,0 +1,664 @@
+"""
+Versioned prompt registry for the chart-analysis provider calls.
+
+Each ``PromptVersion`` pairs the prompt text with the pydantic schema of the
+JSON it asks for, so the parser always reads the shape that was requested.
+Versions are immutable: change the text by adding a version and switching
+``CHART_PROMPT_VERSION``. Token counts are computed once at import.
+
+Prompt-caching layout: the prompt text is the whole, byte-identical static
+prefix of every request (system message / first part) and the chart image
+always comes after it, so OpenAI's automatic prefix cache and Gemini's
+implicit cache can reuse it across users.
+
+Structured output: ``openai_response_format`` / ``gemini_response_schema``
+derive the provider-native schema from the same pydantic model, and
+``parse`` validates the reply against it in one pass (``model_validate_json``
+straight from the response text), so a reply in the requested shape never
+goes through ``json.loads`` + dict walking.
+
+``record_usage`` turns the provider ``usage`` / ``usageMetadata`` fields into
+per-version token, cost and latency metrics; ``usage_report`` summarises
+them for ``GET /api/prompts``.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from .metrics import Counter, Histogram
+from .tracing import current_span
+
+try:
+    import tiktoken  # opcional: contagem exata; sem ele usamos uma estimativa
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens for ``text`` (tiktoken o200k_base if installed, else a BPE-like estimate)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # Estimativa: palavras longas viram várias sub-palavras (~4 caracteres cada); pontuação/emoji = 1
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _TOKEN_RE.findall(text))
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """OpenAI vision input tokens for an image (85 base + 170 per 512px tile after resizing)."""
+    if detail == "low" or width <= 0 or height <= 0:
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+# --- Esquemas de resposta ---------------------------------------------------
+
+class MalformedOutput(ValueError):
+    """The model reply is not a JSON object in the prompt's schema."""
+
+
+class _Lenient(BaseModel):
+    # Aceita chaves extras e números onde o esquema pede texto ("preco_atual": 43250.5)
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+
+class EstruturaV2(_Lenient):
+    tendencia_principal: str = ""
+    descricao: str = ""
+
+
+class SuporteResistenciaV2(_Lenient):
+    suporte_proximo: str = ""
+    resistencia_proxima: str = ""
+    base_analise: str = ""
+
+
+class CandlestickV2(_Lenient):
+    padrao_identificado: str = ""
+    descricao: str = ""
+
+
+class PadroesV2(_Lenient):
+    formacao_identificada: str = ""
+    descricao: str = ""
+
+
+class IndicadoresV2(_Lenient):
+    rsi: str = "não disponível"
+    macd: str = "não disponível"
+    medias_moveis: str = "não disponível"
+    volume: str = "não disponível"
+    bollinger: str = "não disponível"
+    outros: str = "não disponível"
+
+
+class ConfluenciaV2(_Lenient):
+    sinais_confirmados: List[str] = []
+    decisao_final: str = Field("aguardar", json_schema_extra={"enum": ["compra", "venda", "aguardar"]})
+    justificativa: str = ""
+
+
+class ResumoV2(_Lenient):
+    acao: str = Field("esperar", json_schema_extra={"enum": ["compra", "venda", "esperar"]})
+    justificativa: str = ""
+
+
+class ChartAnalysisV2(_Lenient):
+    """Resposta da metodologia de 6 passos (formato lido por analyze_chart_with_ai)."""
+    simbolo_detectado: str = "CHART_UNKNOWN"
+    preco_atual: str = "N/D"
+    passo_1_estrutura: EstruturaV2 = EstruturaV2()
+    passo_2_suporte_resistencia: SuporteResistenciaV2 = SuporteResistenciaV2()
+    passo_3_candlestick: CandlestickV2 = CandlestickV2()
+    passo_4_padroes: PadroesV2 = PadroesV2()
+    passo_5_indicadores: IndicadoresV2 = IndicadoresV2()
+    passo_6_confluencia: ConfluenciaV2 = ConfluenciaV2()
+    resumo_analise: ResumoV2 = ResumoV2()
+
+
+class EstruturaMercadoV1(_Lenient):
+    tendencia_principal: str = ""
+    sub_tendencias: List[str] = []
+    topos_fundos: str = ""
+
+
+class SuportesResistenciasV1(_Lenient):
+    suportes: List[float] = []
+    resistencias: List[float] = []
+    forca_niveis: str = ""
+
+
+class ChartAnalysisV1(_Lenient):
+    """Resposta do prompt legado de 7 passos."""
+    simbolo_detectado: str = "CHART_UNKNOWN"
+    preco_atual: str = "N/D"
+    timeframe_detectado: str = ""
+    analise_tecnica: str = ""
+    decisao: str = Field("esperar", json_schema_extra={"enum": ["compra", "venda", "esperar"]})
+    justificativa_decisao: str = ""
+    confianca_percentual: float = 0
+    indicadores_utilizados: List[str] = []
+    estrutura_mercado: EstruturaMercadoV1 = EstruturaMercadoV1()
+    suportes_resistencias: SuportesResistenciasV1 = SuportesResistenciasV1()
+
+
+def _v1_to_v2(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Mapeia o formato legado para as chaves lidas pelo parser (passo_*/resumo_analise)."""
+    estrutura = payload.get("estrutura_mercado") or {}
+    return {
+        **payload,
+        "passo_1_estrutura": {"tendencia_principal": str(estrutura.get("tendencia_principal", "")),
+                              "descricao": str(estrutura.get("topos_fundos", ""))},
+        "passo_6_confluencia": {"decisao_final": payload.get("decisao", "esperar"),
+                                "justificativa": payload.get("justificativa_decisao", "")},
+        "resumo_analise": {"acao": payload.get("decisao", "esperar"),
+                           "justificativa": payload.get("justificativa_decisao", "")},
+    }
+
+
+def _identity(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return payload
+
+
+def strict_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """JSON schema in OpenAI strict mode form: refs inlined, every property required, no extra keys."""
+    raw = model.model_json_schema()
+    defs = raw.pop("$defs", {})
+
+    def convert(node: Dict[str, Any]) -> Dict[str, Any]:
+        if "$ref" in node:
+            node = defs[node["$ref"].rsplit("/", 1)[1]]
+        out = {k: node[k] for k in ("type", "enum", "description") if k in node}
+        if node.get("type") == "object":
+            properties = {name: convert(sub) for name, sub in node.get("properties", {}).items()}
+            out.update(properties=properties, required=list(properties), additionalProperties=False)
+        elif node.get("type") == "array":
+            out["items"] = convert(node.get("items") or {"type": "string"})
+        return out
+
+    return convert(raw)
+
+
+def gemini_schema(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Strict JSON schema -> Gemini ``responseSchema`` (OpenAPI subset, upper-case types)."""
+    out = {"type": node["type"].upper()}
+    if "enum" in node:
+        out["enum"] = node["enum"]
+    if node["type"] == "object":
+        out["properties"] = {name: gemini_schema(sub) for name, sub in node["properties"].items()}
+        out["required"] = node["required"]
+    elif node["type"] == "array":
+        out["items"] = gemini_schema(node["items"])
+    return out
+
+
+@dataclass(frozen=True)
+class PromptVersion:
+    name: str
+    version: str
+    text: str
+    schema: Type[BaseModel]
+    max_output_tokens: int
+    normalize: Callable[[Dict[str, Any]], Dict[str, Any]] = _identity
+    prompt_tokens: int = field(init=False)
+    sha256: str = field(init=False)
+    json_schema: Dict[str, Any] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "prompt_tokens", count_tokens(self.text))
+        object.__setattr__(self, "sha256", hashlib.sha256(self.text.encode()).hexdigest()[:12])
+        object.__setattr__(self, "json_schema", strict_json_schema(self.schema))
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def openai_response_format(self) -> Dict[str, Any]:
+        return {"type": "json_schema", "json_schema": {
+            "name": f"{self.name}_{self.version}", "strict": True, "schema": self.json_schema}}
+
+    def gemini_response_schema(self) -> Dict[str, Any]:
+        return gemini_schema(self.json_schema)
+
+    def parse(self, content: str) -> Tuple[Dict[str, Any], str]:
+        """
+        Validate a reply against the schema; returns (normalized payload, outcome).
+
+        ``valid``: the reply is exactly the JSON object. ``repaired``: the object had
+        to be cut out of surrounding text. Raises MalformedOutput otherwise. Only
+        the keys the model sent are returned, so the parser's free-text fallback
+        still sees a reply that ignored the format.
+        """
+        try:
+            model = self.schema.model_validate_json(content)
+            outcome = "valid"
+        except ValidationError:
+            start, end = content.find("{"), content.rfind("}")
+            if start == -1 or end <= start:
+                raise MalformedOutput("Não foi possível extrair JSON válido da resposta") from None
+            try:
+                model = self.schema.model_validate_json(content[start:end + 1])
+            except ValidationError as e:
+                raise MalformedOutput(f"Resposta fora do esquema {self.key}: {e.error_count()} erro(s)") from None
+            outcome = "repaired"
+        return self.normalize(model.model_dump(exclude_unset=True)), outcome
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "sha256": self.sha256,
+            "prompt_tokens": self.prompt_tokens,
+            "token_count_method": "tiktoken" if _ENCODING is not None else "estimate",
+            "max_output_tokens": self.max_output_tokens,
+            "schema": self.schema.__name__,
+        }
+
+
+# Prompt legado (7 passos); mantido para comparação de custo/qualidade
+_CHART_ANALYSIS_V1 = """Você é um analista técnico de mercado financeiro altamente especializado, com vasta experiência em análise gráfica, padrões de preço, indicadores técnicos e estratégias de trading. Sua tarefa é analisar uma imagem de um gráfico financeiro fornecida, utilizando seus conhecimentos avançados para extrair o máximo de informações e fornecer uma análise completa, precisa e acionável.
+
+PROCESSO DE ANÁLISE PASSO A PASSO:
+
+**PASSO 1: ANÁLISE DA ESTRUTURA DE MERCADO E TENDÊNCIA**
+- Identifique a tendência principal (Alta, Baixa ou Lateral)
+- Determine sub-tendências de menor grau
+- Trace linhas de tendência (LTA/LTB)
+- Marque topos e fundos relevantes
+
+**PASSO 2: IDENTIFICAÇÃO DE SUPORTES E RESISTÊNCIAS**
+- Detecte zonas de congestão
+- Trace níveis horizontais de suporte/resistência
+- Avalie a força de cada nível
+- Observe mudanças de polaridade
+
+**PASSO 3: ANÁLISE DE PADRÕES DE CANDLESTICK**
+- Detecte padrões de reversão (Engolfo, Martelo, Estrela Cadente, etc.)
+- Identifique padrões de continuação (Doji em tendência, etc.)
+- Avalie confiabilidade (Alta/Média/Baixa)
+- Contextualize com tendência e S/R
+
+**PASSO 4: DETECÇÃO DE PADRÕES GRÁFICOS CLÁSSICOS**
+- Procure padrões de reversão (OCO, Topo/Fundo Duplo, etc.)
+- Identifique padrões de continuação (Triângulos, Bandeiras, etc.)
+- Projete alvos baseados na altura dos padrões
+- Determine direção provável de rompimento
+
+**PASSO 5: ANÁLISE DE INDICADORES TÉCNICOS VISÍVEIS**
+- Liste todos indicadores visíveis (MAs, RSI, MACD, etc.)
+- Interprete sinais de cada indicador
+- Analise comportamento do volume
+- Avalie confluência entre indicadores
+
+**PASSO 6: SUGESTÃO DE TRADING E GESTÃO DE RISCO**
+- Determine direção da operação (Long/Short)
+- Defina ponto ideal de entrada
+- Calcule stop loss baseado em S/R ou ATR
+- Projete take profit baseado em padrões
+- Calcule relação risco-retorno
+
+**PASSO 7: CONSIDERAÇÕES FINAIS**
+- Indique nível de confiança da análise
+- Mencione contexto de mercado relevante
+- Destaque evidências visuais principais
+
+FORMATO DE RESPOSTA OBRIGATÓRIO (JSON):
+{
+  "simbolo_detectado": "SÍMBOLO EXATO do gráfico",
+  "preco_atual": "PREÇO EXATO visível",
+  "timeframe_detectado": "TIMEFRAME identificado",
+  "analise_tecnica": "Análise completa seguindo os 7 passos",
+  "decisao": "compra|venda|esperar",
+  "justificativa_decisao": "Justificativa detalhada baseada na confluência",
+  "confianca_percentual": 75,
+  "indicadores_utilizados": ["Lista de indicadores analisados"],
+  "estrutura_mercado": {
+    "tendencia_principal": "Alta/Baixa/Lateral",
+    "sub_tendencias": ["Tendências menores"],
+    "topos_fundos": "Descrição da estrutura"
+  },
+  "suportes_resistencias": {
+    "suportes": [42000, 41500],
+    "resistencias": [44000, 44500],
+    "forca_niveis": "Avaliação da força"
+  }
+}
+
+**INSTRUÇÕES CRÍTICAS:**
+1. Analise APENAS o que está VISÍVEL no gráfico
+2. NÃO invente dados que não consegue ver
+3. Base toda análise em evidências visuais concretas
+4. Priorize confluência de múltiplos sinais
+5. Adapte a análise ao tipo de mercado identificado
+6. Forneça justificativas técnicas sólidas
+7. Responda APENAS o JSON válido, sem texto adicional"""
+
+# Prompt profissional de análise técnica - Metodologia de 6 passos
+_CHART_ANALYSIS_V2 = """Você é um ANALISTA TÉCNICO PROFISSIONAL especializado em mercados financeiros.
+
+🔍 TAREFA: Analise este gráfico seguindo RIGOROSAMENTE a metodologia de 6 passos.
+
+⚠️ INSTRUÇÕES CRÍTICAS:
+1. EXAMINE DETALHADAMENTE cada parte visível do gráfico
+2. PROCURE ATIVAMENTE por indicadores técnicos (RSI, MACD, médias móveis, Volume, etc.)
+3. Se indicadores estiverem visíveis, ANALISE-OS COMPLETAMENTE com valores específicos
+4. NÃO diga "não disponível" se conseguir ver dados dos indicadores
+5. Use APENAS informações visíveis - não invente dados
+6. Retorne APENAS o JSON final
+
+🎯 METODOLOGIA DE 6 PASSOS OBRIGATÓRIA:
+
+PASSO 1 - ESTRUTURA DO GRÁFICO:
+- Identifique tendência principal (alta/baixa/lateral) baseada em topos e fundos
+- Analise o timeframe visível
+- Observe a direção geral dos preços
+
+PASSO 2 - SUPORTE E RESISTÊNCIA:
+- Identifique níveis horizontais onde o preço reagiu múltiplas vezes
+- Marque zonas de rejeição e aceitação claras
+- Use apenas pontos claramente visíveis
+
+PASSO 3 - PADRÕES DE CANDLESTICK:
+- Procure padrões de reversão: martelo, doji, engolfo, estrela cadente
+- Procure padrões de continuação: marubozu, spinning tops
+- Se não houver padrões claros, declare "nenhum padrão claro"
+
+PASSO 4 - FORMAÇÕES GRÁFICAS:
+- Identifique triângulos, retângulos, cunhas, ombro-cabeça-ombro
+- Procure topos/fundos duplos ou triplos
+- Se não houver formações claras, declare "nenhum padrão formado"
+
+PASSO 5 - INDICADORES TÉCNICOS (CRÍTICO - ANALISE TUDO QUE ESTIVER VISÍVEL):
+🚨 EXAMINE CUIDADOSAMENTE se há indicadores visíveis:
+
+▶️ RSI (Relative Strength Index):
+   - Se visível: leia o valor exato (0-100) e interprete (sobrecompra >70, sobrevenda <30)
+   - Se não visível: "não disponível"
+
+▶️ MACD (Moving Average Convergence Divergence):
+   - Se visível: analise linha MACD vs linha de sinal, histograma, cruzamentos
+   - Se não visível: "não disponível"
+
+▶️ MÉDIAS MÓVEIS:
+   - Se visíveis: identifique período (MM20, MM50, MM200) e posição do preço
+   - Se não visíveis: "não disponível"
+
+▶️ BOLLINGER BANDS:
+   - Se visíveis: analise posição do preço vs bandas superior/inferior
+   - Se não visíveis: "não disponível"
+
+▶️ VOLUME:
+   - Se visível: analise padrão de volume vs movimento de preço
+   - Se não visível: "não disponível"
+
+▶️ OUTROS INDICADORES:
+   - Procure Stochastic, Williams %R, CCI, ADX, OBV
+   - Analise qualquer indicador visível no gráfico
+
+PASSO 6 - CONFLUÊNCIA E DECISÃO:
+- Combine APENAS sinais confirmados nos passos 1-5
+- Identifique confluências (múltiplos indicadores apontando na mesma direção)
+- Tome decisão final baseada em evidências
+FORMATO DE RESPOSTA OBRIGATÓRIO (JSON):
+
+⚠️ IMPORTANTE: SEMPRE EXTRAIA O SÍMBOLO E PREÇO VISÍVEIS NO GRÁFICO
+
+{
+  "simbolo_detectado": "SÍMBOLO EXATO lido do gráfico (ex: BTCUSDT, EURUSD, AAPL)",
+  "preco_atual": "PREÇO ATUAL EXATO visível no gráfico",
+  
+  "passo_1_estrutura": {
+    "tendencia_principal": "alta|baixa|lateral",
+    "descricao": "descrição da tendência baseada apenas no que está visível"
+  },
+  
+  "passo_2_suporte_resistencia": {
+    "suporte_proximo": "valor do suporte mais próximo visível no gráfico",
+    "resistencia_proxima": "valor da resistência mais próxima visível no gráfico",
+    "base_analise": "topos e fundos identificados no gráfico"
+  },
+  
+  "passo_3_candlestick": {
+    "padrao_identificado": "nome do padrão OU 'nenhum padrão claro'",
+    "descricao": "descrição do padrão se identificado, ou 'não há padrões claros visíveis'"
+  },
+  
+  "passo_4_padroes": {
+    "formacao_identificada": "nome da formação OU 'nenhum padrão formado'",
+    "descricao": "descrição da formação se identificada, ou 'não há padrões formados'"
+  },
+  
+  "passo_5_indicadores": {
+    "rsi": "LEIA O VALOR EXATO se visível (ex: 'RSI 65 - zona de sobrecompra') OU 'não disponível'",
+    "macd": "ANALISE COMPLETAMENTE se visível (ex: 'MACD 0.25 acima do sinal, histograma positivo') OU 'não disponível'",
+    "medias_moveis": "IDENTIFIQUE TODAS as MMs visíveis (ex: 'MM20 em 45200, MM50 em 44800, preço acima de ambas') OU 'não disponível'",
+    "volume": "ANALISE o padrão de volume se visível (ex: 'Volume alto nas altas, confirma movimento') OU 'não disponível'",
+    "bollinger": "POSIÇÃO nas bandas se visível (ex: 'Preço na banda superior, possível sobrecompra') OU 'não disponível'",
+    "outros": "QUALQUER outro indicador visível (Stochastic, Williams %R, etc.) OU 'não disponível'"
+  },
+  
+  "passo_6_confluencia": {
+    "sinais_confirmados": ["lista apenas dos sinais confirmados nos passos anteriores"],
+    "decisao_final": "compra|venda|aguardar",
+    "justificativa": "justificativa baseada APENAS nos sinais confirmados"
+  },
+  
+  "resumo_analise": {
+    "acao": "compra|venda|esperar",
+    "justificativa": "resumo técnico profissional baseado nos 6 passos (máximo 150 caracteres)"
+  }
+}
+INSTRUÇÕES FINAIS CRÍTICAS:
+1. Retorne APENAS o JSON, sem texto antes ou depois
+2. Siga EXATAMENTE os 6 passos metodológicos
+3. Use APENAS informações visíveis no gráfico
+4. Se algo não estiver visível, escreva "não disponível" ou "nenhum padrão claro"
+5. SEMPRE extraia o símbolo e preço exatos do gráfico
+6. Base a decisão final apenas nos sinais confirmados nos 6 passos
+
+EXEMPLO DE RESPOSTA CORRETA:
+{
+  "simbolo_detectado": "BTCUSD",
+  "preco_atual": "43250.50",
+  "passo_1_estrutura": {
+    "tendencia_principal": "alta",
+    "descricao": "Tendência de alta clara com topos e fundos ascendentes"
+  },
+  "passo_2_suporte_resistencia": {
+    "suporte_proximo": "42800",
+    "resistencia_proxima": "44500",
+    "base_analise": "Suporte em mínima anterior, resistência em topo recente"
+  },
+  "passo_3_candlestick": {
+    "padrao_identificado": "martelo",
+    "descricao": "Martelo formado no suporte com confirmação bullish"
+  },
+  "passo_4_padroes": {
+    "formacao_identificada": "bandeira bullish",
+    "descricao": "Consolidação em formato de bandeira após movimento de alta"
+  },
+  "passo_5_indicadores": {
+    "rsi": "RSI 45 - zona neutra favorável para entrada",
+    "macd": "MACD 0.12 acima do sinal, histograma crescente - momentum positivo",
+    "medias_moveis": "MM20 em 43100, MM50 em 42850 - preço acima de ambas, tendência de alta",
+    "volume": "Volume alto nas últimas altas, confirmando movimento de alta",
+    "bollinger": "Preço no meio das bandas, espaço para movimento",
+    "outros": "Stochastic em 65 - ainda em zona de alta mas não sobrecomprado"
+  },
+  "passo_6_confluencia": {
+    "sinais_confirmados": ["tendência alta", "suporte testado", "RSI favorável", "MACD positivo"],
+    "decisao_final": "compra",
+    "justificativa": "Confluência de 4 sinais técnicos positivos"
+  },
+  "resumo_analise": {
+    "acao": "compra",
+    "justificativa": "BTCUSD: Tendência alta, suporte testado, confluência técnica positiva"
+  }
+}
+
+LEMBRE-SE: NUNCA INVENTE DADOS QUE NÃO CONSEGUE VER NO GRÁFICO!
+RETORNE APENAS O JSON ACIMA, SEM TEXTO ADICIONAL!"""
+
+class NarrativaV1(_Lenient):
+    indice: int = 0
+    narrativa: str = ""
+
+
+class OhlcNarrationV1(_Lenient):
+    narrativas: List[NarrativaV1] = []
+
+
+_OHLC_NARRATION_V1 = """Você é um analista técnico. Recebe, para um ou mais ativos numerados, indicadores já calculados a partir dos candles (não uma imagem) e a decisão do motor de indicadores (BUY, SELL ou WAIT).
+Para cada ativo escreva em português, em no máximo 3 frases curtas, o que os números dizem: tendência, momentum (RSI/MACD), posição nas bandas de Bollinger, volatilidade (ATR) e os níveis de suporte/resistência.
+Não mude a decisão, não invente preços nem indicadores que não foram informados.
+Retorne APENAS o JSON: {"narrativas": [{"indice": 0, "narrativa": "..."}]}"""
+
+PROMPTS: Dict[str, PromptVersion] = {p.key: p for p in (
+    PromptVersion("chart_analysis", "v1", _CHART_ANALYSIS_V1, ChartAnalysisV1, max_output_tokens=2000,
+                  normalize=_v1_to_v2),
+    PromptVersion("chart_analysis", "v2", _CHART_ANALYSIS_V2, ChartAnalysisV2, max_output_tokens=2000),
+    PromptVersion("ohlc_narration", "v1", _OHLC_NARRATION_V1, OhlcNarrationV1, max_output_tokens=200),
+)}
+DEFAULT_VERSIONS = {"chart_analysis": "v2", "ohlc_narration": "v1"}
+# Versão escolhível por ambiente (rollout/rollback sem deploy), por prompt
+VERSION_ENV = {"chart_analysis": "CHART_PROMPT_VERSION"}
+
+
+def get_prompt(name: str = "chart_analysis", version: Optional[str] = None) -> PromptVersion:
+    env = VERSION_ENV.get(name)
+    version = version or (env and os.getenv(env)) or DEFAULT_VERSIONS.get(name)
+    try:
+        return PROMPTS[f"{name}@{version}"]
+    except KeyError:
+        raise ValueError(f"Prompt desconhecido: {name}@{version}") from None
+
+
+# --- Contabilização de uso --------------------------------------------------
+
+PROMPT_TOKENS = Counter(
+    "tickrify_prompt_tokens", "Provider-reported tokens by prompt version, provider, model and kind "
+    "(input, cached_input, output)", ("prompt", "provider", "model", "kind"))
+PROMPT_COST = Counter(
+    "tickrify_prompt_cost_usd", "Estimated provider cost in USD by prompt version", ("prompt", "provider", "model"))
+PROMPT_SECONDS = Histogram(
+    "tickrify_prompt_request_duration_seconds", "Provider call latency by prompt version",
+    ("prompt", "provider", "model"))
+
+# USD por 1M tokens: (entrada, saída, entrada em cache)
+DEFAULT_MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4-turbo": (10.00, 30.00, 10.00),
+    "gpt-4-vision-preview": (10.00, 30.00, 10.00),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gemini-1.5-pro": (1.25, 5.00, 0.3125),
+}
+
+
+def _model_prices() -> Dict[str, Tuple[float, float, float]]:
+    """DEFAULT_MODEL_PRICES com sobrescritas de AI_MODEL_PRICES ("modelo=entrada:saida[:cache];...")."""
+    prices = dict(DEFAULT_MODEL_PRICES)
+    for entry in filter(None, (e.strip() for e in os.getenv("AI_MODEL_PRICES", "").split(";"))):
+        model, _, spec = entry.partition("=")
+        values = [float(v) for v in spec.split(":")]
+        prices[model.strip()] = (values[0], values[1], values[2] if len(values) > 2 else values[0])
+    return prices
+
+
+MODEL_PRICES = _model_prices()
+
+
+def normalize_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """OpenAI ``usage`` or Gemini ``usageMetadata`` -> input/cached_input/output token counts."""
+    usage = usage or {}
+    if "promptTokenCount" in usage or "candidatesTokenCount" in usage:
+        return {
+            "input": int(usage.get("promptTokenCount") or 0),
+            "cached_input": int(usage.get("cachedContentTokenCount") or 0),
+            "output": int(usage.get("candidatesTokenCount") or 0),
+        }
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "input": int(usage.get("prompt_tokens") or 0),
+        "cached_input": int(details.get("cached_tokens") or 0),
+        "output": int(usage.get("completion_tokens") or 0),
+    }
+
+
+def estimate_cost(model: str, tokens: Dict[str, int]) -> float:
+    price_in, price_out, price_cached = MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    uncached = max(0, tokens["input"] - tokens["cached_input"])
+    return (uncached * price_in + tokens["cached_input"] * price_cached + tokens["output"] * price_out) / 1_000_000
+
+
+class _Totals:
+    __slots__ = ("calls", "input", "cached_input", "output", "cost_usd", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.input = self.cached_input = self.output = 0
+        self.cost_usd = self.seconds = 0.0
+
+
+_usage_lock = threading.Lock()
+_usage: Dict[Tuple[str, str, str], _Totals] = {}
+
+
+def record_usage(prompt: PromptVersion, provider: str, model: str, usage: Optional[Dict[str, Any]],
+                 seconds: float) -> Dict[str, int]:
+    """Account one successful provider call; also annotates the current span."""
+    tokens = normalize_usage(usage)
+    cost = estimate_cost(model, tokens)
+    for kind, value in tokens.items():
+        if value:
+            PROMPT_TOKENS.labels(prompt.key, provider, model, kind).inc(value)
+    PROMPT_COST.labels(prompt.key, provider, model).inc(cost)
+    PROMPT_SECONDS.labels(prompt.key, provider, model).observe(seconds)
+    with _usage_lock:
+        totals = _usage.setdefault((prompt.key, provider, model), _Totals())
+        totals.calls += 1
+        totals.input += tokens["input"]
+        totals.cached_input += tokens["cached_input"]
+        totals.output += tokens["output"]
+        totals.cost_usd += cost
+        totals.seconds += seconds
+    span = current_span()
+    span.set_attribute("ai.prompt", prompt.key)
+    span.set_attribute("ai.usage.input_tokens", tokens["input"])
+    span.set_attribute("ai.usage.cached_input_tokens", tokens["cached_input"])
+    span.set_attribute("ai.usage.output_tokens", tokens["output"])
+    return tokens
+
+
+def usage_report() -> Dict[str, Any]:
+    """Per prompt version/provider/model: calls, mean tokens, cache hit ratio, cost and latency."""
+    with _usage_lock:
+        rows = [(key, totals) for key, totals in _usage.items()]
+    report = []
+    for (prompt, provider, model), t in sorted(rows):
+        report.append({
+            "prompt": prompt,
+            "provider": provider,
+            "model": model,
+            "calls": t.calls,
+            "input_tokens": t.input,
+            "cached_input_tokens": t.cached_input,
+            "output_tokens": t.output,
+            "cache_hit_ratio": round(t.cached_input / t.input, 4) if t.input else 0.0,
+            "cost_usd": round(t.cost_usd, 6),
+            "cost_per_call_usd": round(t.cost_usd / t.calls, 6) if t.calls else 0.0,
+            "mean_latency_seconds": round(t.seconds / t.calls, 3) if t.calls else 0.0,
+        })
+    return {"prompts": [p.describe() for p in PROMPTS.values()], "active": get_prompt().key, "usage": report}
@@ -0,0 +1,279 @@
+"""
+Token-bucket rate limiting, applied as ASGI middleware before routing.
+
+Requests are keyed by the verified JWT subject when the bearer token checks
+out locally (no network, no DB), otherwise by client IP. Each limited route
+has a rate per plan; the plan comes from token claims or from a hint the
+analysis endpoint records after its subscription lookup, so the limiter
+itself never touches the database.
+
+Buckets live in a bounded in-process LRU by default. With several workers
+set ``RATE_LIMIT_BACKEND=redis`` to share them (optional ``redis``
+package; the limiter fails open if Redis is unreachable).
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from .auth import verify_token_claims
+from .logging_config import get_logger
+from .metrics import Counter, register_stats
+
+logger = get_logger(__name__)
+
+RATE_LIMITED = Counter(
+    "tickrify_rate_limited", "Requests rejected by the rate limiter", ("route", "plan"))
+RATE_LIMIT_BACKEND_ERRORS = Counter(
+    "tickrify_rate_limit_backend_errors", "Shared rate-limit backend failures (request allowed)")
+
+ANONYMOUS = "anonymous"
+
+# "<METHOD> <path>=<plan>:<requests>/<seconds>,...;..."  ("*" = any plan without its own entry)
+DEFAULT_RATE_LIMITS = (
+    "POST /api/analyze-chart=anonymous:5/60,free:10/60,trader:30/60,alpha_pro:60/60;"
+    "POST /api/analysis-jobs=anonymous:5/60,free:10/60,trader:30/60,alpha_pro:60/60;"
+    "POST /api/checkout=*:10/60;"
+    "POST /api/stripe/create-checkout-session=*:10/60;"
+    "GET /api/signal=anonymous:60/60,*:120/60;"
+    "POST /api/signals=anonymous:10/60,*:60/60;"
+    "POST /api/analyze-ohlc=anonymous:10/60,*:60/60"
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    requests: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.period
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    method: str
+    path: str
+    limits: Dict[str, Limit]
+
+    def limit_for(self, plan: str) -> Optional[Limit]:
+        return self.limits.get(plan) or self.limits.get("*")
+
+
+def parse_rules(spec: str) -> Dict[Tuple[str, str], RouteRule]:
+    rules = {}
+    for entry in filter(None, (e.strip() for e in spec.split(";"))):
+        route, _, limits_spec = entry.partition("=")
+        method, _, path = route.strip().partition(" ")
+        limits = {}
+        for item in filter(None, (i.strip() for i in limits_spec.split(","))):
+            plan, _, rate = item.partition(":")
+            requests, _, period = rate.partition("/")
+            limits[plan.strip()] = Limit(int(requests), float(period or 1))
+        rule = RouteRule(method.strip().upper(), path.strip(), limits)
+        rules[(rule.method, rule.path)] = rule
+    return rules
+
+
+class MemoryBackend:
+    """Per-process buckets in an LRU dict; an evicted bucket was idle and would have refilled anyway."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.evictions = 0
+
+    async def take(self, key: str, limit: Limit, now: Optional[float] = None) -> Tuple[bool, float, float]:
+        """Consume one token; returns (allowed, tokens left, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (float(limit.requests), now))
+        tokens = min(float(limit.requests), tokens + (now - updated) * limit.rate)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return allowed, tokens, 0.0 if allowed else (1.0 - tokens) / limit.rate
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": "memory", "keys": len(self._buckets), "evictions": self.evictions}
+
+
+# KEYS[1] bucket; ARGV: capacity, rate/s, now (s), ttl (s). Returns {allowed, tokens*1000}
+_REDIS_TAKE = """
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {allowed, math.floor(tokens * 1000)}
+"""
+
+
+class RedisBackend:
+    """Buckets shared by all workers; the refill/consume step is one atomic Lua call."""
+
+    def __init__(self, url: str, prefix: str = "tickrify:rl:"):
+        import redis.asyncio as redis  # opcional: só necessário com RATE_LIMIT_BACKEND=redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self.errors = 0
+
+    async def take(self, key: str, limit: Limit, now: Optional[float] = None) -> Tuple[bool, float, float]:
+        now = time.time() if now is None else now
+        ttl = max(1, math.ceil(limit.period * 2))
+        try:
+            allowed, milli_tokens = await self._take(
+                keys=[self.prefix + key], args=[limit.requests, limit.rate, now, ttl])
+        except Exception as e:
+            self.errors += 1
+            RATE_LIMIT_BACKEND_ERRORS.inc()
+            logger.warning("Rate limit backend indisponível, requisição liberada: %s", e)
+            return True, float(limit.requests), 0.0
+        tokens = milli_tokens / 1000.0
+        return bool(allowed), tokens, 0.0 if allowed else (1.0 - tokens) / limit.rate
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": "redis", "errors": self.errors}
+
+
+class RateLimiter:
+    def __init__(self, rules: Dict[Tuple[str, str], RouteRule], backend=None, trust_forwarded: bool = False,
+                 plan_hints: int = 50_000):
+        self.rules = rules
+        self.backend = backend or MemoryBackend()
+        self.trust_forwarded = trust_forwarded
+        self._plan_hints: "OrderedDict[str, str]" = OrderedDict()
+        self._plan_hints_max = plan_hints
+
+    def remember_plan(self, user_id: str, plan: str) -> None:
+        """Called after a subscription lookup so later requests are limited at the user's plan."""
+        self._plan_hints.pop(user_id, None)
+        self._plan_hints[user_id] = plan
+        if len(self._plan_hints) > self._plan_hints_max:
+            self._plan_hints.popitem(last=False)
+
+    def identify(self, headers: Dict[str, str], client: Optional[Iterable]) -> Tuple[str, str]:
+        """(bucket identity, plan) for a request."""
+        authorization = headers.get("authorization", "")
+        if authorization.startswith("Bearer "):
+            claims = verify_token_claims(authorization[7:])
+            if claims:
+                user_id = str(claims["sub"])
+                plan = _plan_from_claims(claims) or self._plan_hints.get(user_id) or "free"
+                return f"u:{user_id}", plan
+        ip = None
+        if self.trust_forwarded:
+            ip = headers.get("x-forwarded-for", "").split(",")[0].strip() or None
+        if ip is None and client:
+            ip = list(client)[0]
+        return f"ip:{ip or 'unknown'}", ANONYMOUS
+
+    async def check(self, method: str, path: str, headers: Dict[str, str],
+                    client: Optional[Iterable] = None) -> Optional[Tuple[Limit, float, float, str]]:
+        """None if the route is not limited, else (limit, tokens left, retry_after, plan); retry_after > 0 means rejected."""
+        rule = self.rules.get((method, path.rstrip("/") or "/"))
+        if rule is None:
+            return None
+        identity, plan = self.identify(headers, client)
+        limit = rule.limit_for(plan)
+        if limit is None:
+            return None
+        allowed, tokens, retry_after = await self.backend.take(f"{method} {rule.path}|{identity}", limit)
+        return limit, tokens, (0.0 if allowed else retry_after), plan
+
+    def stats(self) -> Dict[str, object]:
+        return {**self.backend.stats(), "plan_hints": len(self._plan_hints)}
+
+
+def _plan_from_claims(claims: Dict) -> Optional[str]:
+    for container in (claims, claims.get("public_metadata"), claims.get("app_metadata")):
+        if isinstance(container, dict) and isinstance(container.get("plan"), str):
+            return container["plan"]
+    return None
+
+
+def limiter_from_env() -> RateLimiter:
+    backend = None
+    if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "redis":
+        try:
+            backend = RedisBackend(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+        except ImportError:
+            logger.warning("RATE_LIMIT_BACKEND=redis, mas o pacote redis não está instalado; usando memória local")
+    return RateLimiter(
+        parse_rules(os.getenv("RATE_LIMITS", DEFAULT_RATE_LIMITS)),
+        backend=backend or MemoryBackend(int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))),
+        trust_forwarded=os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes"),
+    )
+
+
+rate_limiter = limiter_from_env()
+register_stats("tickrify_rate_limit", lambda: rate_limiter.stats(), counters=("evictions", "errors"))
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware: a rejected request gets 429 + Retry-After before
+    any auth, DB or body handling. Admitted requests on limited routes carry
+    X-RateLimit-Limit / X-RateLimit-Remaining.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiter or rate_limiter
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+        outcome = await limiter.check(scope["method"], scope["path"], headers, scope.get("client"))
+        if outcome is None:
+            await self.app(scope, receive, send)
+            return
+        limit, tokens, retry_after, plan = outcome
+        rate_headers = {"X-RateLimit-Limit": str(limit.requests), "X-RateLimit-Remaining": str(int(tokens))}
+        if retry_after:
+            RATE_LIMITED.labels(scope["path"], plan).inc()
+            # Mesmo formato das respostas do ErrorHandler
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "status": "error",
+                    "code": 429,
+                    "message": "Limite de requisições excedido",
+                    "details": "Aguarde um momento ou faça upgrade do seu plano",
+                    "path": scope["path"],
+                },
+                headers={**rate_headers, "Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + [
+                    (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in rate_headers.items()]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -154,4 +154,28 @@ CREATE POLICY "Usuários podem criar seus próprios sinais"
 -- Índice para signals
 CREATE INDEX IF NOT EXISTS idx_signals_user_id ON signals(user_id);
 
+-- Jobs de análise assíncrona (/api/analysis-jobs); image_base64 é apagado ao concluir
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id UUID PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id),
+    plan_type TEXT NOT NULL DEFAULT 'free',
+    status TEXT NOT NULL CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    image_base64 TEXT,
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE analysis_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Usuários podem ver seus próprios jobs de análise"
+    ON analysis_jobs FOR SELECT
+    USING (auth.uid() = user_id);
 
+-- Retomada após restart: jobs pendentes em ordem de chegada
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_pending ON analysis_jobs(status, created_at)
+    WHERE status IN ('queued', 'running');
@@ -1,15 +1,23 @@
-from typing import Optional
+from typing import List, Optional, Tuple
 import os
-import json
-from datetime import datetime
-from fastapi import APIRouter
-from pydantic import BaseModel
-from .signal_utils import interpret_model_output, canonical_signal_response
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from .signal_utils import interpret_model_output, interpret_logits_batch, canonical_signal_response
+from .batching import MicroBatcher
+from .debug_capture import capture_debug
+from .signal_publisher import SignalPublisher
+from .metrics import CACHE_HITS, register_stats
 
 router = APIRouter()
 
+# Upper bound on rows scored by a single /api/signals call
+MAX_BATCH_SIGNALS = int(os.getenv("MAX_BATCH_SIGNALS", "500"))
+
 
 class SignalResp(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())  # model_version é um campo da API, não do pydantic
+
     signal: str
     confidence: float
     reason: str
@@ -17,6 +25,16 @@ class SignalResp(BaseModel):
     model_version: Optional[str] = None
 
 
+class SignalBatchReq(BaseModel):
+    symbols: Optional[List[str]] = None
+    logits: Optional[List[List[float]]] = None
+
+
+class SignalBatchResp(BaseModel):
+    symbols: List[Optional[str]]
+    signals: List[SignalResp]
+
+
 async def generate_signal_from_model():
     """
     Placeholder deterministic generator. In production, wrap real model calls.
@@ -24,26 +42,41 @@ async def generate_signal_from_model():
     """
     # For now, return a neutral WAIT suggestion to be deterministic without external deps
     text = "Recommendation: WAIT due to mixed signals."
-    # model_debug_mode: persist raw outputs for auditing
-    if os.getenv("MODEL_DEBUG_MODE", "").lower() in {"1", "true", "yes", "on"}:
-        try:
-            os.makedirs("logs/model_debug", exist_ok=True)
-            payload = {"timestamp": datetime.utcnow().isoformat() + "Z", "text": text, "logits": None}
-            with open(f"logs/model_debug/{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.json", "w") as f:
-                json.dump(payload, f)
-        except Exception:
-            pass
+    # model_debug_mode: persist raw outputs for auditing (buffered, written off the event loop)
+    capture_debug("signal", {"text": text, "logits": None})
     return (text, None)
 
 
+async def generate_signal_batch_from_model(symbols: List[Optional[str]]) -> Tuple[List[Optional[str]], Optional[list]]:
+    """
+    Batched placeholder generator: one model call for a whole watchlist.
+    Returns (texts, logits) where logits is an (N, 3) matrix or None.
+    """
+    text, logits = await generate_signal_from_model()
+    return [text] * len(symbols), ([logits] * len(symbols) if logits is not None else None)
+
+
+async def _run_signal_batch(symbols: List[Optional[str]]) -> List[Tuple[Optional[str], Optional[list]]]:
+    texts, logits = await generate_signal_batch_from_model(symbols)
+    return [(text, logits[i] if logits is not None else None) for i, text in enumerate(texts)]
+
+
+# Concurrent /api/signal requests share one batched model call
+signal_batcher = MicroBatcher(
+    _run_signal_batch,
+    max_batch_size=int(os.getenv("SIGNAL_BATCH_MAX_SIZE", "64")),
+    max_latency_ms=float(os.getenv("SIGNAL_BATCH_MAX_LATENCY_MS", "5")),
+    name="signal",
+)
+
+
 def get_model_version_or_none() -> Optional[str]:
     return "v1"
 
 
-@router.get("/api/signal", response_model=SignalResp)
-async def api_signal():
+async def compute_signal(symbol: Optional[str] = None) -> dict:
     try:
-        model_text, logits = await generate_signal_from_model()
+        model_text, logits = await signal_batcher.submit(symbol)
         parsed = interpret_model_output(model_text, model_logits=logits)
     except Exception as e:
         parsed = {"signal": "WAIT", "confidence": 0.0, "reason": f"error: {str(e)[:150]}"}
@@ -55,3 +88,99 @@ async def api_signal():
     )
 
 
+# One computation per symbol per refresh interval, shared by every poller and subscriber
+signal_publisher = SignalPublisher(
+    compute_signal,
+    refresh_interval=float(os.getenv("SIGNAL_REFRESH_SECONDS", "5")),
+    max_symbols=int(os.getenv("SIGNAL_MAX_SYMBOLS", "1000")),
+)
+
+
+register_stats("tickrify_signal_batcher", signal_batcher.stats, counters=("batches", "items"))
+register_stats("tickrify_signal_publisher", signal_publisher.stats, counters=("computations", "reads"))
+
+
+def _normalize_symbol(symbol: Optional[str]) -> Optional[str]:
+    if not symbol:
+        return None
+    symbol = symbol.strip().upper()
+    if len(symbol) > 20 or not symbol.replace("-", "").replace("/", "").replace(".", "").isalnum():
+        raise HTTPException(status_code=400, detail="Símbolo inválido")
+    return symbol
+
+
+@router.get("/api/signal", response_model=SignalResp)
+async def api_signal(request: Request, symbol: Optional[str] = None):
+    snapshot = await signal_publisher.get(_normalize_symbol(symbol))
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"public, max-age={snapshot.max_age()}",
+    }
+    if request.headers.get("if-none-match") == snapshot.etag:
+        CACHE_HITS.labels("signal_etag").inc()
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
+@router.get("/api/signal/stream")
+async def api_signal_stream(symbol: Optional[str] = None):
+    """Server-Sent Events: pushes the current signal and every new one as it is published."""
+    symbol = _normalize_symbol(symbol)
+
+    async def events():
+        async for snapshot in signal_publisher.subscribe(symbol):
+            if snapshot is None:
+                yield b": keepalive\n\n"
+            else:
+                yield b"event: signal\nid: %d\ndata: %s\n\n" % (snapshot.version, snapshot.body)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/api/signal/batching")
+async def api_signal_batching_stats():
+    """Batch-size and queue-wait metrics of the /api/signal micro-batcher and publisher."""
+    return {**signal_batcher.stats(), "publisher": signal_publisher.stats()}
+
+
+@router.post("/api/signals", response_model=SignalBatchResp)
+async def api_signals(req: SignalBatchReq):
+    """Score a whole watchlist (or a caller-supplied logits matrix) in one pass."""
+    if req.logits is not None:
+        symbols = req.symbols or [None] * len(req.logits)
+        if len(symbols) != len(req.logits):
+            raise HTTPException(status_code=400, detail="symbols e logits devem ter o mesmo tamanho")
+    else:
+        symbols = req.symbols or []
+    if not symbols:
+        return {"symbols": [], "signals": []}
+    if len(symbols) > MAX_BATCH_SIGNALS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_BATCH_SIGNALS} sinais por requisição")
+
+    model_version = get_model_version_or_none()
+    if req.logits is not None:
+        logits, texts = req.logits, None
+    else:
+        try:
+            texts, logits = await generate_signal_batch_from_model(symbols)
+        except Exception as e:
+            error = canonical_signal_response("WAIT", 0.0, f"error: {str(e)[:150]}", model_version=model_version)
+            return {"symbols": symbols, "signals": [error] * len(symbols)}
+
+    if logits is not None:
+        try:
+            signals = interpret_logits_batch(logits, model_version=model_version)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        signals = []
+        for text in texts:
+            parsed = interpret_model_output(text)
+            signals.append(canonical_signal_response(
+                parsed["signal"], parsed["confidence"], parsed["reason"], model_version=model_version,
+            ))
+    return {"symbols": symbols, "signals": signals}
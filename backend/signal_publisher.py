@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from .metrics import CACHE_HITS, CACHE_MISSES
+
+
+class SignalSnapshot:
+    """Immutable, pre-serialized signal shared by every reader until the next refresh."""
+
+    __slots__ = ("symbol", "version", "data", "body", "etag", "expires_at")
+
+    def __init__(self, symbol: Optional[str], version: int, data: Dict[str, Any], expires_at: float):
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        object.__setattr__(self, "symbol", symbol)
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "data", MappingProxyType(dict(data)))
+        object.__setattr__(self, "body", body)
+        object.__setattr__(self, "etag", '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"')
+        object.__setattr__(self, "expires_at", expires_at)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SignalSnapshot is immutable")
+
+    def extended(self, expires_at: float) -> "SignalSnapshot":
+        return SignalSnapshot(self.symbol, self.version, dict(self.data), expires_at)
+
+    def max_age(self) -> int:
+        return max(0, math.ceil(self.expires_at - time.monotonic()))
+
+
+class SignalPublisher:
+    """
+    Computes each symbol's signal at most once per ``refresh_interval`` and
+    serves every reader (polling GETs and push subscribers) from the same
+    snapshot. A refresh that yields the same signal keeps the previous
+    snapshot (same version, timestamp and ETag), so clients only see a change
+    when the model actually produces a new signal.
+    """
+
+    # Fields that identify a signal; the timestamp is not part of its identity
+    IDENTITY_FIELDS = ("signal", "confidence", "reason", "model_version", "explainability")
+
+    def __init__(
+        self,
+        compute: Callable[[Optional[str]], Awaitable[Dict[str, Any]]],
+        refresh_interval: float = 5.0,
+        max_symbols: int = 1000,
+    ):
+        self.compute = compute
+        self.refresh_interval = refresh_interval
+        self.max_symbols = max_symbols
+        self._snapshots: "OrderedDict[Optional[str], SignalSnapshot]" = OrderedDict()
+        self._inflight: Dict[Optional[str], Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self.computations = 0
+        self.reads = 0
+        self.subscribers = 0
+
+    def peek(self, symbol: Optional[str] = None) -> Optional[SignalSnapshot]:
+        return self._snapshots.get(symbol)
+
+    async def get(self, symbol: Optional[str] = None) -> SignalSnapshot:
+        self.reads += 1
+        snapshot = self._snapshots.get(symbol)
+        if snapshot is not None and snapshot.expires_at > time.monotonic():
+            CACHE_HITS.labels("signal_snapshot").inc()
+            return snapshot
+        CACHE_MISSES.labels("signal_snapshot").inc()
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(symbol)
+        if inflight is None or inflight[0] is not loop:
+            task = loop.create_task(self._refresh(symbol))
+            self._inflight[symbol] = (loop, task)
+        else:
+            task = inflight[1]
+        # shield: a cancelled reader must not cancel the refresh other readers are waiting on
+        return await asyncio.shield(task)
+
+    async def _refresh(self, symbol: Optional[str]) -> SignalSnapshot:
+        try:
+            data = await self.compute(symbol)
+            self.computations += 1
+            expires_at = time.monotonic() + self.refresh_interval
+            previous = self._snapshots.get(symbol)
+            if previous is not None and all(previous.data.get(f) == data.get(f) for f in self.IDENTITY_FIELDS):
+                snapshot = previous.extended(expires_at)
+            else:
+                snapshot = SignalSnapshot(symbol, (previous.version + 1) if previous else 1, data, expires_at)
+            self._snapshots[symbol] = snapshot
+            self._snapshots.move_to_end(symbol)
+            while len(self._snapshots) > self.max_symbols:
+                self._snapshots.popitem(last=False)
+            return snapshot
+        finally:
+            self._inflight.pop(symbol, None)
+
+    async def subscribe(self, symbol: Optional[str] = None, keepalive: float = 15.0) -> AsyncIterator[Optional[SignalSnapshot]]:
+        """
+        Yield the current snapshot, then every new version as it is published.
+        Yields None as a keepalive when nothing changed for ``keepalive`` seconds.
+        """
+        self.subscribers += 1
+        try:
+            last_version = None
+            last_sent = time.monotonic()
+            while True:
+                snapshot = await self.get(symbol)
+                now = time.monotonic()
+                if snapshot.version != last_version:
+                    last_version = snapshot.version
+                    last_sent = now
+                    yield snapshot
+                elif now - last_sent >= keepalive:
+                    last_sent = now
+                    yield None
+                await asyncio.sleep(max(0.05, snapshot.expires_at - time.monotonic()))
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> Mapping[str, Any]:
+        return {
+            "refresh_interval": self.refresh_interval,
+            "symbols": len(self._snapshots),
+            "computations": self.computations,
+            "reads": self.reads,
+            "subscribers": self.subscribers,
+        }
@@ -1,15 +1,29 @@
-import re
-import json
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+from . import startup
+from .keywords import KEYWORDS
+
+# NumPy carregada no primeiro sinal interpretado, não na importação do app
+np = startup.lazy_import("numpy")
+
+SIGNAL_LABELS = ("BUY", "SELL", "WAIT")
+WAIT_THRESHOLD = 0.55
 
 
 def softmax(logits):
-    import numpy as np
+    logits = np.asarray(logits, dtype=float)
     e = np.exp(logits - np.max(logits))
     return e / e.sum()
 
 
+def softmax_rows(logits):
+    """Numerically stable row-wise softmax for an (N, K) matrix."""
+    logits = np.asarray(logits, dtype=float)
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
 def interpret_model_output(model_out_text: Optional[str] = None, model_logits=None) -> Dict:
     """
     Return canonical response:
@@ -18,42 +32,60 @@ def interpret_model_output(model_out_text: Optional[str] = None, model_logits=No
     # 1) If logits available -> use probabilities
     if model_logits is not None:
         probs = softmax(model_logits)
-        import numpy as np
         idx = int(np.argmax(probs))
-        labels = ["BUY", "SELL", "WAIT"]
         conf = float(probs[idx])
-        signal = labels[idx]
-        if conf < 0.55:
+        signal = SIGNAL_LABELS[idx]
+        if conf < WAIT_THRESHOLD:
             signal = "WAIT"
         return {"signal": signal, "confidence": round(conf, 4), "reason": "probabilistic classifier"}
 
-    # 2) Else parse text
-    t = (model_out_text or "").lower()
-    if re.search(r"\b(buy|long|compra)\b", t):
+    # 2) Else parse text (single pass over the text for every keyword category)
+    hits = KEYWORDS.scan(model_out_text)
+    if hits.has("signal_buy"):
         sig = "BUY"
-    elif re.search(r"\b(sell|short|venda)\b", t):
+    elif hits.has("signal_sell"):
         sig = "SELL"
-    elif re.search(r"\b(wait|hold|esperar)\b", t):
-        sig = "WAIT"
     else:
         sig = "WAIT"
 
     # confidence heuristic
     conf = 0.7
-    if "strong" in t or "confident" in t:
+    if hits.has("confidence_strong"):
         conf = 0.92
-    elif "weak" in t or "slight" in t:
+    elif hits.has("confidence_weak"):
         conf = 0.6
     return {"signal": sig, "confidence": round(conf, 4), "reason": "parsed from text"}
 
 
+def interpret_logits_batch(logits_matrix, model_version: Optional[str] = None) -> List[Dict]:
+    """
+    Batched counterpart of interpret_model_output for an (N, 3) logits matrix.
+    Softmax, argmax, the WAIT threshold and confidence are computed for the whole
+    matrix at once; each row yields the same dict as
+    canonical_signal_response(**interpret_model_output(model_logits=row)).
+    """
+    logits = np.asarray(logits_matrix, dtype=float)
+    if logits.ndim != 2 or logits.shape[1] != len(SIGNAL_LABELS):
+        raise ValueError(f"expected an (N, {len(SIGNAL_LABELS)}) logits matrix, got shape {logits.shape}")
+    probs = softmax_rows(logits)
+    idx = probs.argmax(axis=1)
+    conf = probs[np.arange(len(idx)), idx]
+    idx = np.where(conf < WAIT_THRESHOLD, SIGNAL_LABELS.index("WAIT"), idx)
+    timestamp = datetime.now(timezone.utc).isoformat()
+    return [
+        canonical_signal_response(SIGNAL_LABELS[i], round(c, 4), "probabilistic classifier",
+                                  model_version=model_version, timestamp=timestamp)
+        for i, c in zip(idx.tolist(), conf.tolist())
+    ]
+
+
 def canonical_signal_response(signal: str, confidence: float, reason: str, model_version: Optional[str] = None,
-                              explainability: Optional[Dict] = None) -> Dict:
+                              explainability: Optional[Dict] = None, timestamp: Optional[str] = None) -> Dict:
     return {
         "signal": signal,
         "confidence": float(max(0.0, min(1.0, confidence))),
         "reason": reason[:200],
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": timestamp or datetime.now(timezone.utc).isoformat(),
         "model_version": model_version,
         **({"explainability": explainability} if explainability is not None else {})
     }
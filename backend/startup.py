@@ -0,0 +1,246 @@
+"""
+Cold-start accounting and deferred imports.
+
+``backend.main`` imports this module first. Importing the app used to pull in
+the Stripe and Supabase SDKs, PyJWT, requests, NumPy and Pillow, load
+``.env`` once per module and connect to Supabase, all before the first
+request could be served. Now:
+
+* ``lazy_import("stripe")`` returns a stand-in that imports the module on
+  first attribute access (``stripe.Customer``, ``np.asarray``) and records
+  how long that first import took. An optional ``on_load`` hook configures
+  the module once (API key, HTTP client).
+* ``load_env()`` reads ``.env`` once per process, however many modules
+  ask for it.
+* Configuration checks that used to log at import time are logged once by
+  the startup hook (``log_startup``), together with the report.
+
+The report (``GET /api/startup``, ``tickrify_startup_*`` gauges) has the
+seconds from the start of the app import to: the end of the import
+(``import_seconds``), the end of the startup hooks (``ready_seconds``) and
+the first response (``first_response_seconds``). It also lists each deferred
+import with its first-use cost and the heavy modules not loaded yet. With
+``STARTUP_PROFILE_IMPORTS=true`` every import made after this module is
+timed (a ``sys.meta_path`` hook, like ``python -X importtime``). The report
+then includes the slowest top-level packages. ``STARTUP_WARMUP=true``
+(default) loads the deferred modules in a background thread once the app is
+serving, so long-running workers do not pay for them on a user request.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import register_stats
+
+_STARTED = time.perf_counter()
+
+# Dependências que não devem ser importadas no cold start (relatório: quais ainda não foram carregadas)
+HEAVY_MODULES = ("stripe", "supabase", "jwt", "requests", "numpy", "PIL")
+
+_phases: Dict[str, float] = {}
+_lazy_imports: Dict[str, float] = {}
+_lazy_modules: List["LazyModule"] = []
+_lock = threading.RLock()
+_env_loaded = False
+
+
+def load_env() -> None:
+    """Load ``.env`` (nearest to the working directory) once per process; never overrides the environment."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if _env_loaded:
+            return
+        try:
+            from dotenv import find_dotenv, load_dotenv
+
+            path = find_dotenv(usecwd=True)
+            if path:
+                load_dotenv(path, override=False)
+        except Exception:
+            # Ausência de .env (ou do python-dotenv) não deve impedir a subida
+            pass
+        _env_loaded = True
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    __slots__ = ("_name", "_on_load", "_module", "_loading")
+
+    def __init__(self, name: str, on_load: Optional[Callable[[Any], None]] = None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        # Uma trava por módulo: o aquecimento importando o Stripe não segura quem precisa do PyJWT
+        self._loading = threading.Lock()
+
+    def _load(self):
+        with self._loading:
+            if self._module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self._name)
+                if self._on_load is not None:
+                    self._on_load(module)
+                _lazy_imports.setdefault(self._name, time.perf_counter() - started)
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._module or self._load(), attribute)
+
+    def __setattr__(self, attribute: str, value: Any) -> None:
+        if attribute in LazyModule.__slots__:
+            object.__setattr__(self, attribute, value)
+        else:
+            # monkeypatch.setattr(ai_service.requests, "post", ...) altera o módulo real
+            setattr(self._module or self._load(), attribute, value)
+
+    def __delattr__(self, attribute: str) -> None:
+        delattr(self._module or self._load(), attribute)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{' (loaded)' if self.loaded else ''}>"
+
+
+def lazy_import(name: str, on_load: Optional[Callable[[Any], None]] = None) -> LazyModule:
+    module = LazyModule(name, on_load)
+    _lazy_modules.append(module)
+    return module
+
+
+class _TimedLoader:
+    def __init__(self, loader, name: str, profiler: "ImportProfiler"):
+        self._loader = loader
+        self._name = name
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.seconds[self._name] = time.perf_counter() - started
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._loader, attribute)
+
+
+class ImportProfiler:
+    """``sys.meta_path`` hook timing each module import, including the imports it triggers."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            find = getattr(finder, "find_spec", None)
+            if finder is self or find is None:
+                continue
+            spec = find(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, name, self)
+            return spec
+        return None
+
+    def top_packages(self, limit: int = 15) -> Dict[str, float]:
+        """Top-level packages by cumulative import time (what each dependency costs)."""
+        packages = sorted(((name, seconds) for name, seconds in self.seconds.items() if "." not in name),
+                          key=lambda item: item[1], reverse=True)
+        return {name: round(seconds, 4) for name, seconds in packages[:limit]}
+
+
+profiler: Optional[ImportProfiler] = None
+if os.getenv("STARTUP_PROFILE_IMPORTS", "false").lower() in ("1", "true", "yes"):
+    profiler = ImportProfiler()
+    sys.meta_path.insert(0, profiler)
+
+
+def mark(phase: str) -> None:
+    """Record the first time ``phase`` is reached (seconds since the app import started)."""
+    if phase not in _phases:
+        _phases[phase] = time.perf_counter() - _STARTED
+
+
+def config_checks() -> List[str]:
+    """Configuration problems worth a warning at startup (environment only; no SDK is imported)."""
+    warnings = []
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if not (openai_key and openai_key.startswith("sk-")):
+        warnings.append("OPENAI_API_KEY inválida ou não encontrada - usando análise local")
+    if not (os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_SERVICE_KEY")):
+        warnings.append("SUPABASE_URL/SUPABASE_SERVICE_KEY ausentes - modo offline/dev ativado")
+    if not os.getenv("SUPABASE_JWT_SECRET"):
+        warnings.append("SUPABASE_JWT_SECRET ausente - autenticação relaxada em desenvolvimento")
+    if not os.getenv("STRIPE_SECRET_KEY"):
+        warnings.append("STRIPE_SECRET_KEY não configurada - Stripe desativado em desenvolvimento")
+    return warnings
+
+
+def report() -> Dict[str, Any]:
+    current: Dict[str, Any] = {f"{phase}_seconds": round(seconds, 4) for phase, seconds in _phases.items()}
+    current["lazy_imports"] = {name: round(seconds, 4) for name, seconds in _lazy_imports.items()}
+    current["lazy_import_seconds"] = round(sum(_lazy_imports.values()), 4)
+    current["deferred"] = [name for name in HEAVY_MODULES if name not in sys.modules]
+    if profiler is not None:
+        current["import_profile"] = profiler.top_packages()
+    return current
+
+
+def log_startup(logger) -> None:
+    for warning in config_checks():
+        logger.warning(warning)
+    logger.info("Aplicação pronta", extra=report())
+
+
+def warm_up(*loaders: Callable[[], Any]) -> Optional[threading.Thread]:
+    """Import every deferred module (and run ``loaders``) in a background thread; no-op if disabled."""
+    if os.getenv("STARTUP_WARMUP", "true").lower() in ("0", "false", "no"):
+        return None
+
+    def run() -> None:
+        for load in [module._load for module in list(_lazy_modules)] + list(loaders):
+            try:
+                load()
+            except Exception:
+                # Falha aqui reaparece (e é tratada) no primeiro uso real
+                pass
+
+    thread = threading.Thread(target=run, name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+class FirstResponseMiddleware:
+    """Pure ASGI middleware recording when the first HTTP response of the process was sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "first_response" in _phases:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marking(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                mark("first_response")
+
+        await self.app(scope, receive, send_marking)
+
+
+register_stats("tickrify_startup", report)
@@ -1,9 +1,13 @@
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
+from . import deadlines
 from .auth import AuthMiddleware, get_current_user_from_request
 from .database import Database, User
 from .stripe_service import StripeService
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api/stripe", tags=["stripe"])
 
@@ -68,11 +72,13 @@ async def create_checkout_session(req: StripeCheckoutRequest, request: Request):
         # Se temos um usuário, registrar a tentativa de checkout
         if user_id:
             # Registrar tentativa de checkout no log
-            print(f"🛒 Checkout iniciado: usuário={user_id}, sessão={session['session_id']}, plano={req.price_id}")
+            logger.info("Checkout iniciado: usuário=%s, sessão=%s, plano=%s", user_id, session['session_id'], req.price_id)
         
         return StripeCheckoutResponse(**session)
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao criar sessão de checkout: {e}")
+        logger.error("Erro ao criar sessão de checkout: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/subscription-status", response_model=Dict[str, Any])
@@ -86,8 +92,10 @@ async def get_subscription_status(subscription_id: str, current_user: User = Dep
         
         # Obter status da assinatura
         return await StripeService.get_subscription_status(subscription_id)
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao obter status da assinatura: {e}")
+        logger.error("Erro ao obter status da assinatura: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/cancel-subscription", response_model=Dict[str, Any])
@@ -110,8 +118,10 @@ async def cancel_subscription(req: StripeSubscriptionRequest, current_user: User
             })
         
         return result
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao cancelar assinatura: {e}")
+        logger.error("Erro ao cancelar assinatura: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/update-subscription", response_model=Dict[str, Any])
@@ -141,8 +151,10 @@ async def update_subscription(req: StripeUpdateSubscriptionRequest, current_user
             })
         
         return result
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao atualizar assinatura: {e}")
+        logger.error("Erro ao atualizar assinatura: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/create-portal-session", response_model=Dict[str, Any])
@@ -156,8 +168,10 @@ async def create_portal_session(req: StripePortalRequest, current_user: User = D
         
         # Criar sessão do portal
         return await StripeService.create_customer_portal_session(req.customer_id, req.return_url)
+    except deadlines.DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao criar sessão do portal: {e}")
+        logger.error("Erro ao criar sessão do portal: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 
@@ -1,18 +1,80 @@
 import os
-import stripe
+import re
+from urllib.parse import urlsplit
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from fastapi import HTTPException
-from dotenv import load_dotenv
+from . import deadlines, startup
 from .database import Database
+from .logging_config import get_logger
+from .tracing import SPAN_KIND_CLIENT, start_span
 
 # Carregar variáveis de ambiente
-load_dotenv()
+startup.load_env()
 
-# Configurar Stripe (modo tolerante em desenvolvimento)
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-if not stripe.api_key:
-    print("\033[93mAVISO: STRIPE_SECRET_KEY não configurada - Stripe desativado em desenvolvimento\033[0m")
+logger = get_logger(__name__)
+
+
+_STRIPE_ID_RE = re.compile(r"^[a-z]+_[A-Za-z0-9_-]*[A-Z0-9][A-Za-z0-9_-]*$")
+
+
+# Limite de cada chamada à API do Stripe (encurtado pelo prazo da requisição, quando houver)
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "20"))
+
+
+def _traced_http_client(stripe_module):
+    class TracedStripeHTTPClient(stripe_module.RequestsClient):
+        """Cliente HTTP do SDK com um span por chamada (inclui as feitas pelos webhooks)"""
+
+        # O SDK lê self._timeout a cada requisição (e a cada nova tentativa): devolver o que resta do prazo
+        @property
+        def _timeout(self):
+            left = deadlines.remaining()
+            if left is None:
+                return self._base_timeout
+            return max(deadlines.MIN_CALL_SECONDS, min(self._base_timeout, left))
+
+        @_timeout.setter
+        def _timeout(self, value):
+            self._base_timeout = value
+
+        def request_with_retries(self, method, url, headers, post_data=None, max_network_retries=None, *,
+                                 _usage=None):
+            # Sem prazo restante, nem começar (o SDK transformaria o erro em APIConnectionError)
+            deadlines.timeout(self._base_timeout, "stripe")
+            path = urlsplit(url).path
+            # IDs (cus_..., sub_...) fora do nome do span para manter a cardinalidade baixa
+            route = "/".join("{id}" if _STRIPE_ID_RE.match(part) else part for part in path.split("/"))
+            with start_span(f"stripe {method.upper()} {route}",
+                            {"http.method": method.upper(), "http.url": path, "peer.service": "stripe"},
+                            SPAN_KIND_CLIENT) as span:
+                body, status, response_headers = super().request_with_retries(
+                    method, url, headers, post_data, max_network_retries, _usage=_usage
+                )
+                span.set_attribute("http.status_code", status)
+                if status >= 400:
+                    span.set_status(False, f"HTTP {status}")
+                return body, status, response_headers
+
+    return TracedStripeHTTPClient(timeout=STRIPE_TIMEOUT_SECONDS)
+
+
+def _configure_stripe(stripe_module) -> None:
+    # Configurar Stripe (modo tolerante em desenvolvimento) no primeiro uso do SDK
+    stripe_module.api_key = os.getenv("STRIPE_SECRET_KEY")
+    if os.getenv("STRIPE_API_BASE"):
+        # Permite apontar para um stand-in local (testes de carga)
+        stripe_module.api_base = os.getenv("STRIPE_API_BASE")
+    stripe_module.default_http_client = _traced_http_client(stripe_module)
+
+
+# O SDK leva ~0,7 s para importar: carregado na primeira chamada (ou pelo aquecimento pós-startup)
+stripe = startup.lazy_import("stripe", on_load=_configure_stripe)
+
+
+async def _stripe(method, *args, **kwargs):
+    """Chamada síncrona do SDK fora do event loop, limitada pelo prazo da requisição"""
+    return await deadlines.to_thread("stripe", STRIPE_TIMEOUT_SECONDS, method, *args, **kwargs)
 
 class StripeService:
     """Serviço para interação com a API do Stripe"""
@@ -64,7 +126,8 @@ class StripeService:
                     else:
                         # Criar novo cliente com os metadados
                         if customer_email:
-                            customer = stripe.Customer.create(
+                            customer = await _stripe(
+                                stripe.Customer.create,
                                 email=customer_email,
                                 name=customer_name,
                                 metadata=metadata
@@ -72,7 +135,7 @@ class StripeService:
                             session_params["customer"] = customer.id
             
             # Criar sessão de checkout
-            session = stripe.checkout.Session.create(**session_params)
+            session = await _stripe(stripe.checkout.Session.create, **session_params)
             
             # Retornar dados da sessão
             return {
@@ -81,10 +144,12 @@ class StripeService:
             }
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao criar sessão de checkout: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao criar sessão de checkout: {e}")
+            logger.error("Erro ao criar sessão de checkout: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
     @staticmethod
@@ -94,7 +159,7 @@ class StripeService:
             if not stripe.api_key:
                 raise HTTPException(status_code=400, detail="Stripe não configurado. Defina STRIPE_SECRET_KEY no .env")
             # Buscar assinatura no Stripe
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = await _stripe(stripe.Subscription.retrieve, subscription_id)
             
             # Retornar dados formatados
             return {
@@ -109,10 +174,12 @@ class StripeService:
             }
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao obter status da assinatura: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao obter status da assinatura: {e}")
+            logger.error("Erro ao obter status da assinatura: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
     @staticmethod
@@ -122,7 +189,7 @@ class StripeService:
             if not stripe.api_key:
                 raise HTTPException(status_code=400, detail="Stripe não configurado. Defina STRIPE_SECRET_KEY no .env")
             # Cancelar assinatura no Stripe
-            canceled_subscription = stripe.Subscription.delete(subscription_id)
+            canceled_subscription = await _stripe(stripe.Subscription.delete, subscription_id)
             
             # Retornar dados da assinatura cancelada
             return {
@@ -132,10 +199,12 @@ class StripeService:
             }
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao cancelar assinatura: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao cancelar assinatura: {e}")
+            logger.error("Erro ao cancelar assinatura: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
     @staticmethod
@@ -145,7 +214,7 @@ class StripeService:
             if not stripe.api_key:
                 raise HTTPException(status_code=400, detail="Stripe não configurado. Defina STRIPE_SECRET_KEY no .env")
             # Buscar assinatura atual
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = await _stripe(stripe.Subscription.retrieve, subscription_id)
             
             # Obter ID do item da assinatura (normalmente é apenas um)
             if not subscription.items.data or len(subscription.items.data) == 0:
@@ -154,7 +223,8 @@ class StripeService:
             item_id = subscription.items.data[0].id
             
             # Atualizar assinatura com novo preço
-            updated_subscription = stripe.Subscription.modify(
+            updated_subscription = await _stripe(
+                stripe.Subscription.modify,
                 subscription_id,
                 items=[{
                     'id': item_id,
@@ -175,10 +245,12 @@ class StripeService:
             }
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao atualizar assinatura: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao atualizar assinatura: {e}")
+            logger.error("Erro ao atualizar assinatura: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
     @staticmethod
@@ -188,7 +260,8 @@ class StripeService:
             if not stripe.api_key:
                 raise HTTPException(status_code=400, detail="Stripe não configurado. Defina STRIPE_SECRET_KEY no .env")
             # Criar sessão do portal
-            session = stripe.billing_portal.Session.create(
+            session = await _stripe(
+                stripe.billing_portal.Session.create,
                 customer=customer_id,
                 return_url=return_url
             )
@@ -199,10 +272,12 @@ class StripeService:
             }
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao criar sessão do portal: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao criar sessão do portal: {e}")
+            logger.error("Erro ao criar sessão do portal: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
     @staticmethod
@@ -210,7 +285,7 @@ class StripeService:
         """Obtém dados de um cliente do Stripe"""
         try:
             # Buscar cliente no Stripe
-            customer = stripe.Customer.retrieve(customer_id)
+            customer = await _stripe(stripe.Customer.retrieve, customer_id)
             
             # Retornar dados do cliente
             return {
@@ -221,10 +296,12 @@ class StripeService:
             }
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao obter cliente: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao obter cliente: {e}")
+            logger.error("Erro ao obter cliente: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     
     @staticmethod
@@ -232,7 +309,8 @@ class StripeService:
         """Lista todas as assinaturas de um cliente"""
         try:
             # Buscar assinaturas do cliente
-            subscriptions = stripe.Subscription.list(
+            subscriptions = await _stripe(
+                stripe.Subscription.list,
                 customer=customer_id,
                 status='all',
                 limit=10
@@ -251,10 +329,12 @@ class StripeService:
             } for sub in subscriptions.data]
             
         except stripe.error.StripeError as e:
-            print(f"❌ Erro Stripe: {e}")
+            logger.error("Erro Stripe: %s", e)
             raise HTTPException(status_code=400, detail=f"Erro ao listar assinaturas: {str(e)}")
+        except deadlines.DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"❌ Erro ao listar assinaturas: {e}")
+            logger.error("Erro ao listar assinaturas: %s", e)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 
@@ -3,20 +3,24 @@ import json
 import uuid
 from datetime import datetime, timedelta
 from fastapi import FastAPI, Request, Header, HTTPException, Depends
-import stripe
-from dotenv import load_dotenv
-from .database import Database, Subscription
+from . import startup
+from .database import Database, Subscription, _execute, get_supabase_client
+from .logging_config import get_logger
+from .stripe_service import stripe
+from .tracing import traced
 
 # Carregar variáveis de ambiente
-load_dotenv()
+startup.load_env()
 
-# Configurar Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+logger = get_logger(__name__)
+
+# Configurar Stripe: o SDK (chave, cliente HTTP) é configurado em stripe_service no primeiro uso
 endpoint_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
 app = FastAPI(title="Tickrify Stripe Webhooks", version="1.0.0")
 
 @app.post("/webhook/stripe")
+@traced("stripe_webhook")
 async def stripe_webhook(request: Request, stripe_signature: str = Header(None)):
     """Endpoint para receber eventos do Stripe Webhook"""
     try:
@@ -25,7 +29,7 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
         payload_str = payload.decode("utf-8")
         
         # Log para debug
-        print(f"📦 Webhook recebido: {stripe_signature[:10]}...")
+        logger.debug("Webhook recebido")
         
         # Verificar assinatura do webhook
         try:
@@ -33,24 +37,24 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
                 payload_str, stripe_signature, endpoint_secret
             )
         except ValueError as e:
-            print(f"❌ Erro ao analisar payload: {e}")
+            logger.error("Erro ao analisar payload: %s", e)
             raise HTTPException(status_code=400, detail="Payload inválido")
         except stripe.error.SignatureVerificationError as e:
-            print(f"❌ Assinatura inválida: {e}")
+            logger.error("Assinatura inválida: %s", e)
             raise HTTPException(status_code=400, detail="Assinatura inválida")
         
         # Idempotência: evitar reprocessamento
         try:
-            from .database import supabase_client
-            exists = supabase_client.table("stripe_webhook_events").select("id").eq("id", event["id"]).execute()
+            client = get_supabase_client()
+            exists = await _execute(client.table("stripe_webhook_events").select("id").eq("id", event["id"]))
             if exists.data:
                 return {"status": "ignored", "reason": "duplicate", "event_id": event["id"]}
-            supabase_client.table("stripe_webhook_events").insert({"id": event["id"]}).execute()
+            await _execute(client.table("stripe_webhook_events").insert({"id": event["id"]}))
         except Exception as _:
             pass
 
         # Log do tipo de evento
-        print(f"✅ Evento Stripe validado: {event['type']}")
+        logger.info("Evento Stripe validado: %s", event['type'])
         
         # Processar diferentes tipos de eventos
         if event["type"] == "checkout.session.completed":
@@ -72,21 +76,22 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
         return {"status": "success", "event_type": event["type"]}
     
     except Exception as e:
-        print(f"❌ Erro ao processar webhook: {e}")
+        logger.error("Erro ao processar webhook: %s", e)
         # Não reenviar erro 500 para o Stripe, pois ele tentará reenviar o webhook
         return {"status": "error", "message": str(e)}
 
+@traced("stripe_webhook.checkout_session_completed")
 async def handle_checkout_session_completed(session):
     """Processa evento de checkout.session.completed"""
     try:
-        print(f"💰 Checkout concluído: {session.id}")
+        logger.info("Checkout concluído: %s", session.id)
         
         # Obter detalhes da sessão
         customer_id = session.get("customer")
         subscription_id = session.get("subscription")
         
         if not customer_id:
-            print("⚠️ Checkout sem customer_id, ignorando")
+            logger.warning("Checkout sem customer_id, ignorando")
             return
         
         # Obter cliente para extrair metadados
@@ -94,13 +99,13 @@ async def handle_checkout_session_completed(session):
         user_id = customer.metadata.get("user_id")
         
         if not user_id:
-            print(f"⚠️ Cliente sem user_id nos metadados: {customer_id}")
+            logger.warning("Cliente sem user_id nos metadados: %s", customer_id)
             # Tentar buscar pelo email
             user = await Database.get_user_by_email(customer.email)
             if user:
                 user_id = user.id
             else:
-                print(f"❌ Não foi possível associar o cliente a um usuário: {customer.email}")
+                logger.error("Não foi possível associar o cliente a um usuário: %s", customer.email)
                 return
         
         # Se for uma assinatura
@@ -112,7 +117,7 @@ async def handle_checkout_session_completed(session):
             price_id = subscription.items.data[0].price.id if subscription.items.data else None
             
             if not price_id:
-                print(f"❌ Assinatura sem price_id: {subscription_id}")
+                logger.error("Assinatura sem price_id: %s", subscription_id)
                 return
             
             # Mapear price_id para tipo de plano
@@ -143,9 +148,9 @@ async def handle_checkout_session_completed(session):
             result = await Database.create_subscription(subscription_data)
             
             if result:
-                print(f"✅ Assinatura criada com sucesso: {result.id}")
+                logger.info("Assinatura criada com sucesso: %s", result.id)
             else:
-                print(f"❌ Erro ao criar assinatura para usuário {user_id}")
+                logger.error("Erro ao criar assinatura para usuário %s", user_id)
         
         # Se for um pagamento único
         else:
@@ -153,30 +158,31 @@ async def handle_checkout_session_completed(session):
             pass
     
     except Exception as e:
-        print(f"❌ Erro ao processar checkout.session.completed: {e}")
+        logger.error("Erro ao processar checkout.session.completed: %s", e)
 
+@traced("stripe_webhook.invoice_payment_succeeded")
 async def handle_invoice_payment_succeeded(invoice):
     """Processa evento de invoice.payment_succeeded"""
     try:
-        print(f"💳 Pagamento de fatura bem-sucedido: {invoice.id}")
+        logger.info("Pagamento de fatura bem-sucedido: %s", invoice.id)
         
         # Obter IDs relevantes
         customer_id = invoice.get("customer")
         subscription_id = invoice.get("subscription")
         
         if not subscription_id or not customer_id:
-            print("⚠️ Fatura sem subscription_id ou customer_id, ignorando")
+            logger.warning("Fatura sem subscription_id ou customer_id, ignorando")
             return
         
         # Buscar assinatura existente
         db_subscription = await Database.get_subscription_by_stripe_id(subscription_id)
         
         if not db_subscription:
-            print(f"⚠️ Assinatura não encontrada no banco de dados: {subscription_id}")
+            logger.warning("Assinatura não encontrada no banco de dados: %s", subscription_id)
             # Tentar buscar usuário pelo customer_id
             user = await Database.get_user_by_stripe_customer_id(customer_id)
             if not user:
-                print(f"❌ Não foi possível encontrar usuário para customer_id: {customer_id}")
+                logger.error("Não foi possível encontrar usuário para customer_id: %s", customer_id)
                 return
             
             # Obter detalhes da assinatura do Stripe
@@ -186,7 +192,7 @@ async def handle_invoice_payment_succeeded(invoice):
             price_id = stripe_subscription.items.data[0].price.id if stripe_subscription.items.data else None
             
             if not price_id:
-                print(f"❌ Assinatura sem price_id: {subscription_id}")
+                logger.error("Assinatura sem price_id: %s", subscription_id)
                 return
             
             # Mapear price_id para tipo de plano
@@ -217,9 +223,9 @@ async def handle_invoice_payment_succeeded(invoice):
             result = await Database.create_subscription(subscription_data)
             
             if result:
-                print(f"✅ Assinatura criada com sucesso: {result.id}")
+                logger.info("Assinatura criada com sucesso: %s", result.id)
             else:
-                print(f"❌ Erro ao criar assinatura para usuário {user.id}")
+                logger.error("Erro ao criar assinatura para usuário %s", user.id)
         else:
             # Atualizar assinatura existente
             # Obter detalhes da assinatura do Stripe
@@ -243,23 +249,24 @@ async def handle_invoice_payment_succeeded(invoice):
             result = await Database.update_subscription(db_subscription.id, subscription_update)
             
             if result:
-                print(f"✅ Assinatura atualizada com sucesso: {result.id}")
+                logger.info("Assinatura atualizada com sucesso: %s", result.id)
             else:
-                print(f"❌ Erro ao atualizar assinatura {db_subscription.id}")
+                logger.error("Erro ao atualizar assinatura %s", db_subscription.id)
     
     except Exception as e:
-        print(f"❌ Erro ao processar invoice.payment_succeeded: {e}")
+        logger.error("Erro ao processar invoice.payment_succeeded: %s", e)
 
+@traced("stripe_webhook.subscription_updated")
 async def handle_subscription_updated(subscription):
     """Processa evento de customer.subscription.updated"""
     try:
-        print(f"🔄 Assinatura atualizada: {subscription.id}")
+        logger.info("Assinatura atualizada: %s", subscription.id)
         
         # Buscar assinatura existente
         db_subscription = await Database.get_subscription_by_stripe_id(subscription.id)
         
         if not db_subscription:
-            print(f"⚠️ Assinatura não encontrada no banco de dados: {subscription.id}")
+            logger.warning("Assinatura não encontrada no banco de dados: %s", subscription.id)
             return
         
         # Extrair informações relevantes
@@ -285,53 +292,55 @@ async def handle_subscription_updated(subscription):
         result = await Database.update_subscription(db_subscription.id, subscription_update)
         
         if result:
-            print(f"✅ Assinatura atualizada com sucesso: {result.id}")
+            logger.info("Assinatura atualizada com sucesso: %s", result.id)
         else:
-            print(f"❌ Erro ao atualizar assinatura {db_subscription.id}")
+            logger.error("Erro ao atualizar assinatura %s", db_subscription.id)
     
     except Exception as e:
-        print(f"❌ Erro ao processar customer.subscription.updated: {e}")
+        logger.error("Erro ao processar customer.subscription.updated: %s", e)
 
+@traced("stripe_webhook.subscription_deleted")
 async def handle_subscription_deleted(subscription):
     """Processa evento de customer.subscription.deleted"""
     try:
-        print(f"❌ Assinatura cancelada: {subscription.id}")
+        logger.info("Assinatura cancelada: %s", subscription.id)
         
         # Buscar assinatura existente
         db_subscription = await Database.get_subscription_by_stripe_id(subscription.id)
         
         if not db_subscription:
-            print(f"⚠️ Assinatura não encontrada no banco de dados: {subscription.id}")
+            logger.warning("Assinatura não encontrada no banco de dados: %s", subscription.id)
             return
         
         # Cancelar assinatura
         result = await Database.cancel_subscription(db_subscription.id)
         
         if result:
-            print(f"✅ Assinatura cancelada com sucesso: {db_subscription.id}")
+            logger.info("Assinatura cancelada com sucesso: %s", db_subscription.id)
         else:
-            print(f"❌ Erro ao cancelar assinatura {db_subscription.id}")
+            logger.error("Erro ao cancelar assinatura %s", db_subscription.id)
     except Exception as e:
-        print(f"❌ Erro ao processar customer.subscription.deleted: {e}")
+        logger.error("Erro ao processar customer.subscription.deleted: %s", e)
 
+@traced("stripe_webhook.invoice_payment_failed")
 async def handle_invoice_payment_failed(invoice):
     """Marca assinatura como inativa em caso de falha de pagamento"""
     try:
         subscription_id = invoice.get("subscription")
         if not subscription_id:
-            print("⚠️ Falha sem subscription_id, ignorando")
+            logger.warning("Falha sem subscription_id, ignorando")
             return
         db_subscription = await Database.get_subscription_by_stripe_id(subscription_id)
         if not db_subscription:
-            print(f"⚠️ Assinatura não encontrada para falha: {subscription_id}")
+            logger.warning("Assinatura não encontrada para falha: %s", subscription_id)
             return
         await Database.update_subscription(db_subscription.id, {
             "is_active": False,
             "status": "past_due"
         })
-        print(f"❌ Pagamento falhou, assinatura marcada como inativa: {db_subscription.id}")
+        logger.warning("Pagamento falhou, assinatura marcada como inativa: %s", db_subscription.id)
     except Exception as e:
-        print(f"❌ Erro ao processar invoice.payment_failed: {e}")
+        logger.error("Erro ao processar invoice.payment_failed: %s", e)
 
 def map_price_id_to_plan_type(price_id: str) -> str:
     """Mapeia o price_id do Stripe para o tipo de plano"""
@@ -0,0 +1,456 @@
+"""
+Lightweight tracing for request waterfalls, exported as OTLP/JSON.
+
+Spans nest through a contextvar, so they follow awaits and ``asyncio.to_thread``;
+use ``run_in_executor``/``wrap_context`` for other executors and threads.
+Finished traces are handed to a background exporter thread: one
+ExportTraceServiceRequest JSON object per line in a file (the format of the
+OpenTelemetry collector's file exporter) or POSTed to an OTLP/HTTP collector.
+
+Environment:
+- TRACE_EXPORTER        "" (off, default), "file" or "otlp"
+- TRACE_FILE            file for the file exporter (default logs/traces.jsonl)
+- TRACE_OTLP_ENDPOINT   collector URL (default http://127.0.0.1:4318/v1/traces)
+- TRACE_SAMPLE_RATE     head sampling probability for new traces (default 1.0)
+- TRACE_TAIL_MIN_MS     also keep unsampled traces at least this slow, e.g. 10000
+- TRACE_TAIL_ERRORS     also keep unsampled traces with an error span (default 1)
+- TRACE_SERVICE_NAME    resource service.name (default tickrify-api)
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .logging_config import get_logger, request_id_var
+
+logger = get_logger(__name__)
+
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+MAX_SPANS_PER_TRACE = 1024
+
+
+class _Trace:
+    __slots__ = ("trace_id", "sampled", "spans", "has_error")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.has_error = False
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace", "span_id", "parent_id", "is_root", "start_ns", "end_ns",
+                 "attributes", "status", "status_message", "_token")
+
+    def __init__(self, name: str, trace: _Trace, parent_id: Optional[str], is_root: bool, kind: int,
+                 attributes: Optional[Dict[str, Any]]):
+        self.name = name
+        self.kind = kind
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.is_root = is_root
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes else {}
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_status(self, ok: bool, message: str = "") -> None:
+        self.status = STATUS_OK if ok else STATUS_ERROR
+        self.status_message = message
+        if not ok:
+            self.trace.has_error = True
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)[:500]
+        self.set_status(False, str(exc)[:200])
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def end(self) -> None:
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        trace = self.trace
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(self)
+        if self.is_root:
+            _finish_trace(trace, self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None and not isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+            self.record_exception(exc)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.end()
+
+
+class _NoopSpan:
+    """Returned when tracing is off or the trace will never be exported."""
+
+    trace_id = ""
+    span_id = ""
+    recording = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_status(self, ok, message=""):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+    def traceparent(self) -> str:
+        return ""
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class _SuppressedSpan(_NoopSpan):
+    """Current span of an unsampled trace: keeps its children from starting new traces."""
+
+    def __init__(self):
+        self._tokens: List[contextvars.Token] = []
+
+    def __enter__(self):
+        self._tokens.append(_current_span.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        if self._tokens:
+            _current_span.reset(self._tokens.pop())
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Any] = contextvars.ContextVar("current_span", default=None)
+
+
+class _Config:
+    def __init__(self):
+        self.exporter = os.getenv("TRACE_EXPORTER", "").strip().lower()
+        self.sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+        tail_ms = os.getenv("TRACE_TAIL_MIN_MS", "").strip()
+        self.tail_min_ns = int(float(tail_ms) * 1_000_000) if tail_ms else None
+        self.tail_errors = os.getenv("TRACE_TAIL_ERRORS", "1").lower() in ("1", "true", "yes", "on")
+        self.service_name = os.getenv("TRACE_SERVICE_NAME", "tickrify-api")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporter)
+
+    @property
+    def tail_sampling(self) -> bool:
+        return self.tail_min_ns is not None or self.tail_errors
+
+
+_config: Optional[_Config] = None
+_exporter: Optional["_Exporter"] = None
+_config_lock = threading.Lock()
+
+
+def _get_config() -> _Config:
+    global _config, _exporter
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                config = _Config()
+                if config.exporter:
+                    _exporter = _Exporter(config)
+                _config = config
+    return _config
+
+
+def configure_tracing(exporter: Optional["_Exporter"] = None) -> None:
+    """Re-read TRACE_* env (tests, reloads); optionally install a custom exporter."""
+    global _config, _exporter
+    with _config_lock:
+        if _exporter is not None:
+            _exporter.close()
+        config = _Config()
+        if exporter is not None:
+            config.exporter = config.exporter or "custom"
+            _exporter = exporter
+        else:
+            _exporter = _Exporter(config) if config.exporter else None
+        _config = config
+
+
+def _parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    try:
+        sampled = bool(int(parts[3][:2], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None, kind: int = SPAN_KIND_INTERNAL,
+               traceparent: Optional[str] = None):
+    """
+    Start a span as a child of the current one (or a new trace). Use as a
+    context manager; the span becomes current inside the ``with`` block.
+    """
+    config = _get_config()
+    if not config.enabled:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    if isinstance(parent, _NoopSpan):
+        return NOOP_SPAN
+    if parent is not None:
+        return Span(name, parent.trace, parent.span_id, False, kind, attributes)
+    remote = _parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < config.sample_rate
+    if not sampled and not config.tail_sampling:
+        return _SuppressedSpan()
+    return Span(name, _Trace(trace_id, sampled), parent_id, True, kind, attributes)
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced(name: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL, **attributes: Any):
+    """Decorator wrapping a sync or async function in a span."""
+
+    def decorator(func: Callable):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name, attributes, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name, attributes, kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def wrap_context(func: Callable) -> Callable:
+    """Bind ``func`` to the current context (current span) for another thread."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+async def run_in_executor(func: Callable, *args: Any, executor=None) -> Any:
+    """``loop.run_in_executor`` that keeps the current span as parent in the worker thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(contextvars.copy_context().run, func, *args))
+
+
+def _finish_trace(trace: _Trace, root: Span) -> None:
+    config = _get_config()
+    keep = trace.sampled
+    if not keep and config.tail_min_ns is not None and root.end_ns - root.start_ns >= config.tail_min_ns:
+        keep = True
+    if not keep and config.tail_errors and trace.has_error:
+        keep = True
+    if keep and _exporter is not None:
+        _exporter.submit(trace.spans)
+
+
+# --- OTLP/JSON export ------------------------------------------------------
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _span_to_otlp(span: Span) -> Dict[str, Any]:
+    out = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_attribute(k, v) for k, v in span.attributes.items()],
+        "status": {"code": span.status, **({"message": span.status_message} if span.status_message else {})},
+    }
+    if span.parent_id:
+        out["parentSpanId"] = span.parent_id
+    return out
+
+
+def to_otlp(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", service_name)]},
+        "scopeSpans": [{"scope": {"name": "tickrify.tracing"}, "spans": [_span_to_otlp(s) for s in spans]}],
+    }]}
+
+
+class _Exporter:
+    """Background exporter: never blocks the request path, drops traces when the queue is full."""
+
+    def __init__(self, config: _Config, max_queue: int = 2048):
+        self.config = config
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue(max_queue)
+        self.exported = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, spans: List[Span]) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < 64:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._export(batch)
+                    return
+                batch.append(more)
+            self._export(batch)
+
+    def _export(self, traces: List[List[Span]]) -> None:
+        try:
+            self.export(traces)
+            self.exported += len(traces)
+        except Exception as e:
+            self.dropped += len(traces)
+            logger.warning("Falha ao exportar traces: %s", e)
+
+    def export(self, traces: List[List[Span]]) -> None:
+        if self.config.exporter == "file":
+            path = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                for spans in traces:
+                    f.write(json.dumps(to_otlp(spans, self.config.service_name), separators=(",", ":")) + "\n")
+        elif self.config.exporter == "otlp":
+            endpoint = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+            body = to_otlp([s for spans in traces for s in spans], self.config.service_name)
+            req = urllib.request.Request(endpoint, data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                resp.read()
+
+    def close(self, timeout: float = 5.0) -> None:
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+def shutdown_tracing() -> None:
+    if _exporter is not None:
+        _exporter.close()
+
+
+atexit.register(shutdown_tracing)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: one SERVER span per request, named after the route
+    template, continuing an incoming W3C ``traceparent`` when present.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _get_config().enabled:
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        method = scope.get("method", "")
+        with start_span(f"HTTP {method}", {"http.method": method, "http.target": scope.get("path", "")},
+                        SPAN_KIND_SERVER, traceparent) as span:
+            request_id = request_id_var.get()
+            if request_id:
+                span.set_attribute("request.id", request_id)
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(False, f"HTTP {message['status']}")
+                    if span.recording:
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"x-trace-id", span.trace_id.encode("latin-1"))]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = scope.get("route")
+                route_path = getattr(route, "path_format", None) or getattr(route, "path", None)
+                if route_path and span.recording:
+                    span.name = f"{method} {route_path}"
+                    span.set_attribute("http.route", route_path)
@@ -0,0 +1,181 @@
+"""
+Chart image ingestion for the analysis endpoints.
+
+Besides the original JSON body (``{"image_base64": ..., "user_id": ...}``)
+the endpoints accept ``multipart/form-data`` (``image`` file field, optional
+``user_id`` field) and raw ``image/*`` bodies (user id from ``?user_id=``,
+``X-User-Id`` or the bearer token). Binary bodies are streamed straight into
+a temporary file; every path enforces ``MAX_IMAGE_UPLOAD_MB`` while reading
+and rejects oversized bodies with 413 as soon as the limit is crossed (or up
+front when ``Content-Length`` already exceeds it).
+"""
+import asyncio
+import base64
+import hashlib
+import math
+import os
+import tempfile
+from typing import AsyncIterator, NamedTuple, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+MAX_IMAGE_BYTES = int(float(os.getenv("MAX_IMAGE_UPLOAD_MB", "10")) * 1024 * 1024)
+# Base64 infla 4/3; folga para os demais campos do JSON/multipart
+_ENVELOPE_SLACK = 64 * 1024
+
+IMAGE_FIELDS = ("image", "file")
+_COPY_CHUNK = 256 * 1024
+
+
+class ChartAnalysisRequest(BaseModel):
+    image_base64: str
+    user_id: str
+
+
+class ChartUpload(NamedTuple):
+    user_id: Optional[str]
+    image_path: str
+    size: int
+    sha256: str  # dos bytes da imagem (deduplicação de requisições idênticas)
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    limit = f"{max_bytes / (1024 * 1024):g} MB" if max_bytes >= 1024 * 1024 else f"{max_bytes // 1024} KB"
+    return HTTPException(status_code=413, detail=f"Imagem excede o limite de {limit}")
+
+
+async def _capped_stream(request: Request, limit: int, max_bytes: int) -> AsyncIterator[bytes]:
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(max_bytes)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _too_large(max_bytes)
+        yield chunk
+
+
+def write_temp_image(data: bytes) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
+        temp_file.write(data)
+        return temp_file.name
+
+
+def _decode_base64(base64_string: str) -> bytes:
+    try:
+        # Remove o prefixo data:image/... se presente
+        if "," in base64_string:
+            base64_string = base64_string.split(",")[1]
+        return base64.b64decode(base64_string)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao decodificar imagem: {str(e)}")
+
+
+def decode_base64_image(base64_string: str) -> str:
+    """Decodifica imagem base64 e salva como arquivo temporário"""
+    return write_temp_image(_decode_base64(base64_string))
+
+
+def _store_base64_image(base64_string: str, max_bytes: int) -> ChartUpload:
+    # Mesmo limite dos corpos binários, aplicado à imagem decodificada
+    data = _decode_base64(base64_string)
+    if len(data) > max_bytes:
+        raise _too_large(max_bytes)
+    return ChartUpload(None, write_temp_image(data), len(data), hashlib.sha256(data).hexdigest())
+
+
+async def _receive_raw(request: Request, max_bytes: int) -> ChartUpload:
+    size = 0
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
+        try:
+            async for chunk in _capped_stream(request, max_bytes, max_bytes):
+                temp_file.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    user_id = request.query_params.get("user_id") or request.headers.get("x-user-id")
+    return ChartUpload(user_id, temp_file.name, size, digest.hexdigest())
+
+
+async def _receive_multipart(request: Request, max_bytes: int) -> ChartUpload:
+    parser = MultiPartParser(request.headers, _capped_stream(request, max_bytes + _ENVELOPE_SLACK, max_bytes),
+                             max_files=1, max_fields=8)
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=f"Multipart inválido: {e.message}")
+    try:
+        upload = next((form[name] for name in IMAGE_FIELDS if hasattr(form.get(name), "file")), None)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Campo de arquivo 'image' ausente")
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
+            # O parser já guardou o arquivo em um SpooledTemporaryFile (memória até 1 MB, depois disco)
+            upload.file.seek(0)
+            for chunk in iter(lambda: upload.file.read(_COPY_CHUNK), b""):
+                temp_file.write(chunk)
+                digest.update(chunk)
+            size = temp_file.tell()
+    finally:
+        await form.close()
+    if size > max_bytes:
+        os.unlink(temp_file.name)
+        raise _too_large(max_bytes)
+    user_id = form.get("user_id") or request.query_params.get("user_id") or request.headers.get("x-user-id")
+    return ChartUpload(user_id if isinstance(user_id, str) else None, temp_file.name, size, digest.hexdigest())
+
+
+async def _receive_json(request: Request, max_bytes: int) -> ChartUpload:
+    limit = math.ceil(max_bytes * 4 / 3) + _ENVELOPE_SLACK
+    body = bytearray()
+    async for chunk in _capped_stream(request, limit, max_bytes):
+        body += chunk
+    try:
+        # Validação direto dos bytes (parser JSON do pydantic-core), sem passar por dict intermediário
+        payload = ChartAnalysisRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    del body
+    if not payload.image_base64 or not payload.user_id:
+        raise HTTPException(status_code=400, detail="Dados de entrada inválidos")
+    # Decodificação e escrita fora do event loop (até MAX_IMAGE_UPLOAD_MB por requisição)
+    upload = await asyncio.to_thread(_store_base64_image, payload.image_base64, max_bytes)
+    return upload._replace(user_id=payload.user_id)
+
+
+async def receive_chart_upload(request: Request, max_bytes: Optional[int] = None) -> ChartUpload:
+    """Read the chart image from a JSON, multipart or raw ``image/*`` body into a temporary file."""
+    max_bytes = max_bytes or MAX_IMAGE_BYTES
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type.startswith("image/") or content_type == "application/octet-stream":
+        return await _receive_raw(request, max_bytes)
+    if content_type == "multipart/form-data":
+        return await _receive_multipart(request, max_bytes)
+    if content_type in ("", "application/json") or content_type.endswith("+json"):
+        return await _receive_json(request, max_bytes)
+    raise HTTPException(status_code=415, detail="Use application/json, multipart/form-data ou image/*")
+
+
+# OpenAPI: o corpo é lido manualmente, então os formatos aceitos são declarados aqui
+CHART_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": ChartAnalysisRequest.model_json_schema()},
+            "multipart/form-data": {"schema": {
+                "type": "object",
+                "required": ["image"],
+                "properties": {"image": {"type": "string", "format": "binary"}, "user_id": {"type": "string"}},
+            }},
+            "image/*": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
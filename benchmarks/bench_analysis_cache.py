@@ -0,0 +1,108 @@
+"""
+Shared on-disk analysis cache (backend.disk_cache) under several workers.
+
+Run from the repository root:
+    python -m benchmarks.bench_analysis_cache [--workers 4] [--requests 20000]
+
+1. Hit rate: a Zipf-distributed stream of chart uploads (popular screenshots
+   are re-sent by many users) spread round-robin over N workers, comparing a
+   per-process cache (what the in-memory layers give) with the shared file.
+   A restart halfway through empties the per-process caches only.
+2. Latency: N processes read and write the same file concurrently; prints
+   p50/p99 of hits and writes.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from backend.disk_cache import DiskCache
+
+_RESULT = {"acao": "compra", "justificativa": "BTCUSDT: rompimento da resistência com volume crescente"}
+
+
+def _zipf_stream(requests: int, images: int, seed: int = 7) -> List[int]:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(images)]
+    return rng.choices(range(images), weights=weights, k=requests)
+
+
+def hit_rates(workers: int, requests: int, images: int) -> Dict[str, float]:
+    stream = _zipf_stream(requests, images)
+    local: List[set] = [set() for _ in range(workers)]
+    shared, local_hits, shared_hits = set(), 0, 0
+    for i, image in enumerate(stream):
+        if i == len(stream) // 2:
+            local = [set() for _ in range(workers)]  # deploy/restart: memória dos processos zerada
+        worker = local[i % workers]
+        local_hits += image in worker
+        shared_hits += image in shared
+        worker.add(image)
+        shared.add(image)
+    return {"per_process": local_hits / requests, "shared": shared_hits / requests}
+
+
+def _worker(path: str, worker: int, operations: int, keys: int, queue) -> None:
+    cache = DiskCache(path)
+    rng = random.Random(worker)
+    reads, writes = [], []
+    for _ in range(operations):
+        key = f"{rng.randrange(keys):064x}|chart_analysis@v2"
+        started = time.perf_counter()
+        if cache.get("chart_analysis", key) is None:
+            reads.append(None)
+            started = time.perf_counter()
+            cache.put("chart_analysis", key, _RESULT)
+            writes.append(time.perf_counter() - started)
+        else:
+            reads.append(time.perf_counter() - started)
+    queue.put(([r for r in reads if r is not None], writes))
+
+
+def latency(workers: int, operations: int, keys: int) -> Dict[str, float]:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "analysis.sqlite3")
+        DiskCache(path).stats()  # cria o arquivo antes dos workers
+        processes = [context.Process(target=_worker, args=(path, w, operations, keys, queue)) for w in range(workers)]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+    hits = sorted(t for reads, _ in results for t in reads)
+    writes = sorted(t for _, w in results for t in w)
+
+    def percentile(values: List[float], q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))] * 1e6 if values else 0.0
+
+    return {
+        "hits": len(hits), "writes": len(writes),
+        "hit_p50_us": percentile(hits, 0.5), "hit_p99_us": percentile(hits, 0.99),
+        "write_p50_us": percentile(writes, 0.5), "write_p99_us": percentile(writes, 0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--operations", type=int, default=5000)
+    args = parser.parse_args()
+    print(f"{'workers':>8} {'per-process hit rate':>21} {'shared hit rate':>16}")
+    for workers in sorted({1, 2, 4, args.workers}):
+        rates = hit_rates(workers, args.requests, args.images)
+        print(f"{workers:>8} {rates['per_process']:>21.1%} {rates['shared']:>16.1%}")
+    measured = latency(args.workers, args.operations, keys=args.operations)
+    print(f"\n{args.workers} processes, {measured['hits']} hits / {measured['writes']} writes: "
+          f"hit p50 {measured['hit_p50_us']:.0f} us, p99 {measured['hit_p99_us']:.0f} us; "
+          f"write p50 {measured['write_p50_us']:.0f} us, p99 {measured['write_p99_us']:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Precision/recall and latency of the chart pre-screen (backend.chart_screen)
+on the labelled synthetic set from benchmarks.chart_samples.
+
+Run from the repository root:
+    python -m benchmarks.bench_chart_screen [-n 400] [--seed 11] [--format png|jpeg]
+
+"Positive" means "likely a chart" (accepted). Recall is the share of real
+charts let through, which is what users feel; precision is the share of
+accepted uploads that really are charts, which is what the provider bill feels.
+"""
+import argparse
+import statistics
+import tempfile
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from backend.chart_screen import screen_image, screen_threshold
+
+from .chart_samples import labelled_samples
+
+THRESHOLDS = (0.1, 0.2, 0.3, 0.45, 0.6, 0.75)
+
+
+def precision_recall(scored: List[Tuple[float, bool]], threshold: float) -> Dict[str, float]:
+    tp = sum(1 for score, chart in scored if chart and score >= threshold)
+    fp = sum(1 for score, chart in scored if not chart and score >= threshold)
+    fn = sum(1 for score, chart in scored if chart and score < threshold)
+    return {
+        "precision": tp / (tp + fp) if tp + fp else 1.0,
+        "recall": tp / (tp + fn) if tp + fn else 1.0,
+        "false_accepts": fp,
+        "false_rejects": fn,
+    }
+
+
+def run(n: int, seed: int, image_format: str) -> Dict[str, object]:
+    scored: List[Tuple[float, bool]] = []
+    seconds: List[float] = []
+    rejected_by_kind: Dict[str, Counter] = defaultdict(Counter)
+    threshold = screen_threshold()
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, sample in enumerate(labelled_samples(n, seed)):
+            # Pelo disco, como no endpoint (inclui o custo de decodificar PNG/JPEG)
+            path = Path(tmp) / f"{i}.{image_format}"
+            sample.image.save(path, format="JPEG" if image_format == "jpeg" else "PNG")
+            result = screen_image(str(path))
+            scored.append((result.score, sample.is_chart))
+            seconds.append(result.seconds)
+            rejected_by_kind[sample.kind]["rejected" if not result.likely_chart else "accepted"] += 1
+    seconds.sort()
+    return {
+        "samples": len(scored),
+        "charts": sum(1 for _, chart in scored if chart),
+        "threshold": threshold,
+        "at_threshold": precision_recall(scored, threshold),
+        "sweep": {t: precision_recall(scored, t) for t in THRESHOLDS},
+        "by_kind": {kind: dict(c) for kind, c in sorted(rejected_by_kind.items())},
+        "ms_p50": statistics.median(seconds) * 1000,
+        "ms_p95": seconds[int(len(seconds) * 0.95) - 1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--format", choices=("png", "jpeg"), default="png")
+    args = parser.parse_args()
+    report = run(args.n, args.seed, args.format)
+    at = report["at_threshold"]
+    print(f"{report['samples']} samples ({report['charts']} charts), {args.format}, "
+          f"threshold {report['threshold']}: precision {at['precision']:.3f} recall {at['recall']:.3f} "
+          f"| screen p50 {report['ms_p50']:.1f} ms p95 {report['ms_p95']:.1f} ms")
+    print(f"{'threshold':>10} {'precision':>10} {'recall':>8} {'false acc':>10} {'false rej':>10}")
+    for threshold, row in report["sweep"].items():
+        print(f"{threshold:>10} {row['precision']:>10.3f} {row['recall']:>8.3f} "
+              f"{row['false_accepts']:>10} {row['false_rejects']:>10}")
+    for kind, counts in report["by_kind"].items():
+        print(f"  {kind:<8} accepted {counts.get('accepted', 0):>4}  rejected {counts.get('rejected', 0):>4}")
+
+
+if __name__ == "__main__":
+    main()
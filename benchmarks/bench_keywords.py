@@ -0,0 +1,62 @@
+"""
+Keyword classification: legacy regex/substring scans vs. the single-pass KeywordMatcher.
+
+Run from the repository root:
+    python -m benchmarks.bench_keywords
+"""
+import random
+import re
+import time
+
+from backend.keywords import KEYWORDS
+
+_VOCAB = (
+    "o preço está em tendência lateral com suporte próximo e resistência acima do topo anterior "
+    "sem confirmação clara de direção análise técnica indica consolidação price action shows "
+    "consolidation near support with neutral momentum rsi macd volume médias móveis bandas"
+).split()
+
+
+def _legacy(text):
+    t = text.lower()
+    re.search(r"\b(buy|long|compra)\b", t)
+    re.search(r"\b(sell|short|venda)\b", t)
+    re.search(r"\b(wait|hold|esperar)\b", t)
+    "strong" in t or "confident" in t
+    "weak" in t or "slight" in t
+    "macd" in t
+    any(w in t for w in ["positivo", "bullish", "acima"])
+    any(w in t for w in ["negativo", "bearish", "abaixo"])
+    any(ma in t for ma in ["média móvel", "mm", "moving average", "ma"])
+    any(w in t for w in ["acima", "above", "rompeu"])
+    any(w in t for w in ["abaixo", "below", "rompimento"])
+    "volume" in t
+    any(w in t for w in ["alto", "high", "crescente", "forte"])
+    any(w in t for w in ["baixo", "low", "fraco"])
+    any(w in t for w in ["compra", "buy", "bullish", "entrada", "long"])
+    any(w in t for w in ["venda", "sell", "bearish", "saída", "short"])
+
+
+def _matcher(text):
+    KEYWORDS.scan(text)
+
+
+def _timeit(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    rng = random.Random(7)
+    for label, n_words, repeat in (("short", 12, 20000), ("long", 1500, 300), ("very long", 8000, 60)):
+        text = " ".join(rng.choice(_VOCAB) for _ in range(n_words))
+        legacy = _timeit(_legacy, text, repeat)
+        matcher = _timeit(_matcher, text, repeat)
+        print(f"{label:>9} ({len(text):>6} chars): legacy {legacy * 1e6:9.1f} us  "
+              f"matcher {matcher * 1e6:9.1f} us  speedup {legacy / matcher:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Accuracy and latency of the local chart engine (backend.chart_digitizer +
+backend.local_analysis) on synthetic charts from benchmarks.chart_samples.
+
+Run from the repository root:
+    python -m benchmarks.bench_local_analysis [-n 80] [--seed 5]
+
+Accuracy is the correlation between recovered and true closes (line/area
+series are resampled to the digitized columns); candles/bars also report
+whether every bar was found.
+"""
+import argparse
+import random
+import statistics
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from backend.local_analysis import analyze_image
+
+from .chart_samples import chart
+
+KINDS = ("candles", "bars", "line", "area")
+
+
+def _correlation(recovered: np.ndarray, true: np.ndarray) -> float:
+    if len(recovered) != len(true):
+        true = np.interp(np.linspace(0, len(true) - 1, len(recovered)), np.arange(len(true)), true)
+    return float(np.corrcoef(recovered, true)[0, 1])
+
+
+def run(n: int, seed: int) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(seed)
+    rows: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    for i in range(n):
+        kind = KINDS[i % len(KINDS)]
+        sample = chart(rng, kind)
+        result = analyze_image(sample.image)
+        stats = rows[kind]
+        stats["ms"].append(result.seconds * 1000)
+        if result.chart is None:
+            stats["missed"].append(1.0)
+            continue
+        stats["missed"].append(0.0)
+        stats["corr"].append(_correlation(result.chart.ohlc[:, 3], sample.ohlc[:, 3]))
+        if kind in ("candles", "bars"):
+            stats["all_bars"].append(float(len(result.chart.ohlc) == len(sample.ohlc)))
+    return {
+        kind: {
+            "samples": len(stats["ms"]),
+            "missed": sum(stats["missed"]),
+            "corr_p10": float(np.percentile(stats["corr"], 10)) if stats["corr"] else float("nan"),
+            "all_bars": statistics.mean(stats["all_bars"]) if stats["all_bars"] else float("nan"),
+            "ms_p50": statistics.median(stats["ms"]),
+            "ms_max": max(stats["ms"]),
+        }
+        for kind, stats in rows.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'kind':<8} {'samples':>7} {'missed':>6} {'corr p10':>9} {'all bars':>9} {'p50 ms':>7} {'max ms':>7}")
+    for kind, row in run(args.n, args.seed).items():
+        print(f"{kind:<8} {row['samples']:>7} {row['missed']:>6.0f} {row['corr_p10']:>9.4f} "
+              f"{row['all_bars']:>9.2f} {row['ms_p50']:>7.1f} {row['ms_max']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
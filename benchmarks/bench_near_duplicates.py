@@ -0,0 +1,79 @@
+"""
+Threshold sweep and index cost for the near-duplicate reuse of chart analyses.
+
+Run from the repository root:
+    python -m benchmarks.bench_near_duplicates [--pairs 200] [--entries 5000]
+
+On the synthetic re-screenshot set (benchmarks.chart_samples.rescreenshot:
+one extra bar, 0-12 px crop per side, JPEG re-encode) prints, per Hamming
+distance, the share of true re-screenshots within it (reuse rate) and of
+different series drawn in the same theme within it (wrong reuse rate). Then
+times multi-index radius queries against a linear scan over random
+fingerprints.
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from backend.near_duplicates import Entry, MultiIndex, hamming, image_fingerprint
+from benchmarks.chart_samples import rescreenshot
+
+DISTANCES = (4, 6, 8, 10, 12, 16, 20, 24)
+
+
+def distances(pairs: int, seed: int = 11) -> Dict[str, List[int]]:
+    rng = random.Random(seed)
+    same, other = [], []
+    hash_ms = []
+    for _ in range(pairs):
+        sample = rescreenshot(rng)
+        started = time.perf_counter()
+        original = image_fingerprint(sample.original.image)
+        hash_ms.append((time.perf_counter() - started) * 1000)
+        same.append(hamming(original, image_fingerprint(sample.again.image)))
+        other.append(hamming(original, image_fingerprint(sample.other.image)))
+    return {"same": same, "other": other, "hash_ms": hash_ms}
+
+
+def index_cost(entries: int, radius: int, queries: int = 200, seed: int = 5) -> Dict[str, float]:
+    rng = random.Random(seed)
+    index = MultiIndex(radius)
+    stored = [Entry(rng.getrandbits(127), float(i), None, {}, None) for i in range(entries)]
+    for entry in stored:
+        index.add(entry)
+    # Metade das consultas perto de uma entrada existente, metade aleatória
+    probes = [stored[rng.randrange(entries)].fingerprint ^ (1 << rng.randrange(127)) if i % 2 else rng.getrandbits(127)
+              for i in range(queries)]
+    started = time.perf_counter()
+    for probe in probes:
+        index.search(probe)
+    index_us = (time.perf_counter() - started) / queries * 1e6
+    started = time.perf_counter()
+    for probe in probes:
+        [entry for entry in stored if hamming(probe, entry.fingerprint) <= radius]
+    linear_us = (time.perf_counter() - started) / queries * 1e6
+    return {"multi_index_us": index_us, "linear_us": linear_us}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--entries", type=int, default=5000)
+    args = parser.parse_args()
+    measured = distances(args.pairs)
+    print(f"fingerprint: median {statistics.median(measured['hash_ms']):.2f} ms per image ({args.pairs} pairs)")
+    print(f"{'distance':>8} {'reuse rate':>11} {'wrong reuse':>12}")
+    for distance in DISTANCES:
+        reuse = sum(d <= distance for d in measured["same"]) / len(measured["same"])
+        wrong = sum(d <= distance for d in measured["other"]) / len(measured["other"])
+        print(f"{distance:>8} {reuse:>11.1%} {wrong:>12.1%}")
+    print(f"\n{'radius':>8} {'index us':>9} {'linear us':>10}  ({args.entries} entries)")
+    for radius in (6, 10, 20):
+        cost = index_cost(args.entries, radius)
+        print(f"{radius:>8} {cost['multi_index_us']:>9.1f} {cost['linear_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
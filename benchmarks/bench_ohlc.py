@@ -0,0 +1,65 @@
+"""
+Latency of the vectorized OHLC indicator engine behind /api/analyze-ohlc.
+
+Run from the repository root:
+    python -m benchmarks.bench_ohlc [--bars 250] [--repeat 20]
+
+Times ``backend.ohlc_api._analyze`` (indicators, S/R, confluence and the
+canonical signal dicts) for growing batches of equal-length series, and the
+same work one symbol at a time for comparison.
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from backend.ohlc_api import _analyze
+
+BATCHES = (1, 10, 100, 500, 1000)
+
+
+def synthetic(symbols: int, bars: int, seed: int = 3) -> np.ndarray:
+    """(symbols, 5, bars) random-walk OHLCV."""
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 1, (symbols, bars)), axis=1)
+    opens = np.concatenate((closes[:, :1], closes[:, :-1]), axis=1)
+    spread = rng.uniform(0, 1, (2, symbols, bars))
+    highs, lows = np.maximum(opens, closes) + spread[0], np.minimum(opens, closes) - spread[1]
+    return np.stack((opens, highs, lows, closes, rng.uniform(1e3, 1e4, (symbols, bars))), axis=1)
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(bars: int, repeat: int) -> Dict[int, Dict[str, float]]:
+    report = {}
+    for symbols in BATCHES:
+        series = list(synthetic(symbols, bars))
+        report[symbols] = {
+            "batched_ms": _median_ms(lambda: _analyze(series), repeat),
+            "one_by_one_ms": _median_ms(lambda: [_analyze([s]) for s in series], max(1, repeat // 5)),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bars", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(f"{'symbols':>8} {'batched ms':>11} {'one by one ms':>14} {'speedup':>8}  ({args.bars} bars)")
+    for symbols, row in run(args.bars, args.repeat).items():
+        print(f"{symbols:>8} {row['batched_ms']:>11.2f} {row['one_by_one_ms']:>14.2f} "
+              f"{row['one_by_one_ms'] / row['batched_ms']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
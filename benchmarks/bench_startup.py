@@ -0,0 +1,143 @@
+"""
+Cold start of the API process (backend.startup).
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--runs 5] [--port 8797]
+
+1. Import profile: ``python -X importtime -c "import backend.main"`` in a
+   fresh interpreter; prints the total and the slowest top-level packages
+   (cumulative, like the ``import_profile`` of ``GET /api/startup``) and
+   which heavy SDKs the import left for later.
+2. Cold start to first response: launches uvicorn with the app N times and
+   polls ``/health`` until it answers; prints p50/max of the time from spawn
+   to the first 200, and the app's own report (import, ready, first
+   response).
+3. First use of a deferred module: the first ``/api/analyze-ohlc`` request
+   (NumPy + the local engine) with ``STARTUP_WARMUP=false`` and with the
+   background warm-up on.
+"""
+import argparse
+import ast
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("stripe", "supabase", "jwt", "requests", "numpy", "PIL")
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+_OHLC_BODY = {"series": [{"symbol": "BTCUSDT", "open": [100.0 + i for i in range(60)],
+                          "high": [101.0 + i for i in range(60)], "low": [99.0 + i for i in range(60)],
+                          "close": [100.5 + i for i in range(60)]}]}
+
+
+def import_profile(limit: int = 12) -> Tuple[float, Dict[str, float], List[str]]:
+    """(total seconds, slowest top-level packages, heavy modules loaded) for ``import backend.main``."""
+    script = f"import sys, backend.main; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True)
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match and match.group(3) == "backend.main":
+            total = int(match.group(2)) / 1e6
+        # Cada pacote aparece uma vez (na primeira importação), com o custo acumulado do que ele puxou
+        elif match and "." not in match.group(3) and match.group(3) != "backend":
+            packages[match.group(3)] = int(match.group(2)) / 1e6
+    slowest = dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit])
+    loaded = ast.literal_eval(completed.stdout.strip().splitlines()[-1])
+    return total, slowest, loaded
+
+
+def _spawn(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _first_response(url: str, process: subprocess.Popen, started: float, timeout: float = 30.0) -> float:
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"app at {url} did not answer in {timeout}s")
+
+
+def cold_starts(runs: int, port: int, env: Dict[str, str]) -> Tuple[List[float], Optional[dict]]:
+    seconds, report = [], None
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = _spawn(port, env)
+        try:
+            seconds.append(_first_response(url, process, started))
+            report = httpx.get(f"{url}/api/startup", timeout=5.0).json()
+        finally:
+            _stop(process)
+    return seconds, report
+
+
+def first_ohlc_request(port: int, env: Dict[str, str], warmup: bool) -> float:
+    url = f"http://127.0.0.1:{port}"
+    process = _spawn(port, dict(env, STARTUP_WARMUP="true" if warmup else "false"))
+    try:
+        _first_response(url, process, time.perf_counter())
+        if warmup:
+            time.sleep(3.0)  # um usuário raramente chega no primeiro segundo após o deploy
+        started = time.perf_counter()
+        response = httpx.post(f"{url}/api/analyze-ohlc", json=_OHLC_BODY, timeout=30.0)
+        response.raise_for_status()
+        return time.perf_counter() - started
+    finally:
+        _stop(process)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8797)
+    args = parser.parse_args()
+
+    total, slowest, loaded = import_profile()
+    print(f"import backend.main: {total * 1000:.0f} ms; heavy modules loaded: {', '.join(loaded) or 'none'}")
+    for name, seconds in slowest.items():
+        print(f"  {name:<24} {seconds * 1000:>8.1f} ms")
+
+    env = dict(os.environ, ENVIRONMENT="development", METRICS_TOKEN="")
+    seconds, report = cold_starts(args.runs, args.port, env)
+    print(f"\nspawn -> first /health 200 over {len(seconds)} runs: p50 {statistics.median(seconds) * 1000:.0f} ms, "
+          f"max {max(seconds) * 1000:.0f} ms")
+    if report:
+        phases = ", ".join(f"{key[:-8]} {value * 1000:.0f} ms" for key, value in report.items()
+                           if key.endswith("_seconds") and key != "lazy_import_seconds")
+        print(f"app report (since the app import started): {phases}")
+
+    cold = first_ohlc_request(args.port, env, warmup=False)
+    warm = first_ohlc_request(args.port, env, warmup=True)
+    print(f"\nfirst /api/analyze-ohlc: {cold * 1000:.0f} ms without warm-up, {warm * 1000:.0f} ms after warm-up")
+
+
+if __name__ == "__main__":
+    main()
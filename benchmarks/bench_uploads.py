@@ -0,0 +1,95 @@
+"""
+Chart upload ingestion: legacy base64-in-JSON handling vs. the streamed JSON,
+multipart and raw image/* paths of backend.uploads.
+
+Run from the repository root:
+    python -m benchmarks.bench_uploads [--mb 4]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from starlette.requests import Request
+
+from backend.uploads import ChartAnalysisRequest, decode_base64_image, receive_chart_upload
+
+CHUNK = 64 * 1024
+
+
+def _chunks(body: bytes):
+    return [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)] or [b""]
+
+
+def _request(chunks, content_type: str) -> Request:
+    chunks = list(chunks)
+    length = sum(len(c) for c in chunks)
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    headers = [(b"content-type", content_type.encode()), (b"content-length", str(length).encode())]
+    return Request({"type": "http", "method": "POST", "path": "/", "query_string": b"user_id=u1",
+                    "headers": headers}, receive)
+
+
+async def _legacy(chunks, content_type: str) -> str:
+    # FastAPI Body(...) path: whole body in memory, json.loads, pydantic, b64decode
+    request = _request(chunks, content_type)
+    raw = await request.body()
+    payload = ChartAnalysisRequest(**json.loads(raw))
+    return decode_base64_image(payload.image_base64)
+
+
+async def _streamed(chunks, content_type: str) -> str:
+    return (await receive_chart_upload(_request(chunks, content_type), max_bytes=64 * 1024 * 1024)).image_path
+
+
+def _measure(fn, body, content_type, repeat):
+    # Chunks are built up front: they stand in for the socket, not for server-side allocations
+    body = _chunks(body)
+    tracemalloc.start()
+    path = asyncio.run(fn(body, content_type))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.unlink(path)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        os.unlink(asyncio.run(fn(body, content_type)))
+    return (time.perf_counter() - start) / repeat, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=4.0, help="image size in MB (default 4)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    image = os.urandom(int(args.mb * 1024 * 1024))
+    json_body = json.dumps({"image_base64": base64.b64encode(image).decode(), "user_id": "u1"}).encode()
+    boundary = "benchboundary"
+    multipart_body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"user_id\"\r\n\r\nu1\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"c.png\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+
+    cases = (
+        ("legacy json (Body + json.loads)", _legacy, json_body, "application/json"),
+        ("json (streamed, validate_json)", _streamed, json_body, "application/json"),
+        ("multipart/form-data", _streamed, multipart_body, f"multipart/form-data; boundary={boundary}"),
+        ("raw image/png", _streamed, image, "image/png"),
+    )
+    print(f"image {len(image) / 1048576:.1f} MB")
+    for label, fn, body, content_type in cases:
+        seconds, peak = _measure(fn, body, content_type, args.repeat)
+        print(f"{label:<34} body {len(body) / 1048576:6.2f} MB  {seconds * 1000:8.2f} ms  "
+              f"peak alloc {peak / 1048576:7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Deterministic labelled image set for the chart pre-screen, the chart digitizer
+and the near-duplicate index.
+
+Positives are rendered trading-platform style charts (candles, OHLC bars,
+line/area charts; light and dark themes, grids, axis labels, legends, volume
+panes, moving-average overlays). Negatives are what users upload by mistake:
+blank or near-blank screenshots, text and chat screenshots, app UIs, photo-like
+images and noise. Every generator takes a ``random.Random`` so the set is the
+same on every run.
+
+    python -m benchmarks.chart_samples --out /tmp/samples   # dump PNGs to eyeball
+"""
+import argparse
+import io
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+_THEMES = (
+    # fundo, grade, texto, alta, baixa
+    ((255, 255, 255), (240, 243, 250), (19, 23, 34), (8, 153, 129), (242, 54, 69)),
+    ((19, 23, 34), (42, 46, 57), (178, 181, 190), (38, 166, 154), (239, 83, 80)),
+    ((250, 250, 250), (225, 225, 225), (60, 60, 60), (0, 150, 0), (200, 0, 0)),
+    ((0, 0, 0), (30, 30, 30), (200, 200, 200), (0, 200, 80), (255, 60, 60)),
+)
+_WORDS = ("preço análise mercado suporte resistência tendência volume compra venda lucro reunião amanhã "
+          "mensagem projeto relatório cliente entrega obrigado bom dia combinado enviado arquivo").split()
+
+
+class ChartSample(NamedTuple):
+    image: Image.Image
+    is_chart: bool
+    kind: str
+    # Só para gráficos: OHLC verdadeiro (n x 4) e a área de plotagem em pixels (x0, y0, x1, y1)
+    ohlc: Optional[np.ndarray] = None
+    plot_box: Optional[Tuple[int, int, int, int]] = None
+
+
+def _font(size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.load_default(size=size)
+
+
+def random_walk_ohlc(rng: random.Random, n: int, start: float = 100.0) -> np.ndarray:
+    """(n, 4) open/high/low/close with drifting volatility."""
+    drift = rng.uniform(-0.004, 0.004)
+    vol = rng.uniform(0.006, 0.025)
+    out = np.empty((n, 4))
+    close = start
+    for i in range(n):
+        open_ = close * (1 + rng.gauss(0, vol / 4))
+        close = open_ * (1 + drift + rng.gauss(0, vol))
+        high = max(open_, close) * (1 + abs(rng.gauss(0, vol / 2)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, vol / 2)))
+        out[i] = (open_, high, low, close)
+    return out
+
+
+def _size(rng: random.Random) -> Tuple[int, int]:
+    return rng.choice(((1280, 720), (1600, 900), (1024, 640), (900, 600), (1440, 810), (800, 500)))
+
+
+def _chart_frame(rng: random.Random, kind: str, ohlc: np.ndarray) -> ChartSample:
+    width, height = _size(rng)
+    bg, grid, text, up, down = rng.choice(_THEMES)
+    image = Image.new("RGB", (width, height), bg)
+    draw = ImageDraw.Draw(image)
+    font = _font(rng.choice((11, 12, 13)))
+    axis_w = rng.randint(55, 80)
+    top = rng.randint(40, 70)
+    volume = rng.random() < 0.4
+    bottom = height - rng.randint(25, 35) - (int(height * 0.15) if volume else 0)
+    x0, x1 = rng.randint(0, 10), width - axis_w
+    y0, y1 = top, bottom
+    if rng.random() < 0.75:
+        for gx in range(x0, x1, rng.randint(70, 140)):
+            draw.line((gx, y0, gx, height - 25), fill=grid)
+        for gy in range(y0, y1, rng.randint(40, 90)):
+            draw.line((x0, gy, x1, gy), fill=grid)
+    lo, hi = float(ohlc[:, 2].min()), float(ohlc[:, 1].max())
+    pad = (hi - lo) * 0.05 or 1.0
+    lo, hi = lo - pad, hi + pad
+
+    def py(price: float) -> float:
+        return y1 - (price - lo) / (hi - lo) * (y1 - y0)
+
+    n = len(ohlc)
+    step = (x1 - x0) / n
+    body = max(1, int(step * rng.uniform(0.55, 0.8)))
+    for i, (o, h, l, c) in enumerate(ohlc):
+        cx = x0 + (i + 0.5) * step
+        colour = up if c >= o else down
+        if kind == "candles":
+            draw.line((cx, py(h), cx, py(l)), fill=colour)
+            top_px, bottom_px = sorted((py(o), py(c)))
+            draw.rectangle((cx - body / 2, top_px, cx + body / 2, max(bottom_px, top_px + 1)), fill=colour)
+        elif kind == "bars":
+            draw.line((cx, py(h), cx, py(l)), fill=colour, width=2)
+            draw.line((cx - body / 2, py(o), cx, py(o)), fill=colour, width=2)
+            draw.line((cx, py(c), cx + body / 2, py(c)), fill=colour, width=2)
+    if kind in ("line", "area"):
+        colour = rng.choice(((41, 98, 255), (255, 152, 0), up, (33, 150, 243)))
+        points = [(x0 + (i + 0.5) * step, py(c)) for i, c in enumerate(ohlc[:, 3])]
+        if kind == "area":
+            fill = tuple(int(a * 0.75 + b * 0.25) for a, b in zip(bg, colour))
+            draw.polygon(points + [(points[-1][0], y1), (points[0][0], y1)], fill=fill)
+        draw.line(points, fill=colour, width=2)
+    if rng.random() < 0.5:
+        # Média móvel sobreposta
+        closes = ohlc[:, 3]
+        period = rng.choice((9, 20))
+        ma = np.convolve(closes, np.ones(period) / period, mode="valid")
+        points = [(x0 + (i + period - 0.5) * step, py(v)) for i, v in enumerate(ma)]
+        if len(points) > 1:
+            draw.line(points, fill=rng.choice(((255, 193, 7), (156, 39, 176), (33, 150, 243))), width=1)
+    if volume:
+        vol_top = bottom + 10
+        for i, (o, _, _, c) in enumerate(ohlc):
+            cx = x0 + (i + 0.5) * step
+            bar_h = rng.uniform(0.1, 1.0) * (height - 30 - vol_top)
+            draw.rectangle((cx - body / 2, height - 30 - bar_h, cx + body / 2, height - 30),
+                           fill=up if c >= o else down)
+    # Eixo de preços à direita, eixo de tempo embaixo, legenda no topo
+    for k in range(6):
+        price = lo + (hi - lo) * k / 5
+        draw.text((x1 + 6, py(price) - 6), f"{price:,.2f}", fill=text, font=font)
+    for gx in range(x0 + 40, x1 - 40, 140):
+        draw.text((gx, height - 20), f"{rng.randint(1, 28):02d} {rng.choice(('Jan', 'Fev', 'Mar', 'Abr'))}",
+                  fill=text, font=font)
+    symbol = rng.choice(("BTCUSDT", "PETR4", "EURUSD", "AAPL", "ETHUSDT", "VALE3"))
+    draw.text((10, 10), f"{symbol} · {rng.choice(('1h', '4h', '1D', '15m'))} · BINANCE  O{ohlc[-1, 0]:.2f} "
+                        f"H{ohlc[-1, 1]:.2f} L{ohlc[-1, 2]:.2f} C{ohlc[-1, 3]:.2f}", fill=text, font=font)
+    return ChartSample(image, True, kind, ohlc, (x0, y0, x1, y1))
+
+
+def chart(rng: random.Random, kind: Optional[str] = None, candles: Optional[int] = None) -> ChartSample:
+    kind = kind or rng.choice(("candles", "candles", "bars", "line", "area"))
+    ohlc = random_walk_ohlc(rng, candles or rng.randint(40, 160), start=rng.uniform(1, 50000))
+    return _chart_frame(rng, kind, ohlc)
+
+
+def blank(rng: random.Random) -> ChartSample:
+    width, height = _size(rng)
+    bg = rng.choice(_THEMES)[0]
+    image = Image.new("RGB", (width, height), bg)
+    if rng.random() < 0.6:
+        # Barra de título/menus de um app vazio
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, width, 32), fill=tuple(max(0, c - 20) for c in bg))
+        draw.text((12, 9), rng.choice(("Nova aba", "Sem título", "Carregando...")), fill=(120, 120, 120),
+                  font=_font(12))
+    return ChartSample(image, False, "blank")
+
+
+def text_screenshot(rng: random.Random) -> ChartSample:
+    width, height = _size(rng)
+    bg, _, text, _, _ = rng.choice(_THEMES)
+    image = Image.new("RGB", (width, height), bg)
+    draw = ImageDraw.Draw(image)
+    size = rng.choice((13, 14, 16, 18))
+    font = _font(size)
+    y = rng.randint(15, 40)
+    while y < height - size:
+        line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, max(4, width // (size * 5)))))
+        draw.text((rng.randint(15, 30), y), line.capitalize(), fill=text, font=font)
+        y += int(size * rng.uniform(1.4, 2.2))
+    return ChartSample(image, False, "text")
+
+
+def chat_screenshot(rng: random.Random) -> ChartSample:
+    width, height = rng.choice(((720, 1280), (1080, 1920), (828, 1792)))
+    image = Image.new("RGB", (width, height), rng.choice(((236, 229, 221), (255, 255, 255), (17, 27, 33))))
+    draw = ImageDraw.Draw(image)
+    font = _font(28)
+    y = 120
+    while y < height - 150:
+        mine = rng.random() < 0.5
+        w = rng.randint(width // 3, int(width * 0.75))
+        h = rng.choice((70, 110, 150))
+        x = width - w - 30 if mine else 30
+        draw.rounded_rectangle((x, y, x + w, y + h), 18, fill=(217, 253, 211) if mine else (255, 255, 255))
+        for k in range(h // 40):
+            draw.text((x + 20, y + 15 + k * 36), " ".join(rng.choice(_WORDS) for _ in range(w // 90)),
+                      fill=(20, 20, 20), font=font)
+        y += h + rng.randint(15, 40)
+    draw.rectangle((0, 0, width, 100), fill=(0, 128, 105))
+    return ChartSample(image, False, "chat")
+
+
+def app_ui(rng: random.Random) -> ChartSample:
+    width, height = _size(rng)
+    bg, grid, text, up, _ = rng.choice(_THEMES)
+    image = Image.new("RGB", (width, height), bg)
+    draw = ImageDraw.Draw(image)
+    font = _font(14)
+    draw.rectangle((0, 0, 220, height), fill=grid)
+    for k in range(10):
+        draw.text((20, 30 + k * 40), rng.choice(_WORDS).capitalize(), fill=text, font=font)
+    for k in range(rng.randint(3, 8)):
+        x, y = rng.randint(250, width - 300), rng.randint(20, height - 120)
+        draw.rounded_rectangle((x, y, x + rng.randint(120, 280), y + rng.randint(40, 100)), 8,
+                               fill=rng.choice((grid, up)), outline=text)
+        draw.text((x + 12, y + 12), rng.choice(_WORDS).capitalize(), fill=text, font=font)
+    return ChartSample(image, False, "ui")
+
+
+def photo(rng: random.Random) -> ChartSample:
+    """Photo-like image: smooth lighting gradient, a few soft blobs (faces, objects) and sensor noise."""
+    width, height = rng.choice(((1080, 1350), (1200, 900), (960, 1280), (1280, 720)))
+    seed = rng.randrange(2 ** 32)
+    gen = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.array([rng.uniform(40, 220) for _ in range(3)], dtype=np.float32)
+    tilt = np.array([rng.uniform(-80, 80) for _ in range(3)], dtype=np.float32)
+    pixels = base + tilt * (xx / width)[..., None] + tilt[::-1] * (yy / height)[..., None]
+    for _ in range(rng.randint(3, 7)):
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        radius = rng.uniform(0.1, 0.35) * min(width, height)
+        weight = np.exp(-(((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * radius ** 2)))[..., None]
+        pixels = pixels * (1 - weight) + np.array([rng.uniform(0, 255) for _ in range(3)], np.float32) * weight
+    pixels += gen.normal(0, rng.uniform(3, 12), pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return ChartSample(image.filter(ImageFilter.GaussianBlur(rng.uniform(0, 1.5))), False, "photo")
+
+
+def noise(rng: random.Random) -> ChartSample:
+    gen = np.random.default_rng(rng.randrange(2 ** 32))
+    width, height = _size(rng)
+    return ChartSample(Image.fromarray(gen.integers(0, 256, (height, width, 3), dtype=np.uint8)), False, "noise")
+
+
+NEGATIVES: Dict[str, Callable[[random.Random], ChartSample]] = {
+    "blank": blank, "text": text_screenshot, "chat": chat_screenshot, "ui": app_ui, "photo": photo, "noise": noise,
+}
+
+
+class Rescreenshot(NamedTuple):
+    original: ChartSample
+    again: ChartSample  # mesmo gráfico um pouco depois: +1 barra, recorte diferente, recompressão JPEG
+    other: ChartSample  # mesmo tema/layout, outra série (não pode reaproveitar a análise)
+
+
+def rescreenshot(rng: random.Random, kind: Optional[str] = None) -> Rescreenshot:
+    kind = kind or rng.choice(("candles", "candles", "bars", "line", "area"))
+    style = rng.randrange(2 ** 32)
+    ohlc = random_walk_ohlc(rng, rng.randint(40, 160), start=rng.uniform(1, 50000))
+    original = _chart_frame(random.Random(style), kind, ohlc[:-1])
+    later = _chart_frame(random.Random(style), kind, ohlc).image
+    width, height = later.size
+    left, top, right, bottom = (rng.randint(0, 12) for _ in range(4))
+    buffer = io.BytesIO()
+    later.crop((left, top, width - right, height - bottom)).save(buffer, "JPEG", quality=rng.randint(70, 92))
+    again = ChartSample(Image.open(io.BytesIO(buffer.getvalue())).convert("RGB"), True, kind, ohlc)
+    other_ohlc = random_walk_ohlc(rng, len(ohlc) - 1, start=float(ohlc[0, 0]))
+    return Rescreenshot(original, again, _chart_frame(random.Random(style), kind, other_ohlc))
+
+
+def labelled_samples(n: int = 120, seed: int = 7, chart_share: float = 0.5) -> List[ChartSample]:
+    """``n`` samples, about ``chart_share`` charts and the rest spread over the negative kinds."""
+    rng = random.Random(seed)
+    samples = []
+    negatives = list(NEGATIVES.values())
+    for i in range(n):
+        if rng.random() < chart_share:
+            samples.append(chart(rng))
+        else:
+            samples.append(negatives[i % len(negatives)](rng))
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("-n", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    args.out.mkdir(parents=True, exist_ok=True)
+    for i, sample in enumerate(labelled_samples(args.n, args.seed)):
+        sample.image.save(args.out / f"{i:03d}_{'chart' if sample.is_chart else 'other'}_{sample.kind}.png")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Deterministic synthetic corpus for the benchmark suite.
+
+Every generator takes a seed so baselines stay comparable between runs.
+"""
+import json
+import random
+from typing import Dict, List
+
+_PT_WORDS = (
+    "o preço está em tendência de alta com suporte próximo e resistência acima do topo anterior "
+    "rompimento confirmado volume crescente médias móveis alinhadas rsi em zona neutra macd "
+    "positivo bandas de bollinger abertas consolidação lateral aguardar confirmação compra venda"
+).split()
+_EN_WORDS = (
+    "price is trending higher with nearby support and resistance above the previous high "
+    "confirmed breakout rising volume aligned moving averages rsi neutral zone macd bullish "
+    "bollinger bands widening sideways consolidation wait for confirmation buy sell strong weak"
+).split()
+
+_SYMBOLS = ("BTCUSDT", "ETHUSDT", "EURUSD", "AAPL", "TSLA", "SPY", "SOLUSDT", "GBPUSD")
+
+
+def completion(rng: random.Random, language: str = "pt", words: int = 40) -> str:
+    """Free-text model completion in Portuguese or English."""
+    vocab = _PT_WORDS if language == "pt" else _EN_WORDS
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        n = min(remaining, rng.randint(6, 18))
+        sentence = " ".join(rng.choice(vocab) for _ in range(n))
+        sentences.append(sentence.capitalize() + rng.choice((".", ".", ";", ",")))
+        remaining -= n
+    return " ".join(sentences)
+
+
+def six_step_analysis(rng: random.Random, language: str = "pt", words: int = 40) -> Dict:
+    """Model JSON in the passo_* schema parsed by analyze_chart_with_ai."""
+    action = rng.choice(("compra", "venda", "esperar"))
+    return {
+        "simbolo_detectado": rng.choice(_SYMBOLS),
+        "preco_atual": f"{rng.uniform(1, 50000):.2f}",
+        "passo_1_estrutura": {"tendencia_principal": rng.choice(("alta", "baixa", "lateral")),
+                              "descricao": completion(rng, language, words // 4 or 1)},
+        "passo_2_suporte_resistencia": {"suporte_proximo": "42800", "resistencia_proxima": "44500",
+                                        "base_analise": completion(rng, language, words // 8 or 1)},
+        "passo_3_candlestick": {"padrao_identificado": "martelo", "descricao": completion(rng, language, words // 8 or 1)},
+        "passo_4_padroes": {"formacao_identificada": "bandeira", "descricao": completion(rng, language, words // 8 or 1)},
+        "passo_5_indicadores": {k: completion(rng, language, words // 16 or 1)
+                                for k in ("rsi", "macd", "medias_moveis", "volume", "bollinger", "outros")},
+        "passo_6_confluencia": {"sinais_confirmados": ["tendência", "volume"], "decisao_final": action,
+                                "justificativa": completion(rng, language, words // 8 or 1)},
+        "resumo_analise": {"acao": action, "justificativa": completion(rng, language, 12)[:150]},
+    }
+
+
+def provider_content(rng: random.Random, language: str = "pt", words: int = 40, wrapped: bool = False) -> str:
+    """Raw message content as returned by a provider; ``wrapped`` adds prose/markdown around the JSON."""
+    body = json.dumps(six_step_analysis(rng, language, words), ensure_ascii=False, indent=2)
+    if not wrapped:
+        return body
+    return f"Segue a análise solicitada:\n```json\n{body}\n```\nLembre-se de gerenciar o risco."
+
+
+def logits_batch(rng: random.Random, rows: int) -> List[List[float]]:
+    return [[rng.gauss(0, 2), rng.gauss(0, 2), rng.gauss(0, 2)] for _ in range(rows)]
+
+
+def build_corpus(seed: int = 1234) -> Dict[str, object]:
+    rng = random.Random(seed)
+    return {
+        "text_short_pt": [completion(rng, "pt", 12) for _ in range(64)],
+        "text_short_en": [completion(rng, "en", 12) for _ in range(64)],
+        "text_long_pt": [completion(rng, "pt", 1500) for _ in range(8)],
+        "text_long_en": [completion(rng, "en", 1500) for _ in range(8)],
+        "content_clean": [provider_content(rng, "pt", 120) for _ in range(16)],
+        "content_wrapped": [provider_content(rng, "pt", 120, wrapped=True) for _ in range(16)],
+        "free_text_json": [json.dumps({"analise": completion(rng, "pt", 400)}, ensure_ascii=False) for _ in range(8)],
+        "logits_row": logits_batch(rng, 64),
+        "logits_batch": logits_batch(rng, 1000),
+    }
@@ -0,0 +1,284 @@
+"""
+End-to-end load test of the FastAPI app against local stand-ins (no paid APIs).
+
+    python -m benchmarks.loadtest --duration 30 --concurrency 32
+    python -m benchmarks.loadtest --profile openai=latency_ms:1500,jitter_ms:500,error_rate:0.05 \\
+                                  --profile supabase=latency_ms:25 --mix analyze=5,signal=10,webhook=1
+
+Starts stand-ins for OpenAI, Gemini, Supabase PostgREST, Stripe and the Clerk
+JWKS endpoint (see benchmarks/standins.py), launches uvicorn with the app
+pointed at them (ENVIRONMENT=production, so auth, quota and persistence run
+for real), drives concurrent traffic with signed JWTs, base64 charts and
+signed Stripe webhooks, and reports p50/p95/p99 latency, throughput and
+errors per route.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import jwt
+
+from .standins import (GeminiStandIn, JwksStandIn, OpenAIStandIn, PostgrestStandIn, Profile, StandIn,
+                       StripeStandIn)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+JWT_SECRET = "loadtest-jwt-secret"
+WEBHOOK_SECRET = "whsec_loadtest"
+PRICE_ID = "price_loadtest"
+DEFAULT_MIX = "analyze=4,signal=10,signals=2,checkout=1,webhook=1"
+
+
+def _fake_service_key() -> str:
+    # supabase-py only checks that the key looks like a JWT
+    return jwt.encode({"role": "service_role", "iss": "loadtest"}, "unused", algorithm="HS256")
+
+
+def _chart_png(rng: random.Random, kilobytes: int) -> bytes:
+    from PIL import Image, ImageDraw
+
+    width, height = 1280, 720
+    image = Image.new("RGB", (width, height), (19, 23, 34))
+    draw = ImageDraw.Draw(image)
+    price = height / 2
+    for x in range(20, width - 20, 12):
+        move = rng.gauss(0, 12)
+        top, bottom = sorted((price, price + move))
+        color = (38, 166, 154) if move < 0 else (239, 83, 80)
+        draw.line([(x + 4, top - rng.uniform(2, 15)), (x + 4, bottom + rng.uniform(2, 15))], fill=color)
+        draw.rectangle([x, top, x + 8, max(bottom, top + 1)], fill=color)
+        price = min(max(price + move, 50), height - 50)
+    # incompressible noise strip so the payload reaches the requested size
+    noise = Image.frombytes("RGB", (width, max(1, kilobytes * 1024 // (width * 3))), rng.randbytes(
+        width * 3 * max(1, kilobytes * 1024 // (width * 3))))
+    image.paste(noise, (0, height - noise.height))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, status: str, seconds: float) -> None:
+        self.samples[route].append(seconds)
+        self.statuses[route][status] += 1
+
+    @staticmethod
+    def _pct(sorted_values: List[float], q: float) -> float:
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+        return sorted_values[index]
+
+    def report(self, elapsed: float) -> str:
+        lines = [f"{'route':<26} {'count':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  statuses"]
+        for route in sorted(self.samples):
+            values = sorted(self.samples[route])
+            statuses = self.statuses[route]
+            errors = sum(n for s, n in statuses.items() if not s.startswith("2") and s != "304")
+            lines.append(
+                f"{route:<26} {len(values):>7} {len(values) / elapsed:>8.1f} "
+                f"{self._pct(values, 0.50) * 1000:>9.1f} {self._pct(values, 0.95) * 1000:>9.1f} "
+                f"{self._pct(values, 0.99) * 1000:>9.1f} {errors:>7}  "
+                + ", ".join(f"{s}={n}" for s, n in sorted(statuses.items()))
+            )
+        return "\n".join(lines)
+
+
+class TrafficGenerator:
+    def __init__(self, base_url: str, users: List[Dict[str, str]], charts: List[str], mix: Dict[str, int], seed: int):
+        self.base_url = base_url
+        self.users = users
+        self.charts = charts
+        self.routes = list(mix)
+        self.weights = [mix[r] for r in self.routes]
+        self.rng = random.Random(seed)
+
+    def _token(self, user_id: str) -> str:
+        return jwt.encode({"sub": user_id, "exp": int(time.time()) + 3600}, JWT_SECRET, algorithm="HS256",
+                          headers={"kid": "loadtest"})
+
+    def _webhook(self, user_id: str) -> Tuple[bytes, str]:
+        event_type = self.rng.choice(("checkout.session.completed", "invoice.payment_failed"))
+        obj = {"id": f"cs_{uuid.uuid4().hex[:12]}", "object": "checkout.session",
+               "customer": f"cus_{user_id}", "subscription": f"sub_{user_id}"}
+        if event_type == "invoice.payment_failed":
+            obj = {"id": f"in_{uuid.uuid4().hex[:12]}", "object": "invoice", "subscription": f"sub_{user_id}"}
+        payload = json.dumps({"id": f"evt_{uuid.uuid4().hex}", "object": "event", "type": event_type,
+                              "data": {"object": obj}}).encode()
+        timestamp = int(time.time())
+        signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+        return payload, f"t={timestamp},v1={signature}"
+
+    def build(self) -> Tuple[str, str, str, Dict]:
+        """Return (route label, method, path, httpx request kwargs)."""
+        route = self.rng.choices(self.routes, self.weights)[0]
+        user = self.rng.choice(self.users)
+        auth = {"Authorization": f"Bearer {self._token(user['id'])}"}
+        if route == "analyze":
+            body = {"image_base64": self.rng.choice(self.charts), "user_id": user["id"]}
+            return "POST /api/analyze-chart", "POST", "/api/analyze-chart", {"json": body, "headers": auth}
+        if route == "signal":
+            symbol = self.rng.choice(("BTCUSDT", "ETHUSDT", "EURUSD", None))
+            params = {"symbol": symbol} if symbol else {}
+            return "GET /api/signal", "GET", "/api/signal", {"params": params}
+        if route == "signals":
+            body = {"symbols": self.rng.sample(["BTCUSDT", "ETHUSDT", "SOLUSDT", "EURUSD", "AAPL", "SPY"], 4)}
+            return "POST /api/signals", "POST", "/api/signals", {"json": body}
+        if route == "checkout":
+            body = {"price_id": PRICE_ID, "customer_email": user["email"], "metadata": {"user_id": user["id"]}}
+            return "POST /api/checkout", "POST", "/api/checkout", {"json": body, "headers": auth}
+        if route == "webhook":
+            payload, signature = self._webhook(user["id"])
+            headers = {"Stripe-Signature": signature, "Content-Type": "application/json"}
+            return "POST /webhook/stripe", "POST", "/webhook/stripe", {"content": payload, "headers": headers}
+        raise ValueError(f"unknown route in mix: {route}")
+
+
+async def drive(generator: TrafficGenerator, concurrency: int, duration: float, timeout: float) -> Tuple[Recorder, float]:
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=generator.base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                label, method, path, kwargs = generator.build()
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    status = str(response.status_code)
+                except httpx.TimeoutException:
+                    status = "timeout"
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                recorder.record(label, status, time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return recorder, time.perf_counter() - started
+
+
+def _parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in filter(None, spec.split(",")):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def _wait_healthy(url: str, process: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"app exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/api/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"app at {url} did not become healthy in {timeout}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load test against local stand-ins")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of traffic (default 20)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+    parser.add_argument("--profile", action="append", default=[], metavar="SERVICE=SPEC",
+                        help="stand-in profile, e.g. openai=latency_ms:800,jitter_ms:200,error_rate:0.02,payload_bytes:4000 "
+                             "(services: openai, gemini, supabase, stripe, jwks)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--premium-ratio", type=float, default=0.3)
+    parser.add_argument("--image-kb", type=int, default=150, help="approximate chart PNG size")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--app-log", default=os.devnull, help="file receiving the app's stdout/stderr")
+    args = parser.parse_args(argv)
+
+    profiles = {"openai": Profile(latency_ms=800, jitter_ms=300), "gemini": Profile(latency_ms=900, jitter_ms=300),
+                "supabase": Profile(latency_ms=15, jitter_ms=5), "stripe": Profile(latency_ms=120, jitter_ms=40),
+                "jwks": Profile(latency_ms=30)}
+    for spec in args.profile:
+        service, _, value = spec.partition("=")
+        profiles[service] = Profile.parse(value)
+
+    rng = random.Random(args.seed)
+    standins: Dict[str, StandIn] = {
+        "openai": OpenAIStandIn(profiles["openai"]), "gemini": GeminiStandIn(profiles["gemini"]),
+        "supabase": PostgrestStandIn(profiles["supabase"]), "stripe": StripeStandIn(profiles["stripe"]),
+        "jwks": JwksStandIn(profiles["jwks"]),
+    }
+    for standin in standins.values():
+        standin.start()
+
+    users = [{"id": str(uuid.UUID(int=rng.getrandbits(128))), "email": f"user{i}@loadtest.local"} for i in range(args.users)]
+    pg = standins["supabase"]
+    pg.seed("users", [dict(u) for u in users])
+    pg.seed("subscriptions", [{
+        "id": str(uuid.uuid4()), "user_id": u["id"], "price_id": PRICE_ID,
+        "plan_type": rng.choice(("trader", "alpha_pro")), "is_active": True,
+        "start_date": "2024-01-01T00:00:00", "status": "active",
+    } for u in users if rng.random() < args.premium_ratio])
+
+    env = dict(os.environ)
+    env.update({
+        "ENVIRONMENT": "production",
+        "OPENAI_API_KEY": "sk-loadtest", "OPENAI_BASE_URL": f"{standins['openai'].url}/v1",
+        "GEMINI_API_KEY": "loadtest", "GEMINI_BASE_URL": f"{standins['gemini'].url}/v1beta",
+        "SUPABASE_URL": pg.url, "SUPABASE_SERVICE_KEY": _fake_service_key(), "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "STRIPE_SECRET_KEY": "sk_test_loadtest", "STRIPE_API_BASE": standins["stripe"].url,
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET, "STRIPE_PRICE_TRADER_MONTHLY": PRICE_ID,
+        "CLERK_JWKS_URL": f"{standins['jwks'].url}/.well-known/jwks.json",
+    })
+    base_url = f"http://127.0.0.1:{args.port}"
+    log = open(args.app_log, "ab")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        _wait_healthy(base_url, process)
+        charts = ["data:image/png;base64," + base64.b64encode(_chart_png(rng, args.image_kb)).decode() for _ in range(4)]
+        generator = TrafficGenerator(base_url, users, charts, _parse_mix(args.mix), args.seed)
+        print(f"driving {base_url} for {args.duration:.0f}s with {args.concurrency} concurrent clients "
+              f"(chart ≈ {len(charts[0]) // 1024} KiB base64)")
+        recorder, elapsed = asyncio.run(drive(generator, args.concurrency, args.duration, args.timeout))
+        total = sum(len(v) for v in recorder.samples.values())
+        print(recorder.report(elapsed))
+        print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+        print("stand-in traffic: " + ", ".join(
+            f"{name}={s.requests} (injected errors {s.errors_injected})" for name, s in standins.items()))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        for standin in standins.values():
+            standin.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Microbenchmark suite for the hot paths of signal parsing and response shaping.
+
+    python -m benchmarks.run                      # run and print results
+    python -m benchmarks.run --save-baseline      # record benchmarks/baseline.json
+    python -m benchmarks.run --check              # fail (exit 1) on regressions
+    python -m benchmarks.run --check --threshold 0.3 --filter interpret
+
+Each case reports ops/sec (best of several calibrated runs) and the peak
+memory allocated by a single operation (tracemalloc). Baselines are machine
+specific: record them on the machine that runs --check.
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from backend.ai_service import AIService
+from backend.main import extract_free_text_heuristics
+from backend.signal_utils import canonical_signal_response, interpret_logits_batch, interpret_model_output
+
+from .corpus import build_corpus
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+def _cycle(items) -> Callable[[], object]:
+    return itertools.cycle(items).__next__
+
+
+def build_cases(corpus: Dict[str, object]) -> Dict[str, Callable[[], object]]:
+    """name -> zero-argument callable performing one operation."""
+    cases: Dict[str, Callable[[], object]] = {}
+
+    for key in ("text_short_pt", "text_short_en", "text_long_pt", "text_long_en"):
+        nxt = _cycle(corpus[key])
+        cases[f"interpret_{key}"] = lambda nxt=nxt: interpret_model_output(nxt())
+
+    nxt_row = _cycle(corpus["logits_row"])
+    cases["interpret_logits_row"] = lambda: interpret_model_output(model_logits=nxt_row())
+    batch = corpus["logits_batch"]
+    cases["interpret_logits_batch_1000"] = lambda: interpret_logits_batch(batch, model_version="v1")
+
+    cases["canonical_signal_response"] = lambda: canonical_signal_response(
+        "BUY", 0.8123, "parsed from text", model_version="v1", explainability={"source": "bench"})
+
+    for key in ("content_clean", "content_wrapped"):
+        nxt = _cycle(corpus[key])
+        cases[f"ai_parse_json_{key}"] = lambda nxt=nxt: AIService.parse_json_content(nxt())
+
+    nxt_free = _cycle(corpus["free_text_json"])
+    cases["chart_free_text_heuristics"] = lambda: extract_free_text_heuristics(nxt_free())
+    return cases
+
+
+def _time_once(op: Callable[[], object], n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        op()
+    return time.perf_counter() - start
+
+
+def measure(op: Callable[[], object], min_time: float = 0.1, repeat: int = 9, alloc_samples: int = 20) -> Dict[str, float]:
+    op()  # warm caches (regex compilation, memoised tokens, imports)
+    n = 1
+    while True:
+        elapsed = _time_once(op, n)
+        if elapsed >= min_time / 4:
+            break
+        n *= 4
+    n = max(1, int(n * (min_time / max(elapsed, 1e-9))))
+    best = min(_time_once(op, n) for _ in range(repeat))
+
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(alloc_samples):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            op()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+    finally:
+        tracemalloc.stop()
+    return {"ops_per_sec": n / best, "alloc_peak_bytes": float(sorted(peaks)[len(peaks) // 2])}
+
+
+def run_suite(name_filter: Optional[str] = None, quick: bool = False, seed: int = 1234) -> Dict[str, Dict[str, float]]:
+    cases = build_cases(build_corpus(seed))
+    results = {}
+    for name, op in cases.items():
+        if name_filter and name_filter not in name:
+            continue
+        if quick:
+            results[name] = measure(op, min_time=0.001, repeat=1, alloc_samples=2)
+        else:
+            results[name] = measure(op)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Return a description of every case that regressed beyond ``threshold`` (fraction)."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']:.0f} ops/s vs baseline {base['ops_per_sec']:.0f}")
+        # small absolute slack so a few hundred bytes of noise don't fail tiny cases
+        if current["alloc_peak_bytes"] > base["alloc_peak_bytes"] * (1 + threshold) + 1024:
+            regressions.append(f"{name}: {current['alloc_peak_bytes']:.0f} B peak vs baseline {base['alloc_peak_bytes']:.0f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", help="only run cases whose name contains this string")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case regressed beyond --threshold")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed regression fraction (default 0.25)")
+    parser.add_argument("--retries", type=int, default=2, help="re-measure regressed cases before failing (default 2)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.filter)
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+
+    print(f"{'case':<36} {'ops/sec':>14} {'alloc peak':>12} {'vs baseline':>12}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        delta = f"{(r['ops_per_sec'] / base['ops_per_sec'] - 1) * 100:+.1f}%" if base else "-"
+        print(f"{name:<36} {r['ops_per_sec']:>14,.0f} {r['alloc_peak_bytes'] / 1024:>10.1f}KiB {delta:>12}")
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        args.baseline.write_text(json.dumps({
+            "meta": {"python": platform.python_version(), "machine": platform.machine(), "recorded_at": time.time()},
+            "results": merged,
+        }, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {args.baseline}")
+
+    if args.check:
+        regressions = compare(results, baseline, args.threshold)
+        for _ in range(args.retries):
+            if not regressions:
+                break
+            # Timing noise (shared CPUs, frequency scaling) is bursty: re-measure only the suspects
+            suspects = {line.split(":", 1)[0] for line in regressions}
+            cases = build_cases(build_corpus())
+            remeasured = {name: measure(cases[name]) for name in suspects}
+            regressions = compare(remeasured, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Local stand-ins for the external services the backend calls, for load tests.
+
+Each stand-in is a threaded HTTP server with a configurable Profile (latency,
+jitter, error rate, payload size):
+
+- OpenAI chat completions   POST /v1/chat/completions
+- Gemini generateContent    POST /v1beta/models/<model>:generateContent
+- Supabase PostgREST        GET/POST/PATCH /rest/v1/<table>  (in-memory tables)
+- Stripe                    /v1/customers/<id>, /v1/subscriptions/<id>, POST /v1/checkout/sessions
+- Clerk JWKS                GET /.well-known/jwks.json
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class Profile:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    payload_bytes: int = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Profile":
+        """Parse ``latency_ms:800,jitter_ms:200,error_rate:0.02,payload_bytes:4000``."""
+        profile = cls()
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            key, _, value = part.partition(":")
+            current = getattr(profile, key)  # AttributeError on unknown keys is the right failure
+            setattr(profile, key, type(current)(float(value)) if isinstance(current, int) else float(value))
+        return profile
+
+
+class StandIn:
+    """Base class: subclasses implement ``handle(method, path, query, body) -> (status, payload)``."""
+
+    name = "standin"
+
+    def __init__(self, profile: Optional[Profile] = None, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile or Profile()
+        self.requests = 0
+        self.errors_injected = 0
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                url = urlparse(self.path)
+                status, payload = standin._serve(method, url.path, parse_qs(url.query), raw, self.headers)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"standin-{self.name}", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandIn":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _serve(self, method, path, query, raw, headers) -> Tuple[int, Any]:
+        with self._lock:
+            self.requests += 1
+        p = self.profile
+        delay = p.latency_ms + (random.uniform(-p.jitter_ms, p.jitter_ms) if p.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if p.error_rate and random.random() < p.error_rate:
+            with self._lock:
+                self.errors_injected += 1
+            return p.error_status, {"error": {"message": f"{self.name} stand-in injected error"}}
+        try:
+            body = json.loads(raw) if raw and raw[:1] in (b"{", b"[") else raw
+            return self.handle(method, path, query, body, headers)
+        except Exception as e:
+            return 500, {"error": {"message": f"{self.name} stand-in failure: {e}"}}
+
+    def handle(self, method, path, query, body, headers) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def _filler(self, minimum: int = 0) -> str:
+        return "x" * max(0, self.profile.payload_bytes - minimum)
+
+
+def _analysis_json(action: str, filler: str) -> Dict[str, Any]:
+    return {
+        "simbolo_detectado": "BTCUSDT",
+        "preco_atual": "43250.50",
+        "passo_1_estrutura": {"tendencia_principal": "alta", "descricao": "Topos e fundos ascendentes"},
+        "passo_2_suporte_resistencia": {"suporte_proximo": "42800", "resistencia_proxima": "44500",
+                                        "base_analise": "Mínima anterior e topo recente"},
+        "passo_3_candlestick": {"padrao_identificado": "martelo", "descricao": "Martelo no suporte"},
+        "passo_4_padroes": {"formacao_identificada": "bandeira", "descricao": filler or "Bandeira de alta"},
+        "passo_5_indicadores": {"rsi": "RSI 45", "macd": "MACD acima do sinal", "medias_moveis": "MM20 > MM50",
+                                "volume": "Volume crescente", "bollinger": "Meio das bandas", "outros": "não disponível"},
+        "passo_6_confluencia": {"sinais_confirmados": ["tendência alta", "MACD positivo"], "decisao_final": action,
+                                "justificativa": "Confluência positiva"},
+        "resumo_analise": {"acao": action, "justificativa": "BTCUSDT: tendência de alta com confluência técnica"},
+    }
+
+
+class OpenAIStandIn(StandIn):
+    name = "openai"
+
+    def handle(self, method, path, query, body, headers):
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": "not found"}}
+        content = json.dumps(_analysis_json(random.choice(("compra", "venda", "esperar")), self._filler(1500)),
+                             ensure_ascii=False)
+        return 200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "model": body.get("model") if isinstance(body, dict) else None,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1900, "completion_tokens": len(content) // 4,
+                      "total_tokens": 1900 + len(content) // 4},
+        }
+
+
+class GeminiStandIn(StandIn):
+    name = "gemini"
+
+    def handle(self, method, path, query, body, headers):
+        if method != "POST" or ":generateContent" not in path:
+            return 404, {"error": {"message": "not found"}}
+        text = json.dumps(_analysis_json(random.choice(("compra", "venda", "esperar")), self._filler(1500)),
+                          ensure_ascii=False)
+        return 200, {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 1900, "candidatesTokenCount": len(text) // 4},
+        }
+
+
+class PostgrestStandIn(StandIn):
+    """Minimal PostgREST: eq filters, insert, update, order/limit. Tables live in memory."""
+
+    name = "supabase"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._table_lock = threading.Lock()
+
+    def seed(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        with self._table_lock:
+            self.tables.setdefault(table, []).extend(rows)
+
+    @staticmethod
+    def _filters(query) -> List[Tuple[str, str]]:
+        out = []
+        for key, values in query.items():
+            if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                continue
+            for value in values:
+                if value.startswith("eq."):
+                    out.append((key, value[3:]))
+        return out
+
+    @staticmethod
+    def _matches(row, filters) -> bool:
+        for key, value in filters:
+            cell = row.get(key)
+            if isinstance(cell, bool):
+                cell = "true" if cell else "false"
+            if str(cell) != value:
+                return False
+        return True
+
+    def handle(self, method, path, query, body, headers):
+        if not path.startswith("/rest/v1/"):
+            return 404, {"message": "not found"}
+        table = path[len("/rest/v1/"):].strip("/")
+        filters = self._filters(query)
+        with self._table_lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "GET":
+                result = [r for r in rows if self._matches(r, filters)]
+                if "limit" in query:
+                    result = result[: int(query["limit"][0])]
+                return 200, result
+            if method == "POST":
+                new_rows = body if isinstance(body, list) else [body]
+                for row in new_rows:
+                    row.setdefault("id", str(uuid.uuid4()))
+                rows.extend(new_rows)
+                return 201, new_rows
+            if method == "PATCH":
+                updated = []
+                for row in rows:
+                    if self._matches(row, filters):
+                        row.update(body)
+                        updated.append(row)
+                return 200, updated
+        return 405, {"message": "method not allowed"}
+
+
+class StripeStandIn(StandIn):
+    name = "stripe"
+
+    def handle(self, method, path, query, body, headers):
+        now = int(time.time())
+        parts = path.strip("/").split("/")
+        if parts[:3] == ["v1", "checkout", "sessions"] and method == "POST":
+            sid = f"cs_test_{uuid.uuid4().hex[:16]}"
+            return 200, {"id": sid, "object": "checkout.session", "url": f"https://checkout.stripe.test/{sid}",
+                         "metadata": {"filler": self._filler()}}
+        if parts[:2] == ["v1", "customers"] and len(parts) == 3:
+            return 200, {"id": parts[2], "object": "customer", "email": f"{parts[2]}@loadtest.local",
+                         "name": "Load Test", "metadata": {"user_id": parts[2].replace("cus_", "")}}
+        if parts[:2] == ["v1", "customers"] and method == "POST":
+            return 200, {"id": f"cus_{uuid.uuid4().hex[:12]}", "object": "customer", "metadata": {}}
+        if parts[:2] == ["v1", "subscriptions"] and len(parts) == 3:
+            return 200, {
+                "id": parts[2], "object": "subscription", "status": "active",
+                "current_period_end": now + 30 * 86400, "cancel_at_period_end": False,
+                "items": {"object": "list", "data": [{"id": "si_test", "object": "subscription_item",
+                                                      "price": {"id": "price_loadtest", "object": "price",
+                                                                "product": "prod_loadtest"}}]},
+            }
+        return 404, {"error": {"message": f"no stand-in route for {method} {path}"}}
+
+
+class JwksStandIn(StandIn):
+    name = "jwks"
+
+    def __init__(self, *args, keys: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keys = keys or [{"kty": "RSA", "kid": "loadtest", "use": "sig", "alg": "RS256",
+                              "n": "sXchQ", "e": "AQAB"}]
+
+    def handle(self, method, path, query, body, headers):
+        if path.endswith("/jwks.json"):
+            return 200, {"keys": self.keys}
+        return 404, {"error": "not found"}
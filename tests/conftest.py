@@ -0,0 +1,29 @@
+import io
+import os
+import random
+
+# Antes de importar o app: configure_logging roda na importação e, por padrão, grava api_errors.log no diretório atual
+os.environ["LOG_ERROR_FILE"] = ""
+
+import pytest  # noqa: E402
+
+from backend import rate_limit  # noqa: E402
+from backend.rate_limit import RateLimiter  # noqa: E402
+from benchmarks.chart_samples import chart  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    # Os testes de rate limiting instalam o próprio limiter
+    monkeypatch.setattr(rate_limit, "rate_limiter", RateLimiter({}))
+
+
+@pytest.fixture
+def chart_png():
+    """PNG of a synthetic candlestick chart; the same seed gives the same bytes."""
+    def make(seed: int = 1) -> bytes:
+        buffer = io.BytesIO()
+        chart(random.Random(seed), "candles", 30).image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    return make
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend.admission import AdmissionController, AdmissionRejected
+from backend.main import app
+
+
+def test_queued_slots_are_shared_by_tier_weight():
+    controller = AdmissionController(capacity=1, weights={"alpha_pro": 3, "free": 1}, per_user_inflight=10)
+    order = []
+
+    async def worker(user, tier):
+        async with controller.admit(user, tier):
+            order.append(tier)
+            await asyncio.sleep(0)
+
+    async def run():
+        holder = await controller.acquire("holder", "free")
+        tasks = [asyncio.create_task(worker(f"f{i}", "free")) for i in range(4)]
+        tasks += [asyncio.create_task(worker(f"p{i}", "alpha_pro")) for i in range(4)]
+        await asyncio.sleep(0)
+        assert controller.queue_depth("free") == 4 and controller.queue_depth("alpha_pro") == 4
+        controller.release(holder)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # Paid tier gets ~3 of every 4 slots while both queues are backlogged; free is not starved
+    assert order[:4].count("alpha_pro") == 3
+    assert order.index("free") < 4 and sorted(order) == ["alpha_pro"] * 4 + ["free"] * 4
+
+
+def test_per_user_cap_and_queue_timeout_are_rejected_with_retry_after():
+    controller = AdmissionController(capacity=1, max_wait={"free": 0.05}, per_user_inflight=1)
+
+    async def run():
+        ticket = await controller.acquire("u1", "free")
+        with pytest.raises(AdmissionRejected) as per_user:
+            await controller.acquire("u1", "free")
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await controller.acquire("u2", "free")
+        assert controller.queue_depth() == 0
+        controller.release(ticket)
+        async with controller.admit("u2", "free") as second:
+            assert second.waited == 0.0
+        return per_user.value, timed_out.value
+
+    per_user, timed_out = asyncio.run(run())
+    assert (per_user.status_code, per_user.reason) == (429, "user_inflight")
+    assert (timed_out.status_code, timed_out.reason) == (503, "queue_timeout")
+    assert timed_out.retry_after >= 1
+
+
+def test_http_exception_headers_reach_the_client():
+    @app.get("/__test/admission-rejected")
+    async def rejected():
+        raise HTTPException(status_code=503, detail="busy", headers={"Retry-After": "7"})
+
+    try:
+        response = TestClient(app).get("/__test/admission-rejected")
+    finally:
+        app.router.routes.pop()
+    assert response.status_code == 503 and response.headers["retry-after"] == "7"
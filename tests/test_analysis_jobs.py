@@ -0,0 +1,111 @@
+import asyncio
+import base64
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from backend import analysis_jobs as jobs_module
+from backend.analysis_jobs import AnalysisJobQueue
+from backend.database import AnalysisJob
+from backend.main import app
+
+
+def test_job_is_accepted_immediately_and_completes_in_background(chart_png):
+    image_base64 = base64.b64encode(chart_png()).decode()
+    with TestClient(app) as client:
+        created = client.post("/api/analysis-jobs", json={"image_base64": image_base64, "user_id": "dev-user"})
+        assert created.status_code == 202
+        job = created.json()
+        assert job["status"] == "queued" and created.headers["location"] == job["links"]["self"]
+
+        done = client.get(job["links"]["self"], params={"wait": 10}).json()
+        assert done["status"] == "succeeded"
+        assert done["result"]["acao"] in ("compra", "venda", "esperar")
+
+        events = client.get(job["links"]["events"]).text
+        assert events.startswith("event: status") and '"succeeded"' in events
+        assert client.get("/api/analysis-jobs/does-not-exist").status_code == 404
+
+
+def test_recover_requeues_persisted_and_stale_jobs(monkeypatch):
+    now = datetime.now(timezone.utc)
+    persisted = [
+        AnalysisJob(id="queued", user_id="u1", status="queued", image_base64="x", created_at=now),
+        AnalysisJob(id="stale", user_id="u1", status="running", attempts=1, image_base64="x", created_at=now,
+                    started_at=now - timedelta(hours=1)),
+        AnalysisJob(id="live", user_id="u2", status="running", attempts=1, created_at=now, started_at=now),
+        AnalysisJob(id="poison", user_id="u2", status="running", attempts=3, created_at=now,
+                    started_at=now - timedelta(hours=1)),
+    ]
+    updates = {}
+
+    async def pending(limit=500):
+        return persisted
+
+    async def claim(job_id, expected_status, data):
+        return True
+
+    async def update(job_id, data):
+        updates[job_id] = data["status"]
+        return True
+
+    monkeypatch.setattr(jobs_module.Database, "get_pending_analysis_jobs", pending)
+    monkeypatch.setattr(jobs_module.Database, "claim_analysis_job", claim)
+    monkeypatch.setattr(jobs_module.Database, "update_analysis_job", update)
+    processed = []
+
+    async def process(job):
+        processed.append(job.id)
+        return {"acao": "esperar", "justificativa": "ok"}
+
+    async def run():
+        queue = AnalysisJobQueue(process, workers=2, stale_seconds=60)
+        requeued = await queue.recover()
+        assert queue.pending_for("u1") == 2
+        for job_id in ("queued", "stale"):
+            await queue.wait(job_id, timeout=5)
+        await queue.stop()
+        return requeued, queue
+
+    requeued, queue = asyncio.run(run())
+    assert requeued == 2 and sorted(processed) == ["queued", "stale"]
+    assert updates == {"poison": "failed", "queued": "succeeded", "stale": "succeeded"}
+    assert queue.pending_for("u1") == 0
+
+
+def test_failed_claim_of_a_queued_job_is_retried_then_fails_the_job(monkeypatch):
+    now = datetime.now(timezone.utc)
+    claims, updates = [], {}
+
+    async def claim(job_id, expected_status, data):
+        claims.append(job_id)
+        # "flaky": o banco falha na primeira reserva; "down": falha sempre
+        return job_id == "flaky" and claims.count(job_id) > 1
+
+    async def get_job(job_id):
+        return AnalysisJob(id=job_id, user_id="u1", status="queued", created_at=now)
+
+    async def update(job_id, data):
+        updates[job_id] = data["status"]
+        return True
+
+    monkeypatch.setattr(jobs_module.Database, "claim_analysis_job", claim)
+    monkeypatch.setattr(jobs_module.Database, "get_analysis_job", get_job)
+    monkeypatch.setattr(jobs_module.Database, "update_analysis_job", update)
+
+    async def process(job):
+        return {"acao": "esperar", "justificativa": "ok"}
+
+    async def run():
+        queue = AnalysisJobQueue(process, workers=2, claim_attempts=3, claim_retry_seconds=0.01)
+        queue._ensure_workers()
+        for job_id in ("flaky", "down"):
+            queue._jobs[job_id] = AnalysisJob(id=job_id, user_id="u1", status="queued", created_at=now)
+            queue._queue.put_nowait(job_id)
+        results = [await queue.wait(job_id, timeout=5) for job_id in ("flaky", "down")]
+        await queue.stop()
+        return results
+
+    flaky, down = asyncio.run(run())
+    assert flaky.status == "succeeded" and down.status == "failed"
+    assert claims.count("down") == 3 and updates == {"flaky": "succeeded", "down": "failed"}
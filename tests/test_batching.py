@@ -0,0 +1,55 @@
+import asyncio
+from backend.batching import MicroBatcher
+
+
+def test_micro_batcher_coalesces_concurrent_submissions():
+    calls = []
+
+    async def batch_fn(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(batch_fn, max_batch_size=4, max_latency_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+    stats = batcher.stats()
+    assert stats["batches"] == 2 and stats["items"] == 6
+    assert stats["batch_size_histogram"] == {2: 1, 4: 1}
+
+
+def test_micro_batcher_propagates_errors():
+    async def batch_fn(items):
+        raise RuntimeError("model down")
+
+    async def run():
+        batcher = MicroBatcher(batch_fn, max_batch_size=8, max_latency_ms=1)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_micro_batcher_holds_in_flight_batches_until_done():
+    release = None
+
+    async def batch_fn(items):
+        await release.wait()
+        return items
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        batcher = MicroBatcher(batch_fn, max_batch_size=2, max_latency_ms=1)
+        pending = asyncio.gather(batcher.submit(1), batcher.submit(2))
+        await asyncio.sleep(0.01)
+        in_flight = len(batcher._tasks)
+        release.set()
+        return in_flight, await pending, len(batcher._tasks)
+
+    in_flight, results, left = asyncio.run(run())
+    assert in_flight == 1 and results == [1, 2] and left == 0
@@ -0,0 +1,33 @@
+from benchmarks.corpus import build_corpus
+from benchmarks.run import compare, run_suite
+
+
+def test_corpus_is_deterministic():
+    assert build_corpus(seed=3) == build_corpus(seed=3)
+
+
+def test_suite_runs_every_case_and_flags_regressions():
+    results = run_suite(quick=True)
+    assert "interpret_logits_batch_1000" in results and "ai_parse_json_content_wrapped" in results
+    assert all(r["ops_per_sec"] > 0 for r in results.values())
+    baseline = {"case": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 100.0}}
+    assert compare({"case": {"ops_per_sec": 900.0, "alloc_peak_bytes": 100.0}}, baseline, 0.25) == []
+    assert len(compare({"case": {"ops_per_sec": 500.0, "alloc_peak_bytes": 100.0}}, baseline, 0.25)) == 1
+
+
+def test_standins_serve_provider_and_postgrest_shapes():
+    import httpx
+    from benchmarks.standins import OpenAIStandIn, PostgrestStandIn, Profile
+
+    assert Profile.parse("latency_ms:5,error_rate:0.5,error_status:429") == Profile(5.0, 0.0, 0.5, 429, 0)
+    openai, pg = OpenAIStandIn().start(), PostgrestStandIn().start()
+    try:
+        reply = httpx.post(f"{openai.url}/v1/chat/completions", json={"model": "gpt-4o"}).json()
+        assert "passo_6_confluencia" in reply["choices"][0]["message"]["content"]
+        pg.seed("users", [{"id": "u1", "email": "a@b.c"}, {"id": "u2", "email": "d@e.f"}])
+        assert httpx.get(f"{pg.url}/rest/v1/users", params={"id": "eq.u2"}).json() == [{"id": "u2", "email": "d@e.f"}]
+        httpx.patch(f"{pg.url}/rest/v1/users", params={"id": "eq.u1"}, json={"email": "x@y.z"})
+        assert pg.tables["users"][0]["email"] == "x@y.z"
+    finally:
+        openai.stop()
+        pg.stop()
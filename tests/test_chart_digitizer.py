@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+import pytest
+
+from backend import ai_service
+from backend.chart_digitizer import digitize_chart
+from backend.local_analysis import analyze_image, compute_snapshot, decide, preanalysis_context
+from backend.prompts import get_prompt
+from benchmarks.chart_samples import NEGATIVES, chart
+
+
+@pytest.mark.parametrize("kind", ["candles", "bars"])
+def test_candles_and_bars_are_recovered_one_per_bar(kind):
+    for seed in (1, 15, 29):
+        sample = chart(random.Random(seed), kind)
+        digitized = digitize_chart(sample.image)
+        assert digitized is not None and digitized.kind == "candles"
+        assert len(digitized.ohlc) == len(sample.ohlc)
+        for column in range(4):
+            assert np.corrcoef(digitized.ohlc[:, column], sample.ohlc[:, column])[0, 1] > 0.99
+
+
+@pytest.mark.parametrize("kind", ["line", "area"])
+def test_line_and_area_closes_follow_the_series(kind):
+    for seed in (1, 15, 36):
+        sample = chart(random.Random(seed), kind)
+        digitized = digitize_chart(sample.image)
+        assert digitized is not None and digitized.kind == "line"
+        closes = digitized.ohlc[:, 3]
+        assert closes.min() == pytest.approx(0.0) and closes.max() == pytest.approx(100.0)
+        expected = np.interp(np.linspace(0, len(sample.ohlc) - 1, len(closes)),
+                             np.arange(len(sample.ohlc)), sample.ohlc[:, 3])
+        assert np.corrcoef(closes, expected)[0, 1] > 0.95
+
+
+def test_non_chart_yields_esperar_with_honest_message():
+    result = analyze_image(NEGATIVES["blank"](random.Random(1)).image)
+    assert result.acao == "esperar" and result.snapshot is None
+    assert "não foi possível" in result.justificativa
+
+
+def test_local_analysis_is_deterministic_and_within_limits():
+    image = chart(random.Random(4), "candles").image
+    first, second = analyze_image(image), analyze_image(image)
+    assert first.acao in ("compra", "venda", "esperar")
+    assert (first.acao, first.justificativa) == (second.acao, second.justificativa)
+    assert len(first.justificativa) <= 150
+
+
+def test_confluence_follows_a_clear_trend():
+    rising = np.linspace(10, 90, 80) + np.sin(np.arange(80)) * 2
+    falling = rising[::-1]
+    bars = lambda closes: np.column_stack((closes, closes + 1, closes - 1, closes))
+    assert decide(compute_snapshot(bars(rising)))[0] != "venda"
+    assert compute_snapshot(bars(rising)).trend == "alta"
+    assert compute_snapshot(bars(falling)).trend == "baixa"
+    assert decide(compute_snapshot(bars(falling)))[0] != "compra"
+
+
+def test_preanalysis_context_is_sent_after_the_image(monkeypatch):
+    snapshot = analyze_image(chart(random.Random(4), "candles").image).snapshot
+    context = preanalysis_context(snapshot)
+    assert "suporte recente" in context and "RSI(14)" in context
+    sent = {}
+
+    class Reply:
+        status_code = 200
+        text = ""
+
+        def json(self):
+            return {"choices": [{"message": {"content": '{"resumo": {"acao": "esperar", "justificativa": "x"}}'}}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        sent.update(json)
+        return Reply()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-0123456789")
+    monkeypatch.setattr(ai_service.requests, "post", fake_post)
+    ai_service.AIService.analyze_chart_with_openai("AAAA", get_prompt(version="v2"), context=context)
+    parts = sent["messages"][1]["content"]
+    assert parts[0]["type"] == "image_url" and parts[1] == {"type": "text", "text": context}
@@ -0,0 +1,75 @@
+import io
+import random
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend.chart_screen import extract_features, load_thumbnail, screen_image
+from backend.main import app
+from benchmarks.bench_chart_screen import precision_recall
+from benchmarks.chart_samples import NEGATIVES, chart, labelled_samples
+
+
+def test_every_chart_kind_passes_and_every_negative_kind_is_rejected():
+    rng = random.Random(5)
+    for kind in ("candles", "bars", "line", "area"):
+        assert screen_image(chart(rng, kind).image).likely_chart, kind
+    for kind in ("blank", "text", "ui", "photo", "noise"):
+        assert not screen_image(NEGATIVES[kind](rng).image).likely_chart, kind
+
+
+def test_labelled_set_precision_and_recall():
+    scored = [(screen_image(s.image).score, s.is_chart) for s in labelled_samples(60, seed=23)]
+    measured = precision_recall(scored, 0.45)
+    assert measured["recall"] == 1.0
+    assert measured["precision"] >= 0.9
+
+
+def test_text_has_many_runs_per_column_and_charts_few():
+    rng = random.Random(9)
+    text = extract_features(load_thumbnail(NEGATIVES["text"](rng).image))
+    candles = extract_features(load_thumbnail(chart(rng, "candles").image))
+    assert text.runs_per_column >= 5 > candles.runs_per_column
+    assert candles.motion > 0.1 and candles.variety > 0.8
+
+
+def test_smooth_gradient_has_no_edges():
+    # Em int16 a luma de pixels claros dava a volta e um degradê virava uma borda
+    gradient = np.repeat(np.arange(256, dtype=np.uint8)[None, :, None], 64, axis=0).repeat(3, axis=2)
+    assert extract_features(gradient).edge_density == 0.0
+
+
+def test_threshold_is_configurable(monkeypatch):
+    image = chart(random.Random(2), "line").image
+    monkeypatch.setenv("CHART_SCREEN_THRESHOLD", "1.01")
+    assert not screen_image(image).likely_chart
+    assert screen_image(image, threshold=0.2).likely_chart
+
+
+def test_non_charts_get_422_before_any_analysis(monkeypatch):
+    from backend import main
+
+    calls = []
+
+    async def authorize(*args):
+        calls.append(args)
+        raise HTTPException(status_code=402, detail="cota")
+
+    monkeypatch.setattr(main, "_authorize_analysis", authorize)
+    client = TestClient(app)
+    buffer = io.BytesIO()
+    NEGATIVES["text"](random.Random(1)).image.save(buffer, format="PNG")
+    response = client.post("/api/analyze-chart?user_id=dev-user", content=buffer.getvalue(),
+                           headers={"Content-Type": "image/png"})
+    assert response.status_code == 422
+    assert "gráfico de preços" in response.text
+    garbage = client.post("/api/analyze-chart?user_id=dev-user", content=b"not an image",
+                          headers={"Content-Type": "image/png"})
+    assert garbage.status_code == 422
+    assert calls == []
+
+    monkeypatch.setenv("CHART_SCREEN_ENABLED", "false")
+    disabled = client.post("/api/analyze-chart?user_id=dev-user", content=buffer.getvalue(),
+                           headers={"Content-Type": "image/png"})
+    assert disabled.status_code == 402 and len(calls) == 1
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import auth, database, deadlines, main
+from backend.auth import get_current_user_from_request
+from backend.database import Database, User
+from backend.deadlines import (CLIENT_DISCONNECTS, DEADLINE_EXCEEDED, DeadlineExceeded, DeadlineMiddleware,
+                               DeadlinePolicy, parse_rules)
+from backend.error_handler import register_exception_handlers
+from backend.idempotency import SingleFlight
+from backend.preflight import QuotaHints
+
+
+def _app(spec: str, events=None) -> FastAPI:
+    app = FastAPI()
+    events = events if events is not None else []
+
+    @app.get("/slow")
+    async def slow(seconds: float = 1.0):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return {"ok": True}
+
+    @app.get("/budget")
+    async def budget():
+        # O prazo segue a requisição para a thread da chamada bloqueante
+        return {"remaining": await deadlines.to_thread("db", 10.0, deadlines.remaining)}
+
+    @app.get("/db")
+    async def db():
+        return await deadlines.to_thread("db", 10.0, time.sleep, 1.0)
+
+    register_exception_handlers(app)
+    app.add_middleware(DeadlineMiddleware, policy=DeadlinePolicy(parse_rules(spec), default_seconds=5.0,
+                                                                 grace_seconds=0.05))
+    return app
+
+
+def test_rules_match_in_order_with_globs_and_plan_overrides(monkeypatch):
+    policy = DeadlinePolicy(parse_rules(
+        "GET /api/analysis-jobs/*/events=*:0;GET /api/analysis-jobs/*=*:30;"
+        "POST /api/analyze-chart=*:45,trader:60,alpha_pro:90"), default_seconds=20.0)
+    assert policy.budget("GET", "/api/analysis-jobs/abc/events", lambda: "free") == ("/api/analysis-jobs/*/events", 0.0)
+    assert policy.budget("GET", "/api/analysis-jobs/abc/", lambda: "free") == ("/api/analysis-jobs/*", 30.0)
+    assert policy.budget("GET", "/health", lambda: "free") == ("default", 20.0)
+    assert policy.budget("POST", "/api/analyze-chart", lambda: "alpha_pro")[1] == 90.0
+    assert policy.budget("POST", "/api/analyze-chart", lambda: "anonymous")[1] == 45.0
+
+    # Plano vem do token verificado localmente, como no rate limiter
+    monkeypatch.setattr(auth, "SUPABASE_JWT_SECRET", "test-secret")
+    token = jwt.encode({"sub": "u1", "plan": "trader"}, "test-secret", algorithm="HS256")
+    scope = {"headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 1)}
+    assert deadlines._plan(scope) == "trader"
+    assert deadlines._plan({"headers": [], "client": ("10.0.0.1", 1)}) == "anonymous"
+
+
+def test_downstream_timeouts_are_capped_by_the_remaining_budget():
+    assert deadlines.timeout(60, "openai") == 60  # fora de uma requisição: limite próprio da chamada
+    token = deadlines._deadline.set(time.monotonic() + 2.0)
+    try:
+        assert 1.5 < deadlines.timeout(60, "openai") <= 2.0
+        assert deadlines.timeout(0.5, "jwks") == 0.5
+    finally:
+        deadlines._deadline.reset(token)
+    token = deadlines._deadline.set(time.monotonic() - 0.1)
+    before = DEADLINE_EXCEEDED.labels("none", "openai").get()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            deadlines.timeout(60, "openai")
+    finally:
+        deadlines._deadline.reset(token)
+    assert DEADLINE_EXCEEDED.labels("none", "openai").get() == before + 1
+
+
+def test_slow_handler_gets_504_and_is_cancelled():
+    events = []
+    with TestClient(_app("GET /slow=*:0.2", events)) as client:
+        before = DEADLINE_EXCEEDED.labels("/slow", "request").get()
+        started = time.perf_counter()
+        response = client.get("/slow?seconds=2")
+        elapsed = time.perf_counter() - started
+        assert client.get("/slow?seconds=0").status_code == 200
+    assert response.status_code == 504 and response.json()["code"] == 504
+    assert elapsed < 1.0 and events == ["cancelled"]
+    assert DEADLINE_EXCEEDED.labels("/slow", "request").get() == before + 1
+
+
+def test_deadline_reaches_threads_and_bounds_blocking_calls():
+    with TestClient(_app("GET /budget=*:3;GET /db=*:0.3")) as client:
+        remaining = client.get("/budget").json()["remaining"]
+        before = DEADLINE_EXCEEDED.labels("/db", "db").get()
+        response = client.get("/db")
+    assert 2.0 < remaining <= 3.0
+    # A chamada ao "banco" expira com o prazo e vira 504 pelo ErrorHandler, antes do corte do middleware
+    assert response.status_code == 504 and response.json()["error_code"] == "deadline_exceeded"
+    assert DEADLINE_EXCEEDED.labels("/db", "db").get() == before + 1
+
+
+def test_client_disconnect_cancels_the_handler():
+    events, sent = [], []
+    middleware = _app("GET /slow=*:10", events)
+    scope = {"type": "http", "method": "GET", "path": "/slow", "raw_path": b"/slow", "root_path": "",
+             "query_string": b"seconds=5", "headers": [], "client": ("10.0.0.1", 1), "server": ("test", 80),
+             "scheme": "http", "http_version": "1.1", "asgi": {"version": "3.0"}, "app": middleware}
+
+    async def run():
+        messages = asyncio.Queue()
+        await messages.put({"type": "http.request", "body": b"", "more_body": False})
+
+        async def receive():
+            return await messages.get()
+
+        async def send(message):
+            sent.append(message)
+
+        task = asyncio.ensure_future(middleware(scope, receive, send))
+        await asyncio.sleep(0.1)
+        await messages.put({"type": "http.disconnect"})
+        await asyncio.wait_for(task, 1.0)
+
+    before = CLIENT_DISCONNECTS.labels("/slow").get()
+    asyncio.run(run())
+    assert events == ["cancelled"] and not sent
+    assert CLIENT_DISCONNECTS.labels("/slow").get() == before + 1
+
+
+def test_single_flight_work_is_cancelled_when_the_last_waiter_leaves():
+    flight = SingleFlight("test")
+    events = []
+
+    async def work():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0.05)
+        assert not events  # o segundo ainda espera pelo resultado
+        second.cancel()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert events == ["cancelled"] and len(flight) == 0
+
+
+class _SlowQuery:
+    """Consulta PostgREST falsa: qualquer encadeamento, execute() lento."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(self.seconds)
+        return SimpleNamespace(data=[{"count": 0}])
+
+
+def test_usage_query_past_the_deadline_is_a_504_not_a_free_analysis(monkeypatch, chart_png):
+    calls = []
+
+    async def get_active_subscription(user_id):
+        return SimpleNamespace(plan_type="trader")
+
+    async def provider(*args, **kwargs):
+        calls.append("provider")
+        return main.ChartAnalysisResponse(acao="compra", justificativa="ok")
+
+    async def increment_monthly_usage(user_id):
+        calls.append("billed")
+        return 1
+
+    monkeypatch.setattr(database, "get_supabase_client", lambda: _SlowQuery(1.5))
+    monkeypatch.setattr(Database, "get_active_subscription", staticmethod(get_active_subscription))
+    monkeypatch.setattr(Database, "increment_monthly_usage", staticmethod(increment_monthly_usage))
+    monkeypatch.setattr(main, "ENVIRONMENT", "production")
+    monkeypatch.setattr(main, "_run_chart_analysis", provider)
+    monkeypatch.setattr(main, "quota_hints", QuotaHints())
+    monkeypatch.setattr(deadlines, "deadline_policy", DeadlinePolicy(
+        parse_rules("POST /api/analyze-chart=*:1"), grace_seconds=1.0))
+    main.app.dependency_overrides[get_current_user_from_request] = lambda: User(id="u1", email="u1@example.com")
+    try:
+        with TestClient(main.app) as client:
+            before = DEADLINE_EXCEEDED.labels("/api/analyze-chart", "db").get()
+            response = client.post("/api/analyze-chart?user_id=u1", content=chart_png(),
+                                   headers={"Content-Type": "image/png"})
+    finally:
+        main.app.dependency_overrides.clear()
+    # Antes, a falha virava uso 0: cota liberada e análise servida
+    assert response.status_code == 504 and response.json()["error_code"] == "deadline_exceeded"
+    assert calls == []
+    assert DEADLINE_EXCEEDED.labels("/api/analyze-chart", "db").get() == before + 1
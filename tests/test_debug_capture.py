@@ -0,0 +1,28 @@
+import gzip
+import json
+from backend.debug_capture import DebugCaptureSink
+
+
+def test_sink_writes_rotating_compressed_segments(tmp_path):
+    sink = DebugCaptureSink(str(tmp_path), segment_max_records=3)
+    for i in range(7):
+        assert sink.capture("signal", {"i": i})
+    sink.close()
+    segments = sorted(tmp_path.glob("*.jsonl.gz"))
+    assert len(segments) == 3
+    assert not list(tmp_path.glob("*.part"))
+    records = [json.loads(line) for seg in segments for line in gzip.open(seg, "rt")]
+    assert [r["i"] for r in records] == list(range(7))
+    assert all(r["kind"] == "signal" and "timestamp" in r for r in records)
+
+
+def test_sink_samples_and_drops_on_overflow(tmp_path):
+    sampled = DebugCaptureSink(str(tmp_path / "sampled"), sample_rate=0.0)
+    assert not sampled.capture("signal", {})
+    assert sampled.stats()["sampled_out"] == 1
+
+    sink = DebugCaptureSink(str(tmp_path / "full"), buffer_size=1)
+    sink._ensure_started = lambda: None  # keep the writer stopped so the buffer fills up
+    assert sink.capture("signal", {"i": 0})
+    assert not sink.capture("signal", {"i": 1})
+    assert sink.stats()["dropped"] == 1
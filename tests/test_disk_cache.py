@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.disk_cache import DiskCache
+from backend.near_duplicates import RecentAnalyses
+from benchmarks.chart_samples import chart
+
+
+def test_round_trip_namespaces_and_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.put("chart_analysis", "k", {"acao": "compra", "justificativa": "ação"}, now=100.0)
+    assert cache.get("chart_analysis", "k", now=110.0) == {"acao": "compra", "justificativa": "ação"}
+    assert cache.get("other", "k", now=110.0) is None
+    assert cache.get("chart_analysis", "k", now=161.0) is None
+    cache.put("chart_analysis", "k", [1, 2], ttl_seconds=5, now=200.0)
+    assert cache.get("chart_analysis", "k", now=204.0) == [1, 2]
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["entries"] == 1
+
+
+def test_size_bound_evicts_least_recently_read(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=10_000)
+    for i in range(10):
+        cache.put("ns", f"k{i}", "x" * 900, now=1000.0 + i)
+    assert cache.get("ns", "k0", now=2000.0) is not None  # leitura renova k0
+    for i in range(10, 14):
+        cache.put("ns", f"k{i}", "x" * 900, now=2000.0 + i)
+    stats = cache.stats()
+    assert stats["bytes"] <= 10_000 and stats["evictions"] == 3
+    assert cache.get("ns", "k0", now=2100.0) is not None
+    assert cache.get("ns", "k1", now=2100.0) is None and cache.get("ns", "k3", now=2100.0) is None
+    assert cache.get("ns", "k13", now=2100.0) is not None
+
+
+def _write_from_another_process(path):
+    DiskCache(path).put("ns", "shared", {"pid": "child"})
+
+
+def test_entries_are_shared_across_processes_and_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    reader = DiskCache(path)
+    assert reader.get("ns", "shared") is None
+    process = multiprocessing.get_context("spawn").Process(target=_write_from_another_process, args=(path,))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert reader.get("ns", "shared") == {"pid": "child"}
+    assert DiskCache(path).get("ns", "shared") == {"pid": "child"}
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_corrupt_file_is_replaced(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"definitely not sqlite" * 100)
+    cache = DiskCache(str(path))
+    cache.put("ns", "k", 1)
+    assert cache.get("ns", "k") == 1
+    assert list(tmp_path.glob("cache.sqlite3.corrupt-*"))
+
+
+def test_analysis_is_served_from_the_shared_cache(monkeypatch, tmp_path):
+    calls = []
+
+    def provider(image_path):
+        calls.append(image_path)
+        return main.ChartAnalysisResponse(acao="venda", justificativa="ETHUSDT: topo duplo")
+
+    monkeypatch.setattr(main, "OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(main, "analyze_chart_with_ai", provider)
+    monkeypatch.setattr(main, "recent_analyses", RecentAnalyses(window_seconds=0))
+    cache_path = str(tmp_path / "cache.sqlite3")
+    image = tmp_path / "chart.png"
+    chart(random.Random(6), "candles").image.save(image)
+
+    monkeypatch.setattr(main, "analysis_cache", DiskCache(cache_path))
+    first = asyncio.run(main._run_chart_analysis(str(image), "u1", "free"))
+    # Outro worker (outra conexão, mesmo arquivo) e outro usuário: mesma imagem, mesmo prompt
+    monkeypatch.setattr(main, "analysis_cache", DiskCache(cache_path))
+    again = asyncio.run(main._run_chart_analysis(str(image), "u2", "free"))
+    assert again == first and len(calls) == 1
+
+    monkeypatch.setenv("CHART_PROMPT_VERSION", "v1")
+    asyncio.run(main._run_chart_analysis(str(image), "u1", "free"))
+    assert len(calls) == 2
+
+
+def test_unusable_directory_disables_the_tier(tmp_path):
+    (tmp_path / "file").write_text("not a directory")
+    cache = DiskCache(str(tmp_path / "file" / "cache.sqlite3"))
+    assert cache.get("ns", "k") is None
+    cache.put("ns", "k", 1)
+    assert cache.get("ns", "k") is None
+    stats = cache.stats()
+    assert stats["disabled"] and stats["misses"] == 2 and stats["writes"] == 0
+
+
+def test_corrupt_file_already_moved_by_another_worker(tmp_path, monkeypatch):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"definitely not sqlite" * 100)
+    replace = os.replace
+
+    def moved_first(source, target):
+        replace(source, target)  # o outro worker chega antes
+        raise FileNotFoundError(source)
+
+    monkeypatch.setattr(os, "replace", moved_first)
+    cache = DiskCache(str(path))
+    cache.put("ns", "k", 1)
+    assert cache.get("ns", "k") == 1
+
+
+def test_analysis_still_answers_when_the_cache_path_is_unusable(monkeypatch, tmp_path, chart_png):
+    (tmp_path / "file").write_text("not a directory")
+    monkeypatch.setattr(main, "analysis_cache", DiskCache(str(tmp_path / "file" / "cache.sqlite3")))
+    response = TestClient(main.app).post("/api/analyze-chart?user_id=dev-user", content=chart_png(),
+                                         headers={"Content-Type": "image/png"})
+    assert response.status_code == 200
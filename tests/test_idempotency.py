@@ -0,0 +1,73 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.idempotency import SingleFlight
+from backend.main import ChartAnalysisResponse, app
+
+
+@pytest.fixture
+def provider_calls(monkeypatch):
+    calls = []
+
+    async def fake_analysis(image_path, user_id, plan_type, wait_for_admission=False):
+        calls.append(user_id)
+        await asyncio.sleep(0.05)
+        return ChartAnalysisResponse(acao="compra", justificativa=f"call {len(calls)}")
+
+    monkeypatch.setattr(main, "_run_chart_analysis", fake_analysis)
+    return calls
+
+
+def test_single_flight_shares_one_execution():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    async def run():
+        first = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        second = await flight.do("k", work)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [1] * 5 and second == 2 and len(flight) == 0
+
+
+def test_idempotency_key_replays_without_recomputing(provider_calls, chart_png):
+    client = TestClient(app)
+    body = {"image_base64": base64.b64encode(chart_png()).decode(), "user_id": "dev-user"}
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/analyze-chart", json=body, headers=headers)
+    replay = client.post("/api/analyze-chart", json=body, headers=headers)
+    assert first.status_code == replay.status_code == 200
+    assert replay.json() == first.json() and replay.headers["idempotent-replayed"] == "true"
+    assert len(provider_calls) == 1
+
+    other = {**body, "image_base64": base64.b64encode(chart_png(2)).decode()}
+    assert client.post("/api/analyze-chart", json=other, headers=headers).status_code == 422
+    assert client.post("/api/analyze-chart", json=body, headers={"Idempotency-Key": "x" * 300}).status_code == 400
+
+
+def test_concurrent_identical_requests_share_one_analysis(provider_calls, chart_png):
+    image = chart_png()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            post = lambda: client.post("/api/analyze-chart?user_id=dev-user", content=image,
+                                       headers={"Content-Type": "image/png"})
+            return await asyncio.gather(post(), post(), post())
+
+    responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert {r.json()["justificativa"] for r in responses} == {"call 1"}
+    assert len(provider_calls) == 1
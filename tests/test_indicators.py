@@ -0,0 +1,76 @@
+import numpy as np
+
+from backend.indicators import atr, bollinger, ema, macd, rsi, sma
+
+
+def _ema_loop(values, alpha):
+    out = [values[0]]
+    for value in values[1:]:
+        out.append(alpha * value + (1 - alpha) * out[-1])
+    return np.array(out)
+
+
+def _series(n=700, seed=3):
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 1, n))
+    highs = closes + rng.uniform(0, 2, n)
+    lows = closes - rng.uniform(0, 2, n)
+    return highs, lows, closes
+
+
+def test_sma_and_ema_match_loop_references_across_blocks():
+    _, _, closes = _series()
+    assert np.isnan(sma(closes, 20)[:19]).all()
+    np.testing.assert_allclose(sma(closes, 20)[19:], [closes[i - 19:i + 1].mean() for i in range(19, len(closes))])
+    np.testing.assert_allclose(ema(closes, 12), _ema_loop(closes, 2 / 13), rtol=1e-10)
+    np.testing.assert_allclose(ema(closes, alpha=1 / 14), _ema_loop(closes, 1 / 14), rtol=1e-10)
+
+
+def test_rsi_matches_wilder_loop():
+    _, _, closes = _series()
+    delta = np.diff(closes)
+    gain, loss = np.clip(delta, 0, None)[:14].mean(), np.clip(-delta, 0, None)[:14].mean()
+    expected = [100 - 100 / (1 + gain / loss)]
+    for d in delta[14:]:
+        gain = (gain * 13 + max(d, 0)) / 14
+        loss = (loss * 13 + max(-d, 0)) / 14
+        expected.append(100 - 100 / (1 + gain / loss))
+    values = rsi(closes, 14)
+    assert np.isnan(values[:14]).all()
+    np.testing.assert_allclose(values[14:], expected, rtol=1e-9)
+
+
+def test_rsi_of_monotonic_series_is_extreme():
+    assert rsi(np.arange(30.0))[-1] == 100.0
+    assert rsi(np.arange(30.0)[::-1])[-1] == 0.0
+    assert rsi(np.full(30, 5.0))[-1] == 50.0
+
+
+def test_period_one_is_the_series_itself():
+    _, _, closes = _series(40)
+    np.testing.assert_array_equal(ema(closes, 1), closes)
+    np.testing.assert_array_equal(ema(closes, alpha=1.0), closes)
+    delta = np.diff(closes)
+    np.testing.assert_array_equal(rsi(closes, 1)[1:], np.where(delta > 0, 100.0, np.where(delta < 0, 0.0, 50.0)))
+
+
+def test_macd_bollinger_and_atr():
+    highs, lows, closes = _series()
+    lines = macd(closes)
+    line = _ema_loop(closes, 2 / 13) - _ema_loop(closes, 2 / 27)
+    np.testing.assert_allclose(lines.macd, line, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(lines.histogram, line - _ema_loop(line, 0.2), rtol=1e-9, atol=1e-9)
+    assert np.isnan(macd(closes[:20]).macd).all()
+
+    bands = bollinger(closes, 20)
+    window = closes[-20:]
+    assert np.isclose(bands.upper[-1], window.mean() + 2 * window.std())
+    assert np.isclose(bands.lower[-1], window.mean() - 2 * window.std())
+
+    previous = np.concatenate(([closes[0]], closes[:-1]))
+    true_range = np.maximum(highs - lows, np.maximum(abs(highs - previous), abs(lows - previous)))
+    value = true_range[:14].mean()
+    for tr in true_range[14:]:
+        value = (value * 13 + tr) / 14
+    assert np.isclose(atr(highs, lows, closes)[-1], value)
+    assert np.isnan(atr(highs, lows, closes)[:13]).all()
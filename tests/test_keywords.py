@@ -0,0 +1,71 @@
+import json
+import re
+from pathlib import Path
+from backend.keywords import KEYWORDS, KeywordMatcher
+from backend.main import extract_free_text_heuristics
+from backend.signal_utils import interpret_model_output
+
+
+def _reference_text_signal(text):
+    # Regex/substring implementation the matcher replaced
+    t = (text or "").lower()
+    if re.search(r"\b(buy|long|compra)\b", t):
+        sig = "BUY"
+    elif re.search(r"\b(sell|short|venda)\b", t):
+        sig = "SELL"
+    else:
+        sig = "WAIT"
+    conf = 0.7
+    if "strong" in t or "confident" in t:
+        conf = 0.92
+    elif "weak" in t or "slight" in t:
+        conf = 0.6
+    return sig, conf
+
+
+def _reference_chart_categories(text):
+    t = text.lower()
+    return {
+        "macd": "macd" in t,
+        "moving_average": any(ma in t for ma in ["média móvel", "mm", "moving average", "ma"]),
+        "volume_high": any(w in t for w in ["alto", "high", "crescente", "forte"]),
+        "action_buy": any(w in t for w in ["compra", "buy", "bullish", "entrada", "long"]),
+        "action_sell": any(w in t for w in ["venda", "sell", "bearish", "saída", "short"]),
+    }
+
+
+SAMPLES = [
+    "Strong BUY: price broke out, long-term trend intact",
+    "buyers absent; shortage of momentum",
+    "Recomendação de venda — rompimento do suporte",
+    "{\"analise\": \"Média Móvel de 20 acima do preço\", \"volume\": \"fraco\"}",
+    "macd_cross positivo, RSI: 72",
+    "média  móvel com espaço duplo",
+    "sem palavras relevantes aqui",
+    "",
+]
+
+
+def test_matcher_matches_reference_on_golden_and_samples():
+    rows = json.loads((Path(__file__).parent / "golden_signals.json").read_text())
+    texts = [row["text"] for row in rows] + SAMPLES
+    for text in texts:
+        parsed = interpret_model_output(text)
+        assert (parsed["signal"], parsed["confidence"]) == _reference_text_signal(text), text
+        hits = KEYWORDS.scan(text)
+        for category, expected in _reference_chart_categories(text).items():
+            assert hits.has(category) == expected, (text, category)
+
+
+def test_matcher_reports_every_hit_with_category():
+    matcher = KeywordMatcher(words={"buy": ["buy"]}, substrings={"ma": ["média móvel", "ma"]})
+    hits = matcher.scan("Buy above the Média Móvel; buying")
+    assert hits.hits == [("buy", "buy"), ("ma", "média móvel")]
+
+
+def test_free_text_heuristics():
+    result = extract_free_text_heuristics('{"texto": "RSI: 28, MACD negativo, volume alto, tendência de venda"}')
+    assert result["rsi"] == "28"
+    assert result["macd"] == "MACD com sinal negativo detectado"
+    assert result["volume"] == "Volume alto confirmando movimento"
+    assert result["acao"] == "venda"
@@ -0,0 +1,62 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from backend.logging_config import JsonFormatter, _ContextQueueHandler, get_logger, log_payload, request_id_var
+from backend.main import app
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_json_lines_carry_request_id_extra_fields_and_traceback():
+    queued = []
+    handler = _ContextQueueHandler(None)
+    handler.enqueue = queued.append
+    logger = get_logger("backend.test_logging")
+    logger.addHandler(handler)
+    token = request_id_var.set("req-123")
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.error("falha em %s", "passo", exc_info=True, extra={"user_id": "u1"})
+    finally:
+        request_id_var.reset(token)
+        logger.removeHandler(handler)
+
+    entry = json.loads(JsonFormatter().format(queued[0]))
+    assert logger.name == "tickrify.test_logging"
+    assert entry["msg"] == "falha em passo" and entry["level"] == "ERROR"
+    assert entry["request_id"] == "req-123" and entry["user_id"] == "u1"
+    assert "ValueError: boom" in entry["exc"]
+
+
+def test_payload_logs_are_sampled(monkeypatch):
+    logger = get_logger("test_payload")
+    capture = _Capture()
+    logger.addHandler(capture)
+    logger.setLevel(logging.DEBUG)
+    try:
+        monkeypatch.setenv("LOG_PAYLOAD_SAMPLE_RATE", "0")
+        log_payload(logger, "payload", {"a": 1})
+        assert capture.records == []
+        monkeypatch.setenv("LOG_PAYLOAD_SAMPLE_RATE", "1")
+        monkeypatch.setenv("LOG_PAYLOAD_MAX_CHARS", "5")
+        log_payload(logger, "payload", "x" * 20)
+        assert capture.records[0].payload.startswith("xxxxx...[15 chars")
+    finally:
+        logger.removeHandler(capture)
+
+
+def test_request_id_is_echoed_or_generated():
+    client = TestClient(app)
+    assert client.get("/", headers={"X-Request-ID": "abc"}).headers["x-request-id"] == "abc"
+    assert len(client.get("/").headers["x-request-id"]) == 32
@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.metrics import Counter, Gauge, Histogram, Registry, register_stats
+
+
+def test_exposition_format_for_each_metric_type():
+    registry = Registry()
+    requests = Counter("t_requests", "Requests", ("route",), registry=registry)
+    in_flight = Gauge("t_in_flight", "In flight", registry=registry)
+    latency = Histogram("t_latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0), registry=registry)
+    register_stats("t_batcher", lambda: {"name": "signal", "batches": 3, "pending": 2}, counters=("batches",),
+                   registry=registry)
+
+    requests.labels(route='/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    in_flight.inc()
+    latency.labels("decode").observe(0.05)
+    latency.labels(stage="decode").observe(0.5)
+    text = registry.render()
+
+    assert '# TYPE t_requests counter\nt_requests_total{route="/a\\"b"} 3' in text
+    assert "t_in_flight 1" in text
+    assert 't_latency_seconds_bucket{stage="decode",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{stage="decode",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{stage="decode",le="+Inf"} 2' in text
+    assert 't_latency_seconds_count{stage="decode"} 2' in text
+    assert "t_batcher_batches_total 3" in text and "t_batcher_pending 2" in text
+    assert "t_batcher_name" not in text
+
+
+def test_metrics_endpoint_reports_route_templates_and_cache_hits():
+    client = TestClient(app)
+    first = client.get("/api/signal")
+    client.get("/api/signal", headers={"If-None-Match": first.headers["etag"]})
+    text = client.get("/metrics").text
+    assert 'tickrify_http_request_duration_seconds_count{route="/api/signal",method="GET",status="304"}' in text
+    assert 'tickrify_cache_hits_total{cache="signal_etag"}' in text
+    assert "tickrify_http_requests_in_flight 1" in text  # the scrape itself
+    assert "tickrify_signal_batcher_batches_total" in text
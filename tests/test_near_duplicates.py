@@ -0,0 +1,116 @@
+import asyncio
+import random
+
+from backend import main
+from backend.near_duplicates import Entry, MultiIndex, RecentAnalyses, hamming, image_fingerprint
+from benchmarks.chart_samples import chart, rescreenshot
+
+
+def test_rescreenshots_are_close_and_other_series_are_far():
+    rng = random.Random(4)
+    for _ in range(8):
+        sample = rescreenshot(rng)
+        original = image_fingerprint(sample.original.image)
+        assert hamming(original, image_fingerprint(sample.again.image)) <= 16
+        # Outra série no mesmo tema pode cair na faixa de refresh, nunca na de reuso direto
+        assert hamming(original, image_fingerprint(sample.other.image)) > 12
+
+
+def test_multi_index_matches_a_linear_scan():
+    rng = random.Random(2)
+    index = MultiIndex(12)
+    stored = [Entry(rng.getrandbits(127), float(i), None, {}, None) for i in range(300)]
+    for entry in stored:
+        index.add(entry)
+    for entry in stored[::3]:
+        index.discard(entry)
+    live = [e for e in stored if e.alive]
+    assert index.live == len(live) == 200
+    for probe in [e.fingerprint ^ rng.getrandbits(127) & rng.getrandbits(127) & rng.getrandbits(127)
+                  for e in stored[:60]]:
+        for radius in (4, 12):
+            expected = sorted(id(e) for e in live if hamming(probe, e.fingerprint) <= radius)
+            assert sorted(id(e) for _, e in index.search(probe, radius)) == expected
+
+
+def _result(symbol="BTCUSDT", acao="compra"):
+    return {"acao": acao, "justificativa": f"{symbol}: rompimento da resistência"}
+
+
+def test_lookup_window_and_nearest_match():
+    index = RecentAnalyses(reuse_distance=4, refresh_distance=8, window_seconds=60)
+    index.add("u1", 0b1111, _result(), now=0.0)
+    index.add("u1", 0b1, _result("ETHUSDT"), now=1.0)
+    match = index.lookup("u1", 0b11, now=10.0)
+    assert match.distance == 1 and match.entry.symbol == "ETHUSDT"
+    assert index.lookup("u2", 0b11, now=10.0) is None
+    assert index.lookup("u1", (1 << 100) - 1, now=10.0) is None
+    assert index.lookup("u1", 0b1111, now=62.0) is None  # fora da janela
+
+
+def test_caps_per_symbol_per_user_and_users():
+    index = RecentAnalyses(window_seconds=600, max_per_user=3, max_per_symbol=1, max_users=2)
+    far = [((1 << 25) - 1) << (25 * i) for i in range(5)]  # 25 bits distintos: fora do raio de refresh
+    index.add("u1", far[0], _result("BTCUSDT"), now=0.0)
+    index.add("u1", far[0] ^ 1, _result("BTCUSDT", "venda"), now=1.0)
+    assert index.stats()["entries"] == 1
+    assert index.lookup("u1", far[0], now=2.0).entry.result["acao"] == "venda"
+    for i, symbol in enumerate(("A1", "A2", "A3")):
+        index.add("u1", far[i + 1], _result(symbol), now=3.0 + i)
+    assert index.stats()["entries"] == 3
+    assert index.lookup("u1", far[0], now=9.0) is None  # a mais antiga saiu pelo limite por usuário
+    index.add("u2", far[4], _result(), now=10.0)
+    index.add("u3", far[4], _result(), now=11.0)
+    assert index.stats()["users"] == 2 and index.lookup("u1", far[3], now=12.0) is None
+
+
+def test_hit_rate():
+    index = RecentAnalyses()
+    for outcome in ("reused", "refreshed", "refresh_mismatch", "miss"):
+        index.record(outcome)
+    stats = index.stats()
+    assert stats["lookups"] == 4 and stats["hit_rate"] == 0.5
+
+
+def test_rescreenshot_skips_the_provider(monkeypatch, tmp_path):
+    calls = []
+
+    def provider(image_path):
+        calls.append(image_path)
+        return main.ChartAnalysisResponse(acao="compra", justificativa="BTCUSDT: tendência de alta")
+
+    monkeypatch.setattr(main, "OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(main, "analyze_chart_with_ai", provider)
+    monkeypatch.setattr(main, "recent_analyses", RecentAnalyses(reuse_distance=16, refresh_distance=16))
+    sample = rescreenshot(random.Random(8), "candles")
+    paths = []
+    for name, image in (("a", sample.original.image), ("b", sample.again.image), ("c", sample.other.image)):
+        paths.append(str(tmp_path / f"{name}.png"))
+        image.save(paths[-1])
+
+    first = asyncio.run(main._run_chart_analysis(paths[0], "u1", "free"))
+    again = asyncio.run(main._run_chart_analysis(paths[1], "u1", "free"))
+    assert again == first and calls == paths[:1]
+    asyncio.run(main._run_chart_analysis(paths[2], "u1", "free"))
+    asyncio.run(main._run_chart_analysis(paths[1], "u2", "free"))
+    assert calls == [paths[0], paths[2], paths[1]]
+    assert main.recent_analyses.stats()["reused"] == 1
+
+
+def test_refresh_band_reuses_only_when_the_local_reading_agrees(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(main, "analyze_chart_with_ai",
+                        lambda path: main.ChartAnalysisResponse(acao="venda", justificativa="x"))
+    monkeypatch.setattr(main, "recent_analyses", RecentAnalyses(reuse_distance=0, refresh_distance=127))
+    path = str(tmp_path / "chart.png")
+    chart(random.Random(3), "candles").image.save(path)
+    asyncio.run(main._run_chart_analysis(path, "u1", "free"))
+    entry = main.recent_analyses.lookup("u1", 0).entry
+    assert entry.local_acao in ("compra", "venda", "esperar")
+    asyncio.run(main._run_chart_analysis(path, "u1", "free"))  # distância 0: reuso direto
+    entry.local_acao = "outra"
+    other = str(tmp_path / "other.png")
+    chart(random.Random(4), "candles").image.save(other)
+    asyncio.run(main._run_chart_analysis(other, "u1", "free"))
+    stats = main.recent_analyses.stats()
+    assert stats["reused"] == 1 and stats["refresh_mismatch"] == 1
@@ -0,0 +1,105 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from backend import ohlc_api
+from backend.local_analysis import compute_snapshot, compute_snapshots
+from backend.main import app
+
+
+def _candles(symbols, bars, seed=7):
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0.05, 1, (symbols, bars)), axis=1)
+    opens = np.concatenate((closes[:, :1], closes[:, :-1]), axis=1)
+    highs = np.maximum(opens, closes) + rng.uniform(0, 1, (symbols, bars))
+    lows = np.minimum(opens, closes) - rng.uniform(0, 1, (symbols, bars))
+    volume = rng.uniform(1e3, 1e4, (symbols, bars))
+    return np.stack((opens, highs, lows, closes, volume), axis=1)  # (symbols, 5, bars)
+
+
+def _json_body(data, names):
+    return {"series": [dict(symbol=name, **{f: row.tolist() for f, row in zip(ohlc_api._FIELDS, series)})
+                       for name, series in zip(names, data)]}
+
+
+def test_batched_snapshots_match_one_at_a_time():
+    data = _candles(6, 120)
+    ohlc = data[:, :4].transpose(0, 2, 1)
+    assert compute_snapshots(ohlc) == [compute_snapshot(series) for series in ohlc]
+
+
+def test_json_and_binary_bodies_give_the_same_canonical_signals():
+    data = _candles(3, 80)
+    names = ["BTCUSDT", "ETHUSDT", "AAPL"]
+    client = TestClient(app)
+    from_json = client.post("/api/analyze-ohlc", json=_json_body(data, names))
+    from_binary = client.post("/api/analyze-ohlc?symbols=" + ",".join(names), content=data.astype("<f8").tobytes(),
+                              headers={"Content-Type": ohlc_api.BINARY_MEDIA_TYPE})
+    assert from_json.status_code == from_binary.status_code == 200
+    a, b = from_json.json(), from_binary.json()
+    assert a["symbols"] == b["symbols"] == names
+    for left, right in zip(a["signals"], b["signals"]):
+        assert left["signal"] in ("BUY", "SELL", "WAIT")
+        assert 0.0 <= left["confidence"] <= 1.0
+        assert left["model_version"] == ohlc_api.MODEL_VERSION
+        assert left["reason"].startswith("Indicadores")
+        assert (left["signal"], left["explainability"]) == (right["signal"], right["explainability"])
+    levels = a["signals"][0]["explainability"]
+    assert levels["support"] <= levels["close"] <= levels["resistance"]
+    assert levels["volume_ratio"] is not None
+
+
+def test_series_of_different_lengths_and_without_volume():
+    short, long = _candles(1, 30, seed=1)[0], _candles(1, 200, seed=2)[0]
+    body = _json_body([short, long], ["A", "B"])
+    del body["series"][0]["volume"]
+    response = TestClient(app).post("/api/analyze-ohlc", json=body)
+    assert response.status_code == 200
+    first, second = response.json()["signals"]
+    assert first["explainability"]["bars"] == 30 and first["explainability"]["sma50"] is None
+    assert first["explainability"]["volume_ratio"] is None
+    assert second["explainability"]["bars"] == 200 and second["explainability"]["sma50"] is not None
+
+
+def test_malformed_bodies_are_rejected():
+    client = TestClient(app)
+    body = _json_body(_candles(1, 40), ["A"])
+    body["series"][0]["close"] = body["series"][0]["close"][:-1]
+    assert client.post("/api/analyze-ohlc", json=body).status_code == 400
+    packed = _candles(2, 40).astype("<f8").tobytes()
+    assert client.post("/api/analyze-ohlc?symbols=A,B,C", content=packed,
+                       headers={"Content-Type": "application/octet-stream"}).status_code == 400
+    # Tamanho que não é múltiplo do dtype, símbolo vazio e corpo sem ?symbols=
+    for query, content in (("?symbols=A", b"\0" * 7), ("?symbols=A,", packed), ("", packed)):
+        response = client.post("/api/analyze-ohlc" + query, content=content,
+                               headers={"Content-Type": ohlc_api.BINARY_MEDIA_TYPE})
+        assert response.status_code == 400
+    assert client.post("/api/analyze-ohlc", content=b"x", headers={"Content-Type": "text/csv"}).status_code == 415
+
+
+def test_bulk_request_for_hundreds_of_symbols():
+    data = _candles(500, 250)
+    signals = ohlc_api._analyze(list(data))
+    assert len(signals) == 500
+    response = TestClient(app).post("/api/analyze-ohlc?symbols=" + ",".join(f"S{i}" for i in range(500)),
+                                    content=data.astype("<f4").tobytes(),
+                                    headers={"Content-Type": ohlc_api.BINARY_MEDIA_TYPE})
+    assert response.status_code == 200 and len(response.json()["signals"]) == 500
+
+
+def test_narration_is_attached_without_changing_the_decision(monkeypatch):
+    calls = []
+
+    def fake_narrate(prompt, text):
+        calls.append((prompt.key, text))
+        return {"narrativas": [{"indice": 0, "narrativa": "Tendência de alta com RSI neutro."}]}
+
+    monkeypatch.setattr(ohlc_api.AIService, "narrate_with_openai", staticmethod(fake_narrate))
+    body = {**_json_body(_candles(1, 60), ["BTCUSDT"]), "narrate": True}
+    client = TestClient(app)
+    plain = client.post("/api/analyze-ohlc", json={**body, "narrate": False}).json()["signals"][0]
+    narrated = client.post("/api/analyze-ohlc", json=body).json()["signals"][0]
+    assert calls and calls[0][0] == "ohlc_narration@v1" and "BTCUSDT" in calls[0][1]
+    assert narrated["narration"] == "Tendência de alta com RSI neutro."
+    assert narrated["signal"] == plain["signal"] and plain["narration"] is None
+    too_many = {**_json_body(_candles(ohlc_api.MAX_NARRATED_SYMBOLS + 1, 30), ["X"] * 6), "narrate": True}
+    assert client.post("/api/analyze-ohlc", json=too_many).status_code == 400
@@ -1,4 +1,4 @@
-from backend.signal_utils import interpret_model_output
+from backend.signal_utils import interpret_model_output, interpret_logits_batch, canonical_signal_response
 
 
 def test_parser_buy_keywords():
@@ -17,3 +17,13 @@ def test_parser_wait_default():
     assert parsed["signal"] == "WAIT"
 
 
+
+
+def test_logits_batch_matches_single_row():
+    rows = [[2.0, 0.1, -1.0], [0.2, 0.1, 0.0], [-3.0, 4.0, 0.5], [1000.0, 999.0, -1000.0]]
+    batch = interpret_logits_batch(rows, model_version="v1")
+    for row, got in zip(rows, batch):
+        parsed = interpret_model_output(model_logits=row)
+        expected = canonical_signal_response(parsed["signal"], parsed["confidence"], parsed["reason"],
+                                             model_version="v1", timestamp=got["timestamp"])
+        assert got == expected
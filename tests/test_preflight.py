@@ -0,0 +1,114 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.auth import get_current_user_from_request
+from backend.database import Database, User
+from backend.main import ChartAnalysisResponse, app
+from backend.preflight import QuotaHints
+
+DB_DELAY = 0.15
+
+
+@pytest.fixture
+def production(monkeypatch):
+    """Ambiente de produção com usuário autenticado, banco lento e provedor falso."""
+    state = SimpleNamespace(plan="trader", usage=3, events=[])
+
+    async def get_active_subscription(user_id):
+        await asyncio.sleep(DB_DELAY)
+        return SimpleNamespace(plan_type=state.plan)
+
+    async def get_monthly_usage(user_id):
+        await asyncio.sleep(DB_DELAY)
+        state.events.append(("usage_checked", time.perf_counter()))
+        return state.usage
+
+    async def increment_monthly_usage(user_id):
+        state.usage += 1
+        return state.usage
+
+    async def save_analysis(data):
+        return True
+
+    async def provider(image_path, user_id, plan_type, wait_for_admission=False):
+        state.events.append(("provider_started", time.perf_counter()))
+        try:
+            await asyncio.sleep(0.3)
+        except asyncio.CancelledError:
+            state.events.append(("provider_cancelled", time.perf_counter()))
+            raise
+        state.events.append(("provider_done", time.perf_counter()))
+        return ChartAnalysisResponse(acao="compra", justificativa=f"plano {plan_type}")
+
+    for name, fn in (("get_active_subscription", get_active_subscription), ("get_monthly_usage", get_monthly_usage),
+                     ("increment_monthly_usage", increment_monthly_usage), ("save_analysis", save_analysis)):
+        monkeypatch.setattr(Database, name, staticmethod(fn))
+    monkeypatch.setattr(main, "ENVIRONMENT", "production")
+    monkeypatch.setattr(main, "_run_chart_analysis", provider)
+    monkeypatch.setattr(main, "quota_hints", QuotaHints())
+    app.dependency_overrides[get_current_user_from_request] = lambda: User(id="u1", email="u1@example.com")
+    yield state
+    app.dependency_overrides.clear()
+
+
+def _post(client, image):
+    return client.post("/api/analyze-chart?user_id=u1", content=image, headers={"Content-Type": "image/png"})
+
+
+def _events(state, name):
+    return [at for event, at in state.events if event == name]
+
+
+def test_quota_reads_run_concurrently_with_each_other_and_the_upload(production, monkeypatch, chart_png):
+    saved = []
+    savings = main._preflight_savings
+    monkeypatch.setattr(main, "_preflight_savings", lambda *args: saved.append(savings(*args)) or saved[-1])
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        response = _post(client, chart_png())
+        elapsed = time.perf_counter() - started
+    assert response.status_code == 200
+    # Em sequência seriam 2 x DB_DELAY + triagem + provedor
+    assert elapsed < 2 * DB_DELAY + 0.3
+    assert saved[0] >= DB_DELAY * 0.8
+    assert not _events(production, "provider_started")[0] < _events(production, "usage_checked")[0]
+
+
+def test_paid_user_with_headroom_starts_the_provider_call_before_the_quota_check(production, chart_png):
+    with TestClient(app) as client:
+        assert _post(client, chart_png(1)).status_code == 200  # primeira requisição: aprende plano e uso
+        production.events.clear()
+        response = _post(client, chart_png(2))
+    assert response.status_code == 200 and response.json()["justificativa"].startswith("plano trader")
+    assert _events(production, "provider_started")[0] < _events(production, "usage_checked")[0]
+    assert len(_events(production, "provider_done")) == 1
+    assert production.usage == 5
+
+
+def test_speculative_call_is_cancelled_when_the_quota_check_fails(production, chart_png):
+    with TestClient(app) as client:
+        assert _post(client, chart_png(1)).status_code == 200
+        production.events.clear()
+        production.usage = 500  # cota esgotada desde a última requisição
+        response = _post(client, chart_png(2))
+        time.sleep(0.4)
+    assert response.status_code == 402
+    assert _events(production, "provider_started") and _events(production, "provider_cancelled")
+    assert not _events(production, "provider_done")
+
+
+def test_free_plan_and_stale_hints_never_speculate():
+    hints = QuotaHints(max_age_seconds=60, min_headroom=5)
+    hints.remember("free-user", "free", 0, 10, now=0.0)
+    hints.remember("paid", "trader", 100, 120, now=0.0)
+    assert hints.speculative_plan("free-user", now=1.0) is None
+    assert hints.speculative_plan("paid", now=1.0) == "trader"
+    assert hints.speculative_plan("paid", pending=16, now=1.0) is None
+    assert hints.speculative_plan("paid", now=61.0) is None
+    assert hints.speculative_plan("unknown", now=1.0) is None
+    assert QuotaHints(enabled=False).speculative_plan("paid") is None
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import prompts
+from backend.main import app
+from backend.prompts import (PROMPTS, ChartAnalysisV2, count_tokens, estimate_image_tokens, get_prompt,
+                             normalize_usage, record_usage, usage_report)
+
+
+def test_registry_defaults_to_the_six_step_prompt(monkeypatch):
+    monkeypatch.delenv("CHART_PROMPT_VERSION", raising=False)
+    prompt = get_prompt()
+    assert prompt.key == "chart_analysis@v2"
+    assert prompt.schema is ChartAnalysisV2
+    assert "passo_6_confluencia" in prompt.text and "resumo_analise" in prompt.text
+    assert prompt.prompt_tokens == count_tokens(prompt.text) > 0
+
+    monkeypatch.setenv("CHART_PROMPT_VERSION", "v1")
+    assert get_prompt().key == "chart_analysis@v1"
+    assert get_prompt("ohlc_narration").key == "ohlc_narration@v1"
+    with pytest.raises(ValueError):
+        get_prompt(version="v9")
+
+
+def test_prompt_text_is_a_stable_prefix():
+    # Nothing request-specific may leak into the cached prefix
+    for prompt in PROMPTS.values():
+        assert prompt.text == prompt.text.strip()
+        assert "{" not in prompt.text.split("\n", 1)[0]
+        assert len(prompt.sha256) == 12
+
+
+def test_legacy_response_is_normalized_to_the_parser_shape():
+    payload = {"decisao": "compra", "justificativa_decisao": "Rompimento com volume",
+               "estrutura_mercado": {"tendencia_principal": "Alta"}}
+    normalized = get_prompt(version="v1").normalize(payload)
+    assert normalized["resumo_analise"] == {"acao": "compra", "justificativa": "Rompimento com volume"}
+    assert normalized["passo_1_estrutura"]["tendencia_principal"] == "Alta"
+
+
+def test_image_token_estimate_follows_tile_formula():
+    assert estimate_image_tokens(512, 512) == 85 + 170
+    assert estimate_image_tokens(1920, 1080) == 85 + 170 * 6
+    assert estimate_image_tokens(4000, 4000, detail="low") == 85
+
+
+def test_usage_from_both_providers_is_accounted(monkeypatch):
+    monkeypatch.setattr(prompts, "_usage", {})
+    prompt = get_prompt(version="v2")
+    assert normalize_usage({"promptTokenCount": 10, "candidatesTokenCount": 4, "cachedContentTokenCount": 8}) == \
+        {"input": 10, "cached_input": 8, "output": 4}
+    record_usage(prompt, "openai", "gpt-4o", {"prompt_tokens": 3000, "completion_tokens": 500,
+                                              "prompt_tokens_details": {"cached_tokens": 2048}}, 2.0)
+    record_usage(prompt, "openai", "gpt-4o", {"prompt_tokens": 3000, "completion_tokens": 500}, 4.0)
+    (row,) = usage_report()["usage"]
+    assert row["calls"] == 2 and row["output_tokens"] == 1000
+    assert row["cache_hit_ratio"] == round(2048 / 6000, 4)
+    # (952 * 2.50 + 2048 * 1.25 + 500 * 10) + (3000 * 2.50 + 500 * 10) per 1M
+    assert row["cost_usd"] == pytest.approx((2380 + 2560 + 5000 + 7500 + 5000) / 1e6)
+    assert row["mean_latency_seconds"] == 3.0
+
+
+def test_prompts_endpoint_is_protected_like_metrics(monkeypatch):
+    client = TestClient(app)
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    assert client.get("/api/prompts").status_code == 401
+    body = client.get("/api/prompts", headers={"Authorization": "Bearer s3cret"}).json()
+    assert {p["key"] for p in body["prompts"]} == {"chart_analysis@v1", "chart_analysis@v2", "ohlc_narration@v1"}
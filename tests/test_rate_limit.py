@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import jwt
+from fastapi.testclient import TestClient
+
+from backend import auth, rate_limit
+from backend.main import app
+from backend.rate_limit import Limit, MemoryBackend, RateLimiter, parse_rules
+
+
+def test_token_bucket_refills_and_evicts_least_recently_used():
+    backend = MemoryBackend(max_keys=2)
+    limit = Limit(requests=2, period=10)  # 0.2 tokens/s
+
+    async def run():
+        results = [await backend.take("a", limit, now=0.0) for _ in range(3)]
+        results.append(await backend.take("a", limit, now=5.0))
+        await backend.take("b", limit, now=5.0)
+        await backend.take("c", limit, now=5.0)
+        return results
+
+    (first, second, rejected, refilled) = asyncio.run(run())
+    assert first[0] and second[0] and not rejected[0]
+    assert rejected[2] == 5.0  # one token takes 5s at 0.2/s
+    assert refilled[0] and refilled[1] == 0.0
+    assert backend.stats()["keys"] == 2 and backend.evictions == 1 and "a" not in backend._buckets
+
+
+def test_middleware_limits_by_ip_and_verified_user(monkeypatch):
+    limiter = RateLimiter(parse_rules("GET /api/signal=anonymous:2/60,free:3/60,trader:4/60"))
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    client = TestClient(app)
+
+    anonymous = [client.get("/api/signal") for _ in range(3)]
+    assert [r.status_code for r in anonymous] == [200, 200, 429]
+    assert anonymous[0].headers["x-ratelimit-remaining"] == "1"
+    assert int(anonymous[2].headers["retry-after"]) >= 1
+    assert anonymous[2].json()["code"] == 429
+
+    token = jwt.encode({"sub": "user-1", "exp": int(time.time()) + 60}, auth.SUPABASE_JWT_SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/signal", headers=headers).headers["x-ratelimit-limit"] == "3"
+    limiter.remember_plan("user-1", "trader")
+    assert client.get("/api/signal", headers=headers).headers["x-ratelimit-limit"] == "4"
+
+    forged = jwt.encode({"sub": "user-2"}, "wrong-secret", algorithm="HS256")
+    assert client.get("/api/signal", headers={"Authorization": f"Bearer {forged}"}).status_code == 429
@@ -13,3 +13,28 @@ def test_signal_endpoint_shape():
     assert isinstance(data["reason"], str)
 
 
+
+
+def test_signals_batch_endpoint():
+    client = TestClient(app)
+    r = client.post("/api/signals", json={"symbols": ["BTCUSDT", "ETHUSDT"], "logits": [[3, 0, 0], [0, 0.1, 0]]})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["symbols"] == ["BTCUSDT", "ETHUSDT"]
+    assert [s["signal"] for s in data["signals"]] == ["BUY", "WAIT"]
+
+    r = client.post("/api/signals", json={"symbols": ["BTCUSDT", "ETHUSDT", "SOLUSDT"]})
+    assert r.status_code == 200
+    assert len(r.json()["signals"]) == 3
+
+
+def test_signal_endpoint_serves_snapshot_with_etag():
+    client = TestClient(app)
+    first = client.get("/api/signal?symbol=btcusdt")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert "max-age" in first.headers["cache-control"]
+    second = client.get("/api/signal?symbol=BTCUSDT")
+    assert second.json() == first.json()
+    cached = client.get("/api/signal?symbol=BTCUSDT", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
@@ -0,0 +1,44 @@
+import asyncio
+from backend.signal_publisher import SignalPublisher
+
+
+def test_publisher_computes_once_per_interval_and_pushes_changes():
+    calls = []
+
+    async def compute(symbol):
+        calls.append(symbol)
+        await asyncio.sleep(0.01)
+        return {"signal": "BUY" if len(calls) > 1 else "WAIT", "confidence": 0.7, "reason": "r", "timestamp": str(len(calls))}
+
+    async def run():
+        publisher = SignalPublisher(compute, refresh_interval=0.05)
+        snapshots = await asyncio.gather(*(publisher.get("BTC") for _ in range(50)))
+        assert len(calls) == 1
+        assert len({id(s) for s in snapshots}) == 1
+        received = []
+        async for snapshot in publisher.subscribe("BTC"):
+            received.append(snapshot)
+            if len(received) == 2:
+                break
+        return received
+
+    first, second = asyncio.run(run())
+    assert (first.version, first.data["signal"]) == (1, "WAIT")
+    assert (second.version, second.data["signal"]) == (2, "BUY")
+    assert first.etag != second.etag
+
+
+def test_publisher_keeps_snapshot_when_signal_unchanged():
+    async def compute(symbol):
+        return {"signal": "WAIT", "confidence": 0.7, "reason": "r", "timestamp": "changes every call"}
+
+    async def run():
+        publisher = SignalPublisher(compute, refresh_interval=0.01)
+        first = await publisher.get()
+        await asyncio.sleep(0.02)
+        second = await publisher.get()
+        return first, second, publisher.computations
+
+    first, second, computations = asyncio.run(run())
+    assert computations == 2
+    assert second.version == first.version and second.etag == first.etag
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from backend import startup
+from backend.main import app
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_the_app_defers_the_heavy_sdks():
+    script = f"import sys, backend.main; print(sorted(m for m in {startup.HEAVY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, capture_output=True, text=True,
+                               check=True)
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_lazy_module_loads_once_on_first_use(monkeypatch):
+    configured = []
+    module = startup.LazyModule("wave", on_load=configured.append)
+    assert not module.loaded and "wave" in repr(module)
+    assert module.Error.__name__ == "Error"
+    assert module.loaded and module.open is sys.modules["wave"].open
+    assert len(configured) == 1 and configured[0] is sys.modules["wave"]
+    assert "wave" in startup.report()["lazy_imports"]
+
+    # monkeypatch no proxy altera o módulo real (e desfaz ao final)
+    monkeypatch.setattr(module, "open", "patched")
+    assert sys.modules["wave"].open == "patched"
+
+
+def test_import_profiler_times_each_package():
+    profiler = startup.ImportProfiler()
+    sys.modules.pop("tabnanny", None)
+    sys.meta_path.insert(0, profiler)
+    try:
+        import tabnanny  # noqa: F401
+    finally:
+        sys.meta_path.remove(profiler)
+    assert "tabnanny" in profiler.top_packages()
+
+
+def test_startup_report_has_the_cold_start_phases(monkeypatch):
+    monkeypatch.setenv("STARTUP_WARMUP", "false")
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        report = client.get("/api/startup").json()
+    # Marcas de processo: a primeira resposta pode vir de outro teste (TestClient sem startup)
+    assert 0 < report["import_seconds"] <= min(report["ready_seconds"], report["first_response_seconds"])
+    assert set(report["deferred"]) <= set(startup.HEAVY_MODULES)
+    assert "lazy_imports" in report
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from backend import ai_service
+from backend.ai_service import AIService
+from backend.metrics import MODEL_REPLIES, PARSE_RETRY_CALLS
+from backend.prompts import MalformedOutput, get_prompt
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+
+def _completion(content):
+    return FakeResponse({"choices": [{"message": {"role": "assistant", "content": content}}],
+                         "usage": {"prompt_tokens": 10, "completion_tokens": 5}})
+
+
+def test_schema_is_strict_for_openai_and_translated_for_gemini():
+    prompt = get_prompt(version="v2")
+    schema = prompt.openai_response_format()["json_schema"]["schema"]
+    assert schema["additionalProperties"] is False
+    assert set(schema["required"]) == set(schema["properties"])
+    assert schema["properties"]["resumo_analise"]["properties"]["acao"]["enum"] == ["compra", "venda", "esperar"]
+    assert "$ref" not in json.dumps(schema)
+    gemini = prompt.gemini_response_schema()
+    assert gemini["type"] == "OBJECT"
+    assert gemini["properties"]["passo_6_confluencia"]["properties"]["sinais_confirmados"]["type"] == "ARRAY"
+    assert "additionalProperties" not in json.dumps(gemini)
+
+
+def test_parse_validates_in_one_pass_and_keeps_only_sent_keys():
+    prompt = get_prompt(version="v2")
+    payload, outcome = prompt.parse('{"preco_atual": 43250.5, "resumo_analise": {"acao": "compra"}}')
+    assert outcome == "valid"
+    assert payload == {"preco_atual": "43250.5", "resumo_analise": {"acao": "compra"}}
+    assert prompt.parse('Segue: {"resumo_analise": {"acao": "venda"}} ok')[1] == "repaired"
+    with pytest.raises(MalformedOutput):
+        prompt.parse("não consigo analisar")
+    with pytest.raises(MalformedOutput):
+        prompt.parse('{"passo_6_confluencia": {"sinais_confirmados": "tudo"}}')
+
+
+def test_openai_request_carries_schema_and_malformed_reply_costs_one_retry(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.delenv("AI_STRUCTURED_OUTPUT", raising=False)
+    sent = []
+    replies = iter([_completion("Desculpe, aqui vai a análise em texto."),
+                    _completion(json.dumps({"resumo_analise": {"acao": "venda", "justificativa": "LTB"}}))])
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        sent.append(json)
+        return next(replies)
+
+    monkeypatch.setattr(ai_service.requests, "post", fake_post)
+    retries = PARSE_RETRY_CALLS.labels("openai").get()
+    malformed = MODEL_REPLIES.labels("openai", "gpt-4o", "malformed").get()
+
+    result = AIService.analyze_chart_with_openai("data:image/png;base64,AAAA", get_prompt(version="v2"))
+
+    assert result["resumo_analise"]["acao"] == "venda"
+    assert [p["model"] for p in sent] == ["gpt-4o", "gpt-4o-mini"]
+    assert sent[0]["response_format"]["json_schema"]["strict"] is True
+    assert sent[0]["messages"][0] == {"role": "system", "content": get_prompt(version="v2").text}
+    assert PARSE_RETRY_CALLS.labels("openai").get() == retries + 1
+    assert MODEL_REPLIES.labels("openai", "gpt-4o", "malformed").get() == malformed + 1
+
+
+def test_gemini_request_uses_response_schema(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "g-test")
+    sent = []
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        sent.append(json)
+        return FakeResponse({"candidates": [{"content": {"parts": [{"text": '{"simbolo_detectado": "PETR4"}'}]}}],
+                             "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 3}})
+
+    monkeypatch.setattr(ai_service.requests, "post", fake_post)
+    assert AIService.analyze_chart_with_gemini("AAAA")["simbolo_detectado"] == "PETR4"
+    config = sent[0]["generationConfig"]
+    assert config["responseMimeType"] == "application/json"
+    assert config["responseSchema"]["type"] == "OBJECT"
+
+    monkeypatch.setenv("AI_STRUCTURED_OUTPUT", "false")
+    AIService.analyze_chart_with_gemini("AAAA")
+    assert "responseSchema" not in sent[1]["generationConfig"]
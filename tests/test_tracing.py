@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import tracing
+from backend.main import app
+
+
+class _Capture:
+    def __init__(self):
+        self.traces = []
+
+    def submit(self, spans):
+        self.traces.append(spans)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    capture = _Capture()
+
+    def configure(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        tracing.configure_tracing(exporter=capture)
+        return capture
+
+    yield configure
+    monkeypatch.undo()
+    tracing.configure_tracing()
+
+
+def test_spans_nest_across_awaits_and_threads(exported):
+    capture = exported(TRACE_SAMPLE_RATE="1")
+
+    def provider_call():
+        with tracing.start_span("provider"):
+            pass
+
+    async def request():
+        with tracing.start_span("request", kind=tracing.SPAN_KIND_SERVER):
+            await asyncio.sleep(0)
+            with tracing.start_span("db"):
+                await asyncio.sleep(0)
+            await asyncio.to_thread(provider_call)
+            await tracing.run_in_executor(provider_call)
+
+    asyncio.run(request())
+    (spans,) = capture.traces
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span.name, []).append(span)
+    root = by_name["request"][0]
+    assert {s.trace_id for s in spans} == {root.trace_id}
+    assert all(s.parent_id == root.span_id for s in by_name["db"] + by_name["provider"])
+    assert len(by_name["provider"]) == 2
+
+    otlp = tracing.to_otlp(spans, "tickrify-api")["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {s["name"] for s in otlp} == {"request", "db", "provider"}
+    assert all(int(s["endTimeUnixNano"]) >= int(s["startTimeUnixNano"]) for s in otlp)
+
+
+def test_tail_sampling_keeps_slow_and_failed_traces(exported):
+    capture = exported(TRACE_SAMPLE_RATE="0", TRACE_TAIL_MIN_MS="30", TRACE_TAIL_ERRORS="1")
+    with tracing.start_span("fast"):
+        with tracing.start_span("child"):
+            pass
+    with tracing.start_span("slow"):
+        time.sleep(0.04)
+    with pytest.raises(RuntimeError):
+        with tracing.start_span("failed"):
+            raise RuntimeError("provider down")
+    assert [spans[-1].name for spans in capture.traces] == ["slow", "failed"]
+    assert capture.traces[1][0].status == tracing.STATUS_ERROR
+
+
+def test_unsampled_traces_are_not_recorded_without_tail_rules(exported):
+    capture = exported(TRACE_SAMPLE_RATE="0", TRACE_TAIL_MIN_MS="", TRACE_TAIL_ERRORS="0")
+    with tracing.start_span("root") as root:
+        with tracing.start_span("child") as child:
+            pass
+    assert not root.recording and not child.recording and capture.traces == []
+
+
+def test_middleware_continues_incoming_traceparent(exported):
+    capture = exported(TRACE_SAMPLE_RATE="1")
+    parent = "00-" + "ab" * 16 + "-" + "cd" * 8 + "-01"
+    response = TestClient(app).get("/api/signal", headers={"traceparent": parent})
+    assert response.headers["x-trace-id"] == "ab" * 16
+    root = next(s for spans in capture.traces for s in spans if s.name == "GET /api/signal")
+    assert root.parent_id == "cd" * 8 and root.attributes["http.status_code"] == 200
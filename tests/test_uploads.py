@@ -0,0 +1,44 @@
+import base64
+
+from fastapi.testclient import TestClient
+
+from backend import uploads
+from backend.main import app
+
+
+def test_json_multipart_and_raw_bodies_are_equivalent(chart_png):
+    client = TestClient(app)
+    image = chart_png()
+    responses = [
+        client.post("/api/analyze-chart", json={"image_base64": base64.b64encode(image).decode(), "user_id": "dev-user"}),
+        client.post("/api/analyze-chart", files={"image": ("chart.png", image, "image/png")}, data={"user_id": "dev-user"}),
+        client.post("/api/analyze-chart?user_id=dev-user", content=image, headers={"Content-Type": "image/png"}),
+    ]
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert all(r.json()["acao"] in ("compra", "venda", "esperar") for r in responses)
+
+
+def test_oversized_and_unsupported_bodies_are_rejected(monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_IMAGE_BYTES", 1024)
+    client = TestClient(app)
+    big = b"\x89PNG" + b"\0" * 4096
+
+    declared = client.post("/api/analyze-chart", content=big, headers={"Content-Type": "image/png"})
+    assert declared.status_code == 413
+
+    def chunks():
+        for _ in range(8):
+            yield b"\0" * 512
+
+    streamed = client.post("/api/analyze-chart", content=chunks(), headers={"Content-Type": "image/png"})
+    assert streamed.status_code == 413
+
+    multipart = client.post("/api/analyze-chart", files={"image": ("chart.png", big, "image/png")})
+    assert multipart.status_code == 413
+
+    # Base64 dentro da folga do envelope JSON, mas a imagem decodificada passa do limite
+    encoded = client.post("/api/analyze-chart", json={"image_base64": base64.b64encode(big).decode(),
+                                                      "user_id": "dev-user"})
+    assert encoded.status_code == 413
+    assert client.post("/api/analyze-chart", content=b"x", headers={"Content-Type": "text/plain"}).status_code == 415
+    assert client.post("/api/analyze-chart", json={"user_id": "dev-user"}).status_code == 422